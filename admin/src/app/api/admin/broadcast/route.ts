@@ -2,13 +2,12 @@ import { NextResponse } from "next/server";
 import { prisma } from "@/lib/prisma";
 import { getServerEnv } from "@/lib/server-env";
 import { requireAdminAuth } from "@/lib/admin-auth";
-import { enqueueBroadcastJob, getBroadcastJob } from "@/lib/broadcast-jobs";
+import { enqueueBroadcastJob, ensureBroadcastTables, getBroadcastJob } from "@/lib/broadcast-jobs";
 
 const TELEGRAM_API_BASE = "https://api.telegram.org";
 const TELEGRAM_REQUEST_TIMEOUT_MS = 15000;
 const BROADCAST_BATCH_SIZE = 10;
 const BROADCAST_BATCH_DELAY_MS = 500;
-const MAX_BROADCAST_RECIPIENTS = 5000;
 type Segment =
   | "all"
   | "no_paid_24h"
@@ -27,6 +26,110 @@ function toEpochMsExpr(columnRef: string): string {
   `;
 }
 
+// Users in `segment`, as SQL selecting `u.id` in signup order. Banned users and users who
+// blocked the bot (recorded by the bot's broadcast engine) are left out.
+function segmentRecipientsSql(segment: Segment): string {
+  const nowMs = Date.now();
+  const dayMs = 24 * 60 * 60 * 1000;
+  const inactive3dThreshold = nowMs - 3 * dayMs;
+  const inactive7dThreshold = nowMs - 7 * dayMs;
+  const noPaid24hThreshold = nowMs - dayMs;
+  const userCreatedAtMs = toEpochMsExpr("u.createdAt");
+  const logCreatedAtMs = toEpochMsExpr("createdAt");
+  const orderCreatedAtMs = toEpochMsExpr("createdAt");
+
+  if (segment === "no_paid_24h") {
+    return `
+      SELECT u.id
+      FROM users u
+      LEFT JOIN banned_users bu ON bu.userId = u.id
+      LEFT JOIN blocked_users blk ON blk.userId = u.id
+      WHERE bu.userId IS NULL
+        AND blk.userId IS NULL
+        AND ${userCreatedAtMs} <= ${noPaid24hThreshold}
+        AND NOT EXISTS (
+          SELECT 1 FROM orders o WHERE o.userId = u.id AND o.status LIKE 'paid%'
+        )
+      ORDER BY u.rowid ASC
+    `;
+  }
+  if (segment === "inactive_3d") {
+    return `
+      SELECT u.id
+      FROM users u
+      LEFT JOIN banned_users bu ON bu.userId = u.id
+      LEFT JOIN blocked_users blk ON blk.userId = u.id
+      LEFT JOIN (
+        SELECT userId, MAX(${logCreatedAtMs}) AS lastActivity
+        FROM logs
+        GROUP BY userId
+      ) l ON l.userId = u.id
+      WHERE bu.userId IS NULL
+        AND blk.userId IS NULL
+        AND COALESCE(l.lastActivity, ${userCreatedAtMs}) <= ${inactive3dThreshold}
+      ORDER BY u.rowid ASC
+    `;
+  }
+  if (segment === "inactive_7d") {
+    return `
+      SELECT u.id
+      FROM users u
+      LEFT JOIN banned_users bu ON bu.userId = u.id
+      LEFT JOIN blocked_users blk ON blk.userId = u.id
+      LEFT JOIN (
+        SELECT userId, MAX(${logCreatedAtMs}) AS lastActivity
+        FROM logs
+        GROUP BY userId
+      ) l ON l.userId = u.id
+      WHERE bu.userId IS NULL
+        AND blk.userId IS NULL
+        AND COALESCE(l.lastActivity, ${userCreatedAtMs}) <= ${inactive7dThreshold}
+      ORDER BY u.rowid ASC
+    `;
+  }
+  if (segment === "one_paid_no_repeat_7d") {
+    return `
+      SELECT u.id
+      FROM users u
+      LEFT JOIN banned_users bu ON bu.userId = u.id
+      LEFT JOIN blocked_users blk ON blk.userId = u.id
+      JOIN (
+        SELECT userId, COUNT(1) AS paidCount, MAX(${orderCreatedAtMs}) AS lastPaidAt
+        FROM orders
+        WHERE status LIKE 'paid%'
+        GROUP BY userId
+      ) p ON p.userId = u.id
+      WHERE bu.userId IS NULL
+        AND blk.userId IS NULL
+        AND p.paidCount = 1
+        AND p.lastPaidAt <= ${inactive7dThreshold}
+      ORDER BY u.rowid ASC
+    `;
+  }
+  if (segment === "paid_no_referrals") {
+    return `
+      SELECT u.id
+      FROM users u
+      LEFT JOIN banned_users bu ON bu.userId = u.id
+      LEFT JOIN blocked_users blk ON blk.userId = u.id
+      WHERE bu.userId IS NULL
+        AND blk.userId IS NULL
+        AND EXISTS (SELECT 1 FROM orders o WHERE o.userId = u.id AND o.status LIKE 'paid%')
+        AND NOT EXISTS (SELECT 1 FROM users r WHERE r.referrerId = u.id)
+      ORDER BY u.rowid ASC
+    `;
+  }
+  return `
+    SELECT u.id
+    FROM users u
+    LEFT JOIN banned_users bu ON bu.userId = u.id
+    LEFT JOIN blocked_users blk ON blk.userId = u.id
+    WHERE bu.userId IS NULL
+      AND blk.userId IS NULL
+    ORDER BY u.rowid ASC
+  `;
+}
+
 async function ensureBannedUsersTable(): Promise<void> {
   await prisma.$executeRawUnsafe(`
     CREATE TABLE IF NOT EXISTS banned_users (
@@ -138,13 +241,14 @@ export async function GET(req: Request) {
   const authError = requireAdminAuth(req);
   if (authError) return authError;
 
+  await ensureBroadcastTables();
   const url = new URL(req.url);
   const jobId = url.searchParams.get("jobId")?.trim() ?? "";
   if (!jobId) {
     return NextResponse.json({ error: "jobId is required" }, { status: 400 });
   }
 
-  const job = getBroadcastJob(jobId);
+  const job = await getBroadcastJob(jobId);
   if (!job) {
     return NextResponse.json({ error: "Job not found" }, { status: 404 });
   }
@@ -175,127 +279,15 @@ export async function POST(req: Request) {
       return NextResponse.json({ error: "Text or photo is required" }, { status: 400 });
     }
 
-    const recipients: Array<{ id: bigint }> = [];
-    if (previewOnly) {
-      const adminTelegramIdRaw = getServerEnv("ADMIN_TELEGRAM_ID");
-      if (!adminTelegramIdRaw || !/^\d+$/.test(adminTelegramIdRaw)) {
-        return NextResponse.json(
-          { error: "ADMIN_TELEGRAM_ID is missing or invalid" },
-          { status: 500 },
-        );
-      }
-      recipients.push({ id: BigInt(adminTelegramIdRaw) });
-    } else {
-      const nowMs = Date.now();
-      const dayMs = 24 * 60 * 60 * 1000;
-      const inactive3dThreshold = nowMs - 3 * dayMs;
-      const inactive7dThreshold = nowMs - 7 * dayMs;
-      const noPaid24hThreshold = nowMs - dayMs;
-      const userCreatedAtMs = toEpochMsExpr("u.createdAt");
-      const logCreatedAtMs = toEpochMsExpr("createdAt");
-      const orderCreatedAtMs = toEpochMsExpr("createdAt");
-
-      let users: Array<{ id: bigint }> = [];
-      if (segment === "no_paid_24h") {
-        users = await prisma.$queryRawUnsafe<Array<{ id: bigint }>>(`
-          SELECT u.id
-          FROM users u
-          LEFT JOIN banned_users bu ON bu.userId = u.id
-          WHERE bu.userId IS NULL
-            AND ${userCreatedAtMs} <= ${noPaid24hThreshold}
-            AND NOT EXISTS (
-              SELECT 1 FROM orders o WHERE o.userId = u.id AND o.status LIKE 'paid%'
-            )
-          ORDER BY u.rowid ASC
-        `);
-      } else if (segment === "inactive_3d") {
-        users = await prisma.$queryRawUnsafe<Array<{ id: bigint }>>(`
-          SELECT u.id
-          FROM users u
-          LEFT JOIN banned_users bu ON bu.userId = u.id
-          LEFT JOIN (
-            SELECT userId, MAX(${logCreatedAtMs}) AS lastActivity
-            FROM logs
-            GROUP BY userId
-          ) l ON l.userId = u.id
-          WHERE bu.userId IS NULL
-            AND COALESCE(l.lastActivity, ${userCreatedAtMs}) <= ${inactive3dThreshold}
-          ORDER BY u.rowid ASC
-        `);
-      } else if (segment === "inactive_7d") {
-        users = await prisma.$queryRawUnsafe<Array<{ id: bigint }>>(`
-          SELECT u.id
-          FROM users u
-          LEFT JOIN banned_users bu ON bu.userId = u.id
-          LEFT JOIN (
-            SELECT userId, MAX(${logCreatedAtMs}) AS lastActivity
-            FROM logs
-            GROUP BY userId
-          ) l ON l.userId = u.id
-          WHERE bu.userId IS NULL
-            AND COALESCE(l.lastActivity, ${userCreatedAtMs}) <= ${inactive7dThreshold}
-          ORDER BY u.rowid ASC
-        `);
-      } else if (segment === "one_paid_no_repeat_7d") {
-        users = await prisma.$queryRawUnsafe<Array<{ id: bigint }>>(`
-          SELECT u.id
-          FROM users u
-          LEFT JOIN banned_users bu ON bu.userId = u.id
-          JOIN (
-            SELECT userId, COUNT(1) AS paidCount, MAX(${orderCreatedAtMs}) AS lastPaidAt
-            FROM orders
-            WHERE status LIKE 'paid%'
-            GROUP BY userId
-          ) p ON p.userId = u.id
-          WHERE bu.userId IS NULL
-            AND p.paidCount = 1
-            AND p.lastPaidAt <= ${inactive7dThreshold}
-          ORDER BY u.rowid ASC
-        `);
-      } else if (segment === "paid_no_referrals") {
-        users = await prisma.$queryRaw<Array<{ id: bigint }>>`
-          SELECT u.id
-          FROM users u
-          LEFT JOIN banned_users bu ON bu.userId = u.id
-          WHERE bu.userId IS NULL
-            AND EXISTS (SELECT 1 FROM orders o WHERE o.userId = u.id AND o.status LIKE 'paid%')
-            AND NOT EXISTS (SELECT 1 FROM users r WHERE r.referrerId = u.id)
-          ORDER BY u.rowid ASC
-        `;
-      } else {
-        users = await prisma.$queryRaw<Array<{ id: bigint }>>`
-          SELECT u.id
-          FROM users u
-          LEFT JOIN banned_users bu ON bu.userId = u.id
-          WHERE bu.userId IS NULL
-          ORDER BY u.rowid ASC
-        `;
-      }
-      recipients.push(...users);
-    }
-
-    if (!previewOnly && recipients.length > MAX_BROADCAST_RECIPIENTS) {
-      return NextResponse.json(
-        {
-          error: `Broadcast audience too large (${recipients.length}). Use tighter segment or increase MAX_BROADCAST_RECIPIENTS.`,
-        },
-        { status: 400 },
-      );
-    }
-
     if (!previewOnly) {
-      const job = enqueueBroadcastJob({
-        mode: "broadcast",
+      // The bot sends it (bot_py/broadcast.py): paced at the Telegram limit, photo uploaded
+      // once, and resumed from the recipients still pending after a restart.
+      await ensureBroadcastTables();
+      const job = await enqueueBroadcastJob({
         segment,
-        total: recipients.length,
-        worker: async () =>
-          runBroadcastSend({
-            recipients,
-            token,
-            hasPhoto,
-            photo: photo as File | null,
-            text,
-          }),
+        text,
+        photo: hasPhoto ? new Uint8Array(await (photo as File).arrayBuffer()) : null,
+        recipientsSql: segmentRecipientsSql(segment),
       });
 
       return NextResponse.json(
@@ -305,12 +297,21 @@ export async function POST(req: Request) {
           segment,
           queued: true,
           jobId: job.id,
-          total: recipients.length,
+          total: job.total,
         },
         { status: 202 },
       );
     }
 
+    const adminTelegramIdRaw = getServerEnv("ADMIN_TELEGRAM_ID");
+    if (!adminTelegramIdRaw || !/^\d+$/.test(adminTelegramIdRaw)) {
+      return NextResponse.json(
+        { error: "ADMIN_TELEGRAM_ID is missing or invalid" },
+        { status: 500 },
+      );
+    }
+    const recipients = [{ id: BigInt(adminTelegramIdRaw) }];
+
     const result = await runBroadcastSend({
       recipients,
       token,
@@ -45,10 +45,11 @@ export function BroadcastPanel() {
         const sent = Number(job.sent ?? 0);
         const total = Number(job.total ?? 0);
         const failed = Number(job.failed ?? 0);
+        const blocked = Number(job.blocked ?? 0);
         const jobStatus = String(job.status ?? "");
 
         if (jobStatus === "completed") {
-          setStatus(`Broadcast completed: sent ${sent}/${total}, failed ${failed}`);
+          setStatus(`Broadcast completed: sent ${sent}/${total}, failed ${failed}, blocked ${blocked}`);
           setIsPollingJob(false);
           setActiveJobId(null);
           return;
@@ -62,7 +63,7 @@ export function BroadcastPanel() {
           return;
         }
 
-        setStatus(`Broadcast in progress: sent ${sent}/${total}, failed ${failed}`);
+        setStatus(`Broadcast in progress: sent ${sent}/${total}, failed ${failed}, blocked ${blocked}`);
       } catch (error) {
         if (!cancelled) {
           setStatus(`Error: ${error instanceof Error ? error.message : "failed to fetch job status"}`);
@@ -164,4 +165,4 @@ export function BroadcastPanel() {
       {status ? <p className="text-xs text-muted-foreground">{status}</p> : null}
     </form>
   );
-}
+}
@@ -1,3 +1,8 @@
+import { prisma } from "@/lib/prisma";
+
+// Broadcasts are sent by the bot process (bot_py/broadcast.py); the panel only queues them
+// in SQLite and reads their progress back, so a restart of either side loses nothing.
+
 export type BroadcastJobStatus = "queued" | "running" | "completed" | "failed";
 
 export type BroadcastJobSnapshot = {
@@ -8,6 +13,7 @@ export type BroadcastJobSnapshot = {
   total: number;
   sent: number;
   failed: number;
+  blocked: number;
   failedUsers: string[];
   error?: string;
   createdAt: string;
@@ -16,16 +22,22 @@ export type BroadcastJobSnapshot = {
   updatedAt: string;
 };
 
-type BroadcastJobWorkerResult = {
-  sent: number;
-  failed: number;
-  failedUsers: string[];
+type BroadcastRow = {
+  id: string;
+  status: string;
+  segment: string;
+  total: number | bigint;
+  sent: number | bigint;
+  failed: number | bigint;
+  blocked: number | bigint;
+  error: string;
+  createdAt: string;
+  startedAt: string;
+  finishedAt: string;
+  updatedAt: string;
 };
 
-type BroadcastJobWorker = () => Promise<BroadcastJobWorkerResult>;
-
-const MAX_STORED_JOBS = 100;
-const jobs = new Map<string, BroadcastJobSnapshot>();
+const MAX_FAILED_USERS = 25;
 
 function nowIso(): string {
   return new Date().toISOString();
@@ -36,71 +48,119 @@ function makeId(): string {
   return `br_${Date.now()}_${rand}`;
 }
 
-function pruneJobs() {
-  if (jobs.size <= MAX_STORED_JOBS) return;
-  const ordered = Array.from(jobs.values()).sort((a, b) => a.createdAt.localeCompare(b.createdAt));
-  const toDelete = ordered.slice(0, jobs.size - MAX_STORED_JOBS);
-  for (const job of toDelete) {
-    jobs.delete(job.id);
-  }
-}
-
-function patchJob(id: string, patch: Partial<BroadcastJobSnapshot>) {
-  const current = jobs.get(id);
-  if (!current) return;
-  jobs.set(id, {
-    ...current,
-    ...patch,
-    updatedAt: nowIso(),
-  });
+// Same DDL as DB.ensure_runtime_schema in bot_py/db.py; tests_py/test_broadcast.py checks that
+// both build the same tables.
+export async function ensureBroadcastTables(): Promise<void> {
+  await prisma.$executeRawUnsafe(`
+    CREATE TABLE IF NOT EXISTS broadcasts (
+      id TEXT PRIMARY KEY,
+      segment TEXT NOT NULL DEFAULT '',
+      text TEXT NOT NULL DEFAULT '',
+      photo BLOB,
+      photoFileId TEXT NOT NULL DEFAULT '',
+      status TEXT NOT NULL DEFAULT 'queued',
+      total INTEGER NOT NULL DEFAULT 0,
+      sent INTEGER NOT NULL DEFAULT 0,
+      failed INTEGER NOT NULL DEFAULT 0,
+      blocked INTEGER NOT NULL DEFAULT 0,
+      error TEXT NOT NULL DEFAULT '',
+      createdAt TEXT NOT NULL DEFAULT '',
+      startedAt TEXT NOT NULL DEFAULT '',
+      finishedAt TEXT NOT NULL DEFAULT '',
+      updatedAt TEXT NOT NULL DEFAULT ''
+    )
+  `);
+  await prisma.$executeRawUnsafe(`
+    CREATE TABLE IF NOT EXISTS broadcast_recipients (
+      broadcastId TEXT NOT NULL,
+      userId INTEGER NOT NULL,
+      status TEXT NOT NULL DEFAULT 'pending',
+      error TEXT NOT NULL DEFAULT '',
+      PRIMARY KEY (broadcastId, userId)
+    )
+  `);
+  await prisma.$executeRawUnsafe(
+    "CREATE INDEX IF NOT EXISTS broadcast_recipients_status ON broadcast_recipients (broadcastId, status)",
+  );
+  await prisma.$executeRawUnsafe(`
+    CREATE TABLE IF NOT EXISTS blocked_users (
+      userId INTEGER PRIMARY KEY,
+      blockedAt TEXT NOT NULL DEFAULT ''
+    )
+  `);
 }
 
-export function enqueueBroadcastJob(input: {
-  mode: "broadcast";
+/**
+ * Queues a broadcast to every user `recipientsSql` selects (a query returning an `id` column).
+ * The row and its recipients are written in one transaction, so the bot never picks up a
+ * broadcast whose audience is only partly there.
+ */
+export async function enqueueBroadcastJob(input: {
   segment: string;
-  total: number;
-  worker: BroadcastJobWorker;
-}): BroadcastJobSnapshot {
+  text: string;
+  photo: Uint8Array | null;
+  recipientsSql: string;
+}): Promise<BroadcastJobSnapshot> {
+  const id = makeId();
   const createdAt = nowIso();
-  const job: BroadcastJobSnapshot = {
-    id: makeId(),
+  const photo = input.photo ? Buffer.from(input.photo) : null;
+
+  const total = await prisma.$transaction(async (tx) => {
+    const count = await tx.$executeRawUnsafe(`
+      INSERT INTO broadcast_recipients (broadcastId, userId)
+      SELECT '${id}', r.id FROM (${input.recipientsSql}) r
+    `);
+    await tx.$executeRaw`
+      INSERT INTO broadcasts (id, segment, text, photo, status, total, createdAt, updatedAt)
+      VALUES (${id}, ${input.segment}, ${input.text}, ${photo}, 'queued', ${count}, ${createdAt}, ${createdAt})
+    `;
+    return count;
+  });
+
+  return {
+    id,
     status: "queued",
-    mode: input.mode,
+    mode: "broadcast",
     segment: input.segment,
-    total: input.total,
+    total,
     sent: 0,
     failed: 0,
+    blocked: 0,
     failedUsers: [],
     createdAt,
     updatedAt: createdAt,
   };
-
-  jobs.set(job.id, job);
-  pruneJobs();
-
-  queueMicrotask(async () => {
-    patchJob(job.id, { status: "running", startedAt: nowIso() });
-    try {
-      const result = await input.worker();
-      patchJob(job.id, {
-        status: "completed",
-        sent: result.sent,
-        failed: result.failed,
-        failedUsers: result.failedUsers,
-        finishedAt: nowIso(),
-      });
-    } catch (error) {
-      patchJob(job.id, {
-        status: "failed",
-        error: error instanceof Error ? error.message : "Broadcast job failed",
-        finishedAt: nowIso(),
-      });
-    }
-  });
-
-  return job;
 }
 
-export function getBroadcastJob(jobId: string): BroadcastJobSnapshot | null {
-  return jobs.get(jobId) ?? null;
+export async function getBroadcastJob(jobId: string): Promise<BroadcastJobSnapshot | null> {
+  const rows = await prisma.$queryRaw<BroadcastRow[]>`
+    SELECT id, status, segment, total, sent, failed, blocked, error, createdAt, startedAt, finishedAt, updatedAt
+    FROM broadcasts
+    WHERE id = ${jobId}
+  `;
+  const row = rows[0];
+  if (!row) return null;
+
+  const failedRows = await prisma.$queryRaw<Array<{ userId: bigint; error: string }>>`
+    SELECT userId, error
+    FROM broadcast_recipients
+    WHERE broadcastId = ${jobId} AND status = 'failed'
+    LIMIT ${MAX_FAILED_USERS}
+  `;
+  return {
+    id: row.id,
+    status: row.status as BroadcastJobStatus,
+    mode: "broadcast",
+    segment: row.segment,
+    total: Number(row.total),
+    sent: Number(row.sent),
+    failed: Number(row.failed),
+    blocked: Number(row.blocked),
+    failedUsers: failedRows.map((item) => `${item.userId.toString()}: ${item.error}`),
+    error: row.error || undefined,
+    createdAt: row.createdAt,
+    startedAt: row.startedAt || undefined,
+    finishedAt: row.finishedAt || undefined,
+    updatedAt: row.updatedAt,
+  };
 }
@@ -0,0 +1,321 @@
+"""Content-addressed store for built playables.
+
+Objects live under ``objects/<key[:2]>/<key>.html`` where the key hashes the normalized
+build inputs (runtime config, GEO and a fingerprint of the sources that produced it).
+Orders get a hard link under ``orders/<order_id>/<filename>`` so the delivered document
+keeps its human-readable name while identical configs share one file on disk. Objects
+are evicted least-recently-used once the store grows past its byte budget; order links
+are only needed for delivery and are pruned after ``order_link_ttl_seconds``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import secrets
+import shutil
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+CACHE_SCHEMA_VERSION = 1
+DEFAULT_ORDER_LINK_TTL_SECONDS = 60 * 60
+# Order links whose key key_of still knows; delivery looks a link up right after it is made.
+LINK_KEYS_MAX_ENTRIES = 1024
+# Build inputs and outputs that never influence the produced HTML.
+FINGERPRINT_SKIP_DIRS = frozenset({"node_modules", "dist", "release", ".git", ".vite"})
+
+_fingerprints: dict[tuple[str, ...], str] = {}
+
+
+def source_fingerprint(paths: Iterable[Path]) -> str:
+    """Hash of path, size and mtime for every file under ``paths``.
+
+    Computed once per process: templates and library artifacts only change on deploy,
+    which restarts the bot.
+    """
+    cache_key = tuple(str(path) for path in paths)
+    cached = _fingerprints.get(cache_key)
+    if cached is not None:
+        return cached
+    digest = hashlib.sha256()
+    for raw in cache_key:
+        root = Path(raw)
+        files = [root] if root.is_file() else sorted(_walk(root))
+        for file_path in files:
+            try:
+                stat = file_path.stat()
+            except OSError:
+                continue
+            digest.update(f"{file_path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    fingerprint = digest.hexdigest()
+    _fingerprints[cache_key] = fingerprint
+    return fingerprint
+
+
+def _walk(root: Path) -> Iterable[Path]:
+    for current, dirs, files in os.walk(root):
+        dirs[:] = [name for name in dirs if name not in FINGERPRINT_SKIP_DIRS]
+        for name in files:
+            yield Path(current) / name
+
+
+def content_hash(root: Path) -> str:
+    """SHA-256 over relative paths and bytes of every file under ``root``.
+
+    Unlike :func:`source_fingerprint` this ignores mtimes, so a fresh checkout of the
+    same commit hashes the same and nothing is rebuilt.
+    """
+    digest = hashlib.sha256()
+    if root.is_file():
+        files = [(root.name, root)]
+    else:
+        files = sorted((path.relative_to(root).as_posix(), path) for path in _walk(root))
+    for relative, path in files:
+        digest.update(relative.encode("utf-8") + b"\0")
+        with path.open("rb") as handle:
+            while chunk := handle.read(1 << 20):
+                digest.update(chunk)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@dataclass(slots=True)
+class CacheStats:
+    entries: int = 0
+    bytes: int = 0
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class ArtifactCache:
+    def __init__(self, root: Path, *, budget_bytes: int, order_link_ttl_seconds: int = DEFAULT_ORDER_LINK_TTL_SECONDS) -> None:
+        self._objects_dir = root / "objects"
+        self._orders_dir = root / "orders"
+        self._scratch_dir = root / "scratch"
+        self._budget_bytes = budget_bytes
+        self._order_link_ttl_seconds = order_link_ttl_seconds
+        # key -> size in bytes, least recently used first.
+        self._entries: OrderedDict[str, int] | None = None
+        self._inflight: dict[str, asyncio.Future[Path | None]] = {}
+        # key -> requests between resolving the object and linking it; _prune skips these.
+        self._pins: dict[str, int] = {}
+        # order link -> key it was linked from, most recent last.
+        self._link_keys: OrderedDict[Path, str] = OrderedDict()
+        self._stats = CacheStats()
+
+    @staticmethod
+    def key_for(runtime_config: dict[str, Any], geo_id: str | None, source_version: str) -> str:
+        normalized = {
+            "schema": CACHE_SCHEMA_VERSION,
+            "source": source_version,
+            "geo": geo_id or "en_usd",
+            "config": runtime_config,
+        }
+        return hashlib.sha256(json.dumps(normalized, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+    def stats(self) -> CacheStats:
+        entries = self._entries or {}
+        return CacheStats(
+            entries=len(entries),
+            bytes=sum(entries.values()),
+            hits=self._stats.hits,
+            misses=self._stats.misses,
+            evictions=self._stats.evictions,
+        )
+
+    def order_path(self, order_id: str, filename: str) -> Path:
+        """Where a per-order file lives; anything written there is pruned with the order links."""
+        return self._orders_dir / order_id / filename
+
+    def key_of(self, path: Path) -> str | None:
+        """The key of the artifact ``path`` was recently linked from by :meth:`get_or_build`, if known."""
+        return self._link_keys.get(Path(path))
+
+    def _object_path(self, key: str) -> Path:
+        return self._objects_dir / key[:2] / f"{key}.html"
+
+    def _load_index(self) -> OrderedDict[str, int]:
+        found: list[tuple[float, str, int]] = []
+        if self._objects_dir.exists():
+            for path in self._objects_dir.glob("*/*.html"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, path.stem, stat.st_size))
+        found.sort()
+        return OrderedDict((key, size) for _, key, size in found)
+
+    async def _index(self) -> OrderedDict[str, int]:
+        if self._entries is None:
+            self._entries = await asyncio.to_thread(self._load_index)
+        return self._entries
+
+    async def get_or_build(
+        self,
+        key: str,
+        order_id: str,
+        filename: str,
+        build: Callable[[Path], Awaitable[Path | None]],
+    ) -> Path | None:
+        """Return a per-order link to the artifact for ``key``, building it on a miss.
+
+        ``build`` receives a scratch path it may write to and returns the produced file
+        (the scratch path or any other file, which is then moved into the store).
+        Concurrent calls for the same key share one build; if its owner is cancelled
+        (e.g. a preempted speculative build), the others start a fresh one. The object is
+        pinned against eviction until its order link exists.
+        """
+        self._pins[key] = self._pins.get(key, 0) + 1
+        try:
+            stored = await self._resolve(key, build)
+            if stored is None:
+                return None
+            try:
+                link_path = await asyncio.to_thread(self._link, stored, order_id, filename)
+            except FileNotFoundError:
+                # A prune already underway when this request pinned the key removed the object.
+                logging.warning("[ArtifactCache] %s vanished before it was linked, rebuilding", key)
+            else:
+                self._link_keys[link_path] = key
+                self._link_keys.move_to_end(link_path)
+                if len(self._link_keys) > LINK_KEYS_MAX_ENTRIES:
+                    self._link_keys.popitem(last=False)
+                return link_path
+        finally:
+            remaining = self._pins[key] - 1
+            if remaining:
+                self._pins[key] = remaining
+            else:
+                del self._pins[key]
+        return await self.get_or_build(key, order_id, filename, build)
+
+    async def _resolve(self, key: str, build: Callable[[Path], Awaitable[Path | None]]) -> Path | None:
+        """The stored object for ``key``: cached, shared with a build in flight, or built now."""
+        entries = await self._index()
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._stats.hits += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                task = asyncio.current_task()
+                if not inflight.cancelled() or (task is not None and task.cancelling()):
+                    raise
+                return await self._resolve(key, build)
+        if key in entries and await asyncio.to_thread(self._touch, self._object_path(key)):
+            self._stats.hits += 1
+            entries.move_to_end(key)
+            return self._object_path(key)
+
+        self._stats.misses += 1
+        future: asyncio.Future[Path | None] = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            stored = await self._build(key, build)
+            future.set_result(stored)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Nobody may be waiting on it; mark retrieved so asyncio does not warn.
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+        if stored is not None:
+            await self._prune()
+        return stored
+
+    async def _build(self, key: str, build: Callable[[Path], Awaitable[Path | None]]) -> Path | None:
+        scratch = self._scratch_dir / f"{key}.{secrets.token_hex(4)}.html"
+        await asyncio.to_thread(self._scratch_dir.mkdir, parents=True, exist_ok=True)
+        try:
+            produced = await build(scratch)
+            if produced is None:
+                return None
+            target = self._object_path(key)
+            size = await asyncio.to_thread(self._store, produced, target)
+        finally:
+            await asyncio.to_thread(scratch.unlink, missing_ok=True)
+        entries = await self._index()
+        entries[key] = size
+        entries.move_to_end(key)
+        return target
+
+    @staticmethod
+    def _store(produced: Path, target: Path) -> int:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(produced, target)
+        except OSError:
+            # Different filesystem (e.g. previews/ on another volume): copy, then rename in place.
+            temp_path = target.with_suffix(".tmp")
+            shutil.copyfile(produced, temp_path)
+            os.replace(temp_path, target)
+            produced.unlink(missing_ok=True)
+        return target.stat().st_size
+
+    @staticmethod
+    def _touch(path: Path) -> bool:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _link(self, stored: Path, order_id: str, filename: str) -> Path:
+        link_path = self.order_path(order_id, filename)
+        order_dir = link_path.parent
+        order_dir.mkdir(parents=True, exist_ok=True)
+        temp_path = order_dir / f".{filename}.{secrets.token_hex(4)}.tmp"
+        try:
+            os.link(stored, temp_path)
+        except OSError:
+            shutil.copyfile(stored, temp_path)
+        os.replace(temp_path, link_path)
+        return link_path
+
+    async def _prune(self) -> None:
+        # The index is only touched on the loop; the thread gets paths nobody references any more.
+        await asyncio.to_thread(self._sweep, self._evict())
+
+    def _evict(self) -> list[Path]:
+        entries = self._entries
+        if entries is None:
+            return []
+        total = sum(entries.values())
+        victims: list[Path] = []
+        for key in list(entries):
+            if total <= self._budget_bytes or len(entries) <= 1:
+                break
+            if key in self._pins:
+                continue
+            size = entries.pop(key)
+            victims.append(self._object_path(key))
+            total -= size
+            self._stats.evictions += 1
+            logging.info("[ArtifactCache] Evicted %s (%s bytes)", key, size)
+        return victims
+
+    def _sweep(self, victims: list[Path]) -> None:
+        for path in victims:
+            path.unlink(missing_ok=True)
+        if not self._orders_dir.exists():
+            return
+        cutoff = time.time() - self._order_link_ttl_seconds
+        for order_dir in self._orders_dir.iterdir():
+            try:
+                if order_dir.stat().st_mtime < cutoff:
+                    shutil.rmtree(order_dir, ignore_errors=True)
+            except OSError:
+                continue
@@ -0,0 +1,348 @@
+"""Optimized copies of the playable templates with smaller raster assets.
+
+Every asset a template ships ends up base64-inlined in each playable, so its size is paid
+on every delivery. For each template this writes a copy under
+``temp/_optimized_templates/<template>/`` in which:
+
+* PNG/JPEG/WebP assets are re-encoded without metadata: optimized in their own format,
+  as lossless WebP, or (unless ``--lossless``) as visually lossless WebP, whichever is
+  smallest; ``--quantize`` also tries a 256-colour PNG;
+* assets converted to WebP get a ``.webp`` name and every reference in the template's
+  sources is rewritten to it;
+* assets that neither the template's sources nor the builder (which checks some by
+  path) mention are left out.
+
+``--keep-formats`` skips the WebP conversions for players whose WebViews predate WebP.
+
+The Node builder clones workspaces from that copy instead of the template while the
+``source_hash`` in its ``.optimized.json`` still matches the template; after any change
+to the template it falls back to the original until this is re-run. The manifest also
+holds the per-asset size report printed by the command.
+
+Needs Pillow from the ``tools`` dependency group, which the bot itself does not (``uv sync --group tools``).
+Run with ``python -m bot_py.asset_optimizer`` (``--help`` for options).
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import re
+import shutil
+import sys
+from collections.abc import Iterable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from urllib.parse import quote
+
+from .artifact_cache import FINGERPRINT_SKIP_DIRS, content_hash
+
+try:
+    from PIL import Image
+except ImportError:  # Only this tool needs Pillow.
+    Image = None  # type: ignore[assignment]
+
+OPTIMIZED_TEMPLATES_SUBDIR = Path("temp") / "_optimized_templates"
+OPTIMIZED_MANIFEST_NAME = ".optimized.json"
+OPTIMIZED_MANIFEST_VERSION = 1
+RASTER_SUFFIXES = frozenset({".png", ".jpg", ".jpeg", ".webp"})
+TEXT_SUFFIXES = frozenset({".js", ".mjs", ".cjs", ".ts", ".jsx", ".tsx", ".vue", ".html", ".css", ".json", ".svg", ".xml", ".atlas", ".fnt", ".txt"})
+# The builder names assets it requires (see RAILROAD_THEME_REQUIRED_ASSETS), so they count as referenced.
+BUILDER_SOURCES = (Path("src") / "builder.ts", Path("dist") / "builder.js")
+WEBP_QUALITY = 90
+# libwebp effort 0-6; 6 takes about ten times as long as 4 for a few percent.
+WEBP_METHOD = 4
+# A re-encode has to beat the original by this much to replace it.
+MIN_SAVING_RATIO = 0.05
+
+
+@dataclass(slots=True, frozen=True)
+class AssetResult:
+    path: str
+    output: str | None
+    original_bytes: int
+    optimized_bytes: int
+    action: str
+
+
+@dataclass(slots=True)
+class TemplateReport:
+    template: str
+    source_hash: str
+    assets: list[AssetResult] = field(default_factory=list)
+
+    @property
+    def original_bytes(self) -> int:
+        return sum(asset.original_bytes for asset in self.assets)
+
+    @property
+    def optimized_bytes(self) -> int:
+        return sum(asset.optimized_bytes for asset in self.assets)
+
+
+def _source_files(root: Path) -> list[str]:
+    files = []
+    for current, dirs, names in os.walk(root):
+        dirs[:] = [name for name in dirs if name not in FINGERPRINT_SKIP_DIRS]
+        for name in names:
+            files.append((Path(current) / name).relative_to(root).as_posix())
+    return sorted(files)
+
+
+def _spellings(name: str) -> set[str]:
+    # Sources may spell a file name raw ("Слой 1.webp") or URL-encoded ("%D0%A1...%201.webp").
+    return {name, quote(name)}
+
+
+def referenced_assets(assets: Iterable[str], sources: str) -> set[str]:
+    """Assets whose file name occurs in ``sources`` (all source text, concatenated).
+
+    Frame sequences are often loaded by building names in a loop (``frame_${i}.png``), so a
+    name ending in digits also counts as referenced when its prefix before the digits occurs.
+    """
+    referenced = set()
+    for asset in assets:
+        name = asset.rpartition("/")[2]
+        stem = name.rpartition(".")[0]
+        prefix = stem.rstrip("0123456789")
+        candidates = _spellings(name)
+        if prefix != stem and prefix.strip(" _-"):
+            candidates |= _spellings(prefix)
+        if any(candidate in sources for candidate in candidates):
+            referenced.add(asset)
+    return referenced
+
+
+def rewrite_references(text: str, renames: dict[str, str]) -> str:
+    """Replace whole file names ``old -> new`` in ``text``, raw or URL-encoded."""
+    if not renames:
+        return text
+    spelled = {}
+    for old, new in renames.items():
+        spelled[old] = new
+        spelled[quote(old)] = quote(new)
+    pattern = re.compile(r"(?<![\w.-])(" + "|".join(re.escape(old) for old in sorted(spelled, key=len, reverse=True)) + r")(?!\.?[\w-])")
+    return pattern.sub(lambda match: spelled[match.group(1)], text)
+
+
+def _encode(image: Image.Image, format: str, **options: object) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **options)
+    return buffer.getvalue()
+
+
+def encode_candidates(data: bytes, *, lossless: bool = False, quantize: bool = False) -> list[tuple[str, str, bytes]]:
+    """``(action, suffix, bytes)`` re-encodings of one image, none of them carrying metadata."""
+    if Image is None:
+        raise RuntimeError("Pillow is required: uv sync --group tools")
+    with Image.open(io.BytesIO(data)) as source:
+        source_format = source.format
+        if getattr(source, "is_animated", False):
+            return []
+        image = source.copy()
+    if image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode == "P" else "RGB")
+    candidates = []
+    if source_format == "PNG":
+        candidates.append(("png", ".png", _encode(image, "PNG", optimize=True)))
+        candidates.append(("webp_lossless", ".webp", _encode(image, "WEBP", lossless=True, quality=80, method=WEBP_METHOD)))
+        if quantize:
+            quantized = image.convert("RGBA").quantize(256, method=Image.Quantize.FASTOCTREE)
+            candidates.append(("png8", ".png", _encode(quantized, "PNG", optimize=True)))
+    elif source_format == "JPEG":
+        candidates.append(("jpeg", ".jpg", _encode(image.convert("RGB"), "JPEG", quality="keep" if image.mode == "RGB" else 95, optimize=True)))
+    if not lossless:
+        candidates.append(("webp", ".webp", _encode(image, "WEBP", quality=WEBP_QUALITY, method=WEBP_METHOD)))
+    return candidates
+
+
+def _optimize_asset(job: tuple[Path, bool, bool, bool]) -> tuple[str, str, bytes] | None:
+    """Best re-encoding of one asset, or None to keep it as it is. Runs in a worker process."""
+    path, lossless, quantize, may_rename = job
+    data = path.read_bytes()
+    suffix = path.suffix.lower()
+    try:
+        candidates = encode_candidates(data, lossless=lossless, quantize=quantize)
+    except (OSError, ValueError):
+        return None
+    # Keep a .jpeg spelled .jpeg: only the format decides whether the name changes.
+    candidates = [
+        (action, suffix if new_suffix == ".jpg" and suffix == ".jpeg" else new_suffix, body)
+        for action, new_suffix, body in candidates
+        if may_rename or new_suffix == suffix or (new_suffix == ".jpg" and suffix == ".jpeg")
+    ]
+    if not candidates:
+        return None
+    best = min(candidates, key=lambda candidate: len(candidate[2]))
+    if len(best[2]) > len(data) * (1 - MIN_SAVING_RATIO):
+        return None
+    return best
+
+
+def optimize_template(
+    template_dir: Path,
+    output_dir: Path,
+    *,
+    lossless: bool = False,
+    quantize: bool = False,
+    keep_formats: bool = False,
+    extra_sources: str = "",
+    dry_run: bool = False,
+    executor: ProcessPoolExecutor | None = None,
+) -> TemplateReport:
+    """Write the optimized copy of ``template_dir`` to ``output_dir`` and report per asset.
+
+    ``extra_sources`` is text outside the template that may name its assets.
+    """
+    files = _source_files(template_dir)
+    texts = {}
+    for relative in files:
+        if Path(relative).suffix.lower() in TEXT_SUFFIXES:
+            try:
+                texts[relative] = (template_dir / relative).read_text(encoding="utf-8")
+            except UnicodeDecodeError:
+                continue
+    assets = [relative for relative in files if Path(relative).suffix.lower() in RASTER_SUFFIXES]
+    referenced = referenced_assets(assets, "\n".join([*texts.values(), extra_sources]))
+    existing = set(files)
+
+    # Copies of one file under several paths (e.g. public/ and src/) are encoded once and
+    # renamed together; different files sharing a name keep it, or the rewrite would be ambiguous.
+    groups: dict[str, list[str]] = {}
+    for asset in assets:
+        if asset in referenced:
+            groups.setdefault(asset.rpartition("/")[2], []).append(asset)
+    jobs = []
+    for members in groups.values():
+        identical = len({(template_dir / member).read_bytes() for member in members}) == 1
+        webp_taken = any(f"{member.rpartition('.')[0]}.webp" in existing for member in members)
+        if identical:
+            jobs.append((members, (template_dir / members[0], lossless, quantize, not (keep_formats or webp_taken))))
+        else:
+            jobs.extend(([member], (template_dir / member, lossless, quantize, False)) for member in members)
+    encode_jobs = [job for _, job in jobs]
+    results = list(executor.map(_optimize_asset, encode_jobs)) if executor is not None else [_optimize_asset(job) for job in encode_jobs]
+
+    report = TemplateReport(template=template_dir.name, source_hash=content_hash(template_dir))
+    renames: dict[str, str] = {}
+    outputs: dict[str, bytes | None] = {}
+    for asset in assets:
+        size = (template_dir / asset).stat().st_size
+        if asset not in referenced:
+            report.assets.append(AssetResult(asset, None, size, 0, "dropped"))
+    for (members, _), result in zip(jobs, results, strict=True):
+        for asset in members:
+            size = (template_dir / asset).stat().st_size
+            if result is None:
+                outputs[asset] = None
+                report.assets.append(AssetResult(asset, asset, size, size, "kept"))
+                continue
+            action, suffix, body = result
+            output = asset.rpartition(".")[0] + suffix if suffix != Path(asset).suffix.lower() else asset
+            if output != asset:
+                renames[asset.rpartition("/")[2]] = output.rpartition("/")[2]
+            outputs[output] = body
+            report.assets.append(AssetResult(asset, output, size, len(body), action))
+    report.assets.sort(key=lambda asset: asset.path)
+    if dry_run:
+        return report
+
+    staging = output_dir.with_name(f".{output_dir.name}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    for relative in files:
+        if relative in assets:
+            continue
+        target = staging / relative
+        target.parent.mkdir(parents=True, exist_ok=True)
+        rewritten = rewrite_references(texts[relative], renames) if relative in texts else None
+        if rewritten is not None and rewritten != texts[relative]:
+            target.write_text(rewritten, encoding="utf-8")
+        else:
+            shutil.copy2(template_dir / relative, target)
+    for output, body in outputs.items():
+        target = staging / output
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if body is None:
+            shutil.copy2(template_dir / output, target)
+        else:
+            target.write_bytes(body)
+    manifest = {
+        "version": OPTIMIZED_MANIFEST_VERSION,
+        "source_hash": report.source_hash,
+        "assets": [asdict(asset) for asset in report.assets],
+    }
+    (staging / OPTIMIZED_MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.replace(staging, output_dir)
+    return report
+
+
+def fresh_optimized_dir(template_dir: Path, optimized_dir: Path, source_hash: str | None = None) -> Path | None:
+    """``optimized_dir`` if it was generated from the current contents of ``template_dir``."""
+    try:
+        manifest = json.loads((optimized_dir / OPTIMIZED_MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or manifest.get("version") != OPTIMIZED_MANIFEST_VERSION:
+        return None
+    if manifest.get("source_hash") != (source_hash or content_hash(template_dir)):
+        return None
+    return optimized_dir
+
+
+def _kib(size: int) -> str:
+    return f"{size / 1024:,.0f}"
+
+
+def format_report(report: TemplateReport) -> str:
+    rows = [("asset", "before KiB", "after KiB", "saved", "action")]
+    for asset in report.assets:
+        saved = 1 - asset.optimized_bytes / asset.original_bytes if asset.original_bytes else 0.0
+        action = asset.action if asset.output in (None, asset.path) else f"{asset.action} -> {asset.output}"
+        rows.append((asset.path, _kib(asset.original_bytes), _kib(asset.optimized_bytes), f"{saved:.0%}", action))
+    total_saved = 1 - report.optimized_bytes / report.original_bytes if report.original_bytes else 0.0
+    rows.append(("total", _kib(report.original_bytes), _kib(report.optimized_bytes), f"{total_saved:.0%}", ""))
+    widths = [max(len(row[column]) for row in rows) for column in range(4)]
+    lines = [f"== {report.template}"]
+    for row in rows:
+        lines.append("  ".join([row[0].ljust(widths[0]), *(cell.rjust(width) for cell, width in zip(row[1:4], widths[1:], strict=True)), row[4]]).rstrip())
+    return "\n".join(lines)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bot_py.asset_optimizer", description="Write templates with re-encoded, pruned raster assets.")
+    parser.add_argument("--template", action="append", help="template directory name, e.g. matching (repeatable; default: all)")
+    parser.add_argument("--lossless", action="store_true", help="only lossless re-encodings")
+    parser.add_argument("--quantize", action="store_true", help="also try 256-colour PNGs")
+    parser.add_argument("--keep-formats", action="store_true", help="never convert to WebP")
+    parser.add_argument("--dry-run", action="store_true", help="print the report without writing anything")
+    args = parser.parse_args(argv)
+    if Image is None:
+        print("Pillow is required: uv sync --group tools", file=sys.stderr)
+        return 1
+
+    root = Path.cwd()
+    templates_dir = root / "templates"
+    names = args.template or sorted(path.name for path in templates_dir.iterdir() if path.is_dir())
+    builder_sources = "\n".join((root / path).read_text(encoding="utf-8") for path in BUILDER_SOURCES if (root / path).is_file())
+    with ProcessPoolExecutor() as executor:
+        for name in names:
+            report = optimize_template(
+                templates_dir / name,
+                root / OPTIMIZED_TEMPLATES_SUBDIR / name,
+                lossless=args.lossless,
+                quantize=args.quantize,
+                keep_formats=args.keep_formats,
+                extra_sources=builder_sources,
+                dry_run=args.dry_run,
+                executor=executor,
+            )
+            print(format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
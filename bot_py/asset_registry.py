@@ -0,0 +1,161 @@
+"""Telegram file_ids of the bot's images and delivered documents.
+
+Menus, the profile and product cards are photos sent by file_id once Telegram has seen
+them. :class:`AssetRegistry` loads the ``asset_cache`` rows of its images at startup and resolves the
+file each image is uploaded from (the first of its candidate paths that exists) once into
+a manifest, so rendering one needs neither a query nor a ``stat``. New file_ids are
+written through to the table. :meth:`AssetRegistry.prewarm` uploads the images that have
+no file_id yet to a service chat in the background, so the first user after a deploy does
+not wait for the upload either.
+
+Delivered playables are re-sent by file_id too (:meth:`AssetRegistry.send_document`),
+under a :func:`document_key` derived from where the file came from rather than its bytes.
+There is a row per distinct delivery, so those ids are read from the table on demand and
+only the most recent :data:`DOCUMENT_IDS_MAX` are kept in memory.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Collection, Mapping, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Protocol
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
+from aiogram.types import FSInputFile, InputFile
+
+from .delivery_archive import ARCHIVE_SUFFIX
+from .rate_limiter import bulk_sends
+
+DOCUMENT_IDS_MAX = 1024
+
+
+@dataclass(slots=True, frozen=True)
+class PhotoAsset:
+    key: str
+    # Files to upload from, in order of preference.
+    candidates: tuple[Path, ...]
+
+
+class AssetStore(Protocol):
+    async def get_assets(self, keys: Collection[str]) -> dict[str, str]: ...
+
+    async def set_asset(self, key: str, file_id: str) -> None: ...
+
+
+def _first_existing(candidates: Sequence[Path]) -> Path | None:
+    return next((path for path in candidates if path.is_file()), None)
+
+
+def document_key(path: Path, artifact_key: str | None = None, *, archived: bool = False) -> str:
+    """Asset-cache key of a delivered file, derived without reading it.
+
+    A file linked from the artifact cache is keyed by its artifact key, so every order that
+    shares the artifact shares one upload. Anything else (a library final, a bulk archive)
+    is keyed by its path, size and modification time, which change whenever it is rewritten.
+    ``archived`` keys the ZIP of the file, which is a different upload than the HTML.
+    """
+    if artifact_key is None:
+        stat = path.stat()
+        artifact_key = hashlib.sha256(f"{path.resolve()}\0{stat.st_size}\0{stat.st_mtime_ns}".encode()).hexdigest()
+    return f"doc:{artifact_key}{ARCHIVE_SUFFIX if archived else ''}"
+
+
+class AssetRegistry:
+    def __init__(self, store: AssetStore, assets: Sequence[PhotoAsset]) -> None:
+        self._store = store
+        self._assets = {asset.key: asset for asset in assets}
+        self._file_ids: dict[str, str] = {}
+        self._paths: dict[str, Path] = {}
+        # Document key -> file_id, least recently used first.
+        self._document_ids: OrderedDict[str, str] = OrderedDict()
+
+    @property
+    def manifest(self) -> Mapping[str, Path]:
+        return self._paths
+
+    async def load(self) -> None:
+        self._file_ids = await self._store.get_assets(list(self._assets))
+        resolved = await asyncio.to_thread(lambda: {key: _first_existing(asset.candidates) for key, asset in self._assets.items()})
+        self._paths = {key: path for key, path in resolved.items() if path is not None}
+        missing = sorted(set(self._assets) - set(self._paths))
+        if missing:
+            logging.warning("[Assets] No image file for %s", ", ".join(missing))
+
+    def photo(self, key: str) -> str | FSInputFile | None:
+        """What to send for ``key``: its file_id, else its file, else None."""
+        file_id = self._file_ids.get(key)
+        if file_id:
+            return file_id
+        path = self._paths.get(key)
+        return FSInputFile(path) if path is not None else None
+
+    async def remember(self, key: str, file_id: str) -> None:
+        if key not in self._assets:
+            if self._document_ids.get(key) == file_id:
+                return
+            self._remember_document(key, file_id)
+        elif self._file_ids.get(key) == file_id:
+            return
+        else:
+            self._file_ids[key] = file_id
+        await self._store.set_asset(key, file_id)
+
+    def _remember_document(self, key: str, file_id: str) -> None:
+        self._document_ids[key] = file_id
+        self._document_ids.move_to_end(key)
+        if len(self._document_ids) > DOCUMENT_IDS_MAX:
+            self._document_ids.popitem(last=False)
+
+    async def _document_id(self, key: str) -> str | None:
+        file_id = self._document_ids.get(key)
+        if file_id is not None:
+            self._document_ids.move_to_end(key)
+            return file_id
+        file_id = (await self._store.get_assets([key])).get(key)
+        if file_id:
+            self._remember_document(key, file_id)
+        return file_id
+
+    async def send_document(self, bot: Bot, chat_id: int, key: str, upload: Callable[[], Awaitable[tuple[InputFile, str]]], **kwargs: Any) -> None:
+        """Send the document known under ``key`` by file_id, else upload ``upload()`` and remember its id.
+
+        ``upload`` returns the file and the key of what it actually is, which differs from
+        ``key`` when it had to fall back to another form (the HTML instead of its ZIP); the
+        new id is remembered under that key. A file_id Telegram rejects is replaced as well.
+        """
+        cached_id = await self._document_id(key)
+        if cached_id:
+            try:
+                await bot.send_document(chat_id, cached_id, **kwargs)
+                return
+            except TelegramBadRequest:
+                logging.warning("[Assets] Cached file_id for %s was rejected, uploading again", key)
+        document, uploaded_key = await upload()
+        sent = await bot.send_document(chat_id, document, **kwargs)
+        if sent.document:
+            await self.remember(uploaded_key, sent.document.file_id)
+
+    async def prewarm(self, bot: Bot, chat_id: int) -> int:
+        """Upload every image without a file_id to ``chat_id`` (and delete it there); returns how many."""
+        uploaded = 0
+        for key, path in self._paths.items():
+            if key in self._file_ids:
+                continue
+            try:
+                with bulk_sends():
+                    sent = await bot.send_photo(chat_id, FSInputFile(path), disable_notification=True)
+                    if sent.photo:
+                        await self.remember(key, sent.photo[-1].file_id)
+                        uploaded += 1
+                    await bot.delete_message(chat_id, sent.message_id)
+            except TelegramAPIError as exc:
+                logging.warning("[Assets] Could not prewarm %s: %s", key, exc)
+        if uploaded:
+            logging.info("[Assets] Prewarmed %s image(s)", uploaded)
+        return uploaded
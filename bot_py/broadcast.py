@@ -0,0 +1,151 @@
+"""Resumable broadcasts to bot users.
+
+The admin panel only enqueues a broadcast: a ``broadcasts`` row with the text and photo
+and one ``broadcast_recipients`` row per user in the chosen segment. :class:`BroadcastEngine`
+in the bot process sends them. The photo is uploaded once, with the first message, and
+every later message reuses the ``file_id`` Telegram returned, which is also stored so a
+resumed broadcast does not upload it again. Sends are paced by a token bucket at the
+Telegram ceiling and run at bulk priority (see :mod:`bot_py.rate_limiter`), so user
+replies are not held up behind them.
+
+Recipients' outcomes are written after every batch, so a restart resumes with the
+recipients still pending and at most one batch is sent twice. Users who have blocked the
+bot are recorded in ``blocked_users`` and skipped by later broadcasts.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Literal, Protocol
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError
+from aiogram.types import BufferedInputFile, LinkPreviewOptions
+
+from .rate_limiter import GLOBAL_MESSAGES_PER_SECOND, TokenBucket, bulk_sends
+
+BROADCAST_BATCH_SIZE = 30
+BROADCAST_CONCURRENCY = 10
+BROADCAST_POLL_SECONDS = 5.0
+TELEGRAM_TEXT_LIMIT = 4096
+TELEGRAM_CAPTION_LIMIT = 1024
+
+RecipientStatus = Literal["sent", "failed", "blocked"]
+
+
+@dataclass(slots=True)
+class BroadcastJob:
+    id: str
+    text: str
+    photo: bytes | None = None
+    photo_file_id: str = ""
+
+
+@dataclass(slots=True, frozen=True)
+class RecipientResult:
+    user_id: int
+    status: RecipientStatus
+    error: str = ""
+
+
+class BroadcastStore(Protocol):
+    async def claim_broadcast(self) -> BroadcastJob | None: ...
+
+    async def next_broadcast_recipients(self, broadcast_id: str, limit: int) -> list[int]: ...
+
+    async def set_broadcast_file_id(self, broadcast_id: str, file_id: str) -> None: ...
+
+    async def record_broadcast_results(self, broadcast_id: str, results: Sequence[RecipientResult]) -> None: ...
+
+    async def finish_broadcast(self, broadcast_id: str, status: str, error: str = "") -> None: ...
+
+
+class BroadcastEngine:
+    """Sends queued broadcasts one at a time, ``concurrency`` messages in flight at ``rate`` a second."""
+
+    def __init__(
+        self,
+        bot: Bot,
+        store: BroadcastStore,
+        *,
+        rate: float = GLOBAL_MESSAGES_PER_SECOND,
+        concurrency: int = BROADCAST_CONCURRENCY,
+        batch_size: int = BROADCAST_BATCH_SIZE,
+        poll_seconds: float = BROADCAST_POLL_SECONDS,
+    ) -> None:
+        self._bot = bot
+        self._store = store
+        self._rate = rate
+        self._concurrency = max(1, concurrency)
+        self._batch_size = max(1, batch_size)
+        self._poll_seconds = poll_seconds
+
+    async def run(self) -> None:
+        while True:
+            try:
+                job = await self._store.claim_broadcast()
+            except Exception:
+                logging.exception("[Broadcast] Could not read queued broadcasts")
+                job = None
+            if job is None:
+                await asyncio.sleep(self._poll_seconds)
+                continue
+            try:
+                await self.send(job)
+            except Exception as exc:
+                logging.exception("[Broadcast] %s failed", job.id)
+                with contextlib.suppress(Exception):
+                    await self._store.finish_broadcast(job.id, "failed", str(exc) or type(exc).__name__)
+
+    async def send(self, job: BroadcastJob) -> None:
+        bucket = TokenBucket(self._rate, self._rate, time.monotonic())
+        slots = asyncio.Semaphore(self._concurrency)
+
+        async def paced(user_id: int) -> RecipientResult:
+            async with slots:
+                while (wait := bucket.wait_time(time.monotonic())) > 0:
+                    await asyncio.sleep(wait)
+                bucket.take()
+                return await self._send_one(job, user_id)
+
+        while recipients := await self._store.next_broadcast_recipients(job.id, self._batch_size):
+            results: list[RecipientResult] = []
+            if job.photo and not job.photo_file_id:
+                # Upload to one recipient at a time until it goes through; everyone after gets the file_id.
+                while recipients and not job.photo_file_id:
+                    results.append(await paced(recipients[0]))
+                    recipients = recipients[1:]
+                if job.photo_file_id:
+                    await self._store.set_broadcast_file_id(job.id, job.photo_file_id)
+            results.extend(await asyncio.gather(*(paced(user_id) for user_id in recipients)))
+            await self._store.record_broadcast_results(job.id, results)
+        await self._store.finish_broadcast(job.id, "completed")
+        logging.info("[Broadcast] %s completed", job.id)
+
+    async def _send_one(self, job: BroadcastJob, user_id: int) -> RecipientResult:
+        try:
+            with bulk_sends():
+                if job.photo:
+                    message = await self._bot.send_photo(
+                        user_id,
+                        job.photo_file_id or BufferedInputFile(job.photo, "broadcast.jpg"),
+                        caption=job.text[:TELEGRAM_CAPTION_LIMIT] or None,
+                    )
+                    if not job.photo_file_id and message.photo:
+                        job.photo_file_id = message.photo[-1].file_id
+                else:
+                    await self._bot.send_message(
+                        user_id,
+                        job.text[:TELEGRAM_TEXT_LIMIT],
+                        link_preview_options=LinkPreviewOptions(is_disabled=True),
+                    )
+        except TelegramForbiddenError as exc:
+            return RecipientResult(user_id, "blocked", exc.message)
+        except TelegramAPIError as exc:
+            return RecipientResult(user_id, "failed", exc.message)
+        return RecipientResult(user_id, "sent")
@@ -0,0 +1,128 @@
+"""Builder benchmark: a fixed build matrix over every template, timed stage by stage.
+
+Builds each game as preview and final for one GEO, ``--repeat`` times in a row on a
+single worker, always from the template (never a library artifact). The first build of a
+template is cold (fresh workspace, dependency linking) and reported separately; the
+stage columns are means over the remaining warm builds. ``--profile`` also writes V8 CPU
+profiles of every build under ``temp/profiles/``.
+
+Run with ``python -m bot_py.build_bench`` (``--help`` for options).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from collections.abc import Sequence
+from pathlib import Path
+
+from .builder_bridge import BUILD_STAGES, BuilderPool, BuildMetrics, summarize_stages
+from .prebuild_library import LIBRARY_KINDS, PREBUILD_DEADLINE_SECONDS, LibraryTarget, library_targets
+
+BENCH_GEO = "en_usd"
+STAGE_COLUMNS = {
+    "copy_template": "copy",
+    "link_deps": "deps",
+    "vite_build": "vite",
+    "inline_assets": "inline",
+    "inject_config": "inject",
+}
+
+
+async def run_matrix(
+    pool: BuilderPool,
+    targets: Sequence[LibraryTarget],
+    *,
+    repeat: int,
+    profile: bool = False,
+) -> dict[str, list[BuildMetrics]]:
+    """Build every target ``repeat`` times, one build at a time; metrics per target in build order."""
+    results: dict[str, list[BuildMetrics]] = {}
+    for target in targets:
+        runs = results.setdefault(target.relative_path, [])
+        for attempt in range(repeat):
+            job_id = f"bench_{target.game_id}_{target.kind}_{attempt}"
+            config = target.config()
+            started = time.monotonic()
+            try:
+                produced = await pool.generate_playable(job_id, config, use_library=False, profile=profile)
+            except RuntimeError:
+                # The worker died before reporting metrics; count the run as failed and go on.
+                logging.exception("[Bench] %s #%s: worker failed", target.relative_path, attempt + 1)
+                failed = BuildMetrics(job_id, config.game, bool(config.is_watermarked), False, time.monotonic() - started, {}, None)
+                runs.append(failed)
+                continue
+            runs.append(pool.metrics.recent(1)[0])
+            if produced is not None:
+                Path(produced).unlink(missing_ok=True)
+            logging.info("[Bench] %s #%s: %.1fs", target.relative_path, attempt + 1, runs[-1].total_seconds)
+    return results
+
+
+def _seconds(value: float | None) -> str:
+    return f"{value:.2f}" if value is not None else "—"
+
+
+def format_table(results: dict[str, list[BuildMetrics]]) -> str:
+    headers = ["target", *STAGE_COLUMNS.values(), "total", "cold", "peak MB", "ok"]
+    rows = [headers]
+    for name, runs in results.items():
+        cold, warm = runs[0], runs[1:] or runs[:1]
+        stages = {summary.stage: summary.mean_seconds for summary in summarize_stages(warm)}
+        peaks = [run.peak_rss_bytes for run in runs if run.peak_rss_bytes is not None]
+        rows.append(
+            [
+                name,
+                *(_seconds(stages.get(stage)) for stage in BUILD_STAGES),
+                _seconds(stages.get("total")),
+                _seconds(cold.total_seconds if cold.ok else None),
+                str(max(peaks) // (1024 * 1024)) if peaks else "—",
+                f"{sum(run.ok for run in runs)}/{len(runs)}",
+            ]
+        )
+    widths = [max(len(row[column]) for row in rows) for column in range(len(headers))]
+    lines = []
+    for row in rows:
+        cells = [row[0].ljust(widths[0]), *(cell.rjust(width) for cell, width in zip(row[1:], widths[1:], strict=True))]
+        lines.append("  ".join(cells))
+    return "\n".join(lines)
+
+
+async def _run(args: argparse.Namespace) -> int:
+    targets = [target for target in library_targets(args.game or None, [args.geo]) if target.kind in args.kinds]
+    if not targets:
+        print("nothing to build")
+        return 1
+    pool = BuilderPool(1, deadline_seconds=PREBUILD_DEADLINE_SECONDS)
+    try:
+        results = await run_matrix(pool, targets, repeat=args.repeat, profile=args.profile)
+    finally:
+        await pool.close()
+    print(format_table(results))
+    if args.profile:
+        for name, runs in results.items():
+            for run in runs:
+                if run.profile_dir:
+                    print(f"  profile {name}: {run.profile_dir}")
+    return 0 if all(run.ok for runs in results.values() for run in runs) else 1
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bot_py.build_bench", description="Time every builder stage across all templates.")
+    parser.add_argument("--repeat", type=int, default=3, help="builds per target; the first one is cold (default: 3)")
+    parser.add_argument("--game", action="append", help="game id to include, e.g. game_drag (repeatable; default: all)")
+    parser.add_argument("--geo", default=BENCH_GEO, help=f"GEO id to build (default: {BENCH_GEO})")
+    parser.add_argument("--kinds", nargs="+", choices=LIBRARY_KINDS, default=list(LIBRARY_KINDS), help="build kinds to include")
+    parser.add_argument("--profile", action="store_true", help="write V8 CPU profiles of every build to temp/profiles/")
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    return asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
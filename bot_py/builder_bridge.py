@@ -1,13 +1,129 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import heapq
+import itertools
 import json
+import logging
+import math
+import os
+import shutil
+import signal
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Mapping, Sequence
+from dataclasses import dataclass, field
+from enum import IntEnum
 from pathlib import Path
 from typing import Any
 
+from .models import OrderConfig
+
 ROOT_DIR = Path.cwd()
 DIST_RUNNER = ROOT_DIR / "dist" / "builder_runner.js"
+DIST_BUILDER = ROOT_DIR / "dist" / "builder.js"
 SRC_RUNNER = ROOT_DIR / "src" / "builder_runner.ts"
+PING_TIMEOUT_SECONDS = 10.0
+HEALTH_CHECK_INTERVAL_SECONDS = 30.0
+# Responses are single JSON lines; keep headroom over asyncio's 64 KiB default.
+STREAM_LIMIT_BYTES = 1 << 20
+DEFAULT_MAX_JOBS_PER_WORKER = 200
+DEFAULT_MAX_WORKER_RSS_BYTES = 512 * 1024 * 1024
+# Memory one worker needs while its vite child is building; used to size the pool.
+WORKER_MEMORY_BUDGET_BYTES = 1024 * 1024 * 1024
+RETIRE_POLL_SECONDS = 0.5
+DEFAULT_MAX_QUEUED_BUILDS = 200
+# Used for ETAs until real build durations have been observed.
+DEFAULT_BUILD_SECONDS = 60.0
+BUILD_DURATION_SAMPLES = 20
+# Enforced from Python on top of the runner's own vite timeout, which covers only one step.
+DEFAULT_BUILD_DEADLINE_SECONDS = 180.0
+# Default WORKSPACES_ROOT of src/builder.ts; each runner keeps its workspaces under <pid>/.
+WORKSPACES_SUBDIR = Path("temp") / "_workspaces"
+BUILD_STAGES = ("copy_template", "link_deps", "vite_build", "inline_assets", "inject_config")
+BUILD_METRICS_SAMPLES = 500
+RSS_SAMPLE_INTERVAL_SECONDS = 0.25
+PROC_DIR = Path("/proc")
+
+
+@dataclass(slots=True, frozen=True)
+class BuildProgress:
+    """A build stage that just started, as reported by the runner.
+
+    Stages in order: copy_template, link_deps, vite_build, inline_assets (previews only),
+    inject_config, done. Library builds skip straight to inject_config.
+    """
+
+    stage: str
+    elapsed_ms: int
+
+
+ProgressListener = Callable[[BuildProgress], None]
+
+
+def stage_durations(events: Sequence[BuildProgress]) -> dict[str, float]:
+    """Seconds spent in each stage: the gap until the next stage event, ending at ``done``."""
+    return {
+        current.stage: max(0, following.elapsed_ms - current.elapsed_ms) / 1000
+        for current, following in itertools.pairwise(events)
+    }
+
+
+@dataclass(slots=True, frozen=True)
+class BuildMetrics:
+    job_id: str
+    game: str | None
+    preview: bool
+    ok: bool
+    total_seconds: float
+    stages: dict[str, float]
+    peak_rss_bytes: int | None
+    profile_dir: str | None = None
+    finished_at: float = field(default_factory=time.time)
+
+
+@dataclass(slots=True, frozen=True)
+class StageSummary:
+    stage: str
+    samples: int
+    mean_seconds: float
+    p95_seconds: float
+
+
+class BuildMetricsStore:
+    """The last ``maxlen`` builds' timings, for /builders and the benchmark CLI."""
+
+    def __init__(self, maxlen: int = BUILD_METRICS_SAMPLES) -> None:
+        self._builds: deque[BuildMetrics] = deque(maxlen=maxlen)
+
+    def record(self, metrics: BuildMetrics) -> None:
+        self._builds.append(metrics)
+
+    def recent(self, limit: int | None = None) -> list[BuildMetrics]:
+        builds = list(self._builds)
+        return builds[-limit:] if limit else builds
+
+    def stage_summary(self) -> list[StageSummary]:
+        return summarize_stages(self._builds)
+
+
+def summarize_stages(builds: Iterable[BuildMetrics]) -> list[StageSummary]:
+    """Per-stage mean and p95 over successful builds, in build order, then ``total``."""
+    succeeded = [build for build in builds if build.ok]
+    samples: dict[str, list[float]] = {stage: [] for stage in BUILD_STAGES}
+    for build in succeeded:
+        for stage, seconds in build.stages.items():
+            samples.setdefault(stage, []).append(seconds)
+    samples["total"] = [build.total_seconds for build in succeeded]
+    summary = []
+    for stage, values in samples.items():
+        if not values:
+            continue
+        values.sort()
+        p95 = values[min(len(values) - 1, math.ceil(len(values) * 0.95) - 1)]
+        summary.append(StageSummary(stage, len(values), sum(values) / len(values), p95))
+    return summary
 
 
 def _runner_command() -> list[str]:
@@ -22,56 +138,817 @@ def _runner_command() -> list[str]:
     ]
 
 
-async def _run(payload: dict[str, Any]) -> dict[str, Any]:
-    cmd = _runner_command()
-    process = await asyncio.create_subprocess_exec(
-        *cmd,
-        cwd=str(ROOT_DIR),
-        stdin=asyncio.subprocess.PIPE,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
+class BuilderWorker:
+    """A long-lived ``builder_runner --serve`` process speaking JSON lines over stdio.
+
+    Requests carry an ``rid`` and may be in flight concurrently; the runner's own build
+    queue decides how many actually build at once. The process is started lazily, and a
+    dead or unresponsive one is replaced on the next request or health check. It leads its
+    own process group, so killing it also takes down the shell and vite children it spawned.
+    """
+
+    def __init__(
+        self,
+        command: Sequence[str] | None = None,
+        *,
+        cwd: Path = ROOT_DIR,
+        env: Mapping[str, str] | None = None,
+    ) -> None:
+        self._command = list(command) if command is not None else None
+        self._cwd = cwd
+        self._env = dict(env) if env else None
+        self._process: asyncio.subprocess.Process | None = None
+        self._reader: asyncio.Task[None] | None = None
+        self._stderr_reader: asyncio.Task[None] | None = None
+        self._pending: dict[int, asyncio.Future[dict[str, Any]]] = {}
+        self._listeners: dict[int, Callable[[dict[str, Any]], None]] = {}
+        self._rids = itertools.count(1)
+        self._start_lock = asyncio.Lock()
+        self.restarts = 0
+
+    @property
+    def pid(self) -> int | None:
+        return self._process.pid if self.alive and self._process is not None else None
+
+    @property
+    def alive(self) -> bool:
+        # stdout EOF is the first sign of a crash; returncode is only set once the child is reaped.
+        return (
+            self._process is not None
+            and self._process.returncode is None
+            and self._reader is not None
+            and not self._reader.done()
+        )
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    async def _ensure_started(self) -> asyncio.subprocess.Process:
+        async with self._start_lock:
+            if self.alive and self._process is not None:
+                return self._process
+            if self._process is not None:
+                self.restarts += 1
+                logging.warning("[Builder] Worker exited with %s, restarting", self._process.returncode)
+                await self._reap()
+            command = self._command or _runner_command()
+            self._process = await asyncio.create_subprocess_exec(
+                *command,
+                "--serve",
+                cwd=str(self._cwd),
+                env={**os.environ, **self._env} if self._env else None,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                limit=STREAM_LIMIT_BYTES,
+                start_new_session=True,
+            )
+            self._reader = asyncio.create_task(self._read_responses(self._process))
+            self._stderr_reader = asyncio.create_task(self._drain_stderr(self._process))
+            return self._process
+
+    async def _read_responses(self, process: asyncio.subprocess.Process) -> None:
+        assert process.stdout is not None
+        try:
+            while line := await process.stdout.readline():
+                try:
+                    response = json.loads(line)
+                except json.JSONDecodeError:
+                    logging.warning("[Builder] Ignoring malformed worker output: %r", line[:200])
+                    continue
+                if not isinstance(response, dict):
+                    continue
+                rid = response.pop("rid", None)
+                if "event" in response:
+                    self._dispatch_event(rid, response)
+                    continue
+                future = self._pending.pop(rid, None) if isinstance(rid, int) else None
+                if future is not None and not future.done():
+                    future.set_result(response)
+        finally:
+            self._fail_pending(process, RuntimeError("builder_worker_exited"))
+
+    def _dispatch_event(self, rid: Any, event: dict[str, Any]) -> None:
+        listener = self._listeners.get(rid) if isinstance(rid, int) else None
+        if listener is None:
+            return
+        try:
+            listener(event)
+        except Exception:
+            logging.exception("[Builder] Event listener failed")
+
+    async def _drain_stderr(self, process: asyncio.subprocess.Process) -> None:
+        assert process.stderr is not None
+        while line := await process.stderr.readline():
+            logging.debug("[Builder] %s", line.decode("utf-8", errors="ignore").rstrip())
+
+    def _fail_pending(self, process: asyncio.subprocess.Process, error: Exception) -> None:
+        if process is not self._process:
+            return
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    async def request(
+        self,
+        payload: dict[str, Any],
+        timeout: float | None = None,
+        on_event: Callable[[dict[str, Any]], None] | None = None,
+    ) -> dict[str, Any]:
+        """Send one request and wait for its response.
+
+        Event lines the runner sends for this request before responding (e.g. build stages)
+        go to ``on_event``, called from the reader task.
+        """
+        process = await self._ensure_started()
+        rid = next(self._rids)
+        future: asyncio.Future[dict[str, Any]] = asyncio.get_running_loop().create_future()
+        self._pending[rid] = future
+        if on_event is not None:
+            self._listeners[rid] = on_event
+        assert process.stdin is not None
+        try:
+            process.stdin.write(json.dumps({**payload, "rid": rid}).encode("utf-8") + b"\n")
+            await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError) as exc:
+            self._pending.pop(rid, None)
+            self._listeners.pop(rid, None)
+            raise RuntimeError("builder_worker_unavailable") from exc
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(rid, None)
+            self._listeners.pop(rid, None)
+
+    async def ping(self, timeout: float = PING_TIMEOUT_SECONDS) -> bool:
+        try:
+            response = await self.request({"action": "ping"}, timeout=timeout)
+        except (RuntimeError, TimeoutError):
+            return False
+        return response.get("pong") is True
+
+    async def restart(self) -> None:
+        async with self._start_lock:
+            await self._reap()
+            self.restarts += 1
+        await self._ensure_started()
+
+    async def check_health(self) -> bool:
+        """Ping an idle worker and restart it if it does not answer; True if it was restarted.
+
+        A worker with requests in flight is left alone: a CPU-bound build can hold up the
+        ping reply, and a restart would kill that build. Stuck builds are the deadline's job.
+        """
+        if not self.alive or self.in_flight:
+            return False
+        # A request may have arrived while the ping was waiting; it is a sign of life too.
+        if await self.ping() or self.in_flight:
+            return False
+        logging.warning("[Builder] Worker pid=%s failed health check, restarting", self.pid)
+        await self.restart()
+        return True
+
+    async def run_health_checks(self, interval_seconds: float = HEALTH_CHECK_INTERVAL_SECONDS) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            await self.check_health()
+
+    async def close(self, grace_seconds: float = 5.0) -> None:
+        """Close stdin so the runner finishes accepted work, then kill it after ``grace_seconds``."""
+        async with self._start_lock:
+            await self._reap(grace_seconds)
+
+    async def _reap(self, grace_seconds: float = 0.0) -> None:
+        process, self._process = self._process, None
+        if process is not None:
+            if process.stdin is not None and not process.stdin.is_closing():
+                process.stdin.close()
+            if grace_seconds > 0:
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(process.wait(), grace_seconds)
+            # Builds the runner started share its process group and can outlive it, holding
+            # the stdio pipes open; take the whole group down before waiting.
+            with contextlib.suppress(ProcessLookupError, PermissionError):
+                os.killpg(process.pid, signal.SIGKILL)
+            await process.wait()
+        for task in (self._reader, self._stderr_reader):
+            if task is not None:
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+        self._reader = self._stderr_reader = None
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(RuntimeError("builder_worker_restarted"))
+
+
+def workspaces_root(cwd: Path, env: Mapping[str, str] | None = None) -> Path:
+    """The runner's WORKSPACES_ROOT: ``BUILDER_WORKSPACE_DIR`` or the default, relative to its cwd."""
+    configured = (os.environ if env is None else env).get("BUILDER_WORKSPACE_DIR")
+    return cwd / (configured or WORKSPACES_SUBDIR)
+
+
+def read_rss_bytes(pid: int | None) -> int | None:
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+
+def read_group_rss_bytes(pgid: int | None) -> int | None:
+    """Summed RSS of every process in group ``pgid``, found by scanning all of ``/proc``."""
+    if pgid is None:
+        return None
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    found = False
+    try:
+        pids = [name for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return None
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat", encoding="ascii", errors="replace") as stat:
+                # comm may contain spaces and parentheses; fields resume after the last ")".
+                fields = stat.read().rpartition(")")[2].split()
+            if int(fields[2]) == pgid:
+                total += int(fields[21]) * page_size
+                found = True
+        except (OSError, ValueError, IndexError):
+            continue
+    return total if found else None
+
+
+def read_tree_rss_bytes(pid: int | None, proc: Path = PROC_DIR) -> int | None:
+    """Summed RSS of ``pid`` and its descendants: a runner plus the builds it spawned.
+
+    Follows ``<proc>/<pid>/task/*/children`` down from ``pid``, reading only those
+    processes. Kernels without that file fall back to :func:`read_group_rss_bytes`,
+    since runners lead their own process group.
+    """
+    if pid is None:
+        return None
+    if not (proc / str(pid) / "task" / str(pid) / "children").exists():
+        return read_group_rss_bytes(pid) if (proc / str(pid)).exists() else None
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    found = False
+    pending = [pid]
+    while pending:
+        current = proc / str(pending.pop())
+        try:
+            total += int((current / "statm").read_text(encoding="ascii").split()[1]) * page_size
+            found = True
+            for task in (current / "task").iterdir():
+                with contextlib.suppress(OSError):
+                    pending.extend(int(child) for child in (task / "children").read_text(encoding="ascii").split())
+        except (OSError, ValueError, IndexError):
+            # The process exited while the tree was being walked.
+            continue
+    return total if found else None
+
+
+class _PeakRss:
+    """Samples the RSS of a worker and its children in the background, keeping the maximum."""
 
-    request = json.dumps(payload).encode("utf-8")
-    stdout_data, stderr_data = await process.communicate(request)
+    def __init__(self, worker: BuilderWorker) -> None:
+        self.peak: int | None = None
+        self._task = asyncio.create_task(self._sample(worker))
 
-    if process.returncode != 0:
-        stderr_text = stderr_data.decode("utf-8", errors="ignore").strip()
-        raise RuntimeError(f"builder_runner_failed:{stderr_text or process.returncode}")
+    async def _sample(self, worker: BuilderWorker) -> None:
+        while True:
+            # The worker may only be starting; its pid appears once the process is up.
+            rss = await asyncio.to_thread(read_tree_rss_bytes, worker.pid)
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+            await asyncio.sleep(RSS_SAMPLE_INTERVAL_SECONDS)
 
-    out_text = stdout_data.decode("utf-8", errors="ignore").strip()
-    if not out_text:
-        raise RuntimeError("builder_runner_empty_output")
+    def stop(self) -> int | None:
+        self._task.cancel()
+        return self.peak
 
+
+def _memory_limit_bytes() -> int | None:
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            raw = Path(path).read_text(encoding="ascii").strip()
+        except OSError:
+            continue
+        # cgroup v1 reports "no limit" as a near-2**63 number, v2 as "max".
+        if raw.isdigit() and int(raw) < 1 << 60:
+            return int(raw)
     try:
-        parsed = json.loads(out_text)
-    except json.JSONDecodeError as exc:
-        raise RuntimeError(f"builder_runner_invalid_json:{out_text}") from exc
+        with open("/proc/meminfo", encoding="ascii") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+
+def default_pool_size() -> int:
+    """One worker per spare core, capped by how many worker memory budgets fit."""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    # Leave a core for the bot's own event loop and Telegram I/O.
+    size = max(1, cpus - 1)
+    memory = _memory_limit_bytes()
+    if memory is not None:
+        size = min(size, max(1, memory // WORKER_MEMORY_BUDGET_BYTES))
+    return size
+
+
+@dataclass(slots=True)
+class WorkerStats:
+    slot: int
+    pid: int | None
+    in_flight: int
+    jobs_completed: int
+    jobs_failed: int
+    jobs_timed_out: int
+    restarts: int
+    recycled: int
+    rss_bytes: int | None
+
+
+@dataclass(slots=True)
+class _Slot:
+    worker: BuilderWorker
+    jobs_completed: int = 0
+    jobs_failed: int = 0
+    jobs_timed_out: int = 0
+    recycled: int = 0
+    restarts: int = 0
+    worker_jobs: int = 0
+    # Counted before the request is written, so concurrent submits see each other.
+    active: int = 0
+
+
+class BuilderPool:
+    """A fixed number of :class:`BuilderWorker` slots, each building one job at a time.
+
+    Jobs go to the slot with the fewest requests in flight. A worker that has served
+    ``max_jobs_per_worker`` builds or grown past ``max_rss_bytes`` is swapped for a fresh
+    one; the old process finishes what it already accepted and is then closed.
+
+    A build that outlives ``deadline_seconds``, or whose caller is cancelled, gets its
+    worker killed and replaced and that runner's build workspaces removed. With the
+    default of one build per worker nothing else is running in that process.
+    """
+
+    def __init__(
+        self,
+        size: int = 0,
+        *,
+        max_jobs_per_worker: int = DEFAULT_MAX_JOBS_PER_WORKER,
+        max_rss_bytes: int = DEFAULT_MAX_WORKER_RSS_BYTES,
+        builds_per_worker: int = 1,
+        deadline_seconds: float = DEFAULT_BUILD_DEADLINE_SECONDS,
+        command: Sequence[str] | None = None,
+        cwd: Path = ROOT_DIR,
+    ) -> None:
+        self._command = command
+        self._cwd = cwd
+        self._worker_env = {"BUILDER_MAX_CONCURRENT_BUILDS": str(builds_per_worker)}
+        # Workers inherit this process's environment, so they resolve the same directory.
+        self._workspaces_root = workspaces_root(cwd)
+        self._builds_per_worker = builds_per_worker
+        self._max_jobs_per_worker = max_jobs_per_worker
+        self._max_rss_bytes = max_rss_bytes
+        self._deadline_seconds = deadline_seconds
+        self._slots = [_Slot(self._new_worker()) for _ in range(size if size > 0 else default_pool_size())]
+        self._retiring: dict[asyncio.Task[None], BuilderWorker] = {}
+        self.metrics = BuildMetricsStore()
+
+    @property
+    def size(self) -> int:
+        return len(self._slots)
+
+    @property
+    def capacity(self) -> int:
+        """Builds the pool can run at once without queueing inside the Node runners."""
+        return len(self._slots) * self._builds_per_worker
+
+    def _new_worker(self) -> BuilderWorker:
+        return BuilderWorker(self._command, cwd=self._cwd, env=self._worker_env)
+
+    def _pick(self) -> _Slot:
+        return min(self._slots, key=lambda slot: (slot.active, slot.worker_jobs))
+
+    async def _submit(
+        self,
+        payload: dict[str, Any],
+        deadline_seconds: float | None = None,
+        on_event: Callable[[dict[str, Any]], None] | None = None,
+        on_start: Callable[[BuilderWorker], None] | None = None,
+    ) -> dict[str, Any]:
+        slot = self._pick()
+        worker = slot.worker
+        slot.active += 1
+        if on_start is not None:
+            on_start(worker)
+        try:
+            response = await worker.request(payload, timeout=deadline_seconds, on_event=on_event)
+        except TimeoutError:
+            slot.jobs_timed_out += 1
+            await asyncio.shield(self._abandon(slot, worker))
+            raise
+        except asyncio.CancelledError:
+            slot.jobs_failed += 1
+            self._abandon(slot, worker)
+            raise
+        except RuntimeError:
+            slot.jobs_failed += 1
+            raise
+        finally:
+            slot.active -= 1
+        if response.get("ok") and response.get("path"):
+            slot.jobs_completed += 1
+        else:
+            slot.jobs_failed += 1
+        slot.worker_jobs += 1
+        self._maybe_recycle(slot, worker)
+        return response
+
+    def _maybe_recycle(self, slot: _Slot, worker: BuilderWorker) -> None:
+        if slot.worker is not worker:
+            return
+        rss = read_rss_bytes(worker.pid)
+        if slot.worker_jobs < self._max_jobs_per_worker and (rss is None or rss <= self._max_rss_bytes):
+            return
+        logging.info("[Builder] Recycling worker pid=%s after %s jobs (rss=%s)", worker.pid, slot.worker_jobs, rss)
+        slot.restarts += worker.restarts
+        slot.worker = self._new_worker()
+        slot.worker_jobs = 0
+        slot.recycled += 1
+        task = asyncio.create_task(self._retire(worker))
+        self._retiring[task] = worker
+        task.add_done_callback(lambda done: self._retiring.pop(done, None))
+
+    def _abandon(self, slot: _Slot, worker: BuilderWorker) -> asyncio.Task[None]:
+        """Kill ``worker`` with whatever it is building and give ``slot`` a fresh one."""
+        if slot.worker is worker:
+            slot.restarts += worker.restarts + 1
+            slot.worker = self._new_worker()
+            slot.worker_jobs = 0
+        # A half-built workspace must not be reused; the next runner would also prune it.
+        work_dir = self._workspaces_root / str(worker.pid) if worker.pid is not None else None
+        task = asyncio.create_task(self._kill(worker, work_dir))
+        self._retiring[task] = worker
+        task.add_done_callback(lambda done: self._retiring.pop(done, None))
+        return task
+
+    @staticmethod
+    async def _kill(worker: BuilderWorker, work_dir: Path | None) -> None:
+        await worker.close(grace_seconds=0)
+        if work_dir is not None:
+            await asyncio.to_thread(shutil.rmtree, work_dir, ignore_errors=True)
+
+    async def _retire(self, worker: BuilderWorker) -> None:
+        while worker.in_flight:
+            await asyncio.sleep(RETIRE_POLL_SECONDS)
+        await worker.close()
+
+    def stats(self) -> list[WorkerStats]:
+        return [
+            WorkerStats(
+                slot=index,
+                pid=slot.worker.pid,
+                in_flight=slot.active,
+                jobs_completed=slot.jobs_completed,
+                jobs_failed=slot.jobs_failed,
+                jobs_timed_out=slot.jobs_timed_out,
+                restarts=slot.restarts + slot.worker.restarts,
+                recycled=slot.recycled,
+                rss_bytes=read_rss_bytes(slot.worker.pid),
+            )
+            for index, slot in enumerate(self._slots)
+        ]
+
+    async def check_health(self) -> int:
+        """Restart idle workers that do not answer a ping; returns how many were restarted.
+
+        Slots with a build running are skipped, see :meth:`BuilderWorker.check_health`.
+        """
+        restarted = 0
+        for slot in self._slots:
+            if slot.active:
+                continue
+            restarted += await slot.worker.check_health()
+        return restarted
+
+    async def run_health_checks(self, interval_seconds: float = HEALTH_CHECK_INTERVAL_SECONDS) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            await self.check_health()
 
-    if not isinstance(parsed, dict):
-        raise RuntimeError("builder_runner_bad_payload")
+    async def close(self) -> None:
+        retiring = dict(self._retiring)
+        for task in retiring:
+            task.cancel()
+        await asyncio.gather(*retiring, return_exceptions=True)
+        await asyncio.gather(*(worker.close() for worker in [*retiring.values(), *(slot.worker for slot in self._slots)]))
 
-    return parsed
+    async def cleanup_temp(self) -> None:
+        # The temp dir is shared by every worker, so one of them is enough.
+        response = await self._slots[0].worker.request({"action": "cleanup"})
+        if not response.get("ok"):
+            raise RuntimeError(str(response.get("error", "cleanup_failed")))
 
+    async def warm_inline_cache(self, template_dir: Path, game_key: str) -> int:
+        """Have a runner encode the assets previews of ``game_key`` inline from ``template_dir``.
 
-async def cleanup_temp() -> None:
-    response = await _run({"action": "cleanup"})
-    if not response.get("ok"):
-        raise RuntimeError(str(response.get("error", "cleanup_failed")))
+        The encodings land in the runners' shared inline store, so parallel preview builds of
+        the template find them there instead of each encoding them again. Returns how many.
+        """
+        # The store is shared by every worker, so one of them is enough.
+        response = await self._slots[0].worker.request({"action": "warm_inline_cache", "templateDir": str(template_dir), "gameKey": game_key})
+        if not response.get("ok"):
+            raise RuntimeError(str(response.get("error", "warm_inline_cache_failed")))
+        return int(response.get("warmed", 0))
 
+    async def generate_playable(
+        self,
+        order_id: str,
+        config: OrderConfig,
+        on_progress: ProgressListener | None = None,
+        *,
+        use_library: bool = True,
+        profile: bool = False,
+    ) -> str | None:
+        """Build ``config`` and return the output path, or None if the build failed.
 
-async def generate_playable(order_id: str, config: dict[str, Any]) -> str | None:
-    response = await _run(
-        {
+        ``use_library=False`` makes the runner build from the template even when a
+        prebuilt library artifact exists; the library prebuild needs that. ``profile``
+        has the runner write V8 CPU profiles of the build; their directory ends up in
+        the build's :class:`BuildMetrics`. Every build, successful or not, is recorded
+        in :attr:`metrics` with its stage timings and peak RSS.
+        """
+        events: list[BuildProgress] = []
+
+        def on_event(event: dict[str, Any]) -> None:
+            stage, elapsed_ms = event.get("stage"), event.get("elapsedMs")
+            if event.get("event") != "stage" or not isinstance(stage, str) or not isinstance(elapsed_ms, int):
+                return
+            progress = BuildProgress(stage, elapsed_ms)
+            events.append(progress)
+            if on_progress is not None:
+                on_progress(progress)
+
+        samplers: list[_PeakRss] = []
+        payload: dict[str, Any] = {
             "action": "generate",
             "id": order_id,
-            "config": config,
+            "config": config.to_dict(),
         }
-    )
-    if not response.get("ok"):
+        if not use_library:
+            payload["useLibrary"] = False
+        if profile:
+            payload["profile"] = True
+        started = time.monotonic()
+        response: dict[str, Any] = {}
+        try:
+            response = await self._submit(payload, self._deadline_seconds, on_event, lambda worker: samplers.append(_PeakRss(worker)))
+        except TimeoutError:
+            logging.warning("[Builder] Job %s missed its %ss deadline; worker killed", order_id, self._deadline_seconds)
+            return None
+        finally:
+            path = response.get("path") if response.get("ok") else None
+            profile_dir = response.get("profileDir")
+            self.metrics.record(
+                BuildMetrics(
+                    job_id=order_id,
+                    game=config.game,
+                    preview=bool(config.is_watermarked),
+                    ok=isinstance(path, str) and bool(path),
+                    total_seconds=time.monotonic() - started,
+                    stages=stage_durations(events),
+                    peak_rss_bytes=samplers[0].stop() if samplers else None,
+                    profile_dir=profile_dir if isinstance(profile_dir, str) else None,
+                )
+            )
+        if isinstance(path, str) and path:
+            return path
         return None
-    path = response.get("path")
-    if isinstance(path, str) and path:
-        return path
-    return None
 
+
+class BuildPriority(IntEnum):
+    PAID_FINAL = 0
+    ADMIN_GRANT = 1
+    PREFETCH = 2
+
+
+class BuildQueueFullError(RuntimeError):
+    pass
+
+
+@dataclass(slots=True, eq=False)
+class BuildTicket:
+    key: str
+    order_id: str
+    config: OrderConfig
+    priority: BuildPriority
+    seq: int
+    future: asyncio.Future[str | None]
+    enqueued_at: float = field(default_factory=time.monotonic)
+    started_at: float | None = None
+    task: asyncio.Task[None] | None = None
+    waiters: int = 0
+    progress: BuildProgress | None = None
+    listeners: list[ProgressListener] = field(default_factory=list)
+
+    @property
+    def running(self) -> bool:
+        return self.started_at is not None
+
+
+class BuildScheduler:
+    """Feeds builds to a :class:`BuilderPool` by priority, one per free pool slot.
+
+    Jobs with the same ``key`` (identical build inputs) are merged: a later submit gets the
+    ticket already queued or running, bumped to the higher of the two priorities; the build
+    is cancelled once every caller waiting on it via :meth:`wait` has been cancelled. Holding
+    jobs here rather than in the Node queue means nothing is dropped when the runner's own
+    queue would overflow, and handlers can report a position and ETA.
+
+    ``PREFETCH`` jobs are speculative and must never hold up anyone else: they do not count
+    against ``max_queued`` for other jobs, never take the last free slot of a multi-slot
+    pool, and a running one is cancelled when a higher-priority job has no slot to start in.
+    """
+
+    def __init__(self, pool: BuilderPool, *, concurrency: int | None = None, max_queued: int = DEFAULT_MAX_QUEUED_BUILDS) -> None:
+        self._pool = pool
+        self._concurrency = concurrency or pool.capacity
+        self._max_queued = max_queued
+        self._heap: list[tuple[int, int, BuildTicket]] = []
+        self._by_key: dict[str, BuildTicket] = {}
+        self._running: set[asyncio.Task[None]] = set()
+        self._seq = itertools.count()
+        self._durations: deque[float] = deque(maxlen=BUILD_DURATION_SAMPLES)
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for ticket in self._by_key.values() if not ticket.running)
+
+    def submit(self, key: str, order_id: str, config: OrderConfig, priority: BuildPriority) -> BuildTicket:
+        existing = self._by_key.get(key)
+        if existing is not None:
+            self.promote(key, priority)
+            return existing
+        queued = self.queued if priority == BuildPriority.PREFETCH else self._queued_above(BuildPriority.PREFETCH)
+        if queued >= self._max_queued:
+            raise BuildQueueFullError("build_queue_full")
+
+        ticket = BuildTicket(
+            key=key,
+            order_id=order_id,
+            config=config,
+            priority=priority,
+            seq=next(self._seq),
+            future=asyncio.get_running_loop().create_future(),
+        )
+        self._by_key[key] = ticket
+        heapq.heappush(self._heap, (priority, ticket.seq, ticket))
+        self._dispatch()
+        return ticket
+
+    def promote(self, key: str, priority: BuildPriority) -> bool:
+        """Raise the queued or running job for ``key`` to ``priority``; False if there is none."""
+        ticket = self._by_key.get(key)
+        if ticket is None:
+            return False
+        if priority < ticket.priority:
+            ticket.priority = priority
+            if not ticket.running:
+                # The old heap entry is skipped when popped; this one jumps the queue.
+                heapq.heappush(self._heap, (priority, ticket.seq, ticket))
+                self._dispatch()
+        return True
+
+    async def wait(self, ticket: BuildTicket, on_progress: ProgressListener | None = None) -> str | None:
+        """Result of ``ticket``; ``on_progress`` hears its build stages, starting with the current one."""
+        ticket.waiters += 1
+        if on_progress is not None:
+            ticket.listeners.append(on_progress)
+            if ticket.progress is not None:
+                on_progress(ticket.progress)
+        try:
+            return await asyncio.shield(ticket.future)
+        except asyncio.CancelledError:
+            if ticket.waiters == 1:
+                self.cancel(ticket)
+            raise
+        finally:
+            ticket.waiters -= 1
+            if on_progress is not None:
+                ticket.listeners.remove(on_progress)
+
+    def cancel(self, ticket: BuildTicket) -> None:
+        if ticket.future.done():
+            return
+        if self._by_key.get(ticket.key) is ticket:
+            del self._by_key[ticket.key]
+        if ticket.task is not None:
+            # The pool kills the worker and clears the job's temp dir.
+            ticket.task.cancel()
+        else:
+            ticket.future.cancel()
+
+    def position(self, ticket: BuildTicket) -> int:
+        """0 while building, otherwise 1-based place among waiting jobs."""
+        if ticket.running or ticket.future.done():
+            return 0
+        return 1 + sum(
+            1
+            for other in self._by_key.values()
+            if not other.running and (other.priority, other.seq) < (ticket.priority, ticket.seq)
+        )
+
+    def average_build_seconds(self) -> float:
+        return sum(self._durations) / len(self._durations) if self._durations else DEFAULT_BUILD_SECONDS
+
+    def eta_seconds(self, ticket: BuildTicket) -> float:
+        average = self.average_build_seconds()
+        if ticket.future.done():
+            return 0.0
+        if ticket.started_at is not None:
+            return max(0.0, average - (time.monotonic() - ticket.started_at))
+        # Running builds are assumed half done; the queue ahead then drains one wave per slot set.
+        waves = math.ceil(self.position(ticket) / self._concurrency)
+        return average * (waves + 0.5)
+
+    def _queued_above(self, priority: BuildPriority) -> int:
+        return sum(1 for ticket in self._by_key.values() if not ticket.running and ticket.priority < priority)
+
+    def _dispatch(self) -> None:
+        # One slot stays free for paid work unless the pool has only one.
+        prefetch_slots = self._concurrency - 1 if self._concurrency > 1 else 1
+        while self._heap and len(self._running) < self._concurrency:
+            priority, _, ticket = self._heap[0]
+            if ticket.running or priority != ticket.priority or self._by_key.get(ticket.key) is not ticket:
+                heapq.heappop(self._heap)
+                continue
+            if priority == BuildPriority.PREFETCH and len(self._running) >= prefetch_slots:
+                break
+            heapq.heappop(self._heap)
+            ticket.started_at = time.monotonic()
+            task = ticket.task = asyncio.create_task(self._run(ticket))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+        self._preempt_prefetch()
+
+    def _preempt_prefetch(self) -> None:
+        waiting = self._queued_above(BuildPriority.PREFETCH)
+        if not waiting:
+            return
+        active = [ticket for ticket in self._by_key.values() if ticket.running]
+        # Cancelled tickets leave _by_key at once but hold their slot until the worker is gone.
+        freeing = len(self._running) - len(active)
+        shortfall = waiting - (self._concurrency - len(self._running)) - freeing
+        speculative = sorted(
+            (ticket for ticket in active if ticket.priority == BuildPriority.PREFETCH),
+            key=lambda ticket: ticket.started_at or 0.0,
+            reverse=True,
+        )
+        # The most recently started ones lose the least work.
+        for ticket in speculative[: max(0, shortfall)]:
+            logging.info("[Builder] Preempting speculative build %s for a paid build", ticket.order_id)
+            self.cancel(ticket)
+
+    @staticmethod
+    def _progress(ticket: BuildTicket, progress: BuildProgress) -> None:
+        ticket.progress = progress
+        for listener in list(ticket.listeners):
+            try:
+                listener(progress)
+            except Exception:
+                logging.exception("[Builder] Progress listener failed")
+
+    async def _run(self, ticket: BuildTicket) -> None:
+        try:
+            path = await self._pool.generate_playable(ticket.order_id, ticket.config, lambda progress: self._progress(ticket, progress))
+        except asyncio.CancelledError:
+            ticket.future.cancel()
+            raise
+        except Exception as exc:
+            ticket.future.set_exception(exc)
+            # Mark the exception retrieved in case every waiter has gone away.
+            ticket.future.exception()
+        else:
+            ticket.future.set_result(path)
+            if path is not None and ticket.started_at is not None:
+                self._durations.append(time.monotonic() - ticket.started_at)
+        finally:
+            if self._by_key.get(ticket.key) is ticket:
+                del self._by_key[ticket.key]
+            self._running.discard(asyncio.current_task())  # type: ignore[arg-type]
+            self._dispatch()
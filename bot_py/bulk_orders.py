@@ -0,0 +1,106 @@
+"""Bulk orders: one game in several GEO/CTA/starting-balance variants, paid as one order.
+
+Variants arrive as text, pasted or sent as a CSV document, one per line:
+``geo, cta[, balance]``. The separator may be a comma, semicolon, tab or plain spaces,
+a ``geo,...`` header line and ``#`` comments are skipped, and a CTA containing the
+separator is glued back together, so unquoted query strings survive. Every variant is
+built like a regular final order and the files are delivered together in one ZIP.
+"""
+
+from __future__ import annotations
+
+import csv
+import re
+from dataclasses import dataclass, field, replace
+
+from .constants import GEOS
+from .helpers import normalize_cta_url, parse_starting_balance
+from .models import OrderConfig, OrderVariant
+
+BULK_ORDER_MAX_VARIANTS = 20
+BULK_CSV_MAX_BYTES = 64 * 1024
+_HEADER_WORDS = frozenset({"geo", "гео"})
+_BALANCE_RE = re.compile(r"\d[\d _']*")
+_GEOS_BY_ID = {geo["id"]: geo for geo in GEOS}
+
+
+@dataclass(slots=True)
+class BulkParseResult:
+    variants: list[OrderVariant] = field(default_factory=list)
+    errors: list[str] = field(default_factory=list)
+
+
+def _split_row(line: str) -> list[str]:
+    # The separator is whatever follows the GEO, so commas later in a CTA do not count.
+    geo = re.match(r"[^\s;,]*", line)
+    delimiter = line[geo.end() if geo else 0 :].lstrip(" ")[:1]
+    if delimiter in {";", "\t", ","}:
+        row = next(csv.reader([line], delimiter=delimiter, skipinitialspace=True))
+        return [value.strip() for value in row]
+    return line.split()
+
+
+def parse_bulk_rows(text: str, *, default_balance: int, max_variants: int = BULK_ORDER_MAX_VARIANTS) -> BulkParseResult:
+    """Variants from ``text`` plus one error line (in Russian, like the bot) per bad row."""
+    result = BulkParseResult()
+    seen: set[tuple[str, str, int]] = set()
+    for number, raw_line in enumerate(text.splitlines(), start=1):
+        line = raw_line.strip()
+        if not line or line.startswith("#"):
+            continue
+        row = _split_row(line)
+        if row[0].lower() in _HEADER_WORDS and not result.variants and not result.errors:
+            continue
+        if len(row) < 2:
+            result.errors.append(f"Строка {number}: нужно минимум GEO и CTA-ссылка.")
+            continue
+
+        geo_id = row[0].lower()
+        if len(row) > 2 and _BALANCE_RE.fullmatch(row[-1]):
+            cta_parts, balance_text = row[1:-1], row[-1]
+        else:
+            cta_parts, balance_text = row[1:], ""
+        click_url = normalize_cta_url(",".join(cta_parts))
+        if geo_id not in _GEOS_BY_ID:
+            result.errors.append(f"Строка {number}: неизвестное GEO «{row[0]}».")
+            continue
+        if click_url is None:
+            result.errors.append(f"Строка {number}: некорректная CTA-ссылка.")
+            continue
+        balance = parse_starting_balance(balance_text) if balance_text else default_balance
+        if balance is None:
+            result.errors.append(f"Строка {number}: некорректный стартовый баланс.")
+            continue
+        if (geo_id, click_url, balance) in seen:
+            result.errors.append(f"Строка {number}: повтор варианта.")
+            continue
+        seen.add((geo_id, click_url, balance))
+        result.variants.append(OrderVariant(geo_id=geo_id, click_url=click_url, starting_balance=balance))
+
+    if len(result.variants) > max_variants:
+        result.errors.append(f"Не больше {max_variants} вариантов в одном заказе, получено {len(result.variants)}.")
+    elif not result.variants and not result.errors:
+        result.errors.append("Не найдено ни одной строки с вариантом.")
+    return result
+
+
+def order_units(config: OrderConfig) -> int:
+    """How many playables an order pays for."""
+    return len(config.variants) if config.variants else 1
+
+
+def variant_config(config: OrderConfig, variant: OrderVariant) -> OrderConfig:
+    """The single-playable config of ``variant`` within the bulk order ``config``."""
+    geo = _GEOS_BY_ID[variant.geo_id]
+    return replace(
+        config,
+        geo_id=variant.geo_id,
+        language=geo["lang"],
+        currency=geo["currency"],
+        click_url=variant.click_url,
+        starting_balance=variant.starting_balance,
+        payment=None,
+        manual_payment=None,
+        variants=None,
+        extra=dict(config.extra),
+    )
@@ -50,6 +50,26 @@ class Config:
     crypto_pay_accepted_assets: str
     log_level: str
     polling_timeout: int
+    session_ttl_seconds: int
+    session_pending_payment_ttl_seconds: int
+    session_sweep_interval_seconds: int
+    callback_token_secret: str
+    builder_pool_size: int
+    builder_worker_max_jobs: int
+    builder_worker_max_rss_mb: int
+    artifact_cache_budget_mb: int
+    build_queue_max: int
+    build_deadline_seconds: int
+    delivery_archive: bool
+    archive_workers: int
+    speculative_builds: bool
+    delivery_workers: int
+    webhook_url: str
+    webhook_path: str
+    webhook_secret: str
+    webhook_concurrency: int
+    telegram_rate_limit: int
+    background_jobs: bool
 
 
 def load_config() -> Config:
@@ -70,6 +90,26 @@ def load_config() -> Config:
         ).strip(),
         log_level=os.getenv("PY_LOG_LEVEL", "INFO").strip() or "INFO",
         polling_timeout=_get_env_number("PY_POLLING_TIMEOUT", "30"),
+        session_ttl_seconds=_get_env_number("SESSION_TTL_SECONDS", "604800"),
+        session_pending_payment_ttl_seconds=_get_env_number("SESSION_PENDING_PAYMENT_TTL_SECONDS", "86400"),
+        session_sweep_interval_seconds=_get_env_number("SESSION_SWEEP_INTERVAL_SECONDS", "600"),
+        callback_token_secret=os.getenv("CALLBACK_TOKEN_SECRET", "").strip(),
+        builder_pool_size=_get_env_number("BUILDER_POOL_SIZE", "0"),
+        builder_worker_max_jobs=_get_env_number("BUILDER_WORKER_MAX_JOBS", "200"),
+        builder_worker_max_rss_mb=_get_env_number("BUILDER_WORKER_MAX_RSS_MB", "512"),
+        artifact_cache_budget_mb=_get_env_number("ARTIFACT_CACHE_BUDGET_MB", "2048"),
+        build_queue_max=_get_env_number("BUILD_QUEUE_MAX", "200"),
+        build_deadline_seconds=_get_env_number("BUILD_DEADLINE_SECONDS", "180"),
+        delivery_archive=os.getenv("DELIVERY_ARCHIVE", "0").strip() == "1",
+        archive_workers=_get_env_number("ARCHIVE_WORKERS", "1"),
+        speculative_builds=os.getenv("SPECULATIVE_BUILDS", "1").strip() == "1",
+        delivery_workers=_get_env_number("DELIVERY_WORKERS", "4"),
+        webhook_url=os.getenv("WEBHOOK_URL", "").strip().rstrip("/"),
+        webhook_path="/" + (os.getenv("WEBHOOK_PATH", "").strip().strip("/") or "telegram/webhook"),
+        webhook_secret=os.getenv("WEBHOOK_SECRET", "").strip(),
+        webhook_concurrency=_get_env_number("WEBHOOK_CONCURRENCY", "32"),
+        telegram_rate_limit=_get_env_number("TELEGRAM_RATE_LIMIT", "30"),
+        background_jobs=os.getenv("BACKGROUND_JOBS", "1").strip() == "1",
     )
 
 
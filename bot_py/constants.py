@@ -9,6 +9,7 @@ GAMES: Final = {
         "THEME": "chicken_farm",
         "ASSET_KEY": "railroad_preview",
         "TITLE": "Chicken Railroad",
+        "TEMPLATE_DIR": "railroad",
     },
     "PLINKO": {
         "ID": "game_plinko_classic",
@@ -21,18 +22,21 @@ GAMES: Final = {
         "GAME_KEY": "olympus",
         "THEME": "gate_of_olympus",
         "TITLE": "Gates of Olympus",
+        "TEMPLATE_DIR": "gate_of_olympus",
     },
     "DRAG": {
         "ID": "game_drag",
         "GAME_KEY": "matching",
         "THEME": "money_drag",
         "TITLE": "Money Matching",
+        "TEMPLATE_DIR": "matching",
     },
     "MATCH3": {
         "ID": "game_match3",
         "GAME_KEY": "match3",
         "THEME": "3_v_ryad",
         "TITLE": "3 v ryad",
+        "TEMPLATE_DIR": "3_v_ryad",
     },
 }
 
@@ -66,7 +70,6 @@ class Callback:
     GEN_PREVIEW = "gen_preview"
     TOP_UP_BALANCE = "top_up_balance"
     I_PAID = "i_paid"
-    GEO_CUSTOM = "geo_custom"
 
     # Language
     SET_LANG_RU = "set_lang_ru"
@@ -76,7 +79,6 @@ class Callback:
 
     # Prefixes
     BUY_CHECK_PREFIX = "buy_check_"
-    GEO_PREFIX = "geo_"
     PAYMENT_CANCEL_PREFIX = "payment_cancel_"
     MANUAL_PAY_MENU_PREFIX = "manual_pay_menu_"
     MANUAL_PAY_PREFIX = "manual_pay_"
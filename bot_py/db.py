@@ -1,16 +1,23 @@
 from __future__ import annotations
 
 import json
+import time
+from collections.abc import Collection, Sequence
 from dataclasses import dataclass
 from datetime import UTC, datetime
 from pathlib import Path
 from typing import Any
 
-from sqlalchemy import Float, Integer, String, func, select
-from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy import Float, Integer, LargeBinary, String, delete, func, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from sqlalchemy.sql import text
 
+from .broadcast import BroadcastJob, RecipientResult
+from .models import OrderConfig, OrderRecord, decode_order_config, encode
+from .outbox import OutboxEntry, OutboxItem
+
 
 class Base(DeclarativeBase):
     pass
@@ -78,6 +85,60 @@ class BannedUser(Base):
     reason: Mapped[str] = mapped_column(String, default="")
 
 
+class OutboxMessage(Base):
+    __tablename__ = "outbox"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String)
+    dedupe_key: Mapped[str | None] = mapped_column("dedupeKey", String, nullable=True, unique=True)
+    payload_json: Mapped[str] = mapped_column("payloadJson", String)
+    # pending -> done, or dead once retries are exhausted.
+    status: Mapped[str] = mapped_column(String, default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    # Unix seconds; a plain number keeps the due-rows query an index range scan.
+    next_attempt_at: Mapped[float] = mapped_column("nextAttemptAt", Float, default=0)
+    last_error: Mapped[str] = mapped_column("lastError", String, default="")
+    created_at: Mapped[str] = mapped_column("createdAt", String, default=lambda: datetime.now(UTC).isoformat())
+
+
+class Broadcast(Base):
+    __tablename__ = "broadcasts"
+
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    segment: Mapped[str] = mapped_column(String, default="")
+    text: Mapped[str] = mapped_column(String, default="")
+    photo: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    photo_file_id: Mapped[str] = mapped_column("photoFileId", String, default="")
+    # queued -> running -> completed | failed; written by the admin panel when queued.
+    status: Mapped[str] = mapped_column(String, default="queued")
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    sent: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    blocked: Mapped[int] = mapped_column(Integer, default=0)
+    error: Mapped[str] = mapped_column(String, default="")
+    created_at: Mapped[str] = mapped_column("createdAt", String, default=lambda: datetime.now(UTC).isoformat())
+    started_at: Mapped[str] = mapped_column("startedAt", String, default="")
+    finished_at: Mapped[str] = mapped_column("finishedAt", String, default="")
+    updated_at: Mapped[str] = mapped_column("updatedAt", String, default=lambda: datetime.now(UTC).isoformat())
+
+
+class BroadcastRecipient(Base):
+    __tablename__ = "broadcast_recipients"
+
+    broadcast_id: Mapped[str] = mapped_column("broadcastId", String, primary_key=True)
+    user_id: Mapped[int] = mapped_column("userId", primary_key=True)
+    # pending -> sent | failed | blocked
+    status: Mapped[str] = mapped_column(String, default="pending")
+    error: Mapped[str] = mapped_column(String, default="")
+
+
+class BlockedUser(Base):
+    __tablename__ = "blocked_users"
+
+    user_id: Mapped[int] = mapped_column("userId", primary_key=True)
+    blocked_at: Mapped[str] = mapped_column("blockedAt", String, default=lambda: datetime.now(UTC).isoformat())
+
+
 def _db_url() -> str:
     db_file = Path.cwd() / "data" / "bot.db"
     return f"sqlite+aiosqlite:///{db_file.as_posix()}"
@@ -99,6 +160,28 @@ class DBError(RuntimeError):
     pass
 
 
+async def _add_outbox(session: AsyncSession, items: Sequence[OutboxItem]) -> None:
+    """Stage ``items`` in ``session``, so they commit (or roll back) with the caller's change."""
+    now = time.time()
+    for item in items:
+        if item.dedupe_key is not None:
+            exists = await session.scalar(select(OutboxMessage.id).where(OutboxMessage.dedupe_key == item.dedupe_key))
+            if exists is not None:
+                continue
+        session.add(
+            OutboxMessage(
+                kind=item.kind,
+                dedupe_key=item.dedupe_key,
+                payload_json=json.dumps(item.payload, ensure_ascii=False),
+                status="pending",
+                attempts=0,
+                next_attempt_at=now + item.delay_seconds,
+                last_error="",
+                created_at=_now(),
+            )
+        )
+
+
 @dataclass(slots=True)
 class UserStats:
     orders_paid: int
@@ -121,6 +204,75 @@ class DB:
                     """
                 )
             )
+            await conn.execute(
+                text(
+                    """
+                    CREATE TABLE IF NOT EXISTS outbox (
+                      id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      kind TEXT NOT NULL,
+                      dedupeKey TEXT UNIQUE,
+                      payloadJson TEXT NOT NULL DEFAULT '{}',
+                      status TEXT NOT NULL DEFAULT 'pending',
+                      attempts INTEGER NOT NULL DEFAULT 0,
+                      nextAttemptAt REAL NOT NULL DEFAULT 0,
+                      lastError TEXT NOT NULL DEFAULT '',
+                      createdAt TEXT NOT NULL DEFAULT ''
+                    )
+                    """
+                )
+            )
+            await conn.execute(text("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, nextAttemptAt)"))
+            # Same DDL as ensureBroadcastTables in the admin panel, which creates and fills these
+            # first; tests_py/test_broadcast.py checks that both build the same tables.
+            await conn.execute(
+                text(
+                    """
+                    CREATE TABLE IF NOT EXISTS broadcasts (
+                      id TEXT PRIMARY KEY,
+                      segment TEXT NOT NULL DEFAULT '',
+                      text TEXT NOT NULL DEFAULT '',
+                      photo BLOB,
+                      photoFileId TEXT NOT NULL DEFAULT '',
+                      status TEXT NOT NULL DEFAULT 'queued',
+                      total INTEGER NOT NULL DEFAULT 0,
+                      sent INTEGER NOT NULL DEFAULT 0,
+                      failed INTEGER NOT NULL DEFAULT 0,
+                      blocked INTEGER NOT NULL DEFAULT 0,
+                      error TEXT NOT NULL DEFAULT '',
+                      createdAt TEXT NOT NULL DEFAULT '',
+                      startedAt TEXT NOT NULL DEFAULT '',
+                      finishedAt TEXT NOT NULL DEFAULT '',
+                      updatedAt TEXT NOT NULL DEFAULT ''
+                    )
+                    """
+                )
+            )
+            await conn.execute(
+                text(
+                    """
+                    CREATE TABLE IF NOT EXISTS broadcast_recipients (
+                      broadcastId TEXT NOT NULL,
+                      userId INTEGER NOT NULL,
+                      status TEXT NOT NULL DEFAULT 'pending',
+                      error TEXT NOT NULL DEFAULT '',
+                      PRIMARY KEY (broadcastId, userId)
+                    )
+                    """
+                )
+            )
+            await conn.execute(
+                text("CREATE INDEX IF NOT EXISTS broadcast_recipients_status ON broadcast_recipients (broadcastId, status)")
+            )
+            await conn.execute(
+                text(
+                    """
+                    CREATE TABLE IF NOT EXISTS blocked_users (
+                      userId INTEGER PRIMARY KEY,
+                      blockedAt TEXT NOT NULL DEFAULT ''
+                    )
+                    """
+                )
+            )
             # Backward-compatible migration for legacy SQLite schema.
             columns_result = await conn.execute(text("PRAGMA table_info(users)"))
             columns = {str(row[1]) for row in columns_result.fetchall()}
@@ -211,7 +363,7 @@ class DB:
         await DB.log_action(user.referrer_id, "referral_reward", f"Received ${reward} from user {user_id}")
 
     @staticmethod
-    async def create_order(order_id: str, user_id: int, game: str, theme: str, config: dict[str, Any]) -> None:
+    async def create_order(order_id: str, user_id: int, game: str, theme: str, config: OrderConfig) -> None:
         async with SessionLocal() as session:
             session.add(
                 Order(
@@ -219,13 +371,13 @@ class DB:
                     user_id=user_id,
                     game_type=game,
                     theme_id=theme,
-                    config_json=json.dumps(config, ensure_ascii=False),
+                    config_json=encode(config),
                 )
             )
             await session.commit()
 
     @staticmethod
-    async def mark_paid(order_id: str, status: str, amount: int, discount: int) -> None:
+    async def mark_paid(order_id: str, status: str, amount: int, discount: int, outbox: Sequence[OutboxItem] = ()) -> None:
         async with SessionLocal() as session:
             order = await session.scalar(select(Order).where(Order.order_id == order_id))
             if order is None:
@@ -233,31 +385,32 @@ class DB:
             order.status = status
             order.amount = int(amount)
             order.discount_applied = int(discount)
+            await _add_outbox(session, outbox)
             await session.commit()
 
     @staticmethod
-    async def set_order_status(order_id: str, status: str) -> None:
+    async def set_order_status(order_id: str, status: str, outbox: Sequence[OutboxItem] = ()) -> None:
         async with SessionLocal() as session:
             order = await session.scalar(select(Order).where(Order.order_id == order_id))
             if order is None:
                 raise DBError("ORDER_NOT_FOUND")
             order.status = status
+            await _add_outbox(session, outbox)
             await session.commit()
 
     @staticmethod
-    async def update_order_config(order_id: str, patch: dict[str, Any]) -> dict[str, Any]:
+    async def update_order_config(order_id: str, **changes: Any) -> OrderConfig:
         async with SessionLocal() as session:
             order = await session.scalar(select(Order).where(Order.order_id == order_id))
             if order is None:
                 raise DBError("ORDER_NOT_FOUND")
 
-            current_config = json.loads(order.config_json)
-            if not isinstance(current_config, dict):
-                current_config = {}
-            next_config = {**current_config, **patch}
-            order.config_json = json.dumps(next_config, ensure_ascii=False)
+            config = decode_order_config(order.config_json)
+            for name, value in changes.items():
+                setattr(config, name, value)
+            order.config_json = encode(config)
             await session.commit()
-            return next_config
+            return config
 
     @staticmethod
     async def finalize_paid_order(
@@ -266,6 +419,7 @@ class DB:
         status: str,
         amount: int,
         discount: int,
+        outbox: Sequence[OutboxItem] = (),
     ) -> dict[str, float]:
         async with SessionLocal() as session:
             async with session.begin():
@@ -287,6 +441,7 @@ class DB:
                 order.status = status
                 order.amount = amount
                 order.discount_applied = discount
+                await _add_outbox(session, outbox)
 
                 return {"newBalance": user.wallet_balance}
 
@@ -297,6 +452,7 @@ class DB:
         status: str,
         amount: int,
         discount: int,
+        outbox: Sequence[OutboxItem] = (),
     ) -> None:
         async with SessionLocal() as session:
             async with session.begin():
@@ -311,25 +467,25 @@ class DB:
                 order.status = status
                 order.amount = amount
                 order.discount_applied = discount
+                await _add_outbox(session, outbox)
 
     @staticmethod
-    async def get_order(order_id: str) -> dict[str, Any] | None:
+    async def get_order(order_id: str) -> OrderRecord | None:
         async with SessionLocal() as session:
             order = await session.scalar(select(Order).where(Order.order_id == order_id))
             if order is None:
                 return None
-            config = json.loads(order.config_json)
-            return {
-                "orderId": order.order_id,
-                "userId": order.user_id,
-                "gameType": order.game_type,
-                "themeId": order.theme_id,
-                "config": config if isinstance(config, dict) else {},
-                "status": order.status,
-                "amount": order.amount,
-                "discountApplied": order.discount_applied,
-                "createdAt": order.created_at,
-            }
+            return OrderRecord(
+                order_id=order.order_id,
+                user_id=order.user_id,
+                game_type=order.game_type,
+                theme_id=order.theme_id,
+                config=decode_order_config(order.config_json),
+                status=order.status,
+                amount=order.amount,
+                discount_applied=order.discount_applied,
+                created_at=order.created_at,
+            )
 
     @staticmethod
     async def log_action(user_id: int, action: str, details: str = "") -> None:
@@ -361,10 +517,12 @@ class DB:
             }
 
     @staticmethod
-    async def get_asset(key: str) -> str | None:
+    async def get_assets(keys: Collection[str]) -> dict[str, str]:
+        if not keys:
+            return {}
         async with SessionLocal() as session:
-            entry = await session.scalar(select(AssetCache).where(AssetCache.key == key))
-            return entry.file_id if entry else None
+            rows = await session.execute(select(AssetCache.key, AssetCache.file_id).where(AssetCache.key.in_(list(keys))))
+            return {key: file_id for key, file_id in rows.all()}
 
     @staticmethod
     async def set_asset(key: str, file_id: str) -> None:
@@ -377,6 +535,179 @@ class DB:
                 entry.updated_at = _now()
             await session.commit()
 
+    @staticmethod
+    async def enqueue_outbox(items: Sequence[OutboxItem]) -> None:
+        async with SessionLocal() as session:
+            await _add_outbox(session, items)
+            await session.commit()
+
+    @staticmethod
+    async def has_pending_outbox(dedupe_key: str) -> bool:
+        async with SessionLocal() as session:
+            row = await session.scalar(
+                select(OutboxMessage.id).where(OutboxMessage.dedupe_key == dedupe_key, OutboxMessage.status == "pending")
+            )
+            return row is not None
+
+    @staticmethod
+    async def due_outbox(
+        now: float,
+        limit: int,
+        exclude: Collection[int] = (),
+        kinds: Collection[str] | None = None,
+        skip_kinds: Collection[str] = (),
+    ) -> list[OutboxEntry]:
+        async with SessionLocal() as session:
+            query = select(OutboxMessage).where(OutboxMessage.status == "pending", OutboxMessage.next_attempt_at <= now)
+            if exclude:
+                query = query.where(OutboxMessage.id.not_in(list(exclude)))
+            if kinds is not None:
+                query = query.where(OutboxMessage.kind.in_(list(kinds)))
+            if skip_kinds:
+                query = query.where(OutboxMessage.kind.not_in(list(skip_kinds)))
+            rows = await session.scalars(query.order_by(OutboxMessage.next_attempt_at, OutboxMessage.id).limit(limit))
+            return [OutboxEntry(id=row.id, kind=row.kind, payload=json.loads(row.payload_json), attempts=row.attempts) for row in rows]
+
+    @staticmethod
+    async def complete_outbox(entry_id: int) -> None:
+        await DB._update_outbox(entry_id, status="done")
+
+    @staticmethod
+    async def retry_outbox(entry_id: int, attempts: int, next_attempt_at: float, error: str) -> None:
+        await DB._update_outbox(entry_id, attempts=attempts, next_attempt_at=next_attempt_at, last_error=error[:1000])
+
+    @staticmethod
+    async def dead_letter_outbox(entry_id: int, attempts: int, error: str) -> None:
+        await DB._update_outbox(entry_id, status="dead", attempts=attempts, last_error=error[:1000])
+
+    @staticmethod
+    async def requeue_outbox(entry_id: int) -> bool:
+        """Give a dead-lettered entry a fresh set of attempts; False if there is no such entry."""
+        async with SessionLocal() as session:
+            row = await session.scalar(select(OutboxMessage).where(OutboxMessage.id == entry_id, OutboxMessage.status == "dead"))
+            if row is None:
+                return False
+            row.status = "pending"
+            row.attempts = 0
+            row.next_attempt_at = time.time()
+            await session.commit()
+            return True
+
+    @staticmethod
+    async def outbox_summary(dead_limit: int = 10) -> dict[str, Any]:
+        async with SessionLocal() as session:
+            counts = dict((await session.execute(select(OutboxMessage.status, func.count()).group_by(OutboxMessage.status))).all())
+            dead = await session.scalars(
+                select(OutboxMessage).where(OutboxMessage.status == "dead").order_by(OutboxMessage.id.desc()).limit(dead_limit)
+            )
+            return {
+                "counts": {str(status): int(count) for status, count in counts.items()},
+                "dead": [{"id": row.id, "kind": row.kind, "attempts": row.attempts, "error": row.last_error} for row in dead],
+            }
+
+    @staticmethod
+    async def claim_broadcast() -> BroadcastJob | None:
+        """The broadcast to send next: one interrupted by a restart first, then the oldest queued."""
+        async with SessionLocal() as session:
+            row = await session.scalar(
+                select(Broadcast)
+                .where(Broadcast.status.in_(("running", "queued")))
+                .order_by((Broadcast.status == "running").desc(), Broadcast.created_at)
+                .limit(1)
+            )
+            if row is None:
+                return None
+            row.status = "running"
+            row.started_at = row.started_at or _now()
+            row.updated_at = _now()
+            await session.commit()
+            return BroadcastJob(id=row.id, text=row.text, photo=row.photo or None, photo_file_id=row.photo_file_id)
+
+    @staticmethod
+    async def next_broadcast_recipients(broadcast_id: str, limit: int) -> list[int]:
+        """Pending recipients in enqueue order; ones that blocked the bot since are marked and skipped."""
+        async with SessionLocal() as session:
+            while True:
+                user_ids = list(
+                    await session.scalars(
+                        select(BroadcastRecipient.user_id)
+                        .where(BroadcastRecipient.broadcast_id == broadcast_id, BroadcastRecipient.status == "pending")
+                        .order_by(text("rowid"))
+                        .limit(limit)
+                    )
+                )
+                blocked = set(await session.scalars(select(BlockedUser.user_id).where(BlockedUser.user_id.in_(user_ids))))
+                if not blocked:
+                    return user_ids
+                await DB._save_broadcast_results(session, broadcast_id, [RecipientResult(user_id, "blocked") for user_id in blocked])
+                await session.commit()
+
+    @staticmethod
+    async def set_broadcast_file_id(broadcast_id: str, file_id: str) -> None:
+        async with SessionLocal() as session:
+            await session.execute(update(Broadcast).where(Broadcast.id == broadcast_id).values(photo_file_id=file_id, updated_at=_now()))
+            await session.commit()
+
+    @staticmethod
+    async def record_broadcast_results(broadcast_id: str, results: Sequence[RecipientResult]) -> None:
+        async with SessionLocal() as session:
+            await DB._save_broadcast_results(session, broadcast_id, results)
+            await session.commit()
+
+    @staticmethod
+    async def _save_broadcast_results(session: AsyncSession, broadcast_id: str, results: Sequence[RecipientResult]) -> None:
+        if not results:
+            return
+        await session.execute(
+            update(BroadcastRecipient),
+            [{"broadcast_id": broadcast_id, "user_id": item.user_id, "status": item.status, "error": item.error[:500]} for item in results],
+        )
+        counts = {status: sum(1 for item in results if item.status == status) for status in ("sent", "failed", "blocked")}
+        await session.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id)
+            .values(
+                sent=Broadcast.sent + counts["sent"],
+                failed=Broadcast.failed + counts["failed"],
+                blocked=Broadcast.blocked + counts["blocked"],
+                updated_at=_now(),
+            )
+        )
+        blocked = [{"user_id": item.user_id, "blocked_at": _now()} for item in results if item.status == "blocked"]
+        if blocked:
+            await session.execute(sqlite_insert(BlockedUser).on_conflict_do_nothing(), blocked)
+
+    @staticmethod
+    async def finish_broadcast(broadcast_id: str, status: str, error: str = "") -> None:
+        async with SessionLocal() as session:
+            await session.execute(
+                update(Broadcast).where(Broadcast.id == broadcast_id).values(status=status, error=error[:1000], finished_at=_now(), updated_at=_now())
+            )
+            await session.commit()
+
+    @staticmethod
+    async def is_user_blocked(user_id: int) -> bool:
+        async with SessionLocal() as session:
+            row = await session.scalar(select(BlockedUser.user_id).where(BlockedUser.user_id == user_id))
+            return row is not None
+
+    @staticmethod
+    async def unblock_user(user_id: int) -> None:
+        """The user talks to the bot again, so later broadcasts reach them."""
+        async with SessionLocal() as session:
+            await session.execute(delete(BlockedUser).where(BlockedUser.user_id == user_id))
+            await session.commit()
+
+    @staticmethod
+    async def _update_outbox(entry_id: int, **changes: Any) -> None:
+        async with SessionLocal() as session:
+            row = await session.scalar(select(OutboxMessage).where(OutboxMessage.id == entry_id))
+            if row is None:
+                return
+            for name, value in changes.items():
+                setattr(row, name, value)
+            await session.commit()
+
     @staticmethod
     async def get_category_discount(category: str) -> int:
         async with SessionLocal() as session:
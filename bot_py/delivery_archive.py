@@ -0,0 +1,102 @@
+"""ZIP variants of delivered playables.
+
+A playable is one HTML file full of base64, which deflates to a fraction of its size, so
+sending it zipped cuts upload time per delivery. The archive for ``<name>.html`` lives
+next to it as ``<name>.zip`` and is reused while it is newer than the HTML: library
+artifacts get theirs from the library prebuild, everything else on first delivery.
+Bulk orders bundle all their variants into one archive the same way. Compression runs
+in worker processes so it never holds up the event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import zipfile
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+ARCHIVE_SUFFIX = ".zip"
+ZIP_COMPRESSION_LEVEL = 9
+
+
+def archive_path_for(html_path: Path) -> Path:
+    return html_path.with_suffix(ARCHIVE_SUFFIX)
+
+
+def is_fresh(html_path: Path, archive_path: Path) -> bool:
+    try:
+        return archive_path.stat().st_mtime_ns >= html_path.stat().st_mtime_ns
+    except OSError:
+        return False
+
+
+def write_archive(html_path: Path, archive_path: Path) -> int:
+    """Zip ``html_path`` into ``archive_path`` atomically and return the archive size."""
+    return write_bundle([(html_path, html_path.name)], archive_path)
+
+
+def write_bundle(members: Sequence[tuple[Path, str]], archive_path: Path) -> int:
+    """Zip ``(file, name in archive)`` pairs into ``archive_path`` atomically; returns its size."""
+    archive_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = archive_path.with_name(f".{archive_path.name}.{os.getpid()}.tmp")
+    try:
+        with zipfile.ZipFile(temp_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=ZIP_COMPRESSION_LEVEL) as archive:
+            for path, name in members:
+                archive.write(path, name)
+        os.replace(temp_path, archive_path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+    return archive_path.stat().st_size
+
+
+class ArchivePool:
+    """Produces archives in a lazily started process pool; one job per archive at a time."""
+
+    def __init__(self, workers: int = 1) -> None:
+        self._workers = max(1, workers)
+        self._executor: ProcessPoolExecutor | None = None
+        self._inflight: dict[Path, asyncio.Future[Path]] = {}
+
+    async def archive_for(self, html_path: Path) -> Path:
+        archive_path = archive_path_for(html_path)
+        if archive_path not in self._inflight and await asyncio.to_thread(is_fresh, html_path, archive_path):
+            return archive_path
+        # Checked after the freshness probe: another caller may have started the job meanwhile.
+        inflight = self._inflight.get(archive_path)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        return await self._write(archive_path, [(html_path, html_path.name)])
+
+    async def bundle(self, members: Sequence[tuple[Path, str]], archive_path: Path) -> Path:
+        """Zip several files into ``archive_path``, replacing whatever is there."""
+        inflight = self._inflight.get(archive_path)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        return await self._write(archive_path, members)
+
+    async def _write(self, archive_path: Path, members: Sequence[tuple[Path, str]]) -> Path:
+        future: asyncio.Future[Path] = asyncio.get_running_loop().create_future()
+        self._inflight[archive_path] = future
+        try:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self._workers)
+            await asyncio.get_running_loop().run_in_executor(self._executor, write_bundle, list(members), archive_path)
+            future.set_result(archive_path)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Nobody may be waiting on it; mark retrieved so asyncio does not warn.
+            future.exception()
+            raise
+        finally:
+            del self._inflight[archive_path]
+        return archive_path
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,124 @@
+"""Background delivery of paid playables.
+
+Handlers hand a delivery to :class:`DeliveryQueue` and return at once. A fixed number of
+workers build and send the files once each job's delay has passed (a timer, not a
+sleeping coroutine), so the coroutines held by deliveries stay bounded however many
+orders are paid at the same time. Every job keeps a status users can query with
+``/status``, and a repeated request for an order that is still being delivered joins
+the pending job instead of delivering it twice.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Literal
+
+DELIVERY_STATUS_TTL_SECONDS = 3600.0
+
+DeliveryState = Literal["scheduled", "queued", "running", "done", "failed"]
+ACTIVE_DELIVERY_STATES: frozenset[DeliveryState] = frozenset({"scheduled", "queued", "running"})
+
+
+class DeliveryError(RuntimeError):
+    """A delivery failed and the user has been told; the message becomes the job's status."""
+
+
+@dataclass(slots=True)
+class DeliveryJob:
+    order_id: str
+    user_id: int
+    run: Callable[[DeliveryJob], Awaitable[None]] = field(repr=False)
+    state: DeliveryState = "scheduled"
+    # Latest progress line while running, the failure reason once failed.
+    detail: str = ""
+    created_at: float = field(default_factory=time.monotonic)
+    finished_at: float | None = None
+    finished: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def active(self) -> bool:
+        return self.state in ACTIVE_DELIVERY_STATES
+
+
+class DeliveryQueue:
+    """Runs delivery jobs on ``workers`` coroutines, started with the first submit."""
+
+    def __init__(self, workers: int = 2, *, status_ttl_seconds: float = DELIVERY_STATUS_TTL_SECONDS) -> None:
+        self._workers = max(1, workers)
+        self._status_ttl_seconds = status_ttl_seconds
+        self._queue: asyncio.Queue[DeliveryJob] = asyncio.Queue()
+        self._jobs: dict[str, DeliveryJob] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        self._tasks: list[asyncio.Task[None]] = []
+
+    @property
+    def pending(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.active)
+
+    def submit(self, order_id: str, user_id: int, run: Callable[[DeliveryJob], Awaitable[None]], *, delay: float = 0.0) -> DeliveryJob:
+        """Schedule ``run`` for ``order_id`` after ``delay`` seconds, or return the job already doing so."""
+        self._prune()
+        existing = self._jobs.get(order_id)
+        if existing is not None and existing.active:
+            return existing
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self._workers)]
+        job = DeliveryJob(order_id=order_id, user_id=user_id, run=run)
+        self._jobs[order_id] = job
+        if delay > 0:
+            self._timers[order_id] = asyncio.get_running_loop().call_later(delay, self._enqueue, job)
+        else:
+            self._enqueue(job)
+        return job
+
+    def status(self, order_id: str) -> DeliveryJob | None:
+        return self._jobs.get(order_id)
+
+    def jobs_for_user(self, user_id: int) -> list[DeliveryJob]:
+        """The user's jobs still remembered, newest first."""
+        self._prune()
+        return sorted((job for job in self._jobs.values() if job.user_id == user_id), key=lambda job: job.created_at, reverse=True)
+
+    def _enqueue(self, job: DeliveryJob) -> None:
+        self._timers.pop(job.order_id, None)
+        job.state = "queued"
+        self._queue.put_nowait(job)
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - self._status_ttl_seconds
+        for order_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[order_id]
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._queue.get()
+            job.state = "running"
+            try:
+                await job.run(job)
+                job.state = "done"
+                job.detail = ""
+            except DeliveryError as exc:
+                job.state = "failed"
+                job.detail = str(exc)
+            except Exception:
+                logging.exception("[Delivery] Order %s: delivery failed", job.order_id)
+                job.state = "failed"
+                job.detail = "Внутренняя ошибка."
+            finally:
+                job.finished_at = time.monotonic()
+                job.finished.set()
+                self._queue.task_done()
+
+    async def close(self) -> None:
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
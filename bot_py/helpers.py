@@ -1,18 +1,17 @@
 ﻿from __future__ import annotations
 
 import asyncio
+import re
 from pathlib import Path
 from typing import Any
+from urllib.parse import urlparse
 
 from .constants import PaymentType
 
 DEFAULT_STARTING_BALANCE = 1000
 DEFAULT_CURRENCY = "$"
 MAX_CURRENCY_LENGTH = 5
-
-
-def create_initial_session() -> dict[str, Any]:
-    return {"config": {}}
+MAX_CTA_URL_LENGTH = 500
 
 
 def sanitize_currency_input(input_value: str, max_len: int = MAX_CURRENCY_LENGTH) -> str:
@@ -32,6 +31,33 @@ def parse_balance_input(input_value: str, fallback: int = DEFAULT_STARTING_BALAN
     return numeric
 
 
+def parse_starting_balance(input_value: str) -> int | None:
+    normalized = re.sub(r"[^\d]", "", input_value.strip())
+    if not normalized:
+        return None
+    try:
+        value = int(normalized)
+    except ValueError:
+        return None
+    if value < 0 or value > 1_000_000_000:
+        return None
+    return value
+
+
+def normalize_cta_url(input_value: str) -> str | None:
+    trimmed = input_value.strip()
+    if not trimmed or len(trimmed) > MAX_CTA_URL_LENGTH:
+        return None
+
+    with_protocol = trimmed if re.match(r"^[a-zA-Z][a-zA-Z\d+\-.]*:", trimmed) else f"https://{trimmed}"
+    parsed = urlparse(with_protocol)
+    if parsed.scheme not in {"http", "https"}:
+        return None
+    if not parsed.netloc:
+        return None
+    return with_protocol
+
+
 def get_discount(count: int) -> int:
     if count >= 10:
         return 20
@@ -1,19 +1,22 @@
 ﻿from __future__ import annotations
 
 import asyncio
+import contextlib
 import logging
 import re
-from dataclasses import dataclass
+import signal
+from collections.abc import Awaitable, Callable
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, replace
 from datetime import UTC, datetime
 from html import escape
 from pathlib import Path
 from typing import Any
-from urllib.parse import urlparse
 
 from aiogram import BaseMiddleware, Bot, Dispatcher, F, Router
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.exceptions import TelegramBadRequest
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
 from aiogram.filters import Command, CommandStart
 from aiogram.filters.command import CommandObject
 from aiogram.types import (
@@ -26,28 +29,82 @@ from aiogram.types import (
     ReplyKeyboardMarkup,
 )
 
-from .builder_bridge import cleanup_temp, generate_playable
+from .artifact_cache import ArtifactCache, source_fingerprint
+from .asset_optimizer import OPTIMIZED_TEMPLATES_SUBDIR
+from .asset_registry import AssetRegistry, PhotoAsset, document_key
+from .broadcast import BroadcastEngine
+from .builder_bridge import DIST_BUILDER, BuilderPool, BuildPriority, BuildProgress, BuildQueueFullError, BuildScheduler, ProgressListener
+from .bulk_orders import BULK_CSV_MAX_BYTES, BULK_ORDER_MAX_VARIANTS, order_units, parse_bulk_rows, variant_config
+from .callback_tokens import (
+    STEP_BALANCE,
+    STEP_BULK,
+    STEP_CUSTOM_BALANCE,
+    STEP_CUSTOM_GEO,
+    STEP_GEO,
+    WIZARD_TOKEN_PREFIX,
+    WizardToken,
+    WizardTokenCodec,
+)
 from .config import CONFIG
 from .constants import ASSETS, CATEGORIES, GAMES, GEOS, Callback, PaymentType
 from .crypto_pay import CreateInvoiceParams, create_crypto_pay_invoice, get_crypto_pay_invoice, is_crypto_pay_enabled
 from .db import DB, DBError
+from .delivery_archive import ARCHIVE_SUFFIX, ArchivePool
+from .delivery_queue import DeliveryError, DeliveryJob, DeliveryQueue
 from .helpers import (
     build_order_summary,
     build_profile_message,
     calc_price,
     get_discount,
-    async_exists,
     get_library_path,
+    normalize_cta_url,
     parse_pay_callback,
+    parse_starting_balance,
 )
+from .models import CryptoPayment, ManualPayment, OrderConfig, OrderRecord, OrderVariant, PendingManualPayment, Session, WizardState
+from .outbox import OutboxDispatcher, OutboxEntry, OutboxHandler, OutboxItem, OutboxRejected
+from .rate_limiter import GLOBAL_MESSAGES_PER_SECOND, OutboundLimiter, bulk_sends
+from .runtime_config import SCRIPT_TEMPLATE_PATH, build_output_filename, inject_runtime_config, to_runtime_config
 from .session_store import FileSessionStore
+from .webhook import WebhookServer, derive_webhook_secret
 
 SESSIONS_DIR = Path.cwd() / "sessions"
 BOT_ASSETS_DIR = Path.cwd() / "assets"
+PREVIEWS_DIR = Path.cwd() / "previews"
+TEMPLATES_DIR = Path.cwd() / "templates"
+OPTIMIZED_TEMPLATES_DIR = Path.cwd() / OPTIMIZED_TEMPLATES_SUBDIR
 ORDER_WIZARD_TIMEOUT_MS = 2 * 60 * 1000
+# Bulk rows are usually put together in a spreadsheet first.
+BULK_WIZARD_TIMEOUT_MS = 15 * 60 * 1000
 FINAL_DELIVERY_DELAY_SECONDS = 30
+# Speculative final builds are given up with the Crypto Pay invoice they were started for.
+SPECULATIVE_BUILD_TTL_SECONDS = 3600
+# Telegram rate-limits edits per chat; build progress is coalesced to one edit per window.
+BUILD_PROGRESS_EDIT_INTERVAL_SECONDS = 3.0
+BUILD_STAGE_LABELS = {
+    "copy_template": "Копирую шаблон",
+    "link_deps": "Подключаю зависимости",
+    "vite_build": "Собираю проект",
+    "inline_assets": "Встраиваю ассеты",
+    "inject_config": "Применяю настройки заказа",
+    "done": "Файл собран, отправляю",
+}
+DELIVERY_STATE_LABELS = {
+    "scheduled": "⏳ ожидает отправки в сборку",
+    "queued": "🕒 ждёт свободного сборщика",
+    "running": "⚙️ собирается и отправляется",
+    "done": "✅ файл отправлен",
+    "failed": "❌ не доставлен",
+}
+DELIVERY_STATUS_HINT = "Статус заказа: /status"
+OUTBOX_DELIVERY = "delivery"
+OUTBOX_ADMIN_MESSAGE = "admin_message"
+OUTBOX_ADMIN_FORWARD = "admin_forward"
+# A delivery entry is held until its job finishes, build included; the delivery queue, not
+# this lane, bounds how many of them run, and admin messages keep the shared slots.
+OUTBOX_DELIVERY_CONCURRENCY = 64
 MAX_CUSTOM_GEO_DESCRIPTION = 400
-MAX_CTA_URL_LENGTH = 500
+STARTING_BALANCE_PRESETS = (1000, 5000, 10000)
 ORDER_STATUS_CANCELLED = "cancelled"
 CANCELLED_ORDER_TEXT = "Оплата по этому заказу отменена. Заказ закрыт. Создайте новый заказ."
 
@@ -61,6 +118,7 @@ class OrderableGame:
     category: str
     buy_callback: str
     description: str
+    template_dir: str
 
 
 ORDERABLE_GAMES: list[OrderableGame] = [
@@ -71,6 +129,7 @@ ORDERABLE_GAMES: list[OrderableGame] = [
         title="Chicken Railroad",
         category=CATEGORIES["CHICKEN"],
         buy_callback="buy_check_railroad",
+        template_dir=GAMES["RAILROAD"]["TEMPLATE_DIR"],
         description="Готовый однофайловый шаблон с железнодорожным игровым циклом.",
     ),
     OrderableGame(
@@ -80,6 +139,7 @@ ORDERABLE_GAMES: list[OrderableGame] = [
         title="Gates of Olympus",
         category=CATEGORIES["SLOTS"],
         buy_callback="buy_check_olympus",
+        template_dir=GAMES["OLYMPUS"]["TEMPLATE_DIR"],
         description="Слот-шаблон с анимированным Zeus и сильным финальным экраном.",
     ),
     OrderableGame(
@@ -89,6 +149,7 @@ ORDERABLE_GAMES: list[OrderableGame] = [
         title="Money Matching",
         category=CATEGORIES["MATCHING"],
         buy_callback="buy_check_matching",
+        template_dir=GAMES["DRAG"]["TEMPLATE_DIR"],
         description="Шаблон drag-and-drop matching с чистым CTA-флоу.",
     ),
     OrderableGame(
@@ -98,6 +159,7 @@ ORDERABLE_GAMES: list[OrderableGame] = [
         title="3 v Ryad",
         category=CATEGORIES["MATCHING"],
         buy_callback="buy_check_match3",
+        template_dir=GAMES["MATCH3"]["TEMPLATE_DIR"],
         description="Быстрый шаблон match-3, оптимизированный под однофайловую выдачу.",
     ),
 ]
@@ -105,6 +167,7 @@ ORDERABLE_GAMES: list[OrderableGame] = [
 ORDERABLE_BY_BUY_CALLBACK = {game.buy_callback: game for game in ORDERABLE_GAMES}
 ORDERABLE_BY_GAME_KEY = {game.key: game for game in ORDERABLE_GAMES}
 ORDERABLE_BY_GAME_ID = {game.id: game for game in ORDERABLE_GAMES}
+GEOS_BY_ID = {geo["id"]: geo for geo in GEOS}
 
 GAME_PREVIEW_PHOTOS: dict[str, list[Path]] = {
     GAMES["RAILROAD"]["GAME_KEY"]: [
@@ -126,6 +189,17 @@ GAME_PREVIEW_PHOTOS: dict[str, list[Path]] = {
     ],
 }
 
+
+def product_preview_key(game_key: str) -> str:
+    return f"product_preview_v2_{game_key}"
+
+
+PHOTO_ASSETS = [
+    PhotoAsset(ASSETS["WELCOME"], (BOT_ASSETS_DIR / "welcomer.png",)),
+    PhotoAsset(ASSETS["PROFILE"], (BOT_ASSETS_DIR / "profile.png",)),
+    *(PhotoAsset(product_preview_key(game_key), tuple(paths)) for game_key, paths in GAME_PREVIEW_PHOTOS.items()),
+]
+
 GAME_CHANNEL_POSTS: dict[str, str] = {
     GAMES["RAILROAD"]["GAME_KEY"]: "https://t.me/rwbrr/290",
     GAMES["DRAG"]["GAME_KEY"]: "https://t.me/rwbrr/281",
@@ -135,7 +209,37 @@ GAME_CHANNEL_POSTS: dict[str, str] = {
 }
 
 router = Router()
-session_store = FileSessionStore(SESSIONS_DIR)
+session_store = FileSessionStore(
+    SESSIONS_DIR,
+    ttl_seconds=CONFIG.session_ttl_seconds,
+    pending_payment_ttl_seconds=CONFIG.session_pending_payment_ttl_seconds,
+    wizard_timeout_ms=ORDER_WIZARD_TIMEOUT_MS,
+)
+builder_pool = BuilderPool(
+    CONFIG.builder_pool_size,
+    max_jobs_per_worker=CONFIG.builder_worker_max_jobs,
+    max_rss_bytes=CONFIG.builder_worker_max_rss_mb * 1024 * 1024,
+    deadline_seconds=CONFIG.build_deadline_seconds,
+)
+build_scheduler = BuildScheduler(builder_pool, max_queued=CONFIG.build_queue_max)
+artifact_cache = ArtifactCache(PREVIEWS_DIR / "_cache", budget_bytes=CONFIG.artifact_cache_budget_mb * 1024 * 1024)
+archive_pool = ArchivePool(CONFIG.archive_workers)
+delivery_queue = DeliveryQueue(CONFIG.delivery_workers)
+# Loaded in start(); renders read file_ids and image paths from memory only.
+asset_registry = AssetRegistry(DB, PHOTO_ASSETS)
+# Runs of deliveries whose outbox entry is pending, left by the handler that can report progress;
+# an entry resumed after a restart has none and is delivered without (see resumed_delivery_run).
+live_delivery_runs: dict[str, Callable[[DeliveryJob], Awaitable[None]]] = {}
+# Button steps of the order wizard travel in signed callback_data instead of the session file.
+wizard_tokens = WizardTokenCodec(
+    CONFIG.callback_token_secret or CONFIG.bot_token,
+    [game.key for game in ORDERABLE_GAMES],
+    [geo["id"] for geo in GEOS],
+    max_age_seconds=ORDER_WIZARD_TIMEOUT_MS // 1000,
+)
+background_tasks: set[asyncio.Task[Any]] = set()
+# Final builds started while the user is still paying, by order id.
+speculative_builds: dict[str, asyncio.Task[None]] = {}
 bot_username_cache: str | None = None
 SUPPORTED_LANGUAGES = {"ru", "en"}
 PENDING_LANGUAGE_SELECTION: set[int] = set()
@@ -191,6 +295,21 @@ TEXTS: dict[str, dict[str, str]] = {
 
 EN_TEXT_REPLACEMENTS: dict[str, str] = {
     "Ваш доступ к боту ограничен.": "Your access to the bot is restricted.",
+    "📦 Пакет вариантов (CSV)": "📦 Bulk variants (CSV)",
+    "📦 <b>Пакетный заказ</b>": "📦 <b>Bulk order</b>",
+    "Отправьте варианты, по одному на строку: <code>GEO, CTA-ссылка, баланс</code> (баланс можно не указывать), текстом или CSV-файлом.": (
+        "Send the variants one per line: <code>GEO, CTA link, balance</code> (balance is optional), as text or a CSV file."
+    ),
+    " вариантов.": " variants.",
+    "Не больше ": "At most ",
+    "Пример:": "Example:",
+    "Отправьте варианты текстом или CSV-файлом.": "Send the variants as text or a CSV file.",
+    "Файл слишком большой, нужен CSV до ": "The file is too large, the CSV limit is ",
+    "Исправьте строки и отправьте список заново:": "Fix these rows and send the list again:",
+    "Список вариантов не принят. Начните заказ заново из главного меню.": "The variant list was not accepted. Start the order again from main menu.",
+    "Пакетный заказ: ": "Bulk order: ",
+    "Всё придёт одним архивом.": "Everything arrives in one archive.",
+    "Проверьте варианты и выберите формат покупки:": "Check the variants and choose your payment option:",
     "Цена: ": "Price: ",
     "Оплатить в Crypto Bot": "Pay securely via Crypto Bot",
     "Проверить оплату": "Verify payment",
@@ -227,6 +346,26 @@ EN_TEXT_REPLACEMENTS: dict[str, str] = {
     "Проверьте демо и выберите формат покупки:": "Review the demo and choose your payment option:",
     "Оплатить напрямую (BTC/USDT)": "Pay directly (BTC/USDT wallet)",
     "Ошибка сборки.": "Build error.",
+    "Заказ в очереди на сборку: место ": "Your order is in the build queue: position ",
+    ", осталось примерно ": ", about ",
+    " мин.": " min left.",
+    "Очередь сборки переполнена. Попробуйте через несколько минут.": "The build queue is full. Please try again in a few minutes.",
+    "Очередь сборки переполнена.": "The build queue is full.",
+    "Внутренняя ошибка.": "Internal error.",
+    "Статус заказа: /status": "Order status: /status",
+    "Статус доставки:": "Delivery status:",
+    "Сейчас нет заказов в доставке.": "No orders are being delivered right now.",
+    "ожидает отправки в сборку": "waiting to be built",
+    "ждёт свободного сборщика": "waiting for a free builder",
+    "собирается и отправляется": "being built and sent",
+    "файл отправлен": "file sent",
+    "не доставлен": "not delivered",
+    "Копирую шаблон": "Copying template",
+    "Подключаю зависимости": "Linking dependencies",
+    "Собираю проект": "Building project",
+    "Встраиваю ассеты": "Inlining assets",
+    "Применяю настройки заказа": "Applying order settings",
+    "Файл собран, отправляю": "File built, sending",
     "Ваш файл без водяного знака готов! 🚀": "Your file without watermark is ready! 🚀",
     "Ваш файл готов.": "Your file is ready.",
     "Некорректная ссылка оплаты.": "Invalid payment link.",
@@ -274,6 +413,12 @@ EN_TEXT_REPLACEMENTS: dict[str, str] = {
     "Теперь отправьте CTA-ссылку.": "Now send your CTA URL.",
     "Введите корректное число для стартового баланса, например <code>1000</code>.": "Enter a valid starting balance number, e.g. <code>1000</code>.",
     "Пропустить (по умолчанию)": "Skip (default)",
+    "Выберите стартовый баланс плеебла или введите своё значение:": "Choose the playable starting balance or enter your own:",
+    "Введите стартовый баланс плеебла (только число):": "Enter the playable starting balance (numbers only):",
+    "✅ Стартовый баланс установлен:": "✅ Starting balance set:",
+    "✏️ Своё значение": "✏️ Custom value",
+    "(по умолчанию)": "(default)",
+    "Некорректный выбор. Начните заказ заново.": "Invalid choice. Start the order again.",
     "Оплата по этому заказу отменена. Заказ закрыт. Создайте новый заказ.": "This payment was canceled. The order is closed, please create a new one.",
     "Ваш баланс пополнен на <b>$": "Your balance has been topped up by <b>$",
 }
@@ -492,12 +637,25 @@ async def edit_or_reply(callback: CallbackQuery, text: str, keyboard: InlineKeyb
     await _reply_from_callback(callback, localized_text, localized_keyboard)
 
 
-async def find_existing_preview_path(game_key: str) -> Path | None:
-    candidates = GAME_PREVIEW_PHOTOS.get(game_key, [])
-    for candidate in candidates:
-        if await async_exists(candidate):
-            return candidate
-    return None
+async def send_asset_photo(
+    target: Message | None,
+    bot: Bot,
+    chat_id: int,
+    key: str,
+    caption: str,
+    reply_markup: InlineKeyboardMarkup,
+) -> bool:
+    """Send the registered image ``key`` as a photo; False if there is none to send."""
+    photo = asset_registry.photo(key)
+    if photo is None:
+        return False
+    if target is not None:
+        sent = await target.answer_photo(photo, caption=caption, reply_markup=reply_markup)
+    else:
+        sent = await bot.send_photo(chat_id, photo, caption=caption, reply_markup=reply_markup)
+    if isinstance(photo, FSInputFile) and sent.photo:
+        await asset_registry.remember(key, sent.photo[-1].file_id)
+    return True
 
 
 def get_default_balance_for_game(game_key: str | None) -> int:
@@ -506,19 +664,6 @@ def get_default_balance_for_game(game_key: str | None) -> int:
     return 1000
 
 
-def parse_starting_balance(input_value: str) -> int | None:
-    normalized = re.sub(r"[^\d]", "", input_value.strip())
-    if not normalized:
-        return None
-    try:
-        value = int(normalized)
-    except ValueError:
-        return None
-    if value < 0 or value > 1_000_000_000:
-        return None
-    return value
-
-
 def get_theme_for_game(game_key: str | None) -> str:
     for game in ORDERABLE_GAMES:
         if game.key == game_key:
@@ -544,20 +689,6 @@ def format_price_caption(base_price: int, discount: int) -> str:
     return f"Цена: <s>${base_price}</s> <b>${discounted}</b> (-{normalized}%)"
 
 
-def normalize_cta_url(input_value: str) -> str | None:
-    trimmed = input_value.strip()
-    if not trimmed or len(trimmed) > MAX_CTA_URL_LENGTH:
-        return None
-
-    with_protocol = trimmed if re.match(r"^[a-zA-Z][a-zA-Z\d+\-.]*:", trimmed) else f"https://{trimmed}"
-    parsed = urlparse(with_protocol)
-    if parsed.scheme not in {"http", "https"}:
-        return None
-    if not parsed.netloc:
-        return None
-    return with_protocol
-
-
 def can_use_library_artifact(click_url: str | None) -> bool:
     return normalize_cta_url(click_url or "") is None
 
@@ -573,6 +704,21 @@ def build_crypto_invoice_keyboard(order_id: str, pay_url: str) -> InlineKeyboard
     )
 
 
+def build_order_payment_keyboard(order_id: str, single_price: int, sub_price: int, demo_url: str | None) -> InlineKeyboardMarkup:
+    rows: list[list[InlineKeyboardButton]] = []
+    if demo_url:
+        rows.append([InlineKeyboardButton(text="👀 Смотреть демо в канале", url=demo_url)])
+    rows.extend(
+        [
+            [InlineKeyboardButton(text=f"💳 Купить разово ($ {single_price})", callback_data=f"{Callback.PAY_PREFIX}{PaymentType.SINGLE}_{order_id}")],
+            [InlineKeyboardButton(text=f"⭐ Подписка ($ {sub_price})", callback_data=f"{Callback.PAY_PREFIX}{PaymentType.SUB}_{order_id}")],
+            [InlineKeyboardButton(text="Оплатить напрямую (BTC/USDT)", callback_data=f"{Callback.MANUAL_PAY_MENU_PREFIX}{order_id}")],
+            [InlineKeyboardButton(text="🏠 Главное меню", callback_data=Callback.MAIN_MENU)],
+        ]
+    )
+    return _inline_keyboard(rows)
+
+
 def build_cancel_payment_keyboard(order_id: str) -> InlineKeyboardMarkup:
     return _inline_keyboard(
         [
@@ -591,59 +737,67 @@ def build_cancelled_order_keyboard() -> InlineKeyboardMarkup:
     )
 
 
-def build_geo_keyboard() -> InlineKeyboardMarkup:
+def build_geo_keyboard(user_id: int, game_key: str) -> InlineKeyboardMarkup:
     rows: list[list[InlineKeyboardButton]] = []
     current_row: list[InlineKeyboardButton] = []
     for geo in GEOS:
-        current_row.append(InlineKeyboardButton(text=geo["name"], callback_data=f"{Callback.GEO_PREFIX}{geo['id']}"))
+        token = wizard_tokens.encode(user_id, WizardToken(step=STEP_GEO, game=game_key, geo=geo["id"]))
+        current_row.append(InlineKeyboardButton(text=geo["name"], callback_data=token))
         if len(current_row) == 2:
             rows.append(current_row)
             current_row = []
     if current_row:
         rows.append(current_row)
-    rows.append([InlineKeyboardButton(text="📝 Заказать своё GEO", callback_data=Callback.GEO_CUSTOM)])
+    custom_token = wizard_tokens.encode(user_id, WizardToken(step=STEP_CUSTOM_GEO, game=game_key))
+    bulk_token = wizard_tokens.encode(user_id, WizardToken(step=STEP_BULK, game=game_key))
+    rows.append([InlineKeyboardButton(text="📦 Пакет вариантов (CSV)", callback_data=bulk_token)])
+    rows.append([InlineKeyboardButton(text="📝 Заказать своё GEO", callback_data=custom_token)])
     rows.append([InlineKeyboardButton(text="Отмена", callback_data=Callback.MAIN_MENU)])
     return _inline_keyboard(rows)
 
-async def get_session(user_id: int) -> dict[str, Any]:
-    return await session_store.get(user_id)
-
-
-async def save_session(user_id: int, session: dict[str, Any]) -> None:
-    await session_store.save(user_id, session)
 
+def build_starting_balance_keyboard(user_id: int, game_key: str, geo_id: str) -> InlineKeyboardMarkup:
+    default_balance = get_default_balance_for_game(game_key)
+    presets = [default_balance, *(value for value in STARTING_BALANCE_PRESETS if value != default_balance)]
+    buttons: list[InlineKeyboardButton] = []
+    for value in presets:
+        token = wizard_tokens.encode(user_id, WizardToken(step=STEP_BALANCE, game=game_key, geo=geo_id, balance=value))
+        label = f"{value} (по умолчанию)" if value == default_balance else str(value)
+        buttons.append(InlineKeyboardButton(text=label, callback_data=token))
+    custom_token = wizard_tokens.encode(user_id, WizardToken(step=STEP_CUSTOM_BALANCE, game=game_key, geo=geo_id))
+    return _inline_keyboard(
+        [
+            buttons[:2],
+            buttons[2:],
+            [InlineKeyboardButton(text="✏️ Своё значение", callback_data=custom_token)],
+            [InlineKeyboardButton(text="Отмена", callback_data=Callback.MAIN_MENU)],
+        ]
+    )
 
-def get_session_config(session: dict[str, Any]) -> dict[str, Any]:
-    config = session.get("config")
-    if not isinstance(config, dict):
-        session["config"] = {}
-        config = session["config"]
-    return config
+async def get_session(user_id: int) -> Session:
+    return await session_store.get(user_id)
 
 
-def get_wizard(session: dict[str, Any]) -> dict[str, Any] | None:
-    wizard = session.get("wizard")
-    return wizard if isinstance(wizard, dict) else None
+async def save_session(user_id: int, session: Session) -> None:
+    await session_store.save(user_id, session)
 
 
-def set_wizard(session: dict[str, Any], stage: str, **extra: Any) -> None:
-    payload = {"stage": stage, "updatedAt": int(datetime.now().timestamp() * 1000)}
-    payload.update(extra)
-    session["wizard"] = payload
+def set_wizard(session: Session, stage: str, attempts: int = 0) -> None:
+    session.wizard = WizardState(stage=stage, updated_at=int(datetime.now().timestamp() * 1000), attempts=attempts)
 
 
-def clear_wizard(session: dict[str, Any]) -> None:
-    session.pop("wizard", None)
+def clear_wizard(session: Session) -> None:
+    session.wizard = None
 
 
-def wizard_expired(wizard: dict[str, Any]) -> bool:
-    updated_at = int(wizard.get("updatedAt", 0))
+def wizard_expired(wizard: WizardState) -> bool:
     now = int(datetime.now().timestamp() * 1000)
-    return (now - updated_at) > ORDER_WIZARD_TIMEOUT_MS
+    timeout = BULK_WIZARD_TIMEOUT_MS if wizard.stage == "bulk_rows" else ORDER_WIZARD_TIMEOUT_MS
+    return (now - wizard.updated_at) > timeout
 
 
-def is_order_cancelled(order: dict[str, Any] | None) -> bool:
-    return bool(order and order.get("status") == ORDER_STATUS_CANCELLED)
+def is_order_cancelled(order: OrderRecord | None) -> bool:
+    return bool(order and order.status == ORDER_STATUS_CANCELLED)
 
 
 async def get_effective_discount_for_game(user_id: int, game_key: str | None) -> dict[str, Any]:
@@ -660,10 +814,11 @@ async def get_effective_discount_for_game(user_id: int, game_key: str | None) ->
     }
 
 
-async def get_discounted_amount(user_id: int, payment_type: str, game_key: str | None = None) -> dict[str, int]:
+async def get_discounted_amount(user_id: int, payment_type: str, game_key: str | None = None, units: int = 1) -> dict[str, int]:
+    """Price of ``units`` playables (a bulk order's variant count) as one order."""
     pricing = await get_effective_discount_for_game(user_id, game_key)
     discount = int(pricing["discount"])
-    amount = calc_price(CONFIG.prices.sub if payment_type == PaymentType.SUB else CONFIG.prices.single, discount)
+    amount = calc_price((CONFIG.prices.sub if payment_type == PaymentType.SUB else CONFIG.prices.single) * units, discount)
     return {"amount": amount, "discount": discount}
 
 
@@ -691,8 +846,6 @@ async def show_main_menu(
     if delete_previous and message is not None:
         await _safe_delete_message(message)
 
-    welcome_path = BOT_ASSETS_DIR / "welcomer.png"
-    cached_id = await DB.get_asset(ASSETS["WELCOME"])
     caption = t(lang, "start_intro") if include_intro else ""
 
     try:
@@ -708,14 +861,7 @@ async def show_main_menu(
                 )
                 return
 
-        if cached_id:
-            await target.answer_photo(cached_id, caption=caption, reply_markup=build_main_menu_keyboard(lang))
-            return
-
-        if await async_exists(welcome_path):
-            sent = await target.answer_photo(FSInputFile(welcome_path), caption=caption, reply_markup=build_main_menu_keyboard(lang))
-            if sent.photo:
-                await DB.set_asset(ASSETS["WELCOME"], sent.photo[-1].file_id)
+        if await send_asset_photo(target, require_bot(target), user_id, ASSETS["WELCOME"], caption, build_main_menu_keyboard(lang)):
             return
 
         await target.answer(t(lang, "menu_home"), reply_markup=build_main_menu_keyboard(lang))
@@ -744,33 +890,11 @@ async def show_product_photo_card(callback: CallbackQuery, game: OrderableGame)
     keyboard = _inline_keyboard(rows)
     caption = localize_text(caption, lang)
     keyboard = localize_inline_keyboard(keyboard, lang) or keyboard
-    cache_key = f"product_preview_v2_{game.key}"
-    preview_path = await find_existing_preview_path(game.key)
-
     message = _callback_message(callback)
     await _safe_delete_message(message)
 
     try:
-        cached_id = await DB.get_asset(cache_key)
-        if cached_id:
-            if message is not None:
-                await message.answer_photo(cached_id, caption=caption, reply_markup=keyboard)
-            else:
-                await require_bot(callback).send_photo(callback.from_user.id, cached_id, caption=caption, reply_markup=keyboard)
-            return
-
-        if preview_path and await async_exists(preview_path):
-            if message is not None:
-                sent = await message.answer_photo(FSInputFile(preview_path), caption=caption, reply_markup=keyboard)
-            else:
-                sent = await require_bot(callback).send_photo(
-                    callback.from_user.id,
-                    FSInputFile(preview_path),
-                    caption=caption,
-                    reply_markup=keyboard,
-                )
-            if sent.photo:
-                await DB.set_asset(cache_key, sent.photo[-1].file_id)
+        if await send_asset_photo(message, require_bot(callback), callback.from_user.id, product_preview_key(game.key), caption, keyboard):
             return
     except Exception:
         logging.exception("Error sending photo preview for %s", game.key)
@@ -780,26 +904,36 @@ async def show_product_photo_card(callback: CallbackQuery, game: OrderableGame)
 
 async def start_order_wizard(callback: CallbackQuery, game: OrderableGame) -> None:
     user_id = callback.from_user.id
-    session = await get_session(user_id)
-    config = get_session_config(session)
-    config.update(
-        {
-            "game": game.key,
-            "themeId": game.theme,
-            "startingBalance": get_default_balance_for_game(game.key),
-        }
-    )
     await DB.log_action(user_id, "auto_select_theme", game.theme)
-    set_wizard(session, "geo")
-    await save_session(user_id, session)
     lang = await get_user_lang(user_id)
     await _reply_from_callback(
         callback,
         t(lang, "choose_geo_en") if lang == "en" else t(lang, "choose_geo"),
-        build_geo_keyboard(),
+        build_geo_keyboard(user_id, game.key),
     )
 
 
+async def begin_wizard_text_step(
+    user_id: int,
+    game: OrderableGame,
+    geo: dict[str, str] | None,
+    starting_balance: int,
+    stage: str,
+) -> None:
+    """Persist the choices carried by the wizard token once a step needs free-text input."""
+    session = await get_session(user_id)
+    config = session.config
+    config.game = game.key
+    config.theme_id = game.theme
+    config.starting_balance = starting_balance
+    if geo is not None:
+        config.language = geo["lang"]
+        config.currency = geo["currency"]
+        config.geo_id = geo["id"]
+    set_wizard(session, stage)
+    await save_session(user_id, session)
+
+
 @router.message(CommandStart())
 async def on_start(message: Message, command: CommandObject) -> None:
     if message.from_user is None:
@@ -807,6 +941,9 @@ async def on_start(message: Message, command: CommandObject) -> None:
     user = message.from_user
 
     is_new_user = await DB.upsert_user(user.id, user.username, user.first_name)
+    # A read on every /start; the delete only when a broadcast found the user had blocked the bot.
+    if await DB.is_user_blocked(user.id):
+        await DB.unblock_user(user.id)
     await DB.log_action(user.id, "start_bot")
 
     if command.args:
@@ -978,8 +1115,6 @@ async def on_game_railroad(callback: CallbackQuery) -> None:
     lang = await get_user_lang(callback.from_user.id)
     await DB.log_action(callback.from_user.id, "view_product", "railroad")
 
-    preview_cache_key = f"product_preview_v2_{GAMES['RAILROAD']['GAME_KEY']}"
-    preview_path = await find_existing_preview_path(GAMES["RAILROAD"]["GAME_KEY"])
     pricing = await get_effective_discount_for_game(callback.from_user.id, GAMES["RAILROAD"]["GAME_KEY"])
     single_price = calc_price(CONFIG.prices.single, pricing["discount"])
     caption = (
@@ -1002,22 +1137,8 @@ async def on_game_railroad(callback: CallbackQuery) -> None:
     await _safe_delete_message(message)
 
     try:
-        cached_id = await DB.get_asset(preview_cache_key)
-        if cached_id:
-            if message is not None:
-                await message.answer_photo(cached_id, caption=caption, reply_markup=keyboard)
-            else:
-                await require_bot(callback).send_photo(callback.from_user.id, cached_id, caption=caption, reply_markup=keyboard)
-            return
-        if preview_path and await async_exists(preview_path):
-            if message is not None:
-                sent = await message.answer_photo(FSInputFile(preview_path), caption=caption, reply_markup=keyboard)
-            else:
-                sent = await require_bot(callback).send_photo(
-                    callback.from_user.id, FSInputFile(preview_path), caption=caption, reply_markup=keyboard
-                )
-            if sent.photo:
-                await DB.set_asset(preview_cache_key, sent.photo[-1].file_id)
+        preview_key = product_preview_key(GAMES["RAILROAD"]["GAME_KEY"])
+        if await send_asset_photo(message, require_bot(callback), callback.from_user.id, preview_key, caption, keyboard):
             return
     except Exception:
         logging.exception("Error sending product page")
@@ -1076,23 +1197,20 @@ async def on_buy_check(callback: CallbackQuery) -> None:
     await start_order_wizard(callback, game)
 
 
-@router.callback_query(F.data.regexp(rf"^{Callback.GEO_PREFIX}"))
-async def on_geo_select(callback: CallbackQuery) -> None:
+@router.callback_query(F.data.startswith(WIZARD_TOKEN_PREFIX))
+async def on_wizard_step(callback: CallbackQuery) -> None:
     await callback.answer()
     user_id = callback.from_user.id
-    session = await get_session(user_id)
-    wizard = get_wizard(session)
-    if not wizard or wizard.get("stage") != "geo":
-        lang = await get_user_lang(callback.from_user.id)
-        await callback.answer(localize_text("Сначала выберите игру.", lang), show_alert=False)
+    token = wizard_tokens.decode(user_id, callback.data or "")
+    game = ORDERABLE_BY_GAME_KEY.get(token.game) if token else None
+    if token is None or game is None:
+        await edit_or_reply(callback, "Некорректный выбор. Начните заказ заново.", WITH_BACK_TO_MENU)
         return
-    if wizard_expired(wizard):
-        clear_wizard(session)
-        await save_session(user_id, session)
+    if wizard_tokens.expired(token):
         await edit_or_reply(callback, "Время ожидания истекло. Начните заказ заново.", WITH_BACK_TO_MENU)
         return
 
-    if callback.data == Callback.GEO_CUSTOM:
+    if token.step == STEP_CUSTOM_GEO:
         pending_count = await DB.count_orders_by_status(user_id, "custom_pending")
         if pending_count >= 3:
             await _reply_from_callback(
@@ -1100,32 +1218,58 @@ async def on_geo_select(callback: CallbackQuery) -> None:
                 "⏳ <b>У вас уже есть 3 активных запроса.</b>\nПожалуйста, дождитесь ответа техподдержки.",
             )
             return
-        set_wizard(session, "custom_geo_desc")
-        await save_session(user_id, session)
+        await begin_wizard_text_step(user_id, game, None, get_default_balance_for_game(game.key), "custom_geo_desc")
         await _reply_from_callback(callback, "💬 <b>Опишите нужное вам GEO (язык, валюта):</b>")
         return
 
-    geo_payload = (callback.data or "").replace(Callback.GEO_PREFIX, "")
-    selected_geo = next((geo for geo in GEOS if geo["id"] == geo_payload), None)
+    if token.step == STEP_BULK:
+        await begin_wizard_text_step(user_id, game, None, get_default_balance_for_game(game.key), "bulk_rows")
+        geo_ids = ", ".join(f"<code>{geo['id']}</code>" for geo in GEOS)
+        await _reply_from_callback(
+            callback,
+            "📦 <b>Пакетный заказ</b>\n\n"
+            "Отправьте варианты, по одному на строку: <code>GEO, CTA-ссылка, баланс</code> "
+            "(баланс можно не указывать), текстом или CSV-файлом.\n"
+            f"GEO: {geo_ids}. Не больше {BULK_ORDER_MAX_VARIANTS} вариантов.\n\n"
+            "Пример:\n<code>en_usd, https://example.com, 1000\npt_brl, https://example.com/br</code>",
+        )
+        return
+
+    selected_geo = GEOS_BY_ID.get(token.geo or "")
     if selected_geo is None:
         return
 
-    config = get_session_config(session)
-    config["language"] = selected_geo["lang"]
-    config["currency"] = selected_geo["currency"]
-    config["geoId"] = geo_payload
-    await DB.log_action(user_id, "select_geo", geo_payload)
+    if token.step == STEP_GEO:
+        await DB.log_action(user_id, "select_geo", selected_geo["id"])
+        await _reply_from_callback(
+            callback,
+            "✅ <b>Настройки GEO применены!</b>\n"
+            f"🌍 Выбранное GEO: <b>{selected_geo['name']}</b>\n"
+            f"💱 Валюта: <b>{selected_geo['currency']}</b>\n\n"
+            "Выберите стартовый баланс плеебла или введите своё значение:",
+            build_starting_balance_keyboard(user_id, game.key, selected_geo["id"]),
+        )
+        return
 
-    set_wizard(session, "starting_balance", attempts=0)
-    await save_session(user_id, session)
-    await _reply_from_callback(
-        callback,
-        "✅ <b>Настройки GEO применены!</b>\n"
-        f"🌍 Выбранное GEO: <b>{selected_geo['name']}</b>\n"
-        f"💱 Валюта: <b>{selected_geo['currency']}</b>\n\n"
-        "Введите стартовый баланс плеебла (только число):",
-    )
-    return
+    if token.step == STEP_CUSTOM_BALANCE:
+        await begin_wizard_text_step(user_id, game, selected_geo, get_default_balance_for_game(game.key), "starting_balance")
+        await _reply_from_callback(
+            callback,
+            "Введите стартовый баланс плеебла (только число):",
+            _inline_keyboard(
+                [[InlineKeyboardButton(text="Пропустить (по умолчанию)", callback_data=Callback.SKIP_STARTING_BALANCE)]]
+            ),
+        )
+        return
+
+    if token.step == STEP_BALANCE and token.balance is not None:
+        await begin_wizard_text_step(user_id, game, selected_geo, token.balance, "cta_url")
+        await DB.log_action(user_id, "set_starting_balance", str(token.balance))
+        await _reply_from_callback(callback, f"✅ Стартовый баланс установлен: <b>{token.balance}</b>")
+        await _reply_from_callback(
+            callback,
+            "🔗 <b>Отправьте CTA-ссылку для редиректа</b>\nПример: <code>https://example.com</code>",
+        )
 
 
 @router.callback_query(F.data == Callback.SKIP_STARTING_BALANCE)
@@ -1133,17 +1277,17 @@ async def on_skip_starting_balance(callback: CallbackQuery) -> None:
     await callback.answer()
     user_id = callback.from_user.id
     session = await get_session(user_id)
-    wizard = get_wizard(session)
-    if not wizard or wizard.get("stage") != "starting_balance":
+    wizard = session.wizard
+    if not wizard or wizard.stage != "starting_balance":
         return
     if wizard_expired(wizard):
         clear_wizard(session)
         await save_session(user_id, session)
         await edit_or_reply(callback, "Время ожидания истекло. Начните заказ заново.", WITH_BACK_TO_MENU)
         return
-    config = get_session_config(session)
-    default_balance = get_default_balance_for_game(config.get("game"))
-    config["startingBalance"] = default_balance
+    config = session.config
+    default_balance = get_default_balance_for_game(config.game)
+    config.starting_balance = default_balance
     await DB.log_action(user_id, "set_starting_balance", str(default_balance))
     set_wizard(session, "cta_url", attempts=0)
     await save_session(user_id, session)
@@ -1158,29 +1302,29 @@ async def on_skip_starting_balance(callback: CallbackQuery) -> None:
 async def on_gen_preview(callback: CallbackQuery) -> None:
     user_id = callback.from_user.id
     session = await get_session(user_id)
-    if session.get("previewInProgress"):
+    if session.preview_in_progress:
         lang = await get_user_lang(callback.from_user.id)
         await callback.answer(localize_text("Генерация уже выполняется. Подождите.", lang), show_alert=False)
         return
 
-    session["previewInProgress"] = True
+    session.preview_in_progress = True
     await save_session(user_id, session)
     await callback.answer()
 
     order_id: str | None = None
     try:
         await DB.log_action(user_id, "gen_preview")
-        config = get_session_config(session)
-        if not config.get("themeId"):
+        config = session.config
+        if not config.theme_id:
             await edit_or_reply(callback, "Нет активной конфигурации.", WITH_BACK_TO_MENU)
             return
 
-        valid_click_url = normalize_cta_url(str(config.get("clickUrl", "")))
+        valid_click_url = normalize_cta_url(config.click_url or "")
         if not valid_click_url:
             last_click_log = await DB.get_last_log_by_action(user_id, "set_click_url")
             restored = normalize_cta_url(str(last_click_log.get("details", ""))) if last_click_log else None
             if restored:
-                config["clickUrl"] = restored
+                config.click_url = restored
                 valid_click_url = restored
                 await DB.log_action(user_id, "restore_click_url", restored)
         if not valid_click_url:
@@ -1190,13 +1334,14 @@ async def on_gen_preview(callback: CallbackQuery) -> None:
                 WITH_BACK_TO_MENU,
             )
             return
-        config["clickUrl"] = valid_click_url
+        config.click_url = valid_click_url
         await save_session(user_id, session)
 
         order_id = f"ord_{user_id}_{int(datetime.now().timestamp() * 1000)}"
-        await DB.create_order(order_id, user_id, str(config.get("game", "railroad")), str(config["themeId"]), config)
+        game_key = config.game or GAMES["RAILROAD"]["GAME_KEY"]
+        await DB.create_order(order_id, user_id, game_key, config.theme_id, config)
 
-        pricing = await get_effective_discount_for_game(user_id, str(config.get("game", GAMES["RAILROAD"]["GAME_KEY"])))
+        pricing = await get_effective_discount_for_game(user_id, game_key)
         p1 = calc_price(CONFIG.prices.single, pricing["discount"])
         p2 = calc_price(CONFIG.prices.sub, pricing["discount"])
         single_line = (
@@ -1210,9 +1355,9 @@ async def on_gen_preview(callback: CallbackQuery) -> None:
             else f"Подписка: ${p2}"
         )
         discount_caption = f"Скидка: {pricing['discount']}%" if pricing["discount"] > 0 else "Скидка: 0%"
-        demo_url = get_channel_post_for_game(str(config.get("game", GAMES["RAILROAD"]["GAME_KEY"])))
-        selected_geo = str(config.get("geoId", "en_usd"))
-        cta_text = escape(str(config.get("clickUrl", "не задана")))
+        demo_url = get_channel_post_for_game(game_key)
+        selected_geo = config.geo_id or "en_usd"
+        cta_text = escape(config.click_url or "не задана")
         demo_line = f"👀 <b>Демо в канале:</b>\n{demo_url}" if demo_url else "👀 <b>Демо в канале:</b>\n<i>пока не настроено</i>"
 
         await edit_or_reply(
@@ -1221,15 +1366,7 @@ async def on_gen_preview(callback: CallbackQuery) -> None:
             f"🔗 <b>CTA-ссылка:</b> <code>{cta_text}</code>\n\n"
             f"💸 <b>{discount_caption}</b>\n{single_line}\n{sub_line}\n\n"
             f"<i>Проверьте демо и выберите формат покупки:</i>",
-            _inline_keyboard(
-                [
-                    [InlineKeyboardButton(text="👀 Смотреть демо в канале", url=demo_url or "https://t.me/rwbrr")],
-                    [InlineKeyboardButton(text=f"💳 Купить разово ($ {p1})", callback_data=f"{Callback.PAY_PREFIX}{PaymentType.SINGLE}_{order_id}")],
-                    [InlineKeyboardButton(text=f"⭐ Подписка ($ {p2})", callback_data=f"{Callback.PAY_PREFIX}{PaymentType.SUB}_{order_id}")],
-                    [InlineKeyboardButton(text="Оплатить напрямую (BTC/USDT)", callback_data=f"{Callback.MANUAL_PAY_MENU_PREFIX}{order_id}")],
-                    [InlineKeyboardButton(text="🏠 Главное меню", callback_data=Callback.MAIN_MENU)],
-                ]
-            ),
+            build_order_payment_keyboard(order_id, p1, p2, demo_url or "https://t.me/rwbrr"),
         )
     except Exception:
         logging.exception("Preview presentation error")
@@ -1241,87 +1378,413 @@ async def on_gen_preview(callback: CallbackQuery) -> None:
         await edit_or_reply(callback, "Ошибка при подготовке демо. Попробуйте снова через минуту.", WITH_BACK_TO_MENU)
     finally:
         refreshed = await get_session(user_id)
-        refreshed["previewInProgress"] = False
+        refreshed.preview_in_progress = False
         await save_session(user_id, refreshed)
 
-async def build_final_order_path(order_id: str, order: dict[str, Any]) -> str | None:
-    config = order.get("config", {})
-    click_url = config.get("clickUrl") if isinstance(config, dict) else None
-    lib_path = None
-    if can_use_library_artifact(click_url):
-        lib_path = await get_library_path(
-            str(order.get("gameType", "")),
-            str(config.get("geoId", "en_usd")),
-            False,
-        )
 
-    if lib_path:
+async def offer_bulk_order(message: Message, user_id: int, config: OrderConfig, variants: list[OrderVariant]) -> None:
+    """Create the order for a parsed bulk variant list and show its price with the payment buttons."""
+    order_id = f"bulk_{user_id}_{int(datetime.now().timestamp() * 1000)}"
+    game_key = config.game or GAMES["RAILROAD"]["GAME_KEY"]
+    theme_id = config.theme_id or get_theme_for_game(game_key)
+    await DB.create_order(order_id, user_id, game_key, theme_id, OrderConfig(game=game_key, theme_id=theme_id, variants=variants))
+    await DB.log_action(user_id, "bulk_order_created", f"{order_id}:{len(variants)}")
+
+    single = await get_discounted_amount(user_id, PaymentType.SINGLE, game_key, len(variants))
+    sub = await get_discounted_amount(user_id, PaymentType.SUB, game_key, len(variants))
+    lines = [
+        f"{index}. <code>{variant.geo_id}</code> · {variant.starting_balance} · {escape(variant.click_url)}"
+        for index, variant in enumerate(variants, start=1)
+    ]
+    discount_caption = f"Скидка: {single['discount']}%"
+    await answer_user(
+        message,
+        f"📦 <b>Пакетный заказ: {len(variants)}</b>\n\n" + "\n".join(lines) + "\n\n"
+        f"💸 <b>{discount_caption}</b>\nРазово: ${single['amount']}\nПодписка: ${sub['amount']}\n\n"
+        "Всё придёт одним архивом.\n<i>Проверьте варианты и выберите формат покупки:</i>",
+        reply_markup=build_order_payment_keyboard(order_id, single["amount"], sub["amount"], None),
+    )
+
+
+def format_build_queue_status(position: int, eta_seconds: float) -> str:
+    minutes = max(1, round(eta_seconds / 60))
+    return f"⏳ Заказ в очереди на сборку: место {position}, осталось примерно {minutes} мин."
+
+
+def format_build_progress(progress: BuildProgress) -> str:
+    label = BUILD_STAGE_LABELS.get(progress.stage, progress.stage)
+    return f"⚙️ {label}… {progress.elapsed_ms // 1000} s"
+
+
+class ThrottledStatus:
+    """Edits a callback's message to ``header`` plus the latest status line.
+
+    At most one edit goes out per ``interval`` seconds; updates arriving in between replace
+    each other, so only the newest is shown.
+    """
+
+    def __init__(self, callback: CallbackQuery, header: str, interval: float = BUILD_PROGRESS_EDIT_INTERVAL_SECONDS) -> None:
+        self._callback = callback
+        self._header = header
+        self._interval = interval
+        self._latest: str | None = None
+        self._last_edit = 0.0
+        self._task: asyncio.Task[None] | None = None
+
+    def update(self, line: str) -> None:
+        self._latest = line
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush())
+
+    async def _flush(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._latest is not None:
+            delay = self._last_edit + self._interval - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            line, self._latest = self._latest, None
+            self._last_edit = loop.time()
+            try:
+                await edit_or_reply(self._callback, f"{self._header}\n\n{line}")
+            except Exception:
+                logging.exception("Failed to update build status")
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+
+async def build_final_order_path(
+    order_id: str,
+    order: OrderRecord,
+    priority: BuildPriority = BuildPriority.PAID_FINAL,
+    on_queued: Callable[[int, float], Awaitable[None]] | None = None,
+    on_progress: ProgressListener | None = None,
+) -> str | None:
+    """Path of the unwatermarked playable for ``order``.
+
+    Node builds go through ``build_scheduler``; when the job has to wait for a worker,
+    ``on_queued`` gets its queue position and estimated seconds until it is ready, and
+    ``on_progress`` hears each build stage as it starts. Bulk orders get the ZIP of all
+    their variants from :func:`build_bulk_order_path` and report neither.
+    """
+    config = order.config
+    if config.variants:
+        return await build_bulk_order_path(order_id, order, priority)
+    game = ORDERABLE_BY_GAME_KEY.get(order.game_type)
+    lib_path = await get_library_path(game.id, config.geo_id or "en_usd", False) if game else None
+
+    if lib_path and can_use_library_artifact(config.click_url):
         logging.info("[Library] Delivering pre-built final: %s", lib_path)
         return lib_path
 
-    final_config = dict(config) if isinstance(config, dict) else {}
-    final_config["isWatermarked"] = False
-    return await generate_playable(f"{order_id}_final", final_config)
+    final_config = replace(config, is_watermarked=False)
 
+    async def schedule(key: str) -> str | None:
+        ticket = build_scheduler.submit(key, f"{order_id}_final", final_config, priority)
+        position = build_scheduler.position(ticket)
+        if position and on_queued is not None:
+            await on_queued(position, build_scheduler.eta_seconds(ticket))
+        return await build_scheduler.wait(ticket, on_progress)
 
-async def deliver_final_order(callback: CallbackQuery, order_id: str, order: dict[str, Any], status_text: str) -> None:
-    lang = await get_user_lang(callback.from_user.id)
-    await edit_or_reply(callback, status_text)
-    await asyncio.sleep(FINAL_DELIVERY_DELAY_SECONDS)
-    final_path = await build_final_order_path(order_id, order)
-    if final_path:
-        message = _callback_message(callback)
-        doc = FSInputFile(final_path)
-        if message is not None:
-            await message.answer_document(
-                doc,
-                caption=localize_text("Ваш файл без водяного знака готов! 🚀", lang),
-                reply_markup=build_main_menu_nav(lang),
-            )
-        else:
-            await require_bot(callback).send_document(
-                callback.from_user.id,
-                doc,
-                caption=localize_text("Ваш файл без водяного знака готов! 🚀", lang),
-                reply_markup=build_main_menu_nav(lang),
-            )
+    if game is None:
+        return await schedule(f"{order_id}_final")
+
+    runtime_config = to_runtime_config(final_config, False)
+    if lib_path:
+        library_artifact = Path(lib_path)
+        sources = (library_artifact, SCRIPT_TEMPLATE_PATH)
+
+        async def build(scratch: Path) -> Path | None:
+            # Same splice the Node builder would do for a library artifact, without spawning it.
+            return await asyncio.to_thread(inject_runtime_config, library_artifact, scratch, runtime_config)
+    else:
+        # The builder may clone from the template's optimized copy instead; either changes the output.
+        sources = (TEMPLATES_DIR / game.template_dir, OPTIMIZED_TEMPLATES_DIR / game.template_dir, DIST_BUILDER)
+
+        async def build(scratch: Path) -> Path | None:
+            built = await schedule(key)
+            return Path(built) if built else None
+
+    source_version = await asyncio.to_thread(source_fingerprint, sources)
+    key = artifact_cache.key_for(runtime_config, config.geo_id, source_version)
+    filename = build_output_filename(f"{order_id}_final", final_config, False)
+    # A speculative build of the same file may be queued or running; it now builds at our priority.
+    build_scheduler.promote(key, priority)
+    output = await artifact_cache.get_or_build(key, order_id, filename, build)
+    return str(output) if output else None
+
+
+async def build_bulk_order_path(order_id: str, order: OrderRecord, priority: BuildPriority = BuildPriority.PAID_FINAL) -> str | None:
+    """Build every variant of a bulk order concurrently and bundle them into one ZIP.
+
+    Each variant goes through :func:`build_final_order_path` as an order of its own, so
+    variants on a library artifact are only a config splice, the rest share the builder
+    pool and identical variants in other orders come from ``artifact_cache``.
+    """
+    variants = order.config.variants or []
+    tasks = [
+        asyncio.create_task(build_final_order_path(f"{order_id}_{index}", replace(order, config=variant_config(order.config, variant)), priority))
+        for index, variant in enumerate(variants, start=1)
+    ]
+    try:
+        paths = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    failed = sum(1 for path in paths if not path)
+    if failed or not paths:
+        logging.error("[Bulk] %s: %s of %s variants failed to build", order_id, failed, len(paths))
+        return None
+    members = [(Path(path), f"{index:02d}_{Path(path).name}") for index, path in enumerate(paths, start=1) if path]
+    archive_name = f"{order.game_type}_{len(members)}_variants{ARCHIVE_SUFFIX}"
+    archive = await archive_pool.bundle(members, artifact_cache.order_path(order_id, archive_name))
+    return str(archive)
+
+
+def start_speculative_build(order: OrderRecord) -> None:
+    """Build the final file of ``order`` at PREFETCH priority while its payment is pending.
+
+    The result lands in ``artifact_cache`` like any order build, so once the payment is
+    confirmed :func:`build_final_order_path` only links it (or joins the running build).
+    """
+    if not CONFIG.speculative_builds or order.order_id in speculative_builds:
         return
-    await edit_or_reply(callback, "Ошибка сборки.", WITH_BACK_TO_MENU)
+    task = asyncio.create_task(_speculative_build(order))
+    speculative_builds[order.order_id] = task
 
+    def forget(_: asyncio.Task[None]) -> None:
+        if speculative_builds.get(order.order_id) is task:
+            del speculative_builds[order.order_id]
 
-def get_stored_crypto_payment(order: dict[str, Any]) -> dict[str, Any] | None:
-    config = order.get("config")
-    if not isinstance(config, dict):
-        return None
-    payment = config.get("payment")
-    if not isinstance(payment, dict):
-        return None
-    if payment.get("provider") != "crypto_pay":
-        return None
+    task.add_done_callback(forget)
 
+
+def discard_speculative_build(order_id: str) -> None:
+    task = speculative_builds.pop(order_id, None)
+    if task is not None:
+        # Drops the job from the queue, or kills its worker if it is already building.
+        task.cancel()
+
+
+async def _speculative_build(order: OrderRecord) -> None:
     try:
-        invoice_id = int(payment.get("invoiceId"))
-        amount = int(payment.get("amount"))
-        discount = int(payment.get("discount"))
-    except (TypeError, ValueError):
-        return None
+        async with asyncio.timeout(SPECULATIVE_BUILD_TTL_SECONDS):
+            await build_final_order_path(order.order_id, order, BuildPriority.PREFETCH)
+    except BuildQueueFullError:
+        logging.info("[Builder] Queue full, no speculative build for %s", order.order_id)
+    except TimeoutError:
+        logging.info("[Builder] Speculative build for %s abandoned", order.order_id)
+    except asyncio.CancelledError:
+        task = asyncio.current_task()
+        if task is not None and task.cancelling():
+            raise
+        logging.info("[Builder] Speculative build for %s preempted", order.order_id)
+    except Exception:
+        logging.exception("[Builder] Speculative build for %s failed", order.order_id)
 
-    payment_type = payment.get("type")
-    pay_url = payment.get("payUrl")
-    if payment_type not in {PaymentType.SINGLE, PaymentType.SUB}:
-        return None
-    if invoice_id <= 0 or amount <= 0 or discount < 0:
-        return None
-    if not isinstance(pay_url, str):
-        pay_url = ""
 
-    return {
-        "invoiceId": invoice_id,
-        "amount": amount,
-        "discount": discount,
-        "type": payment_type,
-        "payUrl": pay_url,
-    }
+async def delivery_document(path: str) -> tuple[FSInputFile, bool]:
+    """What to send for a built playable and whether it is the ZIP: the ZIP when DELIVERY_ARCHIVE is on, otherwise the HTML."""
+    html_path = Path(path)
+    if CONFIG.delivery_archive and html_path.suffix != ARCHIVE_SUFFIX:
+        try:
+            return FSInputFile(await archive_pool.archive_for(html_path)), True
+        except (OSError, BrokenProcessPool):
+            logging.exception("[Delivery] Could not archive %s, sending the HTML", html_path.name)
+    return FSInputFile(html_path), False
+
+
+async def send_delivery_document(bot: Bot, chat_id: int, path: str, **kwargs: Any) -> None:
+    """Send a built playable, re-using the Telegram file_id of an earlier upload of the same file.
+
+    The key comes from the HTML rather than from what is sent, since an archive of the same
+    playable differs in its timestamps; a hit skips archiving as well.
+    """
+    html_path = Path(path)
+    artifact_key = artifact_cache.key_of(html_path)
+    archived = CONFIG.delivery_archive and html_path.suffix != ARCHIVE_SUFFIX
+    cache_key = await asyncio.to_thread(document_key, html_path, artifact_key, archived=archived)
+
+    async def upload() -> tuple[FSInputFile, str]:
+        document, sent_archive = await delivery_document(path)
+        if sent_archive == archived:
+            return document, cache_key
+        # Archiving failed: the HTML went out, so its id must not be served as the ZIP's.
+        return document, await asyncio.to_thread(document_key, html_path, artifact_key, archived=sent_archive)
+
+    await asset_registry.send_document(bot, chat_id, cache_key, upload, **kwargs)
+
+
+def delivery_outbox_key(order_id: str) -> str:
+    return f"{OUTBOX_DELIVERY}:{order_id}"
+
+
+def delivery_outbox_item(order_id: str, priority: BuildPriority = BuildPriority.PAID_FINAL, *, manual: bool = False) -> OutboxItem:
+    """The outbox entry a payment writes, so its delivery survives a restart."""
+    return OutboxItem(
+        kind=OUTBOX_DELIVERY,
+        payload={"orderId": order_id, "priority": int(priority), "manual": manual},
+        dedupe_key=delivery_outbox_key(order_id),
+    )
+
+
+def admin_message_item(text: str, reply_markup: InlineKeyboardMarkup | None = None) -> OutboxItem:
+    markup = reply_markup.model_dump(mode="json", exclude_none=True) if reply_markup is not None else None
+    return OutboxItem(kind=OUTBOX_ADMIN_MESSAGE, payload={"chatId": CONFIG.admin_telegram_id, "text": text, "replyMarkup": markup})
+
+
+def admin_forward_item(from_chat_id: int, message_id: int) -> OutboxItem:
+    return OutboxItem(kind=OUTBOX_ADMIN_FORWARD, payload={"chatId": CONFIG.admin_telegram_id, "fromChatId": from_chat_id, "messageId": message_id})
+
+
+async def start_delivery(order_id: str, user_id: int, run: Callable[[DeliveryJob], Awaitable[None]]) -> None:
+    """Deliver a paid order with ``run``: through its pending outbox entry if the payment left
+    one, otherwise (a re-delivery of an order paid earlier) straight through the queue."""
+    if await DB.has_pending_outbox(delivery_outbox_key(order_id)):
+        # Without background jobs another process dispatches the entry, without this run's progress.
+        if CONFIG.background_jobs:
+            live_delivery_runs[order_id] = run
+        return
+    delivery_queue.submit(order_id, user_id, run, delay=FINAL_DELIVERY_DELAY_SECONDS)
+
+
+async def deliver_final_order(callback: CallbackQuery, order_id: str, order: OrderRecord, status_text: str) -> None:
+    """Deliver the final build of a paid order in the background; the handler returns right away."""
+    await edit_or_reply(callback, f"{status_text}\n\n{DELIVERY_STATUS_HINT}")
+
+    async def run(job: DeliveryJob) -> None:
+        await run_final_delivery(job, require_bot(callback), order, BuildPriority.PAID_FINAL, callback, status_text)
+
+    await start_delivery(order_id, callback.from_user.id, run)
+
+
+async def run_final_delivery(
+    job: DeliveryJob,
+    bot: Bot,
+    order: OrderRecord,
+    priority: BuildPriority,
+    callback: CallbackQuery | None = None,
+    status_text: str = "",
+) -> None:
+    """Build and send the playable, reporting progress in ``callback``'s message if there is one."""
+    lang = await DB.get_user_language(order.user_id)
+    status = ThrottledStatus(callback, status_text) if callback is not None else None
+
+    def report(line: str) -> None:
+        job.detail = line
+        if status is not None:
+            status.update(line)
+
+    async def fail(text: str) -> None:
+        if callback is not None:
+            await edit_or_reply(callback, text, WITH_BACK_TO_MENU)
+
+    async def on_queued(position: int, eta_seconds: float) -> None:
+        report(format_build_queue_status(position, eta_seconds))
+
+    try:
+        final_path = await build_final_order_path(
+            job.order_id,
+            order,
+            priority,
+            on_queued=on_queued,
+            on_progress=lambda progress: report(format_build_progress(progress)),
+        )
+    except BuildQueueFullError:
+        await fail("Очередь сборки переполнена. Попробуйте через несколько минут.")
+        raise DeliveryError("Очередь сборки переполнена.") from None
+    finally:
+        if status is not None:
+            status.close()
+    if not final_path:
+        await fail("Ошибка сборки.")
+        raise DeliveryError("Ошибка сборки.")
+    message = _callback_message(callback) if callback is not None else None
+    await send_delivery_document(
+        bot,
+        message.chat.id if message is not None else order.user_id,
+        final_path,
+        caption=localize_text("Ваш файл без водяного знака готов! 🚀", lang),
+        reply_markup=build_main_menu_nav(lang),
+    )
+
+
+def resumed_delivery_run(bot: Bot, order: OrderRecord, payload: dict[str, Any]) -> Callable[[DeliveryJob], Awaitable[None]]:
+    """How to deliver an outbox entry nobody is waiting on, e.g. one left over from before a restart."""
+    priority = BuildPriority(int(payload.get("priority", BuildPriority.PAID_FINAL)))
+
+    async def run(job: DeliveryJob) -> None:
+        live = live_delivery_runs.get(job.order_id)
+        if live is not None:
+            await live(job)
+        elif payload.get("manual"):
+            await run_manual_delivery(job, bot, order, priority, lambda text: bot.send_message(CONFIG.admin_telegram_id, text))
+        else:
+            await run_final_delivery(job, bot, order, priority)
+
+    return run
+
+
+async def dispatch_outbox_delivery(bot: Bot, entry: OutboxEntry) -> None:
+    order_id = str(entry.payload["orderId"])
+    order = await DB.get_order(order_id)
+    if order is None or not order.is_paid:
+        live_delivery_runs.pop(order_id, None)
+        raise OutboxRejected(f"order {order_id} is missing or unpaid")
+    # The live run is looked up when the job starts, after the delay, so a handler that
+    # registers it just after the payment commits is never too late.
+    job = delivery_queue.submit(order_id, order.user_id, resumed_delivery_run(bot, order, entry.payload), delay=FINAL_DELIVERY_DELAY_SECONDS)
+    await job.finished.wait()
+    if job.state != "done":
+        raise RuntimeError(job.detail or "delivery failed")
+    live_delivery_runs.pop(order_id, None)
+
+
+def outbox_handlers(bot: Bot) -> dict[str, OutboxHandler]:
+    async def delivery(entry: OutboxEntry) -> None:
+        await dispatch_outbox_delivery(bot, entry)
+
+    async def admin_message(entry: OutboxEntry) -> None:
+        markup = entry.payload.get("replyMarkup")
+        try:
+            with bulk_sends():
+                await bot.send_message(
+                    int(entry.payload["chatId"]),
+                    str(entry.payload["text"]),
+                    reply_markup=InlineKeyboardMarkup.model_validate(markup) if markup else None,
+                )
+        except (TelegramBadRequest, TelegramForbiddenError) as exc:
+            raise OutboxRejected(str(exc)) from exc
+
+    async def admin_forward(entry: OutboxEntry) -> None:
+        try:
+            with bulk_sends():
+                await bot.forward_message(int(entry.payload["chatId"]), int(entry.payload["fromChatId"]), int(entry.payload["messageId"]))
+        except (TelegramBadRequest, TelegramForbiddenError) as exc:
+            raise OutboxRejected(str(exc)) from exc
+
+    return {OUTBOX_DELIVERY: delivery, OUTBOX_ADMIN_MESSAGE: admin_message, OUTBOX_ADMIN_FORWARD: admin_forward}
+
+
+async def report_dead_letter(bot: Bot, entry: OutboxEntry, error: str) -> None:
+    if entry.kind == OUTBOX_DELIVERY:
+        live_delivery_runs.pop(str(entry.payload.get("orderId")), None)
+    await bot.send_message(
+        CONFIG.admin_telegram_id,
+        f"⚠️ Outbox #{entry.id} ({entry.kind}) не выполнен: {escape(error)}\nПовторить: /outbox retry {entry.id}",
+    )
+
+
+def format_delivery_status(job: DeliveryJob) -> str:
+    line = f"<code>{escape(job.order_id)}</code>: {DELIVERY_STATE_LABELS[job.state]}"
+    return f"{line} — {job.detail}" if job.detail else line
+
+
+def get_stored_crypto_payment(order: OrderRecord) -> CryptoPayment | None:
+    # Validation happens once when the order config is decoded.
+    return order.config.payment
 
 
 @router.callback_query(F.data.regexp(rf"^{Callback.PAYMENT_CANCEL_PREFIX}"))
@@ -1334,10 +1797,10 @@ async def on_payment_cancel(callback: CallbackQuery) -> None:
         return
 
     order = await DB.get_order(order_id)
-    if not order or int(order.get("userId", 0)) != user_id:
+    if not order or order.user_id != user_id:
         await edit_or_reply(callback, "Заказ не найден.", WITH_BACK_TO_MENU)
         return
-    if str(order.get("status", "")).startswith("paid"):
+    if order.is_paid:
         await edit_or_reply(callback, "Оплата уже подтверждена. Отмена недоступна.", MAIN_MENU_NAV)
         return
     if is_order_cancelled(order):
@@ -1345,10 +1808,10 @@ async def on_payment_cancel(callback: CallbackQuery) -> None:
         return
 
     await DB.set_order_status(order_id, ORDER_STATUS_CANCELLED)
+    discard_speculative_build(order_id)
     session = await get_session(user_id)
-    pending = session.get("pendingManualPayment")
-    if isinstance(pending, dict) and pending.get("orderId") == order_id:
-        session.pop("pendingManualPayment", None)
+    if session.pending_manual_payment and session.pending_manual_payment.order_id == order_id:
+        session.pending_manual_payment = None
     await save_session(user_id, session)
     await DB.log_action(user_id, "payment_cancelled_by_user", order_id)
     await edit_or_reply(
@@ -1366,15 +1829,15 @@ async def on_manual_pay_menu(callback: CallbackQuery) -> None:
         await edit_or_reply(callback, "Некорректная ссылка оплаты.", WITH_BACK_TO_MENU)
         return
     order = await DB.get_order(order_id)
-    if not order or int(order.get("userId", 0)) != callback.from_user.id:
+    if not order or order.user_id != callback.from_user.id:
         await edit_or_reply(callback, "Заказ не найден.", WITH_BACK_TO_MENU)
         return
     if is_order_cancelled(order):
         await edit_or_reply(callback, CANCELLED_ORDER_TEXT, build_cancelled_order_keyboard())
         return
 
-    single = await get_discounted_amount(callback.from_user.id, PaymentType.SINGLE, str(order.get("gameType")))
-    sub = await get_discounted_amount(callback.from_user.id, PaymentType.SUB, str(order.get("gameType")))
+    single = await get_discounted_amount(callback.from_user.id, PaymentType.SINGLE, order.game_type, order_units(order.config))
+    sub = await get_discounted_amount(callback.from_user.id, PaymentType.SUB, order.game_type, order_units(order.config))
     await DB.log_action(callback.from_user.id, "manual_pay_menu_open", order_id)
     await edit_or_reply(
         callback,
@@ -1399,28 +1862,26 @@ async def on_manual_pay_type(callback: CallbackQuery) -> None:
     payment_type, order_id = match.group(1), match.group(2)
 
     order = await DB.get_order(order_id)
-    if not order or int(order.get("userId", 0)) != callback.from_user.id:
+    if not order or order.user_id != callback.from_user.id:
         await edit_or_reply(callback, "Заказ не найден.", WITH_BACK_TO_MENU)
         return
     if is_order_cancelled(order):
         await edit_or_reply(callback, CANCELLED_ORDER_TEXT, build_cancelled_order_keyboard())
         return
 
-    discounted = await get_discounted_amount(callback.from_user.id, payment_type, str(order.get("gameType")))
+    discounted = await get_discounted_amount(callback.from_user.id, payment_type, order.game_type, order_units(order.config))
     await DB.update_order_config(
         order_id,
-        {
-            "manualPayment": {
-                "provider": "direct_wallet",
-                "type": payment_type,
-                "amount": discounted["amount"],
-                "discount": discounted["discount"],
-                "state": "awaiting_transfer",
-                "updatedAt": datetime.now(UTC).isoformat(),
-            }
-        },
+        manual_payment=ManualPayment(
+            type=payment_type,
+            amount=discounted["amount"],
+            discount=discounted["discount"],
+            state="awaiting_transfer",
+            updated_at=datetime.now(UTC).isoformat(),
+        ),
     )
     await DB.set_order_status(order_id, "manual_transfer_pending")
+    start_speculative_build(order)
     await DB.log_action(
         callback.from_user.id,
         "manual_payment_requested",
@@ -1457,20 +1918,21 @@ async def on_manual_paid(callback: CallbackQuery) -> None:
 
     payment_type, order_id = match.group(1), match.group(2)
     order = await DB.get_order(order_id)
-    if not order or int(order.get("userId", 0)) != callback.from_user.id:
+    if not order or order.user_id != callback.from_user.id:
         await edit_or_reply(callback, "Заказ не найден.", WITH_BACK_TO_MENU)
         return
     if is_order_cancelled(order):
         await edit_or_reply(callback, CANCELLED_ORDER_TEXT, build_cancelled_order_keyboard())
         return
 
-    discounted = await get_discounted_amount(callback.from_user.id, payment_type, str(order.get("gameType")))
+    discounted = await get_discounted_amount(callback.from_user.id, payment_type, order.game_type, order_units(order.config))
     session = await get_session(callback.from_user.id)
-    session["pendingManualPayment"] = {
-        "orderId": order_id,
-        "paymentType": payment_type,
-        "amount": discounted["amount"],
-    }
+    session.pending_manual_payment = PendingManualPayment(
+        order_id=order_id,
+        payment_type=payment_type,
+        amount=discounted["amount"],
+        created_at=int(datetime.now().timestamp() * 1000),
+    )
     await save_session(callback.from_user.id, session)
     await DB.set_order_status(order_id, "manual_proof_requested")
     await DB.log_action(
@@ -1495,7 +1957,7 @@ async def on_crypto_check(callback: CallbackQuery) -> None:
         return
 
     order = await DB.get_order(order_id)
-    if not order or int(order.get("userId", 0)) != user_id:
+    if not order or order.user_id != user_id:
         await edit_or_reply(callback, "Заказ не найден.", WITH_BACK_TO_MENU)
         return
     if is_order_cancelled(order):
@@ -1511,14 +1973,14 @@ async def on_crypto_check(callback: CallbackQuery) -> None:
         )
         return
 
-    if str(order.get("status", "")).startswith("paid"):
+    if order.is_paid:
         await deliver_final_order(callback, order_id, order, "Оплата уже подтверждена. Собираю финальный файл...")
         return
 
-    await DB.log_action(user_id, "crypto_pay_check", f"{order_id}:{payment['invoiceId']}")
+    await DB.log_action(user_id, "crypto_pay_check", f"{order_id}:{payment.invoice_id}")
 
     try:
-        invoice = await get_crypto_pay_invoice(int(payment["invoiceId"]))
+        invoice = await get_crypto_pay_invoice(payment.invoice_id)
         if not invoice:
             await edit_or_reply(
                 callback,
@@ -1542,12 +2004,13 @@ async def on_crypto_check(callback: CallbackQuery) -> None:
             await DB.finalize_external_paid_order(
                 order_id,
                 user_id,
-                f"paid_{payment['type']}",
-                int(payment["amount"]),
-                int(payment["discount"]),
+                f"paid_{payment.type}",
+                payment.amount,
+                payment.discount,
+                outbox=[delivery_outbox_item(order_id)],
             )
-            await DB.add_referral_reward(user_id, int(payment["amount"]))
-            await DB.log_action(user_id, "pay_success_crypto", f"${payment['amount']}")
+            await DB.add_referral_reward(user_id, payment.amount)
+            await DB.log_action(user_id, "pay_success_crypto", f"${payment.amount}")
         except DBError as exc:
             if str(exc) == "ORDER_ALREADY_PAID":
                 already_paid = True
@@ -1585,7 +2048,7 @@ async def on_pay(callback: CallbackQuery) -> None:
         return
 
     order = await DB.get_order(parsed["orderId"])
-    if not order or int(order.get("userId", 0)) != user_id:
+    if not order or order.user_id != user_id:
         await edit_or_reply(callback, "Заказ не найден.", WITH_BACK_TO_MENU)
         return
     if is_order_cancelled(order):
@@ -1595,33 +2058,30 @@ async def on_pay(callback: CallbackQuery) -> None:
     await DB.log_action(user_id, "pay_click", parsed["type"])
 
     if is_crypto_pay_enabled():
-        if str(order.get("status", "")).startswith("paid"):
+        if order.is_paid:
             await deliver_final_order(callback, parsed["orderId"], order, "Оплата уже подтверждена. Собираю финальный файл...")
             return
 
-        discounted = await get_discounted_amount(user_id, parsed["type"], str(order.get("gameType")))
+        discounted = await get_discounted_amount(user_id, parsed["type"], order.game_type, order_units(order.config))
         try:
             invoice = await create_crypto_pay_invoice(
                 CreateInvoiceParams(
                     amount_usd=discounted["amount"],
-                    description=f"Оплата заказа {order['orderId']} ({parsed['type']})",
+                    description=f"Оплата заказа {order.order_id} ({parsed['type']})",
                     payload=f"{parsed['orderId']}:{user_id}:{parsed['type']}",
                     expires_in_seconds=3600,
                 )
             )
             await DB.update_order_config(
                 parsed["orderId"],
-                {
-                    "payment": {
-                        "provider": "crypto_pay",
-                        "invoiceId": invoice.invoice_id,
-                        "payUrl": invoice.pay_url,
-                        "type": parsed["type"],
-                        "amount": discounted["amount"],
-                        "discount": discounted["discount"],
-                        "createdAt": datetime.now(UTC).isoformat(),
-                    }
-                },
+                payment=CryptoPayment(
+                    invoice_id=invoice.invoice_id,
+                    pay_url=invoice.pay_url,
+                    type=parsed["type"],
+                    amount=discounted["amount"],
+                    discount=discounted["discount"],
+                    created_at=datetime.now(UTC).isoformat(),
+                ),
             )
             await DB.log_action(
                 user_id,
@@ -1633,6 +2093,7 @@ async def on_pay(callback: CallbackQuery) -> None:
                 f"Инвойс создан на ${discounted['amount']}. Оплатите и нажмите «Проверить оплату».",
                 build_crypto_invoice_keyboard(parsed["orderId"], invoice.pay_url),
             )
+            start_speculative_build(order)
         except Exception:
             logging.exception("Crypto invoice create error")
             await edit_or_reply(
@@ -1642,11 +2103,12 @@ async def on_pay(callback: CallbackQuery) -> None:
             )
         return
 
-    already_paid = str(order.get("status", "")).startswith("paid")
+    already_paid = order.is_paid
     if not already_paid:
-        pricing = await get_effective_discount_for_game(user_id, str(order.get("gameType")))
+        pricing = await get_effective_discount_for_game(user_id, order.game_type)
         discount = int(pricing["discount"])
-        amount = calc_price(CONFIG.prices.sub if parsed["type"] == PaymentType.SUB else CONFIG.prices.single, discount)
+        base_price = CONFIG.prices.sub if parsed["type"] == PaymentType.SUB else CONFIG.prices.single
+        amount = calc_price(base_price * order_units(order.config), discount)
 
         if pricing["stats"].wallet_balance < amount:
             await edit_or_reply(
@@ -1659,7 +2121,14 @@ async def on_pay(callback: CallbackQuery) -> None:
 
         finalized = False
         try:
-            await DB.finalize_paid_order(parsed["orderId"], user_id, f"paid_{parsed['type']}", amount, discount)
+            await DB.finalize_paid_order(
+                parsed["orderId"],
+                user_id,
+                f"paid_{parsed['type']}",
+                amount,
+                discount,
+                outbox=[delivery_outbox_item(parsed["orderId"])],
+            )
             finalized = True
         except DBError as exc:
             if str(exc) == "ORDER_ALREADY_PAID":
@@ -1703,7 +2172,6 @@ async def on_profile(callback: CallbackQuery) -> None:
     bot_username = await get_bot_username(require_bot(callback))
     msg_text = build_profile_message(user_id, stats.orders_paid, stats.wallet_balance, bot_username, lang=lang)
 
-    profile_path = BOT_ASSETS_DIR / "profile.png"
     keyboard = _inline_keyboard(
         [
             [InlineKeyboardButton(text=t(lang, "top_up"), callback_data=Callback.TOP_UP_BALANCE)],
@@ -1714,25 +2182,7 @@ async def on_profile(callback: CallbackQuery) -> None:
     await _safe_delete_message(message)
 
     try:
-        cached_id = await DB.get_asset(ASSETS["PROFILE"])
-        if cached_id:
-            if message is not None:
-                await message.answer_photo(cached_id, caption=msg_text, reply_markup=keyboard)
-            else:
-                await require_bot(callback).send_photo(callback.from_user.id, cached_id, caption=msg_text, reply_markup=keyboard)
-            return
-        if await async_exists(profile_path):
-            if message is not None:
-                sent = await message.answer_photo(FSInputFile(profile_path), caption=msg_text, reply_markup=keyboard)
-            else:
-                sent = await require_bot(callback).send_photo(
-                    callback.from_user.id,
-                    FSInputFile(profile_path),
-                    caption=msg_text,
-                    reply_markup=keyboard,
-                )
-            if sent.photo:
-                await DB.set_asset(ASSETS["PROFILE"], sent.photo[-1].file_id)
+        if await send_asset_photo(message, require_bot(callback), callback.from_user.id, ASSETS["PROFILE"], msg_text, keyboard):
             return
     except Exception:
         logging.exception("Error sending profile")
@@ -1781,75 +2231,93 @@ async def on_i_paid(callback: CallbackQuery) -> None:
         f"<b>ID:</b> <code>{user.id}</code>\n\n"
         "Проверьте входящие транзакции."
     )
-    try:
-        await require_bot(callback).send_message(CONFIG.admin_telegram_id, admin_msg)
-    except Exception:
-        logging.exception("Failed to notify admin")
+    await DB.enqueue_outbox([admin_message_item(admin_msg)])
 
 
-async def approve_manual_order(bot: Bot, order_id: str) -> dict[str, Any]:
+async def approve_manual_order(
+    bot: Bot,
+    order_id: str,
+    priority: BuildPriority = BuildPriority.PAID_FINAL,
+    notify: Callable[[str], Awaitable[Any]] | None = None,
+) -> dict[str, Any]:
+    """Approve a manual payment and queue its delivery; ``notify`` is told how the delivery went."""
     order = await DB.get_order(order_id)
     if not order:
         return {"ok": False, "message": "Заказ не найден."}
 
-    config = order.get("config", {})
-    manual_payment = config.get("manualPayment", {}) if isinstance(config, dict) else {}
-    payment_type = manual_payment.get("type")
-    if payment_type not in {PaymentType.SINGLE, PaymentType.SUB}:
-        payment_type = PaymentType.SINGLE
+    manual_payment = order.config.manual_payment or ManualPayment()
 
-    amount = manual_payment.get("amount", 0)
-    discount = manual_payment.get("discount", 0)
-    try:
-        normalized_amount = max(0, int(amount))
-    except (TypeError, ValueError):
-        normalized_amount = 0
-    try:
-        normalized_discount = max(0, int(discount))
-    except (TypeError, ValueError):
-        normalized_discount = 0
-
-    if not str(order.get("status", "")).startswith("paid"):
-        await DB.mark_paid(order_id, f"paid_manual_{payment_type}", normalized_amount, normalized_discount)
+    if not order.is_paid:
+        await DB.mark_paid(
+            order_id,
+            f"paid_manual_{manual_payment.type}",
+            manual_payment.amount,
+            manual_payment.discount,
+            outbox=[delivery_outbox_item(order_id, priority, manual=True)],
+        )
         await DB.update_order_config(
             order_id,
-            {
-                "manualPayment": {
-                    **(manual_payment if isinstance(manual_payment, dict) else {}),
-                    "state": "approved",
-                    "approvedAt": datetime.now(UTC).isoformat(),
-                }
-            },
+            manual_payment=replace(manual_payment, state="approved", approved_at=datetime.now(UTC).isoformat()),
         )
-        await DB.log_action(order["userId"], "admin_manual_payment_approved", f"{order_id}:${normalized_amount}")
-        if normalized_amount > 0:
-            await DB.add_referral_reward(int(order["userId"]), normalized_amount)
+        await DB.log_action(order.user_id, "admin_manual_payment_approved", f"{order_id}:${manual_payment.amount}")
+        if manual_payment.amount > 0:
+            await DB.add_referral_reward(order.user_id, manual_payment.amount)
 
     fresh_order = await DB.get_order(order_id)
     if not fresh_order:
         return {"ok": False, "message": "Заказ не найден."}
 
-    await asyncio.sleep(FINAL_DELIVERY_DELAY_SECONDS)
+    async def run(job: DeliveryJob) -> None:
+        await run_manual_delivery(job, bot, fresh_order, priority, notify)
+
+    await start_delivery(order_id, order.user_id, run)
+    return {"ok": True, "message": f"Заказ {order_id} одобрен. Файл будет отправлен пользователю {order.user_id} после сборки."}
+
+
+async def run_manual_delivery(
+    job: DeliveryJob,
+    bot: Bot,
+    order: OrderRecord,
+    priority: BuildPriority,
+    notify: Callable[[str], Awaitable[Any]] | None,
+) -> None:
+    async def outcome(text: str) -> None:
+        if notify is None:
+            return
+        try:
+            await notify(f"Заказ {job.order_id}: {text}")
+        except Exception:
+            logging.exception("Failed to report manual delivery of %s", job.order_id)
+
+    async def on_queued(position: int, eta_seconds: float) -> None:
+        job.detail = format_build_queue_status(position, eta_seconds)
+
+    def on_progress(progress: BuildProgress) -> None:
+        job.detail = format_build_progress(progress)
+
     try:
-        final_path = await build_final_order_path(order_id, fresh_order)
+        final_path = await build_final_order_path(job.order_id, order, priority, on_queued=on_queued, on_progress=on_progress)
+    except BuildQueueFullError:
+        await outcome("очередь сборки переполнена. Попробуйте через несколько минут.")
+        raise DeliveryError("Очередь сборки переполнена.") from None
     except Exception:
         logging.exception("Failed to build final playable for manual approval")
-        await DB.log_action(int(order["userId"]), "manual_approve_build_failed", order_id)
-        return {"ok": False, "message": "Ошибка сборки финального файла. Проверьте логи builder и попробуйте снова."}
+        await DB.log_action(order.user_id, "manual_approve_build_failed", job.order_id)
+        await outcome("ошибка сборки финального файла. Проверьте логи builder и попробуйте снова.")
+        raise DeliveryError("Ошибка сборки.") from None
     if not final_path:
-        return {"ok": False, "message": "Ошибка сборки файла."}
+        await outcome("ошибка сборки файла.")
+        raise DeliveryError("Ошибка сборки.")
 
     try:
-        user_lang = await DB.get_user_language(int(order["userId"]))
-        await bot.send_document(
-            int(order["userId"]),
-            FSInputFile(final_path),
-            caption=localize_text("Ваш файл готов.", user_lang),
-        )
-        return {"ok": True, "message": f"Заказ {order_id} одобрен. Файл отправлен пользователю {order['userId']}."}
+        user_lang = await DB.get_user_language(order.user_id)
+        await send_delivery_document(bot, order.user_id, final_path, caption=localize_text("Ваш файл готов.", user_lang))
     except Exception:
         logging.exception("Failed to send granted playable")
-        return {"ok": False, "message": "Не удалось отправить файл пользователю."}
+        await outcome("не удалось отправить файл пользователю.")
+        raise DeliveryError("Не удалось отправить файл.") from None
+    await outcome(f"файл отправлен пользователю {order.user_id}.")
+
 
 @router.callback_query(F.data.regexp(rf"^{Callback.ADMIN_MANUAL_PREFIX}(approve|reject)_"))
 async def on_admin_manual(callback: CallbackQuery) -> None:
@@ -1867,7 +2335,11 @@ async def on_admin_manual(callback: CallbackQuery) -> None:
 
     if action == "approve":
         await edit_or_reply(callback, f"⏳ Одобряю заказ {order_id}. Собираю финальный файл...", MAIN_MENU_NAV)
-        result = await approve_manual_order(require_bot(callback), order_id)
+        result = await approve_manual_order(
+            require_bot(callback),
+            order_id,
+            notify=lambda text: edit_or_reply(callback, text, MAIN_MENU_NAV),
+        )
         await edit_or_reply(callback, result["message"], MAIN_MENU_NAV)
         return
 
@@ -1876,23 +2348,16 @@ async def on_admin_manual(callback: CallbackQuery) -> None:
         await edit_or_reply(callback, "Заказ не найден.", WITH_BACK_TO_MENU)
         return
 
-    config = order.get("config", {})
-    manual_payment = config.get("manualPayment", {}) if isinstance(config, dict) else {}
+    manual_payment = order.config.manual_payment or ManualPayment()
     await DB.update_order_config(
         order_id,
-        {
-            "manualPayment": {
-                **(manual_payment if isinstance(manual_payment, dict) else {}),
-                "state": "rejected",
-                "rejectedAt": datetime.now(UTC).isoformat(),
-            }
-        },
+        manual_payment=replace(manual_payment, state="rejected", rejected_at=datetime.now(UTC).isoformat()),
     )
     await DB.set_order_status(order_id, "manual_rejected")
-    await DB.log_action(int(order["userId"]), "admin_manual_payment_rejected", order_id)
+    await DB.log_action(order.user_id, "admin_manual_payment_rejected", order_id)
     try:
         await require_bot(callback).send_message(
-            int(order["userId"]),
+            order.user_id,
             f"Оплата по заказу {order_id} отклонена. Проверьте данные и отправьте новое подтверждение.",
         )
     except Exception:
@@ -1909,10 +2374,68 @@ async def on_grantorder(message: Message) -> None:
     if len(parts) < 2 or not parts[1].strip():
         await message.answer("Использование: /grantorder <orderId>")
         return
-    result = await approve_manual_order(require_bot(message), parts[1].strip())
+    # Re-grants are admin-initiated and may wait behind orders customers are paying for.
+    result = await approve_manual_order(require_bot(message), parts[1].strip(), BuildPriority.ADMIN_GRANT, notify=message.answer)
     await message.answer(result["message"])
 
 
+@router.message(Command("status"))
+async def on_status(message: Message) -> None:
+    if message.from_user is None:
+        return
+    lang = await get_user_lang(message.from_user.id)
+    jobs = delivery_queue.jobs_for_user(message.from_user.id)
+    if not jobs:
+        await message.answer(localize_text("Сейчас нет заказов в доставке.", lang), reply_markup=build_main_menu_nav(lang))
+        return
+    text = "\n".join(["Статус доставки:", *(format_delivery_status(job) for job in jobs)])
+    await message.answer(localize_text(text, lang), reply_markup=build_main_menu_nav(lang))
+
+
+@router.message(Command("outbox"))
+async def on_outbox(message: Message, command: CommandObject) -> None:
+    if message.from_user is None or message.from_user.id != CONFIG.admin_telegram_id:
+        return
+    args = (command.args or "").split()
+    if args[:1] == ["retry"]:
+        if len(args) != 2 or not args[1].isdigit():
+            await message.answer("Использование: /outbox retry <id>")
+            return
+        requeued = await DB.requeue_outbox(int(args[1]))
+        await message.answer(f"Outbox #{args[1]} снова в очереди." if requeued else f"Outbox #{args[1]} не найден среди неудачных.")
+        return
+    summary = await DB.outbox_summary()
+    counts = summary["counts"]
+    lines = [f"<b>Outbox</b>: pending={counts.get('pending', 0)} done={counts.get('done', 0)} dead={counts.get('dead', 0)}"]
+    lines.extend(f"#{item['id']} {item['kind']} attempts={item['attempts']}: {escape(item['error'] or '—')}" for item in summary["dead"])
+    await message.answer("\n".join(lines))
+
+
+@router.message(Command("builders"))
+async def on_builders(message: Message) -> None:
+    if message.from_user is None or message.from_user.id != CONFIG.admin_telegram_id:
+        return
+    lines = [
+        f"<b>Builder workers: {builder_pool.size}</b>",
+        f"queued={build_scheduler.queued} avg_build={build_scheduler.average_build_seconds():.0f}s",
+    ]
+    for stats in builder_pool.stats():
+        rss = f"{stats.rss_bytes // (1024 * 1024)} MB" if stats.rss_bytes is not None else "—"
+        lines.append(
+            f"#{stats.slot} pid={stats.pid or '—'} busy={stats.in_flight} "
+            f"ok={stats.jobs_completed} failed={stats.jobs_failed} timed_out={stats.jobs_timed_out} "
+            f"restarts={stats.restarts} recycled={stats.recycled} rss={rss}"
+        )
+    summary = builder_pool.metrics.stage_summary()
+    if summary:
+        lines.append("stages (mean / p95):")
+        lines.extend(f"{item.stage} {item.mean_seconds:.1f}s / {item.p95_seconds:.1f}s (n={item.samples})" for item in summary)
+    peaks = [build.peak_rss_bytes for build in builder_pool.metrics.recent() if build.peak_rss_bytes is not None]
+    if peaks:
+        lines.append(f"peak build rss={max(peaks) // (1024 * 1024)} MB")
+    await message.answer("\n".join(lines))
+
+
 @router.message(Command("addbalance"))
 async def on_addbalance(message: Message) -> None:
     if message.from_user is None or message.from_user.id != CONFIG.admin_telegram_id:
@@ -1975,16 +2498,16 @@ async def on_any_message(message: Message) -> None:
     user_id = message.from_user.id
     session = await get_session(user_id)
 
-    pending = session.get("pendingManualPayment")
-    if isinstance(pending, dict):
+    pending = session.pending_manual_payment
+    if pending is not None:
         text = (message.text or "").strip()
         has_photo = bool(message.photo)
         has_document = message.document is not None
 
         if text.lower() == "/cancel":
-            session.pop("pendingManualPayment", None)
+            session.pending_manual_payment = None
             await save_session(user_id, session)
-            await DB.log_action(user_id, "manual_payment_proof_cancelled", str(pending.get("orderId", "")))
+            await DB.log_action(user_id, "manual_payment_proof_cancelled", pending.order_id)
             await answer_user(message, "Запрос на ручную оплату отменён.", reply_markup=MAIN_MENU_NAV)
             return
 
@@ -1992,15 +2515,15 @@ async def on_any_message(message: Message) -> None:
             await answer_user(message, "Отправьте TX hash (текст) или скриншот (фото/документ).")
             return
 
-        order_id = str(pending.get("orderId", ""))
+        order_id = pending.order_id
         order = await DB.get_order(order_id)
-        if not order or int(order.get("userId", 0)) != user_id:
-            session.pop("pendingManualPayment", None)
+        if not order or order.user_id != user_id:
+            session.pending_manual_payment = None
             await save_session(user_id, session)
             await answer_user(message, "Заказ не найден. Начните заново из главного меню.", reply_markup=MAIN_MENU_NAV)
             return
         if is_order_cancelled(order):
-            session.pop("pendingManualPayment", None)
+            session.pending_manual_payment = None
             await save_session(user_id, session)
             await answer_user(message, CANCELLED_ORDER_TEXT, reply_markup=build_cancelled_order_keyboard())
             return
@@ -2010,24 +2533,21 @@ async def on_any_message(message: Message) -> None:
 
         await DB.update_order_config(
             order_id,
-            {
-                "manualPayment": {
-                    "provider": "direct_wallet",
-                    "type": pending.get("paymentType", PaymentType.SINGLE),
-                    "amount": pending.get("amount", 0),
-                    "state": "pending_admin_review",
-                    "proofType": proof_type,
-                    "proofText": proof_text or None,
-                    "proofMessageId": message.message_id,
-                    "submittedAt": datetime.now(UTC).isoformat(),
-                }
-            },
+            manual_payment=ManualPayment(
+                type=pending.payment_type,
+                amount=pending.amount,
+                state="pending_admin_review",
+                proof_type=proof_type,
+                proof_text=proof_text or None,
+                proof_message_id=message.message_id,
+                submitted_at=datetime.now(UTC).isoformat(),
+            ),
         )
-        await DB.set_order_status(order_id, f"manual_review_{pending.get('paymentType', 'single')}")
+        review_status = f"manual_review_{pending.payment_type}"
         await DB.log_action(
             user_id,
             "manual_payment_proof_submitted",
-            f"{order_id}:{pending.get('paymentType', 'single')}:${pending.get('amount', 0)}",
+            f"{order_id}:{pending.payment_type}:${pending.amount}",
         )
 
         safe_first_name = escape(message.from_user.first_name or "Без имени")
@@ -2038,33 +2558,31 @@ async def on_any_message(message: Message) -> None:
             f"<b>Заказ:</b> <code>{escape(order_id)}</code>\n"
             f"<b>Пользователь:</b> {safe_first_name} (@{safe_username})\n"
             f"<b>ID пользователя:</b> <code>{user_id}</code>\n"
-            f"<b>Тип:</b> {pending.get('paymentType', 'single')}\n"
-            f"<b>Сумма:</b> ${pending.get('amount', 0)}\n"
+            f"<b>Тип:</b> {pending.payment_type}\n"
+            f"<b>Сумма:</b> ${pending.amount}\n"
             f"<b>Доказательство:</b> {safe_proof}\n\n"
             f"Или используйте /grantorder {escape(order_id)} для ручной выдачи."
         )
 
-        try:
-            await require_bot(message).send_message(
-                CONFIG.admin_telegram_id,
-                admin_message,
-                reply_markup=_inline_keyboard(
-                    [
-                        [InlineKeyboardButton(text="✅ Одобрить", callback_data=f"{Callback.ADMIN_MANUAL_PREFIX}approve_{order_id}")],
-                        [InlineKeyboardButton(text="❌ Отклонить", callback_data=f"{Callback.ADMIN_MANUAL_PREFIX}reject_{order_id}")],
-                    ]
-                ),
-            )
-            await require_bot(message).forward_message(CONFIG.admin_telegram_id, message.chat.id, message.message_id)
-        except Exception:
-            logging.exception("Failed to notify admin about manual payment proof")
+        review_keyboard = _inline_keyboard(
+            [
+                [InlineKeyboardButton(text="✅ Одобрить", callback_data=f"{Callback.ADMIN_MANUAL_PREFIX}approve_{order_id}")],
+                [InlineKeyboardButton(text="❌ Отклонить", callback_data=f"{Callback.ADMIN_MANUAL_PREFIX}reject_{order_id}")],
+            ]
+        )
+        # The admin is told in the same transaction that puts the order under review.
+        await DB.set_order_status(
+            order_id,
+            review_status,
+            outbox=[admin_message_item(admin_message, review_keyboard), admin_forward_item(message.chat.id, message.message_id)],
+        )
 
-        session.pop("pendingManualPayment", None)
+        session.pending_manual_payment = None
         await save_session(user_id, session)
         await answer_user(message, "Подтверждение отправлено админу. После проверки вы получите готовый файл.", reply_markup=MAIN_MENU_NAV)
         return
 
-    wizard = get_wizard(session)
+    wizard = session.wizard
     if wizard:
         if wizard_expired(wizard):
             clear_wizard(session)
@@ -2072,7 +2590,7 @@ async def on_any_message(message: Message) -> None:
             await answer_user(message, "Время ожидания истекло. Начните заказ заново из главного меню.", reply_markup=MAIN_MENU_NAV)
             return
 
-        stage = wizard.get("stage")
+        stage = wizard.stage
         text = (message.text or "").strip()
         if stage == "custom_geo_desc":
             if not text:
@@ -2085,9 +2603,8 @@ async def on_any_message(message: Message) -> None:
                 await answer_user(message, "Запрос на кастомный GEO пустой. Начните заново из меню.", reply_markup=MAIN_MENU_NAV)
                 return
 
-            config = get_session_config(session)
             order_id = f"custom_{user_id}_{int(datetime.now().timestamp() * 1000)}"
-            await DB.create_order(order_id, user_id, str(config.get("game", "railroad")), "custom", {"description": description})
+            await DB.create_order(order_id, user_id, session.config.game or "railroad", "custom", OrderConfig(description=description))
             await DB.set_order_status(order_id, "custom_pending")
             await DB.log_action(user_id, "request_custom_geo", description)
             clear_wizard(session)
@@ -2099,18 +2616,47 @@ async def on_any_message(message: Message) -> None:
             )
             return
 
+        if stage == "bulk_rows":
+            document = message.document
+            if document is not None:
+                if (document.file_size or 0) > BULK_CSV_MAX_BYTES:
+                    await answer_user(message, f"Файл слишком большой, нужен CSV до {BULK_CSV_MAX_BYTES // 1024} КБ.")
+                    return
+                downloaded = await require_bot(message).download(document)
+                text = downloaded.read().decode("utf-8-sig", errors="replace") if downloaded else ""
+            if not text:
+                await answer_user(message, "Отправьте варианты текстом или CSV-файлом.")
+                return
+            parsed = parse_bulk_rows(text, default_balance=get_default_balance_for_game(session.config.game))
+            if parsed.errors:
+                attempts = wizard.attempts + 1
+                if attempts >= 3:
+                    clear_wizard(session)
+                    await save_session(user_id, session)
+                    await answer_user(message, "Список вариантов не принят. Начните заказ заново из главного меню.", reply_markup=MAIN_MENU_NAV)
+                    return
+                set_wizard(session, "bulk_rows", attempts=attempts)
+                await save_session(user_id, session)
+                await answer_user(message, "Исправьте строки и отправьте список заново:\n" + "\n".join(escape(error) for error in parsed.errors[:10]))
+                return
+            config = session.config
+            clear_wizard(session)
+            await save_session(user_id, session)
+            await offer_bulk_order(message, user_id, config, parsed.variants)
+            return
+
         if stage == "cta_url":
             if not text:
                 await answer_user(message, "Отправьте CTA-ссылку текстом.")
                 return
             cta_url = normalize_cta_url(text)
             if cta_url:
-                config = get_session_config(session)
-                config["clickUrl"] = cta_url
+                config = session.config
+                config.click_url = cta_url
                 await DB.log_action(user_id, "set_click_url", cta_url)
                 clear_wizard(session)
                 await save_session(user_id, session)
-                summary = build_order_summary(config)
+                summary = build_order_summary(config.to_dict())
                 await answer_user(message, "✅ <b>CTA-ссылка сохранена</b>")
                 await answer_user(
                     message,
@@ -2124,7 +2670,7 @@ async def on_any_message(message: Message) -> None:
                 )
                 return
 
-            attempts = int(wizard.get("attempts", 0)) + 1
+            attempts = wizard.attempts + 1
             if attempts >= 3:
                 clear_wizard(session)
                 await save_session(user_id, session)
@@ -2138,8 +2684,7 @@ async def on_any_message(message: Message) -> None:
         if stage == "starting_balance":
             parsed_balance = parse_starting_balance(text)
             if parsed_balance is not None:
-                config = get_session_config(session)
-                config["startingBalance"] = parsed_balance
+                session.config.starting_balance = parsed_balance
                 await DB.log_action(user_id, "set_starting_balance", str(parsed_balance))
                 set_wizard(session, "cta_url", attempts=0)
                 await save_session(user_id, session)
@@ -2150,11 +2695,10 @@ async def on_any_message(message: Message) -> None:
                 )
                 return
 
-            attempts = int(wizard.get("attempts", 0)) + 1
+            attempts = wizard.attempts + 1
             if attempts >= 3:
-                config = get_session_config(session)
-                fallback = get_default_balance_for_game(config.get("game"))
-                config["startingBalance"] = fallback
+                fallback = get_default_balance_for_game(session.config.game)
+                session.config.starting_balance = fallback
                 await DB.log_action(user_id, "set_starting_balance_fallback", str(fallback))
                 set_wizard(session, "cta_url", attempts=0)
                 await save_session(user_id, session)
@@ -2183,16 +2727,16 @@ async def on_any_message(message: Message) -> None:
 @router.callback_query()
 async def on_callback_fallback(callback: CallbackQuery) -> None:
     session = await get_session(callback.from_user.id)
-    wizard = get_wizard(session)
-    if wizard and wizard.get("stage") == "custom_geo_desc":
+    wizard = session.wizard
+    if wizard and wizard.stage == "custom_geo_desc":
         lang = await get_user_lang(callback.from_user.id)
         await callback.answer(localize_text("Отправьте описание вашего GEO текстовым сообщением.", lang), show_alert=False)
         return
-    if wizard and wizard.get("stage") == "cta_url":
+    if wizard and wizard.stage == "cta_url":
         lang = await get_user_lang(callback.from_user.id)
         await callback.answer(localize_text("Отправьте CTA-ссылку текстом.", lang), show_alert=False)
         return
-    if wizard and wizard.get("stage") == "starting_balance":
+    if wizard and wizard.stage == "starting_balance":
         lang = await get_user_lang(callback.from_user.id)
         await callback.answer(localize_text("Отправьте стартовый баланс числом.", lang), show_alert=False)
         return
@@ -2232,17 +2776,55 @@ async def on_error(event: Any) -> None:
         await DB.log_action(user_id, "bot_error", f"{update_type}: {error}")
 
 
+async def run_webhook(bot: Bot, dispatcher: Dispatcher) -> None:
+    """Serve updates on CONFIG.port until cancelled.
+
+    Several processes may share one webhook URL behind a balancer, but only one of them may
+    run with BACKGROUND_JOBS=1: the outbox and broadcast loops do not claim their rows, so a
+    second one would deliver paid orders and broadcast messages twice.
+    """
+    secret = CONFIG.webhook_secret or derive_webhook_secret(CONFIG.bot_token)
+    server = WebhookServer(
+        lambda update: dispatcher.feed_raw_update(bot, update),
+        secret=secret,
+        path=CONFIG.webhook_path,
+        concurrency=CONFIG.webhook_concurrency,
+    )
+    await server.start("0.0.0.0", CONFIG.port)
+    try:
+        await bot.set_webhook(
+            f"{CONFIG.webhook_url}{CONFIG.webhook_path}",
+            secret_token=secret,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+        )
+        await dispatcher.emit_startup(bot=bot)
+        # Stop on the same signals start_polling handles, so shutdown drains in-flight updates.
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            with contextlib.suppress(NotImplementedError):
+                loop.add_signal_handler(signum, stop.set)
+        await stop.wait()
+    finally:
+        await server.close()
+        await dispatcher.emit_shutdown(bot=bot)
+        await bot.session.close()
+
+
 async def start() -> None:
     logging.basicConfig(
         level=getattr(logging, CONFIG.log_level.upper(), logging.INFO),
         format="%(asctime)s %(levelname)s %(message)s",
     )
-    await cleanup_temp()
+    await builder_pool.cleanup_temp()
     await DB.ensure_runtime_schema()
+    await asset_registry.load()
     bot = Bot(
         token=CONFIG.bot_token,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
+    if CONFIG.telegram_rate_limit > 0:
+        bot.session.middleware(OutboundLimiter(global_rate=CONFIG.telegram_rate_limit))
     dispatcher = Dispatcher()
     block_banned = BlockBannedMiddleware()
     language_gate = RequireLanguageSelectionMiddleware()
@@ -2251,7 +2833,41 @@ async def start() -> None:
     dispatcher.callback_query.middleware(block_banned)
     dispatcher.callback_query.middleware(language_gate)
     dispatcher.include_router(router)
-    await dispatcher.start_polling(bot, polling_timeout=CONFIG.polling_timeout)
+    for job in (
+        session_store.run_sweeper(CONFIG.session_sweep_interval_seconds),
+        builder_pool.run_health_checks(),
+        # Images without a file_id yet are uploaded to the admin chat, not to the first user who opens them.
+        asset_registry.prewarm(bot, CONFIG.admin_telegram_id),
+    ):
+        task = asyncio.create_task(job)
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+    outbox = OutboxDispatcher(
+        DB,
+        outbox_handlers(bot),
+        lanes={OUTBOX_DELIVERY: OUTBOX_DELIVERY_CONCURRENCY},
+        on_dead_letter=lambda entry, error: report_dead_letter(bot, entry, error),
+    )
+    broadcasts = BroadcastEngine(bot, DB, rate=CONFIG.telegram_rate_limit or GLOBAL_MESSAGES_PER_SECOND)
+    # Neither claims its rows per process, so only the process with BACKGROUND_JOBS=1 runs them.
+    loops = [asyncio.create_task(outbox.run()), asyncio.create_task(broadcasts.run())] if CONFIG.background_jobs else []
+    try:
+        if CONFIG.webhook_url:
+            await run_webhook(bot, dispatcher)
+        else:
+            # getUpdates is refused while a webhook is set, e.g. after switching back from webhook mode.
+            await bot.delete_webhook()
+            await dispatcher.start_polling(bot, polling_timeout=CONFIG.polling_timeout)
+    finally:
+        # Pending entries stay in the table; the next start resumes them.
+        # A broadcast cut off here resumes from its pending recipients on the next start.
+        for task in loops:
+            task.cancel()
+        await asyncio.gather(*loops, return_exceptions=True)
+        await outbox.close()
+        await delivery_queue.close()
+        await builder_pool.close()
+        archive_pool.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,498 @@
+"""Typed session and order-config models with a compact JSON codec.
+
+Field names on the wire stay camelCase so existing session files, ``Order.configJson``
+rows and the Node builder keep reading the same payloads. Keys the models do not
+know about are carried in ``extra`` and written back untouched.
+
+A :class:`Session` is decoded lazily: ``decode_session`` only parses the JSON, and
+each part (config, wizard, pending payment) is turned into its model the first time it
+is read. Parts a handler never touches are encoded back exactly as they were read, so
+a session load and save costs about what the plain ``json`` round trip did.
+
+The models do not make decoding faster. Building an :class:`OrderConfig` is
+``json.loads`` plus the conversion, so loading an order config or running a wizard step
+that rewrites the config costs more CPU than the dict path. What the models buy is
+memory (a decoded config is about half the size of its dict) and validation in one place.
+``python -m bot_py.models_bench`` compares the two.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from typing import Any
+
+from .constants import PaymentType
+
+_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+_DECODER = json.JSONDecoder()
+
+PAYMENT_TYPES = frozenset({PaymentType.SINGLE, PaymentType.SUB})
+
+
+def _as_int(value: Any, default: int | None = None) -> int | None:
+    if type(value) is int:
+        return value
+    if value is None or isinstance(value, bool):
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _as_str(value: Any) -> str | None:
+    return value if isinstance(value, str) else None
+
+
+def _extra(raw: dict[str, Any], known: frozenset[str]) -> dict[str, Any]:
+    """The keys of ``raw`` a model does not know, to be written back untouched."""
+    if raw.keys() <= known:
+        return {}
+    return {key: value for key, value in raw.items() if key not in known}
+
+
+_CRYPTO_PAYMENT_KEYS = frozenset({"provider", "invoiceId", "payUrl", "type", "amount", "discount", "createdAt"})
+
+
+@dataclass(slots=True)
+class CryptoPayment:
+    invoice_id: int
+    pay_url: str
+    type: str
+    amount: int
+    discount: int
+    created_at: str | None = None
+    provider: str = "crypto_pay"
+    extra: dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, raw: Any) -> CryptoPayment | None:
+        if not isinstance(raw, dict) or raw.get("provider") != "crypto_pay":
+            return None
+        invoice_id = _as_int(raw.get("invoiceId"))
+        amount = _as_int(raw.get("amount"))
+        discount = _as_int(raw.get("discount"))
+        payment_type = raw.get("type")
+        if invoice_id is None or amount is None or discount is None or payment_type not in PAYMENT_TYPES:
+            return None
+        if invoice_id <= 0 or amount <= 0 or discount < 0:
+            return None
+        return cls(
+            invoice_id,
+            _as_str(raw.get("payUrl")) or "",
+            payment_type,
+            amount,
+            discount,
+            _as_str(raw.get("createdAt")),
+            "crypto_pay",
+            _extra(raw, _CRYPTO_PAYMENT_KEYS),
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        out: dict[str, Any] = {
+            **self.extra,
+            "provider": self.provider,
+            "invoiceId": self.invoice_id,
+            "payUrl": self.pay_url,
+            "type": self.type,
+            "amount": self.amount,
+            "discount": self.discount,
+        }
+        if self.created_at is not None:
+            out["createdAt"] = self.created_at
+        return out
+
+
+_MANUAL_PAYMENT_KEYS = frozenset(
+    {
+        "type",
+        "amount",
+        "discount",
+        "state",
+        "provider",
+        "proofType",
+        "proofText",
+        "proofMessageId",
+        "updatedAt",
+        "submittedAt",
+        "approvedAt",
+        "rejectedAt",
+    }
+)
+
+
+@dataclass(slots=True)
+class ManualPayment:
+    type: str = PaymentType.SINGLE
+    amount: int = 0
+    discount: int = 0
+    state: str | None = None
+    provider: str = "direct_wallet"
+    proof_type: str | None = None
+    proof_text: str | None = None
+    proof_message_id: int | None = None
+    updated_at: str | None = None
+    submitted_at: str | None = None
+    approved_at: str | None = None
+    rejected_at: str | None = None
+    extra: dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, raw: Any) -> ManualPayment | None:
+        if not isinstance(raw, dict):
+            return None
+        payment_type = raw.get("type")
+        return cls(
+            payment_type if payment_type in PAYMENT_TYPES else PaymentType.SINGLE,
+            max(0, _as_int(raw.get("amount"), 0) or 0),
+            max(0, _as_int(raw.get("discount"), 0) or 0),
+            _as_str(raw.get("state")),
+            _as_str(raw.get("provider")) or "direct_wallet",
+            _as_str(raw.get("proofType")),
+            _as_str(raw.get("proofText")),
+            _as_int(raw.get("proofMessageId")),
+            _as_str(raw.get("updatedAt")),
+            _as_str(raw.get("submittedAt")),
+            _as_str(raw.get("approvedAt")),
+            _as_str(raw.get("rejectedAt")),
+            _extra(raw, _MANUAL_PAYMENT_KEYS),
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        out: dict[str, Any] = {
+            **self.extra,
+            "provider": self.provider,
+            "type": self.type,
+            "amount": self.amount,
+            "discount": self.discount,
+        }
+        if self.state is not None:
+            out["state"] = self.state
+        if self.proof_type is not None:
+            out["proofType"] = self.proof_type
+        if self.proof_text is not None:
+            out["proofText"] = self.proof_text
+        if self.proof_message_id is not None:
+            out["proofMessageId"] = self.proof_message_id
+        if self.updated_at is not None:
+            out["updatedAt"] = self.updated_at
+        if self.submitted_at is not None:
+            out["submittedAt"] = self.submitted_at
+        if self.approved_at is not None:
+            out["approvedAt"] = self.approved_at
+        if self.rejected_at is not None:
+            out["rejectedAt"] = self.rejected_at
+        return out
+
+
+@dataclass(slots=True)
+class OrderVariant:
+    """One GEO/CTA/balance combination of a bulk order."""
+
+    geo_id: str
+    click_url: str
+    starting_balance: int
+
+    @classmethod
+    def from_dict(cls, raw: Any) -> OrderVariant | None:
+        if not isinstance(raw, dict):
+            return None
+        geo_id = _as_str(raw.get("geoId"))
+        click_url = _as_str(raw.get("clickUrl"))
+        starting_balance = _as_int(raw.get("startingBalance"))
+        if not geo_id or not click_url or starting_balance is None:
+            return None
+        return cls(geo_id=geo_id, click_url=click_url, starting_balance=starting_balance)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"geoId": self.geo_id, "clickUrl": self.click_url, "startingBalance": self.starting_balance}
+
+
+_ORDER_CONFIG_KEYS = frozenset(
+    {
+        "game",
+        "themeId",
+        "language",
+        "currency",
+        "geoId",
+        "startingBalance",
+        "clickUrl",
+        "isWatermarked",
+        "description",
+        "payment",
+        "manualPayment",
+        "variants",
+    }
+)
+
+
+@dataclass(slots=True)
+class OrderConfig:
+    game: str | None = None
+    theme_id: str | None = None
+    language: str | None = None
+    currency: str | None = None
+    geo_id: str | None = None
+    starting_balance: int | None = None
+    click_url: str | None = None
+    is_watermarked: bool | None = None
+    description: str | None = None
+    payment: CryptoPayment | None = None
+    manual_payment: ManualPayment | None = None
+    variants: list[OrderVariant] | None = None
+    extra: dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, raw: Any) -> OrderConfig:
+        if not isinstance(raw, dict) or not raw:
+            return cls()
+        # Read straight off the dict: this runs on every order row and wizard step.
+        get = raw.get
+        extra = _extra(raw, _ORDER_CONFIG_KEYS)
+        payment = None
+        if "payment" in raw:
+            payment = CryptoPayment.from_dict(raw["payment"])
+            if payment is None:
+                # Keep malformed or foreign payment blocks verbatim instead of dropping them on rewrite.
+                extra["payment"] = raw["payment"]
+        game, theme_id, language, currency = get("game"), get("themeId"), get("language"), get("currency")
+        geo_id, click_url, description = get("geoId"), get("clickUrl"), get("description")
+        starting_balance, watermarked, variants = get("startingBalance"), get("isWatermarked"), get("variants")
+        return cls(
+            game if isinstance(game, str) else None,
+            theme_id if isinstance(theme_id, str) else None,
+            language if isinstance(language, str) else None,
+            currency if isinstance(currency, str) else None,
+            geo_id if isinstance(geo_id, str) else None,
+            starting_balance if type(starting_balance) is int else _as_int(starting_balance),
+            click_url if isinstance(click_url, str) else None,
+            watermarked if isinstance(watermarked, bool) else None,
+            description if isinstance(description, str) else None,
+            payment,
+            ManualPayment.from_dict(raw["manualPayment"]) if "manualPayment" in raw else None,
+            [variant for item in variants if (variant := OrderVariant.from_dict(item))] if isinstance(variants, list) else None,
+            extra,
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        out = dict(self.extra)
+        if self.game is not None:
+            out["game"] = self.game
+        if self.theme_id is not None:
+            out["themeId"] = self.theme_id
+        if self.language is not None:
+            out["language"] = self.language
+        if self.currency is not None:
+            out["currency"] = self.currency
+        if self.geo_id is not None:
+            out["geoId"] = self.geo_id
+        if self.starting_balance is not None:
+            out["startingBalance"] = self.starting_balance
+        if self.click_url is not None:
+            out["clickUrl"] = self.click_url
+        if self.is_watermarked is not None:
+            out["isWatermarked"] = self.is_watermarked
+        if self.description is not None:
+            out["description"] = self.description
+        if self.payment is not None:
+            out["payment"] = self.payment.to_dict()
+        if self.manual_payment is not None:
+            out["manualPayment"] = self.manual_payment.to_dict()
+        if self.variants is not None:
+            out["variants"] = [variant.to_dict() for variant in self.variants]
+        return out
+
+    def is_empty(self) -> bool:
+        return not self.to_dict()
+
+
+_WIZARD_KEYS = frozenset({"stage", "updatedAt", "attempts"})
+
+
+@dataclass(slots=True)
+class WizardState:
+    stage: str
+    updated_at: int = 0
+    attempts: int = 0
+    extra: dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, raw: Any) -> WizardState | None:
+        if not isinstance(raw, dict) or not isinstance(raw.get("stage"), str):
+            return None
+        return cls(raw["stage"], _as_int(raw.get("updatedAt"), 0) or 0, _as_int(raw.get("attempts"), 0) or 0, _extra(raw, _WIZARD_KEYS))
+
+    def to_dict(self) -> dict[str, Any]:
+        return {**self.extra, "stage": self.stage, "updatedAt": self.updated_at, "attempts": self.attempts}
+
+
+_PENDING_MANUAL_PAYMENT_KEYS = frozenset({"orderId", "paymentType", "amount", "createdAt"})
+
+
+@dataclass(slots=True)
+class PendingManualPayment:
+    order_id: str
+    payment_type: str = PaymentType.SINGLE
+    amount: int = 0
+    created_at: int | None = None
+    extra: dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, raw: Any) -> PendingManualPayment | None:
+        if not isinstance(raw, dict):
+            return None
+        payment_type = raw.get("paymentType")
+        return cls(
+            str(raw.get("orderId", "")),
+            payment_type if payment_type in PAYMENT_TYPES else PaymentType.SINGLE,
+            _as_int(raw.get("amount"), 0) or 0,
+            _as_int(raw.get("createdAt")),
+            _extra(raw, _PENDING_MANUAL_PAYMENT_KEYS),
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        out: dict[str, Any] = {**self.extra, "orderId": self.order_id, "paymentType": self.payment_type, "amount": self.amount}
+        if self.created_at is not None:
+            out["createdAt"] = self.created_at
+        return out
+
+
+_SESSION_KEYS = frozenset({"config", "wizard", "previewInProgress", "pendingManualPayment"})
+# Marks a session part that has not been decoded from the stored payload yet.
+_UNREAD: Any = object()
+
+
+class Session:
+    """A user's bot state. Parts are decoded on first access; the rest stays as read."""
+
+    __slots__ = ("_raw", "_config", "_wizard", "_pending_manual_payment")
+
+    def __init__(
+        self,
+        config: OrderConfig | None = None,
+        wizard: WizardState | None = None,
+        preview_in_progress: bool = False,
+        pending_manual_payment: PendingManualPayment | None = None,
+        extra: dict[str, Any] | None = None,
+    ) -> None:
+        self._raw: dict[str, Any] = dict(extra) if extra else {}
+        if preview_in_progress:
+            self._raw["previewInProgress"] = True
+        self._config = config if config is not None else OrderConfig()
+        self._wizard = wizard
+        self._pending_manual_payment = pending_manual_payment
+
+    @classmethod
+    def from_dict(cls, raw: Any) -> Session:
+        """Wrap a decoded payload without converting it; ``raw`` is owned by the session from here on."""
+        session = cls.__new__(cls)
+        session._raw = raw if isinstance(raw, dict) else {}
+        session._config = session._wizard = session._pending_manual_payment = _UNREAD
+        return session
+
+    @property
+    def config(self) -> OrderConfig:
+        if self._config is _UNREAD:
+            self._config = OrderConfig.from_dict(self._raw.get("config"))
+        return self._config
+
+    @config.setter
+    def config(self, value: OrderConfig) -> None:
+        self._config = value
+
+    @property
+    def wizard(self) -> WizardState | None:
+        if self._wizard is _UNREAD:
+            self._wizard = WizardState.from_dict(self._raw.get("wizard"))
+        return self._wizard
+
+    @wizard.setter
+    def wizard(self, value: WizardState | None) -> None:
+        self._wizard = value
+
+    @property
+    def pending_manual_payment(self) -> PendingManualPayment | None:
+        if self._pending_manual_payment is _UNREAD:
+            self._pending_manual_payment = PendingManualPayment.from_dict(self._raw.get("pendingManualPayment"))
+        return self._pending_manual_payment
+
+    @pending_manual_payment.setter
+    def pending_manual_payment(self, value: PendingManualPayment | None) -> None:
+        self._pending_manual_payment = value
+
+    @property
+    def preview_in_progress(self) -> bool:
+        return self._raw.get("previewInProgress") is True
+
+    @preview_in_progress.setter
+    def preview_in_progress(self, value: bool) -> None:
+        if value:
+            self._raw["previewInProgress"] = True
+        else:
+            self._raw.pop("previewInProgress", None)
+
+    @property
+    def extra(self) -> dict[str, Any]:
+        return _extra(self._raw, _SESSION_KEYS)
+
+    def to_dict(self) -> dict[str, Any]:
+        out = dict(self._raw)
+        if self._config is not _UNREAD:
+            out["config"] = self._config.to_dict()
+        elif not isinstance(out.get("config"), dict):
+            out["config"] = {}
+        if self._wizard is None:
+            out.pop("wizard", None)
+        elif self._wizard is not _UNREAD:
+            out["wizard"] = self._wizard.to_dict()
+        if self._pending_manual_payment is None:
+            out.pop("pendingManualPayment", None)
+        elif self._pending_manual_payment is not _UNREAD:
+            out["pendingManualPayment"] = self._pending_manual_payment.to_dict()
+        return out
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Session):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f"Session({self.to_dict()!r})"
+
+
+@dataclass(slots=True)
+class OrderRecord:
+    order_id: str
+    user_id: int
+    game_type: str
+    theme_id: str
+    config: OrderConfig
+    status: str
+    amount: int
+    discount_applied: int
+    created_at: str
+
+    @property
+    def is_paid(self) -> bool:
+        return self.status.startswith("paid")
+
+
+def encode(model: OrderConfig | Session) -> str:
+    return _ENCODER.encode(model.to_dict())
+
+
+def decode_order_config(raw: str | None) -> OrderConfig:
+    if not raw:
+        return OrderConfig()
+    try:
+        return OrderConfig.from_dict(_DECODER.decode(raw))
+    except ValueError:
+        return OrderConfig()
+
+
+def decode_session(raw: str | bytes) -> Session:
+    try:
+        return Session.from_dict(_DECODER.decode(raw.decode("utf-8") if isinstance(raw, bytes) else raw))
+    except ValueError:
+        return Session()
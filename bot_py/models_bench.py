@@ -0,0 +1,133 @@
+"""Codec benchmark: typed session/order models against the plain dict round trip they replaced.
+
+Times each case over a fixed set of representative payloads (a fresh session, one in the
+middle of the order wizard, one waiting on a payment) and reports microseconds per payload
+for both the dict path and the model path, plus the memory held by decoded order configs.
+
+Run with ``python -m bot_py.models_bench`` (``--help`` for options).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import timeit
+import tracemalloc
+from collections.abc import Callable, Sequence
+from typing import Any
+
+from .models import decode_order_config, decode_session, encode
+
+PAYLOADS: tuple[dict[str, Any], ...] = (
+    {"config": {}},
+    {
+        "config": {"game": "railroad", "themeId": "chicken_farm", "language": "en", "currency": "$", "geoId": "en_usd", "startingBalance": 1000},
+        "wizard": {"stage": "cta_url", "updatedAt": 1700000000000, "attempts": 1},
+    },
+    {
+        "config": {
+            "game": "matching",
+            "themeId": "fruits",
+            "geoId": "pt_brl",
+            "startingBalance": 5000,
+            "clickUrl": "https://example.com/landing?utm_source=playable",
+            "isWatermarked": False,
+            "payment": {"provider": "crypto_pay", "invoiceId": 42, "payUrl": "https://pay.example/42", "type": "single", "amount": 349, "discount": 0},
+            "manualPayment": {"provider": "direct_wallet", "type": "sub", "amount": 100, "discount": 10, "state": "submitted", "proofType": "text"},
+        },
+        "pendingManualPayment": {"orderId": "ord_1", "paymentType": "sub", "amount": 100, "createdAt": 1700000000000},
+    },
+)
+
+
+def _dict_load(raw: str) -> dict[str, Any]:
+    parsed = json.loads(raw)
+    if not isinstance(parsed, dict):
+        parsed = {}
+    if not isinstance(parsed.get("config"), dict):
+        parsed["config"] = {}
+    return parsed
+
+
+def _dict_save(session: dict[str, Any]) -> str:
+    return json.dumps(session, ensure_ascii=False, separators=(",", ":"))
+
+
+def _dict_step(raw: str) -> str:
+    session = _dict_load(raw)
+    session["config"]["currency"] = session["config"].get("currency") or "$"
+    session.pop("wizard", None)
+    return _dict_save(session)
+
+
+def _model_step(raw: str) -> str:
+    session = decode_session(raw)
+    session.config.currency = session.config.currency or "$"
+    session.wizard = None
+    return encode(session)
+
+
+def _dict_config(raw: str) -> dict[str, Any]:
+    config = json.loads(raw)
+    return config if isinstance(config, dict) else {}
+
+
+def cases() -> list[tuple[str, Callable[[str], object], Callable[[str], object], bool]]:
+    """(name, dict path, model path, runs on configs rather than whole sessions)."""
+    return [
+        ("session load", _dict_load, decode_session, False),
+        ("session save", lambda raw: _dict_save(_dict_load(raw)), lambda raw: encode(decode_session(raw)), False),
+        ("wizard step", _dict_step, _model_step, False),
+        ("order config load", _dict_config, decode_order_config, True),
+    ]
+
+
+def time_case(path: Callable[[str], object], payloads: Sequence[str], number: int) -> float:
+    """Best-of-five microseconds per payload."""
+
+    def run() -> None:
+        for raw in payloads:
+            path(raw)
+
+    return min(timeit.repeat(run, number=number, repeat=5)) / (number * len(payloads)) * 1e6
+
+
+def held_bytes(build: Callable[[], object], count: int = 1000) -> float:
+    """Bytes per object kept alive by ``count`` results of ``build``."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = [build() for _ in range(count)]
+        held = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del kept
+    return held / count
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bot_py.models_bench", description="Compare the model codec with the plain dict round trip.")
+    parser.add_argument("--number", type=int, default=20_000, help="passes over the payload set per timing (default: 20000)")
+    args = parser.parse_args(argv)
+    if args.number < 1:
+        parser.error("--number must be at least 1")
+
+    sessions = [json.dumps(payload, separators=(",", ":")) for payload in PAYLOADS]
+    configs = [json.dumps(payload["config"], separators=(",", ":")) for payload in PAYLOADS]
+    print(f"{'case':<20}{'dict µs':>10}{'model µs':>10}{'ratio':>8}")
+    for name, dict_path, model_path, on_configs in cases():
+        payloads = configs if on_configs else sessions
+        before = time_case(dict_path, payloads, args.number)
+        after = time_case(model_path, payloads, args.number)
+        print(f"{name:<20}{before:>10.2f}{after:>10.2f}{after / before:>8.2f}")
+
+    config = configs[1]
+    before = held_bytes(lambda: json.loads(config))
+    after = held_bytes(lambda: decode_order_config(config))
+    print(f"{'order config bytes':<20}{before:>10.0f}{after:>10.0f}{after / before:>8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""Durable outbox for side effects of payment state changes.
+
+Deliveries and admin notifications are written to the ``outbox`` table in the same
+transaction as the order change they follow (see :class:`bot_py.db.DB`), and
+:class:`OutboxDispatcher` carries them out: every due row goes to the handler for its
+kind, a failed attempt is retried with exponential backoff, and a row that keeps failing
+or can never succeed is dead-lettered for the admin to look at. Kinds can get a
+concurrency lane of their own, so entries that take minutes (a delivery waits for its
+build) never hold the slots quick ones need. Nothing lives only in
+memory between attempts, so after a restart the dispatcher resumes with whatever the
+table still lists as pending.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable, Collection, Mapping
+from dataclasses import dataclass, field
+from typing import Any, Protocol
+
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BACKOFF_BASE_SECONDS = 5.0
+OUTBOX_BACKOFF_MAX_SECONDS = 15 * 60.0
+OUTBOX_POLL_SECONDS = 2.0
+OUTBOX_CONCURRENCY = 8
+
+
+@dataclass(slots=True, frozen=True)
+class OutboxItem:
+    """A side effect to record; a row with the same ``dedupe_key`` is only ever written once."""
+
+    kind: str
+    payload: dict[str, Any] = field(default_factory=dict)
+    dedupe_key: str | None = None
+    delay_seconds: float = 0.0
+
+
+@dataclass(slots=True, frozen=True)
+class OutboxEntry:
+    id: int
+    kind: str
+    payload: dict[str, Any]
+    attempts: int
+
+
+class OutboxRejected(Exception):
+    """Raised by a handler for an entry that can never succeed; it is dead-lettered at once."""
+
+
+class OutboxStore(Protocol):
+    async def due_outbox(
+        self,
+        now: float,
+        limit: int,
+        exclude: Collection[int],
+        kinds: Collection[str] | None = None,
+        skip_kinds: Collection[str] = (),
+    ) -> list[OutboxEntry]: ...
+
+    async def complete_outbox(self, entry_id: int) -> None: ...
+
+    async def retry_outbox(self, entry_id: int, attempts: int, next_attempt_at: float, error: str) -> None: ...
+
+    async def dead_letter_outbox(self, entry_id: int, attempts: int, error: str) -> None: ...
+
+
+OutboxHandler = Callable[[OutboxEntry], Awaitable[None]]
+
+
+def backoff_seconds(attempts: int, base: float = OUTBOX_BACKOFF_BASE_SECONDS, cap: float = OUTBOX_BACKOFF_MAX_SECONDS) -> float:
+    """Delay before the next try after ``attempts`` failed ones: base, 2x base, 4x base, ... up to ``cap``."""
+    return min(cap, base * 2 ** max(0, attempts - 1))
+
+
+class OutboxDispatcher:
+    """Polls ``store`` for due entries and runs up to ``concurrency`` of them at a time.
+
+    ``lanes`` gives a kind a limit of its own; entries of the kinds not listed share
+    ``concurrency``.
+    """
+
+    def __init__(
+        self,
+        store: OutboxStore,
+        handlers: Mapping[str, OutboxHandler],
+        *,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        concurrency: int = OUTBOX_CONCURRENCY,
+        lanes: Mapping[str, int] | None = None,
+        poll_seconds: float = OUTBOX_POLL_SECONDS,
+        on_dead_letter: Callable[[OutboxEntry, str], Awaitable[None]] | None = None,
+    ) -> None:
+        self._store = store
+        self._handlers = dict(handlers)
+        self._max_attempts = max(1, max_attempts)
+        self._concurrency = max(1, concurrency)
+        self._lanes = {kind: max(1, limit) for kind, limit in (lanes or {}).items()}
+        self._poll_seconds = poll_seconds
+        self._on_dead_letter = on_dead_letter
+        self._running: dict[int, asyncio.Task[None]] = {}
+        # entry id -> its lane: the kind for kinds with a lane of their own, else None.
+        self._running_lanes: dict[int, str | None] = {}
+        self._wakeup = asyncio.Event()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._running)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.drain()
+            except Exception:
+                logging.exception("[Outbox] Could not read due entries")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._poll_seconds)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def drain(self) -> int:
+        """Start every due entry there is a free slot for; returns how many were started."""
+        now = time.time()
+        started = 0
+        for lane, limit in [*self._lanes.items(), (None, self._concurrency)]:
+            free = limit - sum(1 for running in self._running_lanes.values() if running == lane)
+            if free <= 0:
+                continue
+            if lane is None:
+                entries = await self._store.due_outbox(now, free, frozenset(self._running), skip_kinds=frozenset(self._lanes))
+            else:
+                entries = await self._store.due_outbox(now, free, frozenset(self._running), kinds=(lane,))
+            for entry in entries:
+                task = asyncio.create_task(self._run_entry(entry))
+                self._running[entry.id] = task
+                self._running_lanes[entry.id] = lane
+                task.add_done_callback(lambda _, entry_id=entry.id: self._finished(entry_id))
+            started += len(entries)
+        return started
+
+    def _finished(self, entry_id: int) -> None:
+        self._running.pop(entry_id, None)
+        self._running_lanes.pop(entry_id, None)
+        # A slot is free again; entries that were left waiting for one may be due.
+        self._wakeup.set()
+
+    async def _run_entry(self, entry: OutboxEntry) -> None:
+        try:
+            await self._attempt(entry)
+        except Exception:
+            # Recording the outcome failed; the entry is still pending and is tried again.
+            logging.exception("[Outbox] Could not record the outcome of %s #%s", entry.kind, entry.id)
+
+    async def _attempt(self, entry: OutboxEntry) -> None:
+        attempts = entry.attempts + 1
+        handler = self._handlers.get(entry.kind)
+        try:
+            if handler is None:
+                raise OutboxRejected(f"no handler for {entry.kind!r}")
+            await handler(entry)
+        except OutboxRejected as exc:
+            await self._dead_letter(entry, attempts, str(exc))
+            return
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+            if attempts >= self._max_attempts:
+                await self._dead_letter(entry, attempts, error)
+                return
+            delay = backoff_seconds(attempts)
+            logging.warning("[Outbox] %s #%s failed (attempt %s), retrying in %.0fs: %s", entry.kind, entry.id, attempts, delay, error)
+            await self._store.retry_outbox(entry.id, attempts, time.time() + delay, error)
+            return
+        await self._store.complete_outbox(entry.id)
+
+    async def _dead_letter(self, entry: OutboxEntry, attempts: int, error: str) -> None:
+        logging.error("[Outbox] %s #%s dead-lettered after %s attempt(s): %s", entry.kind, entry.id, attempts, error)
+        await self._store.dead_letter_outbox(entry.id, attempts, error)
+        if self._on_dead_letter is not None:
+            try:
+                await self._on_dead_letter(entry, error)
+            except Exception:
+                logging.exception("[Outbox] Dead-letter hook failed for #%s", entry.id)
+
+    async def close(self) -> None:
+        """Stop running attempts; their entries stay pending and are picked up after a restart."""
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._running.clear()
+        self._running_lanes.clear()
@@ -0,0 +1,262 @@
+"""Incremental, parallel rebuild of the prebuilt playable library.
+
+Every (game, GEO, kind) pair has an artifact at ``library/<game_id>/<geo>_<kind>.html``
+that final orders without a custom CTA are served from directly. An artifact is rebuilt
+only when it is missing or the hash recorded for it in ``library/manifest.json`` no
+longer matches its inputs: the template directory contents (or its optimized copy, see
+:mod:`bot_py.asset_optimizer`), the Node builder and the build config. Stale artifacts build in parallel on a :class:`BuilderPool`.
+Final artifacts also get their ZIP delivery variant (see :mod:`bot_py.delivery_archive`)
+written next to them, so zipped delivery never compresses a library file on demand, and
+the assets previews inline are encoded once into the builder's shared inline store before
+the builds start.
+
+Run with ``python -m bot_py.prebuild_library`` (``--help`` for options).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from .artifact_cache import content_hash
+from .asset_optimizer import OPTIMIZED_TEMPLATES_SUBDIR, fresh_optimized_dir
+from .builder_bridge import ROOT_DIR, BuilderPool
+from .constants import GAMES, GEOS
+from .delivery_archive import archive_path_for, is_fresh, write_archive
+from .models import OrderConfig
+
+MANIFEST_VERSION = 1
+LIBRARY_GAMES = ("RAILROAD", "OLYMPUS", "DRAG", "MATCH3")
+LIBRARY_KINDS = ("preview", "final")
+LIBRARY_STARTING_BALANCE = 1000
+# Cold template builds install dependencies first; give them far longer than an order build.
+PREBUILD_DEADLINE_SECONDS = 900.0
+
+
+@dataclass(slots=True, frozen=True)
+class LibraryTarget:
+    game_id: str
+    game_key: str
+    theme: str
+    template_dir: str
+    geo_id: str
+    language: str
+    currency: str
+    kind: str
+
+    @property
+    def relative_path(self) -> str:
+        return f"{self.game_id}/{self.geo_id}_{self.kind}.html"
+
+    @property
+    def job_id(self) -> str:
+        return f"lib_{self.game_id}_{self.geo_id}_{self.kind}"
+
+    def config(self) -> OrderConfig:
+        return OrderConfig(
+            game=self.game_key,
+            theme_id=self.theme,
+            language=self.language,
+            currency=self.currency,
+            geo_id=self.geo_id,
+            starting_balance=LIBRARY_STARTING_BALANCE,
+            is_watermarked=self.kind == "preview",
+        )
+
+
+@dataclass(slots=True)
+class PrebuildReport:
+    built: list[str] = field(default_factory=list)
+    fresh: list[str] = field(default_factory=list)
+    failed: list[str] = field(default_factory=list)
+
+
+def library_targets(games: Iterable[str] | None = None, geos: Iterable[str] | None = None) -> list[LibraryTarget]:
+    """Targets for the given game ids and GEO ids; everything orderable by default."""
+    wanted_games = set(games) if games is not None else None
+    wanted_geos = set(geos) if geos is not None else None
+    targets: list[LibraryTarget] = []
+    for name in LIBRARY_GAMES:
+        game = GAMES[name]
+        if wanted_games is not None and game["ID"] not in wanted_games:
+            continue
+        for geo in GEOS:
+            if wanted_geos is not None and geo["id"] not in wanted_geos:
+                continue
+            for kind in LIBRARY_KINDS:
+                targets.append(
+                    LibraryTarget(
+                        game_id=game["ID"],
+                        game_key=game["GAME_KEY"],
+                        theme=game["THEME"],
+                        template_dir=game["TEMPLATE_DIR"],
+                        geo_id=geo["id"],
+                        language=geo["lang"],
+                        currency=geo["currency"],
+                        kind=kind,
+                    )
+                )
+    return targets
+
+
+def target_hash(target: LibraryTarget, template_hash: str, builder_hash: str) -> str:
+    inputs = {
+        "template": template_hash,
+        "builder": builder_hash,
+        "config": target.config().to_dict(),
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def load_manifest(path: Path) -> dict[str, dict[str, Any]]:
+    try:
+        raw = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(raw, dict) or raw.get("version") != MANIFEST_VERSION or not isinstance(raw.get("artifacts"), dict):
+        return {}
+    return {key: value for key, value in raw["artifacts"].items() if isinstance(value, dict)}
+
+
+def write_manifest(path: Path, artifacts: dict[str, dict[str, Any]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_suffix(".tmp")
+    body = {"version": MANIFEST_VERSION, "artifacts": dict(sorted(artifacts.items()))}
+    temp_path.write_text(json.dumps(body, indent=2) + "\n", encoding="utf-8")
+    os.replace(temp_path, path)
+
+
+def _install(produced: Path, target: Path) -> int:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = target.with_name(f".{target.name}.tmp")
+    shutil.copyfile(produced, temp_path)
+    os.replace(temp_path, target)
+    produced.unlink(missing_ok=True)
+    return target.stat().st_size
+
+
+def _refresh_archive(html_path: Path) -> None:
+    archive_path = archive_path_for(html_path)
+    if not is_fresh(html_path, archive_path):
+        write_archive(html_path, archive_path)
+
+
+async def prebuild(
+    pool: BuilderPool,
+    targets: Sequence[LibraryTarget],
+    *,
+    root: Path = ROOT_DIR,
+    force: bool = False,
+    dry_run: bool = False,
+) -> PrebuildReport:
+    library_dir = root / "library"
+    manifest_path = library_dir / "manifest.json"
+    manifest = await asyncio.to_thread(load_manifest, manifest_path)
+    builder_hash = await asyncio.to_thread(content_hash, root / "dist" / "builder.js")
+    template_hashes: dict[str, str] = {}
+    clone_sources: dict[str, Path] = {}
+    for template_dir in sorted({target.template_dir for target in targets}):
+        source = root / "templates" / template_dir
+        digest = await asyncio.to_thread(content_hash, source)
+        optimized = await asyncio.to_thread(fresh_optimized_dir, source, root / OPTIMIZED_TEMPLATES_SUBDIR / template_dir, digest)
+        if optimized is not None:
+            # The builder clones from the optimized copy, so that is what the artifact is built from.
+            digest = await asyncio.to_thread(content_hash, optimized)
+        template_hashes[template_dir] = digest
+        clone_sources[template_dir] = optimized or source
+
+    report = PrebuildReport()
+    stale: list[tuple[LibraryTarget, str]] = []
+    for target in targets:
+        expected = target_hash(target, template_hashes[target.template_dir], builder_hash)
+        recorded = manifest.get(target.relative_path, {}).get("hash")
+        if not force and recorded == expected and (library_dir / target.relative_path).exists():
+            report.fresh.append(target.relative_path)
+        else:
+            stale.append((target, expected))
+    if dry_run:
+        report.built.extend(target.relative_path for target, _ in stale)
+        return report
+    stale_paths = {target.relative_path for target, _ in stale}
+    for target in targets:
+        if target.kind == "final" and target.relative_path not in stale_paths:
+            await asyncio.to_thread(_refresh_archive, library_dir / target.relative_path)
+    # Parallel preview builds would otherwise all encode the same template assets for inlining at once.
+    for template_dir, game_key in sorted({(target.template_dir, target.game_key) for target, _ in stale if target.kind == "preview"}):
+        try:
+            warmed = await pool.warm_inline_cache(clone_sources[template_dir], game_key)
+        except RuntimeError:
+            logging.exception("[Prebuild] %s: inline cache warm-up failed", template_dir)
+            continue
+        logging.info("[Prebuild] %s: %d inlinable asset(s) encoded", template_dir, warmed)
+
+    # More in flight than the pool can build would just queue inside the runners.
+    slots = asyncio.Semaphore(pool.capacity)
+
+    async def build(target: LibraryTarget, expected: str) -> None:
+        async with slots:
+            started = time.monotonic()
+            try:
+                produced = await pool.generate_playable(target.job_id, target.config(), use_library=False)
+            except RuntimeError:
+                logging.exception("[Prebuild] %s: worker failed", target.relative_path)
+                produced = None
+            if produced is None:
+                report.failed.append(target.relative_path)
+                logging.error("[Prebuild] %s: build failed", target.relative_path)
+                return
+            installed = library_dir / target.relative_path
+            size = await asyncio.to_thread(_install, Path(produced), installed)
+            if target.kind == "final":
+                await asyncio.to_thread(_refresh_archive, installed)
+        manifest[target.relative_path] = {"hash": expected, "size": size, "built_at": int(time.time())}
+        # Written after every artifact so an interrupted run keeps what it finished.
+        await asyncio.to_thread(write_manifest, manifest_path, manifest)
+        report.built.append(target.relative_path)
+        logging.info("[Prebuild] %s: %s bytes in %.1fs", target.relative_path, size, time.monotonic() - started)
+
+    await asyncio.gather(*(build(target, expected) for target, expected in stale))
+    return report
+
+
+async def _run(args: argparse.Namespace) -> int:
+    targets = library_targets(args.game or None, args.geo or None)
+    pool = BuilderPool(args.jobs, deadline_seconds=PREBUILD_DEADLINE_SECONDS)
+    try:
+        report = await prebuild(pool, targets, force=args.force, dry_run=args.dry_run)
+    finally:
+        await pool.close()
+    verb = "stale" if args.dry_run else "built"
+    print(f"{verb}: {len(report.built)}, up to date: {len(report.fresh)}, failed: {len(report.failed)}")
+    for relative_path in sorted(report.built):
+        print(f"  {verb} {relative_path}")
+    for relative_path in sorted(report.failed):
+        print(f"  failed {relative_path}")
+    return 1 if report.failed else 0
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bot_py.prebuild_library", description="Rebuild stale library artifacts in parallel.")
+    parser.add_argument("--jobs", type=int, default=0, help="builder workers (default: sized to the machine)")
+    parser.add_argument("--game", action="append", help="game id to build, e.g. game_drag (repeatable)")
+    parser.add_argument("--geo", action="append", help="GEO id to build, e.g. en_usd (repeatable)")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the manifest says up to date")
+    parser.add_argument("--dry-run", action="store_true", help="list stale artifacts without building")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    return asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
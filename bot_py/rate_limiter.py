@@ -0,0 +1,203 @@
+"""Outbound rate limiting for Bot API calls.
+
+:class:`OutboundLimiter` is a request middleware on the bot's session. Before any
+method addressed to a chat goes out it takes a token from a global bucket (Telegram's
+~30 messages a second) and one from that chat's bucket (about one a second in private
+chats, 20 a minute in groups), so bursts queue here instead of turning into 429s.
+
+Waiting calls are granted in priority order: replies to users first, then traffic marked
+with :func:`bulk_sends` such as admin notifications and broadcasts. Bulk calls also leave
+a few global tokens untouched, so a reply arriving in the middle of a broadcast goes out
+at once. A chat waiting on its own bucket does not hold up other chats.
+
+When Telegram still answers with ``retry_after``, the chat is paused for that long and
+the call is queued again, up to a few times.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import math
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods.base import TelegramType
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+    from aiogram.methods import Response, TelegramMethod
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+GLOBAL_MESSAGES_PER_SECOND = 30.0
+PRIVATE_CHAT_MESSAGES_PER_SECOND = 1.0
+PRIVATE_CHAT_BURST = 3.0
+GROUP_CHAT_MESSAGES_PER_SECOND = 20 / 60
+GROUP_CHAT_BURST = 3.0
+# Share of the global bucket bulk traffic may not dip into.
+BULK_RESERVE_SHARE = 0.2
+RETRY_AFTER_MAX_SECONDS = 60.0
+RETRY_AFTER_MAX_RETRIES = 3
+CHAT_BUCKETS_MAX = 10_000
+
+_priority: ContextVar[int] = ContextVar("outbound_priority", default=PRIORITY_INTERACTIVE)
+
+
+@contextlib.contextmanager
+def bulk_sends() -> Iterator[None]:
+    """Send Bot API calls made inside the block at bulk priority."""
+    token = _priority.set(PRIORITY_BULK)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+@dataclass(slots=True)
+class TokenBucket:
+    rate: float
+    capacity: float
+    updated_at: float
+    tokens: float = field(init=False)
+    paused_until: float = 0.0
+
+    def __post_init__(self) -> None:
+        self.tokens = self.capacity
+
+    def wait_time(self, now: float, needed: float = 1.0) -> float:
+        """Seconds until ``needed`` tokens are available; 0 if they are now."""
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1.0
+
+    def idle(self, now: float) -> bool:
+        """True if the bucket is full again by ``now`` and not paused, i.e. dropping it changes nothing."""
+        refilled = self.tokens + max(0.0, now - self.updated_at) * self.rate
+        return refilled >= self.capacity and self.paused_until <= now
+
+
+def _chat_id(method: TelegramMethod[Any]) -> int | str | None:
+    """The chat a call sends to, or None for calls the flood limits do not apply to."""
+    if method.__api_method__.startswith("get"):
+        return None
+    return getattr(method, "chat_id", None)
+
+
+class OutboundLimiter(BaseRequestMiddleware):
+    """Holds each chat-addressed Bot API call until the global and per-chat buckets allow it."""
+
+    def __init__(
+        self,
+        *,
+        global_rate: float = GLOBAL_MESSAGES_PER_SECOND,
+        max_retries: int = RETRY_AFTER_MAX_RETRIES,
+        max_retry_after: float = RETRY_AFTER_MAX_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._clock = clock
+        self._global = TokenBucket(global_rate, global_rate, clock())
+        self._bulk_needed = 1.0 + global_rate * BULK_RESERVE_SHARE
+        # Least recently used first.
+        self._chats: OrderedDict[int | str, TokenBucket] = OrderedDict()
+        self._max_retries = max_retries
+        self._max_retry_after = max_retry_after
+        # Heap of (priority, seq, chat_id, future), so the pump grants in priority order.
+        self._waiters: list[tuple[int, int, int | str, asyncio.Future[None]]] = []
+        self._seq = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = _chat_id(method)
+        if chat_id is None:
+            return await make_request(bot, method)
+        retries = 0
+        while True:
+            await self.acquire(chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as exc:
+                retries += 1
+                if retries > self._max_retries or exc.retry_after > self._max_retry_after:
+                    raise
+                logging.warning("[RateLimit] %s to %s: retry after %ss (retry %s)", method.__api_method__, chat_id, exc.retry_after, retries)
+                self.pause(chat_id, exc.retry_after)
+
+    async def acquire(self, chat_id: int | str, priority: int | None = None) -> None:
+        """Wait for a global token and one of ``chat_id``'s, at the current context's priority by default."""
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (_priority.get() if priority is None else priority, next(self._seq), chat_id, future))
+        self._pump()
+        await future
+
+    def pause(self, chat_id: int | str, seconds: float) -> None:
+        bucket = self._chat_bucket(chat_id)
+        bucket.paused_until = max(bucket.paused_until, self._clock() + seconds)
+
+    def _chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is not None:
+            self._chats.move_to_end(chat_id)
+            return bucket
+        now = self._clock()
+        # Least recently used buckets that have refilled are the same as new ones; a paused or
+        # still draining one is kept even if that leaves the map over its limit for a while.
+        while len(self._chats) >= CHAT_BUCKETS_MAX and next(iter(self._chats.values())).idle(now):
+            self._chats.popitem(last=False)
+        private = isinstance(chat_id, int) and chat_id > 0
+        rate, burst = (PRIVATE_CHAT_MESSAGES_PER_SECOND, PRIVATE_CHAT_BURST) if private else (GROUP_CHAT_MESSAGES_PER_SECOND, GROUP_CHAT_BURST)
+        bucket = self._chats[chat_id] = TokenBucket(rate, burst, now)
+        return bucket
+
+    def _pump(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = self._clock()
+        next_wait = math.inf
+        # Popped in order, so ``waiting`` comes out sorted and is a heap as it is.
+        waiting = []
+        while self._waiters:
+            waiter = heapq.heappop(self._waiters)
+            priority, _, chat_id, future = waiter
+            if future.done():
+                continue  # The caller was cancelled.
+            chat = self._chat_bucket(chat_id)
+            wait = max(chat.wait_time(now), self._global.wait_time(now, self._bulk_needed if priority >= PRIORITY_BULK else 1.0))
+            if wait <= 0:
+                self._global.take()
+                chat.take()
+                future.set_result(None)
+            else:
+                waiting.append(waiter)
+                next_wait = min(next_wait, wait)
+        self._waiters = waiting
+        if waiting:
+            self._timer = asyncio.get_running_loop().call_later(next_wait, self._pump)
@@ -0,0 +1,110 @@
+"""Python port of the builder's library fast path.
+
+A prebuilt ``library/<game>/<geo>_final.html`` only needs the order's runtime config
+spliced in before ``</head>``. Doing that here avoids a Node round-trip for most final
+orders. The artifact is memory-mapped and streamed into the output, so the multi-MB
+HTML never becomes a Python string.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import secrets
+from pathlib import Path
+from typing import Any
+
+from .models import OrderConfig
+
+PREVIEW_MAX_INTERACTIONS = 4
+HEAD_CLOSE = b"</head>"
+# Same script the Node builder injects (see injectRuntimeConfig in src/builder.ts).
+SCRIPT_TEMPLATE_PATH = Path(__file__).with_name("runtime_config_script.js")
+_SCRIPT_TEMPLATE = SCRIPT_TEMPLATE_PATH.read_text(encoding="utf-8").rstrip("\n")
+
+
+def to_runtime_config(config: OrderConfig, is_watermarked: bool) -> dict[str, Any]:
+    runtime_config: dict[str, Any] = {
+        "game": config.game or "railroad",
+        "themeId": config.theme_id or "default",
+        "language": config.language or "en",
+        "currency": config.currency or "$",
+        "startingBalance": config.starting_balance if config.starting_balance is not None else 1000,
+        "isWatermarked": is_watermarked,
+        "previewMaxInteractions": PREVIEW_MAX_INTERACTIONS,
+    }
+    if config.click_url and config.click_url.strip():
+        runtime_config["clickUrl"] = config.click_url
+    target_balance = config.extra.get("targetBalance")
+    if isinstance(target_balance, int | float) and not isinstance(target_balance, bool):
+        runtime_config["targetBalance"] = target_balance
+    return runtime_config
+
+
+def _js_string(value: Any) -> str:
+    # Mirrors JavaScript's String(): booleans are lower-case, missing values are "".
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def build_guard_payload(runtime_config: dict[str, Any]) -> str:
+    keys = ("game", "themeId", "language", "currency", "startingBalance", "previewMaxInteractions", "isWatermarked", "clickUrl")
+    return "|".join([*(_js_string(runtime_config.get(key)) for key in keys), "guard_v2"])
+
+
+def build_runtime_script(runtime_config: dict[str, Any], guard_salt: str | None = None) -> str:
+    salt = guard_salt or secrets.token_hex(6)
+    payload = dict(runtime_config)
+    if payload.get("isWatermarked"):
+        signature_input = f"{build_guard_payload(payload)}|{salt}"
+        payload["__guardSig"] = hashlib.sha256(signature_input.encode("utf-8")).hexdigest()
+        payload["__guardVer"] = "v2"
+    config_json = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).replace("<", "\\u003c").replace("-->", "--\\>")
+    return _SCRIPT_TEMPLATE.replace("{{CONFIG_JSON}}", config_json).replace("{{GUARD_SALT}}", salt)
+
+
+def inject_runtime_config(source: Path, target: Path, runtime_config: dict[str, Any], guard_salt: str | None = None) -> Path:
+    """Write ``source`` to ``target`` with the runtime config script before the first ``</head>``.
+
+    Without a ``</head>`` the script is prepended, as the Node builder does. The output is
+    written to a temp file and renamed, so a concurrent reader never sees a partial file.
+    """
+    script = build_runtime_script(runtime_config, guard_salt).encode("utf-8")
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = target.with_name(f".{target.name}.{os.getpid()}.{secrets.token_hex(4)}.tmp")
+    try:
+        with source.open("rb") as src, temp_path.open("wb") as dst:
+            if os.fstat(src.fileno()).st_size == 0:
+                dst.write(script + b"\n")
+            else:
+                with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                    index = mapped.find(HEAD_CLOSE)
+                    if index < 0:
+                        dst.write(script + b"\n")
+                        dst.write(view)
+                    else:
+                        dst.write(view[:index])
+                        dst.write(script)
+                        dst.write(view[index:])
+        temp_path.replace(target)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return target
+
+
+def build_output_filename(order_id: str, config: OrderConfig, is_watermarked: bool) -> str:
+    """Same naming as buildOutputFilename in the Node builder."""
+    if is_watermarked:
+        return f"PREVIEW_{order_id}.html"
+    game = re.sub(r"[^a-zA-Z0-9_-]", "", config.game or "railroad")
+    theme = re.sub(r"[^a-zA-Z0-9_-]", "", config.theme_id or "default")
+    language = re.sub(r"[^A-Z0-9_-]", "", (config.language or "en").upper())
+    currency = re.sub(r"[^a-zA-Z0-9]", "", config.currency or "$")
+    return f"{game}_{theme}_{language}_{currency}.html"
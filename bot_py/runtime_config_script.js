@@ -0,0 +1 @@
+<script>(function(){window.__USER_CONFIG__={{CONFIG_JSON}};if(window.__USER_CONFIG__&&typeof window.__USER_CONFIG__.clickUrl==="string"){window.STORE_URL=window.__USER_CONFIG__.clickUrl;}window.__PLAYABLE_DIMENSIONS__={width:1080,height:1920};var GUARD_SALT="{{GUARD_SALT}}";var WATERMARK_ID="builder-preview-watermark";var STYLE_ID="builder-preview-style";var FINISH_ID="builder-preview-finished";var LOCKED=false;var interactions=0;function ensureStyle(){if(document.getElementById(STYLE_ID))return;var style=document.createElement("style");style.id=STYLE_ID;style.textContent="#"+WATERMARK_ID+"{position:fixed;inset:0;z-index:2147483646;pointer-events:none;display:grid;place-items:center;font:900 42px/1.1 Arial,sans-serif;color:rgba(255,0,0,.28);text-transform:uppercase;letter-spacing:2px;transform:rotate(-24deg);white-space:pre;text-align:center;}#"+FINISH_ID+"{position:fixed;inset:0;z-index:2147483647;background:rgba(0,0,0,.82);display:none;align-items:center;justify-content:center;padding:24px;box-sizing:border-box;}#"+FINISH_ID+".show{display:flex;}#"+FINISH_ID+" .msg{max-width:780px;text-align:center;color:#fff;font:800 34px/1.25 Arial,sans-serif;text-transform:uppercase;letter-spacing:1px;text-shadow:0 2px 8px rgba(0,0,0,.4);}";document.head.appendChild(style);}function removeWatermarks(){[WATERMARK_ID,FINISH_ID,"watermark","watermark2","watermark3","watermark-overlay"].forEach(function(id){var el=document.getElementById(id);if(el&&el.parentNode){el.parentNode.removeChild(el);}});document.querySelectorAll(".watermark").forEach(function(el){if(el&&el.parentNode){el.parentNode.removeChild(el);}});}function isBlockedTarget(target){if(!target||!(target instanceof Element))return false;if(target.closest("#"+FINISH_ID))return true;if(target.closest("#"+WATERMARK_ID))return true;return false;}function hardStop(reason){if(LOCKED)return;LOCKED=true;var allButtons=document.querySelectorAll("button,input,select,textarea");allButtons.forEach(function(el){if(el&&("disabled" in el)){try{el.disabled=true;}catch(_){}}});var uiLayer=document.getElementById("ui-layer");if(uiLayer){uiLayer.style.pointerEvents="none";}try{if(window.PIXI&&window.PIXI.Ticker&&window.PIXI.Ticker.shared){window.PIXI.Ticker.shared.stop();}}catch(_){ }try{if(window.app&&window.app.ticker&&typeof window.app.ticker.stop==="function"){window.app.ticker.stop();}}catch(_){ }var finish=document.getElementById(FINISH_ID);if(!finish){finish=document.createElement("div");finish.id=FINISH_ID;var msg=document.createElement("div");msg.className="msg";msg.textContent=String.fromCharCode(1055,1056,1045,1042,1068,1070,32,1054,1050,1054,1053,1063,1045,1053,1054,46,32,1050,1059,1055,1048,1058,1045,32,1055,1054,1051,1053,1059,1070,32,1042,1045,1056,1057,1048,1070,46);finish.appendChild(msg);document.body.appendChild(finish);}finish.classList.add("show");document.dispatchEvent(new CustomEvent("preview:ended",{detail:{reason:reason||"limit"}}));}function sha256Hex(str){if(window.crypto&&window.crypto.subtle&&window.TextEncoder){return window.crypto.subtle.digest("SHA-256",new TextEncoder().encode(str)).then(function(buf){var arr=Array.from(new Uint8Array(buf));return arr.map(function(b){return b.toString(16).padStart(2,"0");}).join("");});}return Promise.resolve("");}function buildGuardPayload(cfg){return [String(cfg.game||""),String(cfg.themeId||""),String(cfg.language||""),String(cfg.currency||""),String(cfg.startingBalance||""),String(cfg.previewMaxInteractions||""),String(cfg.isWatermarked||""),String(cfg.clickUrl||""),"guard_v2"].join("|");}function validateGuard(cfg){if(!cfg||!cfg.isWatermarked)return Promise.resolve(true);if(cfg.__guardVer!=="v2"||typeof cfg.__guardSig!=="string"||!cfg.__guardSig){return Promise.resolve(false);}return sha256Hex(buildGuardPayload(cfg)+"|"+GUARD_SALT).then(function(sig){if(!sig)return false;return sig===cfg.__guardSig;});}function tickInteraction(){if(LOCKED)return;interactions+=1;var cfg=window.__USER_CONFIG__||{};var limit=Number(cfg.previewMaxInteractions||4);if(!Number.isFinite(limit)||limit<1){limit=4;}if(interactions>=limit){setTimeout(function(){hardStop("interaction_limit");},120);}}function ensureWatermark(){if(document.getElementById(WATERMARK_ID))return;var overlay=document.createElement("div");overlay.id=WATERMARK_ID;overlay.textContent="PREVIEW MODE\nPURCHASE TO UNLOCK";document.body.appendChild(overlay);}function blockDownloadAndEscape(){document.addEventListener("click",function(ev){var el=ev.target instanceof Element?ev.target.closest("a[download],a[href^='blob:']"):null;if(el){ev.preventDefault();ev.stopPropagation();hardStop("download_blocked");}},{capture:true});try{var oldOpen=window.open;window.open=function(){hardStop("window_open_blocked");return null;};Object.defineProperty(window,"open",{configurable:false,writable:false,value:window.open});if(typeof oldOpen==="function"&&String(oldOpen).indexOf("[native code]")===-1){hardStop("open_tampered");}}catch(_){ }}function setupTamperWatch(cfg){var removedCount=0;var lastSig=cfg.__guardSig||"";setInterval(function(){if(LOCKED)return;var finish=document.getElementById(FINISH_ID);if(finish&&finish.classList.contains("show"))return;if(!document.getElementById(WATERMARK_ID)){removedCount+=1;ensureWatermark();if(removedCount>=2){hardStop("watermark_removed");}}if((cfg.__guardSig||"")!==lastSig){hardStop("guard_sig_mutated");}validateGuard(cfg).then(function(ok){if(!ok){hardStop("guard_invalid");}}).catch(function(){hardStop("guard_error");});if((window.outerWidth-window.innerWidth)>220||(window.outerHeight-window.innerHeight)>220){hardStop("devtools_detected");}},1200);}function setupPreviewLimiter(){var cfg=window.__USER_CONFIG__||{};if(!cfg.isWatermarked){removeWatermarks();return;}validateGuard(cfg).then(function(ok){if(!ok){hardStop("guard_invalid_init");return;}try{Object.freeze(cfg);}catch(_){ }ensureStyle();ensureWatermark();blockDownloadAndEscape();setupTamperWatch(cfg);document.addEventListener("pointerdown",function(ev){if(isBlockedTarget(ev.target))return;tickInteraction();},{passive:true,capture:true});document.addEventListener("keydown",function(ev){if(LOCKED)return;if(ev.key!=="Enter"&&ev.key!==" "&&ev.key!=="Spacebar")return;if(isBlockedTarget(document.activeElement))return;tickInteraction();},{capture:true});}).catch(function(){hardStop("guard_boot_error");});}if(document.readyState==="loading"){document.addEventListener("DOMContentLoaded",setupPreviewLimiter,{once:true});}else{setupPreviewLimiter();}})();</script>
@@ -2,46 +2,209 @@ from __future__ import annotations
 
 import asyncio
 import json
-from collections import defaultdict
+import logging
+import os
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
-from .helpers import create_initial_session
+from .models import Session, decode_session, encode
+
+DEFAULT_SESSION_TTL_SECONDS = 7 * 24 * 60 * 60
+DEFAULT_PENDING_PAYMENT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_WIZARD_TIMEOUT_MS = 2 * 60 * 1000
+# A preview generation never legitimately takes this long; the flag is left over from a crash.
+PREVIEW_IN_PROGRESS_STALE_SECONDS = 15 * 60
+
+
+@dataclass(slots=True)
+class SweepStats:
+    scanned: int = 0
+    deleted: int = 0
+    compacted: int = 0
 
 
 class FileSessionStore:
-    def __init__(self, sessions_dir: Path) -> None:
+    def __init__(
+        self,
+        sessions_dir: Path,
+        *,
+        ttl_seconds: int = DEFAULT_SESSION_TTL_SECONDS,
+        pending_payment_ttl_seconds: int = DEFAULT_PENDING_PAYMENT_TTL_SECONDS,
+        wizard_timeout_ms: int = DEFAULT_WIZARD_TIMEOUT_MS,
+    ) -> None:
         self._sessions_dir = sessions_dir
         self._sessions_dir.mkdir(parents=True, exist_ok=True)
-        self._locks: defaultdict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._ttl_seconds = ttl_seconds
+        self._pending_payment_ttl_seconds = pending_payment_ttl_seconds
+        self._wizard_timeout_ms = wizard_timeout_ms
+        # Locks are reference-counted and dropped once no coroutine holds or waits on them.
+        self._locks: dict[int, asyncio.Lock] = {}
+        self._lock_users: dict[int, int] = {}
 
     def _path_for(self, user_id: int) -> Path:
         return self._sessions_dir / f"{user_id}.json"
 
-    async def get(self, user_id: int) -> dict[str, Any]:
+    @property
+    def active_locks(self) -> int:
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def _lock(self, user_id: int) -> AsyncIterator[None]:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[user_id] = lock
+        self._lock_users[user_id] = self._lock_users.get(user_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            remaining = self._lock_users[user_id] - 1
+            if remaining:
+                self._lock_users[user_id] = remaining
+            else:
+                del self._lock_users[user_id]
+                del self._locks[user_id]
+
+    async def get(self, user_id: int) -> Session:
         path = self._path_for(user_id)
         if not path.exists():
-            return create_initial_session()
+            return Session()
 
-        async with self._locks[user_id]:
+        async with self._lock(user_id):
             try:
-                data = await asyncio.to_thread(path.read_text, encoding="utf-8")
-                parsed = json.loads(data)
-            except Exception:
-                return create_initial_session()
-
-        if not isinstance(parsed, dict):
-            return create_initial_session()
-        if "config" not in parsed or not isinstance(parsed.get("config"), dict):
-            parsed["config"] = {}
-        return parsed
+                data = await asyncio.to_thread(path.read_bytes)
+            except OSError:
+                return Session()
+        return decode_session(data)
 
-    async def save(self, user_id: int, session_data: dict[str, Any]) -> None:
+    async def save(self, user_id: int, session: Session) -> None:
         path = self._path_for(user_id)
         temp_path = path.with_suffix(".tmp")
-        payload = json.dumps(session_data, ensure_ascii=False, separators=(",", ":"))
+        payload = encode(session)
 
-        async with self._locks[user_id]:
+        async with self._lock(user_id):
             await asyncio.to_thread(temp_path.write_text, payload, encoding="utf-8")
             await asyncio.to_thread(temp_path.replace, path)
 
+    async def sweep(self, now: float | None = None) -> SweepStats:
+        """Delete idle sessions and strip expired transient state from the rest."""
+        current = time.time() if now is None else now
+        stats = SweepStats()
+        paths = await asyncio.to_thread(lambda: sorted(self._sessions_dir.iterdir()))
+        for path in paths:
+            if path.suffix == ".tmp":
+                await asyncio.to_thread(self._drop_orphan_temp, path, current)
+                continue
+            if path.suffix != ".json":
+                continue
+            try:
+                user_id = int(path.stem)
+            except ValueError:
+                continue
+            if user_id in self._locks:
+                # Someone is reading or writing this session right now; catch it on the next pass.
+                continue
+
+            stats.scanned += 1
+            async with self._lock(user_id):
+                outcome = await asyncio.to_thread(self._sweep_file, path, current)
+            if outcome == "deleted":
+                stats.deleted += 1
+            elif outcome == "compacted":
+                stats.compacted += 1
+        return stats
+
+    async def run_sweeper(self, interval_seconds: int) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                stats = await self.sweep()
+            except Exception:
+                logging.exception("[Sessions] Sweep failed")
+                continue
+            if stats.deleted or stats.compacted:
+                logging.info(
+                    "[Sessions] Sweep scanned=%s deleted=%s compacted=%s locks=%s",
+                    stats.scanned,
+                    stats.deleted,
+                    stats.compacted,
+                    self.active_locks,
+                )
+
+    def _drop_orphan_temp(self, path: Path, now: float) -> None:
+        try:
+            if now - path.stat().st_mtime > PREVIEW_IN_PROGRESS_STALE_SECONDS:
+                path.unlink(missing_ok=True)
+        except OSError:
+            return
+
+    def _sweep_file(self, path: Path, now: float) -> str | None:
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+        idle_seconds = now - mtime
+        if idle_seconds > self._ttl_seconds:
+            path.unlink(missing_ok=True)
+            return "deleted"
+
+        try:
+            session = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            path.unlink(missing_ok=True)
+            return "deleted"
+        if not isinstance(session, dict):
+            path.unlink(missing_ok=True)
+            return "deleted"
+
+        if not self._compact(session, now, idle_seconds):
+            return None
+
+        if not session.get("config") and set(session) <= {"config"}:
+            path.unlink(missing_ok=True)
+            return "deleted"
+
+        temp_path = path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(session, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+        temp_path.replace(path)
+        # Compaction is not user activity: keep the original mtime so the TTL clock keeps running.
+        os.utime(path, (mtime, mtime))
+        return "compacted"
+
+    def _compact(self, session: dict[str, Any], now: float, idle_seconds: float) -> bool:
+        changed = False
+        now_ms = int(now * 1000)
+
+        wizard = session.get("wizard")
+        if "wizard" in session:
+            updated_at = wizard.get("updatedAt", 0) if isinstance(wizard, dict) else 0
+            try:
+                expired = now_ms - int(updated_at) > self._wizard_timeout_ms
+            except (TypeError, ValueError):
+                expired = True
+            if expired:
+                session.pop("wizard", None)
+                changed = True
+
+        if "previewInProgress" in session and (not session["previewInProgress"] or idle_seconds > PREVIEW_IN_PROGRESS_STALE_SECONDS):
+            session.pop("previewInProgress", None)
+            changed = True
+
+        if "pendingManualPayment" in session:
+            pending = session.get("pendingManualPayment")
+            created_at = pending.get("createdAt") if isinstance(pending, dict) else None
+            try:
+                age_seconds = (now_ms - int(created_at)) / 1000 if created_at is not None else idle_seconds
+            except (TypeError, ValueError):
+                age_seconds = idle_seconds
+            if not isinstance(pending, dict) or age_seconds > self._pending_payment_ttl_seconds:
+                session.pop("pendingManualPayment", None)
+                changed = True
+
+        return changed
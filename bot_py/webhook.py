@@ -0,0 +1,95 @@
+"""Webhook transport: Telegram posts updates to an aiohttp server instead of being polled.
+
+Every request must carry the secret token the webhook was registered with. Accepted
+updates are handed to the dispatcher in background tasks so Telegram gets its 200 at
+once, but never more than ``concurrency`` of them run at a time: past that a request is
+only answered when a slot frees up, which makes Telegram slow down instead of the bot
+piling up handlers.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiohttp import web
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+DEFAULT_WEBHOOK_PATH = "/telegram/webhook"
+DEFAULT_WEBHOOK_CONCURRENCY = 32
+
+UpdateFeed = Callable[[dict[str, Any]], Awaitable[Any]]
+
+
+def derive_webhook_secret(bot_token: str) -> str:
+    """A stable secret for the webhook when none is configured; Telegram only allows [A-Za-z0-9_-]."""
+    return hashlib.sha256(f"webhook:{bot_token}".encode()).hexdigest()
+
+
+class WebhookServer:
+    """Serves ``path`` and feeds the updates posted there to ``feed``."""
+
+    def __init__(
+        self,
+        feed: UpdateFeed,
+        *,
+        secret: str,
+        path: str = DEFAULT_WEBHOOK_PATH,
+        concurrency: int = DEFAULT_WEBHOOK_CONCURRENCY,
+    ) -> None:
+        self._feed = feed
+        self._secret = secret.encode()
+        self.path = path
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._runner: web.AppRunner | None = None
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, "").encode(), self._secret):
+            return web.Response(status=401)
+        try:
+            update = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return web.Response(status=400)
+        if not isinstance(update, dict):
+            return web.Response(status=400)
+        await self._slots.acquire()
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: dict[str, Any]) -> None:
+        try:
+            await self._feed(update)
+        except Exception:
+            logging.exception("[Webhook] Update %s failed", update.get("update_id"))
+        finally:
+            self._slots.release()
+
+    async def start(self, host: str, port: int) -> None:
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logging.info("[Webhook] Listening on %s:%s%s", host, port, self.path)
+
+    async def close(self) -> None:
+        """Stop accepting updates and let the ones already accepted finish."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,97 @@
+"""Post recorded Telegram updates to a running webhook server.
+
+Updates are read from a file holding one update per line, a JSON array of them, or a
+saved ``getUpdates`` response. Each is posted with the webhook secret header the way
+Telegram would, and the statuses and response times are summarised, so a webhook deploy
+can be checked (or loaded) locally without Telegram in the loop. Handlers still answer
+through the real Bot API, so replay updates from a chat you control.
+
+Run with ``python -m bot_py.webhook_replay updates.jsonl --secret ...`` (``--help`` for options).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import Counter
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import aiohttp
+
+from .webhook import DEFAULT_WEBHOOK_PATH, SECRET_HEADER
+
+
+@dataclass(slots=True)
+class ReplayReport:
+    statuses: Counter[int] = field(default_factory=Counter)
+    latencies: list[float] = field(default_factory=list)
+
+    def percentile(self, fraction: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def load_updates(path: Path) -> list[dict[str, Any]]:
+    text = path.read_text(encoding="utf-8").strip()
+    if not text:
+        return []
+    if text[0] in "[{":
+        try:
+            document = json.loads(text)
+        except json.JSONDecodeError:
+            document = None  # One update per line.
+        if isinstance(document, dict) and isinstance(document.get("result"), list):
+            return document["result"]
+        if isinstance(document, list):
+            return document
+        if isinstance(document, dict):
+            return [document]
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+async def replay(updates: Sequence[dict[str, Any]], url: str, secret: str, *, concurrency: int = 1) -> ReplayReport:
+    """Post ``updates`` to ``url``, at most ``concurrency`` at a time and in order when it is 1."""
+    report = ReplayReport()
+    slots = asyncio.Semaphore(max(1, concurrency))
+
+    async def post(session: aiohttp.ClientSession, update: dict[str, Any]) -> None:
+        async with slots:
+            started = time.perf_counter()
+            async with session.post(url, json=update, headers={SECRET_HEADER: secret}) as response:
+                await response.read()
+            report.latencies.append(time.perf_counter() - started)
+            report.statuses[response.status] += 1
+
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(post(session, update) for update in updates))
+    return report
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bot_py.webhook_replay", description="Post recorded updates to a webhook server.")
+    parser.add_argument("updates", type=Path, help="updates as JSON lines, a JSON array or a getUpdates response")
+    parser.add_argument("--url", default=f"http://127.0.0.1:3000{DEFAULT_WEBHOOK_PATH}", help="webhook URL (default: %(default)s)")
+    parser.add_argument("--secret", required=True, help="secret token the server expects")
+    parser.add_argument("--concurrency", type=int, default=1, help="updates in flight at once (default: 1, in file order)")
+    parser.add_argument("--repeat", type=int, default=1, help="post the whole file this many times")
+    args = parser.parse_args(argv)
+    updates = load_updates(args.updates) * max(1, args.repeat)
+    started = time.perf_counter()
+    report = asyncio.run(replay(updates, args.url, args.secret, concurrency=args.concurrency))
+    elapsed = time.perf_counter() - started
+    statuses = ", ".join(f"{status}: {count}" for status, count in sorted(report.statuses.items()))
+    print(f"posted {len(updates)} update(s) in {elapsed:.2f}s ({statuses or 'none'})")
+    print(f"latency p50 {report.percentile(0.5) * 1000:.1f} ms, p95 {report.percentile(0.95) * 1000:.1f} ms")
+    return 0 if set(report.statuses) <= {200} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,8 @@
-import { cleanupTemp, generatePlayable } from "./builder.js";
+import fs from "node:fs/promises";
+import { Session } from "node:inspector/promises";
+import path from "node:path";
+import { createInterface } from "node:readline";
+import { cleanupTemp, generatePlayable, PROFILES_DIR, warmInlineCache } from "./builder.js";
 async function readStdin() {
     return new Promise((resolve, reject) => {
         let data = "";
@@ -16,43 +20,81 @@ function isRecord(input) {
 function toErrorMessage(error) {
     return error instanceof Error ? error.message : String(error);
 }
-async function handleRequest(request) {
+/**
+ * Records a V8 CPU profile of this process while `fn` runs. It covers the in-process
+ * stages (workspace setup, asset inlining, config injection) and any other job running
+ * concurrently; the build command profiles itself via NODE_OPTIONS.
+ */
+async function withCpuProfile(file, fn) {
+    const session = new Session();
+    session.connect();
+    await session.post("Profiler.enable");
+    await session.post("Profiler.start");
+    try {
+        return await fn();
+    }
+    finally {
+        const { profile } = await session.post("Profiler.stop");
+        await fs.writeFile(file, JSON.stringify(profile));
+        session.disconnect();
+    }
+}
+async function handleRequest(request, onStage) {
+    if (request.action === "ping") {
+        return { ok: true };
+    }
     if (request.action === "cleanup") {
         await cleanupTemp();
         return { ok: true };
     }
+    if (request.action === "warm_inline_cache") {
+        if (!request.templateDir) {
+            return { ok: false, error: "INVALID_WARM_REQUEST" };
+        }
+        return { ok: true, warmed: await warmInlineCache(request.templateDir, request.gameKey ?? "railroad") };
+    }
     if (!request.id || !isRecord(request.config)) {
         return { ok: false, error: "INVALID_GENERATE_REQUEST" };
     }
-    const path = await generatePlayable({
+    const profileDir = request.profile ? path.join(PROFILES_DIR, `${request.id}_${Date.now()}`) : undefined;
+    const build = () => generatePlayable({
         id: request.id,
         config: request.config,
-    });
+        useLibrary: request.useLibrary !== false,
+        profileDir,
+    }, onStage);
+    if (!profileDir) {
+        return { ok: true, path: await build() };
+    }
+    await fs.mkdir(profileDir, { recursive: true });
+    const outputPath = await withCpuProfile(path.join(profileDir, "runner.cpuprofile"), build);
     return {
         ok: true,
-        path,
+        path: outputPath,
+        profileDir,
+    };
+}
+function redirectConsoleToStderr() {
+    const originalLog = console.log;
+    const originalWarn = console.warn;
+    const originalError = console.error;
+    console.log = (...args) => {
+        process.stderr.write(`${args.map((v) => String(v)).join(" ")}\n`);
+    };
+    console.warn = (...args) => {
+        process.stderr.write(`${args.map((v) => String(v)).join(" ")}\n`);
+    };
+    console.error = (...args) => {
+        process.stderr.write(`${args.map((v) => String(v)).join(" ")}\n`);
+    };
+    return () => {
+        console.log = originalLog;
+        console.warn = originalWarn;
+        console.error = originalError;
     };
 }
 async function main() {
-    const restoreConsole = (() => {
-        const originalLog = console.log;
-        const originalWarn = console.warn;
-        const originalError = console.error;
-        console.log = (...args) => {
-            process.stderr.write(`${args.map((v) => String(v)).join(" ")}\n`);
-        };
-        console.warn = (...args) => {
-            process.stderr.write(`${args.map((v) => String(v)).join(" ")}\n`);
-        };
-        console.error = (...args) => {
-            process.stderr.write(`${args.map((v) => String(v)).join(" ")}\n`);
-        };
-        return () => {
-            console.log = originalLog;
-            console.warn = originalWarn;
-            console.error = originalError;
-        };
-    })();
+    const restoreConsole = redirectConsoleToStderr();
     try {
         const raw = await readStdin();
         const parsed = JSON.parse(raw);
@@ -74,4 +116,47 @@ async function main() {
         restoreConsole();
     }
 }
-void main();
+/**
+ * Long-lived mode: one JSON request per stdin line, one JSON response per stdout line.
+ * Requests run concurrently and are matched to responses by `rid`, so the builder's own
+ * queue and dependency cache are shared across every request the process serves. A
+ * generate request may be preceded by stage events with the same `rid`.
+ */
+async function serve() {
+    redirectConsoleToStderr();
+    const inFlight = new Set();
+    const write = (response) => {
+        process.stdout.write(`${JSON.stringify(response)}\n`);
+    };
+    const lines = createInterface({ input: process.stdin, crlfDelay: Infinity });
+    for await (const line of lines) {
+        if (!line.trim()) {
+            continue;
+        }
+        let parsed;
+        try {
+            parsed = JSON.parse(line);
+        }
+        catch {
+            write({ rid: null, ok: false, error: "INVALID_JSON" });
+            continue;
+        }
+        if (!isRecord(parsed) || typeof parsed.action !== "string") {
+            write({ rid: isRecord(parsed) ? parsed.rid ?? null : null, ok: false, error: "INVALID_REQUEST" });
+            continue;
+        }
+        const rid = parsed.rid ?? null;
+        const request = parsed;
+        const onStage = (stage, elapsedMs) => write({ rid, event: "stage", stage, elapsedMs });
+        const task = handleRequest(request, onStage)
+            .then((response) => write({ ...response, rid, ...(request.action === "ping" ? { pong: true } : {}) }))
+            .catch((error) => write({ rid, ok: false, error: toErrorMessage(error) }))
+            .finally(() => {
+            inFlight.delete(task);
+        });
+        inFlight.add(task);
+    }
+    // stdin closed: the parent is gone or shutting us down; finish what was accepted.
+    await Promise.allSettled([...inFlight]);
+}
+void (process.argv.includes("--serve") ? serve() : main());
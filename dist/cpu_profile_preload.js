@@ -0,0 +1,24 @@
+/**
+ * Loaded into template build commands via `NODE_OPTIONS=--import` when a build is profiled
+ * (Node rejects `--cpu-prof` in NODE_OPTIONS). Every Node process the command starts, npm
+ * and vite included, writes `<pid>.cpuprofile` into BUILDER_PROFILE_DIR when it exits.
+ */
+import fs from "node:fs";
+import { Session } from "node:inspector";
+import path from "node:path";
+const profileDir = process.env.BUILDER_PROFILE_DIR;
+if (profileDir) {
+    const session = new Session();
+    session.connect();
+    session.post("Profiler.enable");
+    session.post("Profiler.start");
+    // In-process inspector sessions answer synchronously, so this completes inside "exit".
+    process.on("exit", () => {
+        session.post("Profiler.stop", (error, result) => {
+            if (error)
+                return;
+            fs.mkdirSync(profileDir, { recursive: true });
+            fs.writeFileSync(path.join(profileDir, `${process.pid}.cpuprofile`), JSON.stringify(result.profile));
+        });
+    });
+}
@@ -3,7 +3,7 @@ import { constants as fsConstants } from 'fs';
 import path from 'path';
 import { exec } from 'child_process';
 import util from 'util';
-import { fileURLToPath } from 'url';
+import { fileURLToPath, pathToFileURL } from 'url';
 import { createHash, randomBytes, randomInt } from 'crypto';
 import { OrderConfig } from './bot_helpers.js';
 
@@ -18,13 +18,33 @@ const ROOT_DIR = path.resolve(__dirname, '..');
 const PREVIEWS_DIR = path.join(ROOT_DIR, 'previews');
 const TEMP_DIR = path.join(ROOT_DIR, 'temp');
 const DEPS_CACHE_ROOT = path.join(TEMP_DIR, "_deps_cache");
+export const PROFILES_DIR = path.join(TEMP_DIR, "profiles");
+const CPU_PROFILE_PRELOAD = path.join(__dirname, "cpu_profile_preload.js");
+// Written by `python -m bot_py.asset_optimizer`; see resolveTemplateSource().
+const OPTIMIZED_TEMPLATES_ROOT = path.join(TEMP_DIR, "_optimized_templates");
+const OPTIMIZED_MANIFEST_NAME = ".optimized.json";
+// Same as FINGERPRINT_SKIP_DIRS in bot_py/artifact_cache.py, so both sides hash a template alike.
+const SOURCE_HASH_SKIP_DIRS = new Set(["node_modules", "dist", "release", ".git", ".vite"]);
+// Point at a tmpfs (e.g. /dev/shm/playable-workspaces) to keep build I/O off disk.
+const WORKSPACES_ROOT = process.env.BUILDER_WORKSPACE_DIR || path.join(TEMP_DIR, "_workspaces");
 const BUILD_TIMEOUT_MS = 120_000;
 const BUILD_MAX_BUFFER_BYTES = 20 * 1024 * 1024;
 const DEPS_INSTALL_TIMEOUT_MS = 300_000;
 const PROTECTION_TIMEOUT_MS = 300_000;
-const MAX_BUILD_QUEUE_SIZE = 20;
+const MAX_BUILD_QUEUE_SIZE = readPositiveIntEnv("BUILDER_MAX_BUILD_QUEUE_SIZE", 20);
 const PREVIEW_MAX_INTERACTIONS = 4;
-const ASSET_PATH_REGEX = /(?:\.\/|\/)?(?!https?:\/\/|data:|\/\/)[^"'`()<>]+\.(?:png|jpe?g|webp|gif|svg|mp3|ogg|wav|m4a|webm|json|woff2?|ttf)(?:\?[a-zA-Z0-9=%&._-]+)?(?:#[a-zA-Z0-9=%&._-]+)?/gi;
+const ASSET_SEGMENT_REGEX = /[^"'`()<>]+/g;
+const ASSET_EXTENSION_REGEX = /\.(?:png|jpe?g|webp|gif|svg|mp3|ogg|wav|m4a|webm|json|woff2?|ttf)/gi;
+const ASSET_SUFFIX_REGEX = /(?:\?[a-zA-Z0-9=%&._-]+)?(?:#[a-zA-Z0-9=%&._-]+)?/y;
+const NON_LOCAL_REF_REGEX = /https?:\/\/|data:|\/\//iy;
+// Base64 of inlined assets by SHA-256, shared by every runner process; survives cleanupTemp.
+const INLINE_CACHE_ROOT = path.join(TEMP_DIR, "_inline_cache");
+const INLINE_CACHE_MEMORY_BYTES = 64 * 1024 * 1024;
+const INLINE_DIGEST_MAX_ENTRIES = 4096;
+const INLINE_WARM_SKIP_DIRS = new Set(["node_modules", "dist", "release", ".git", ".vite"]);
+const inlineDigestByStat = new Map<string, string>();
+const inlineEncodingByDigest = new Map<string, string>();
+let inlineEncodingBytes = 0;
 const RAILROAD_THEME_REQUIRED_ASSETS: Record<string, string[]> = {
     chicken_farm: [
         "assets/ground_tile.webp",
@@ -227,6 +247,38 @@ async function applyExternalProtections(filePath: string): Promise<void> {
     }
 }
 
+function readPositiveIntEnv(name: string, fallback: number): number {
+    const parsed = Number.parseInt(process.env[name] ?? "", 10);
+    return Number.isFinite(parsed) && parsed > 0 ? parsed : fallback;
+}
+
+/**
+ * Cross-process mutex on a directory: several runner processes share temp/_deps_cache,
+ * and two concurrent `npm install`s into the same cache would corrupt it.
+ */
+async function withDirLock<T>(lockDir: string, fn: () => Promise<T>): Promise<T> {
+    for (;;) {
+        try {
+            await fs.mkdir(lockDir);
+            break;
+        } catch (error) {
+            if ((error as NodeJS.ErrnoException).code !== "EEXIST") throw error;
+            const stat = await fs.stat(lockDir).catch(() => null);
+            if (stat && Date.now() - stat.mtimeMs > DEPS_INSTALL_TIMEOUT_MS) {
+                // The holder died mid-install; its lock can never be released.
+                await fs.rm(lockDir, { recursive: true, force: true });
+                continue;
+            }
+            await new Promise((resolve) => setTimeout(resolve, 500));
+        }
+    }
+    try {
+        return await fn();
+    } finally {
+        await fs.rm(lockDir, { recursive: true, force: true }).catch(() => {});
+    }
+}
+
 function isBuildTimeoutError(error: unknown): boolean {
     if (!error || typeof error !== "object") return false;
     const execError = error as { message?: string; killed?: boolean; signal?: string | number };
@@ -271,6 +323,7 @@ function buildEmptyDataUri(assetPath: string): string {
 type InlineAssetOptions = {
     isPreview: boolean;
     gameKey: string;
+    onEncoded?: (assetPath: string) => void;
 };
 
 function isHighValuePreviewAsset(normalizedAssetPath: string, gameKey: string): boolean {
@@ -310,72 +363,168 @@ function buildTrashWatermarkedImageDataUri(): string {
     return `data:image/svg+xml;base64,${Buffer.from(svg, "utf-8").toString("base64")}`;
 }
 
+function isNonLocalRefAt(text: string, index: number): boolean {
+    NON_LOCAL_REF_REGEX.lastIndex = index;
+    return NON_LOCAL_REF_REGEX.test(text);
+}
+
+// Same references a global ASSET_PATH_REGEX-style scan finds (at most one per run of characters
+// outside quotes, backticks, parentheses and angle brackets, ending at its last asset extension),
+// located without backtracking so long base64 runs cost one pass.
+function findAssetRefs(html: string): Array<[number, number]> {
+    const spans: Array<[number, number]> = [];
+    for (const segment of html.matchAll(ASSET_SEGMENT_REGEX)) {
+        const text = segment[0];
+        const offset = segment.index ?? 0;
+        let dot = -1;
+        let extensionEnd = -1;
+        for (const extension of text.matchAll(ASSET_EXTENSION_REGEX)) {
+            dot = extension.index ?? 0;
+            extensionEnd = dot + extension[0].length;
+        }
+        if (dot < 0) continue;
+        for (let start = 0; start < dot; start++) {
+            const bodies = [start];
+            if (text.startsWith("/", start)) bodies.unshift(start + 1);
+            if (text.startsWith("./", start)) bodies.unshift(start + 2);
+            if (!bodies.some((body) => body < dot && !isNonLocalRefAt(text, body))) continue;
+            ASSET_SUFFIX_REGEX.lastIndex = extensionEnd;
+            const suffix = ASSET_SUFFIX_REGEX.exec(text);
+            spans.push([offset + start, offset + extensionEnd + (suffix ? suffix[0].length : 0)]);
+            break;
+        }
+    }
+    return spans;
+}
+
+function inlineStorePath(digest: string): string {
+    return path.join(INLINE_CACHE_ROOT, digest.slice(0, 2), `${digest}.b64`);
+}
+
+function rememberInlineEncoding(digest: string, encoded: string): void {
+    if (encoded.length > INLINE_CACHE_MEMORY_BYTES) return;
+    inlineEncodingByDigest.set(digest, encoded);
+    inlineEncodingBytes += encoded.length;
+    for (const [evictedDigest, evicted] of inlineEncodingByDigest) {
+        if (inlineEncodingBytes <= INLINE_CACHE_MEMORY_BYTES) break;
+        inlineEncodingByDigest.delete(evictedDigest);
+        inlineEncodingBytes -= evicted.length;
+    }
+}
+
+function rememberInlineDigest(statKey: string, digest: string): void {
+    inlineDigestByStat.delete(statKey);
+    inlineDigestByStat.set(statKey, digest);
+    if (inlineDigestByStat.size > INLINE_DIGEST_MAX_ENTRIES) {
+        const oldest = inlineDigestByStat.keys().next().value;
+        if (oldest !== undefined) inlineDigestByStat.delete(oldest);
+    }
+}
+
+async function recallInlineEncoding(digest: string): Promise<string | null> {
+    const remembered = inlineEncodingByDigest.get(digest);
+    if (remembered !== undefined) {
+        inlineEncodingByDigest.delete(digest);
+        inlineEncodingByDigest.set(digest, remembered);
+        return remembered;
+    }
+    const stored = await fs.readFile(inlineStorePath(digest), "ascii").catch(() => null);
+    if (stored !== null) rememberInlineEncoding(digest, stored);
+    return stored;
+}
+
+// Base64 of an asset, shared by content hash with every other build.
+async function readInlineEncoding(assetPath: string): Promise<string> {
+    const stat = await fs.stat(assetPath);
+    const statKey = `${assetPath}\0${stat.size}\0${stat.mtimeMs}`;
+    const knownDigest = inlineDigestByStat.get(statKey);
+    if (knownDigest) {
+        const known = await recallInlineEncoding(knownDigest);
+        if (known !== null) {
+            rememberInlineDigest(statKey, knownDigest);
+            return known;
+        }
+    }
+    const payload = await fs.readFile(assetPath);
+    const digest = createHash("sha256").update(payload).digest("hex");
+    rememberInlineDigest(statKey, digest);
+    const cached = await recallInlineEncoding(digest);
+    if (cached !== null) return cached;
+
+    const encoded = payload.toString("base64");
+    const storePath = inlineStorePath(digest);
+    const tempPath = `${storePath}.${process.pid}.tmp`;
+    try {
+        await fs.mkdir(path.dirname(storePath), { recursive: true });
+        await fs.writeFile(tempPath, encoded, "ascii");
+        await fs.rename(tempPath, storePath);
+    } catch (e) {
+        // The store only saves re-encoding; a failed write must not fail the build.
+        console.warn(`[Builder] Could not store inline encoding ${digest}:`, e);
+        await fs.rm(tempPath, { force: true }).catch(() => {});
+    }
+    rememberInlineEncoding(digest, encoded);
+    return encoded;
+}
+
+// Data URI for a reference, "" to leave it as is, null if it cannot be resolved.
+async function resolveInlineReplacement(ref: string, workDir: string, options: InlineAssetOptions): Promise<string | null> {
+    const cleanRef = ref.split("#")[0].split("?")[0];
+    const normalized = cleanRef.replace(/^\.?\//, "");
+    if (!normalized || normalized.includes("..") || /^(https?:)?\/\//i.test(normalized) || normalized.startsWith("data:")) return "";
+
+    if (options.isPreview && isHighValuePreviewAsset(normalized, options.gameKey)) {
+        return buildPreviewPlaceholderDataUri(normalized);
+    }
+
+    const assetPath = path.join(workDir, normalized);
+    const assetExists = await fs
+        .access(assetPath, fsConstants.F_OK)
+        .then(() => true)
+        .catch(() => false);
+    const mimeType = assetExists ? getMimeType(assetPath) : null;
+    if (!mimeType) {
+        return shouldReplaceWithInlinePlaceholder(normalized) ? buildEmptyDataUri(normalized) : null;
+    }
+
+    if (options.isPreview && /^image\//.test(mimeType)) return buildTrashWatermarkedImageDataUri();
+    if (options.isPreview && /^audio\//.test(mimeType)) return buildEmptyDataUri(normalized);
+    const encoded = await readInlineEncoding(assetPath);
+    options.onEncoded?.(assetPath);
+    return `data:${mimeType};base64,${encoded}`;
+}
+
 async function inlineLocalAssetsInHtml(htmlPath: string, workDir: string, options: InlineAssetOptions): Promise<void> {
     const html = await fs.readFile(htmlPath, "utf-8");
-    const refs = html.match(ASSET_PATH_REGEX);
-    if (!refs || refs.length === 0) return;
+    const spans = findAssetRefs(html);
+    if (spans.length === 0) return;
 
-    const uniqueRefs = Array.from(new Set(refs));
-    let updated = html;
+    const replacements = new Map<string, string | null>();
+    const chunks: string[] = [];
+    let position = 0;
     let replacedCount = 0;
     const unresolvedRefs: string[] = [];
 
-    for (const ref of uniqueRefs) {
-        const cleanRef = ref.split("#")[0].split("?")[0];
-        const normalized = cleanRef.replace(/^\.?\//, "");
-        if (!normalized || normalized.includes("..") || /^(https?:)?\/\//i.test(normalized) || normalized.startsWith("data:")) continue;
-
-        if (options.isPreview && isHighValuePreviewAsset(normalized, options.gameKey)) {
-            updated = updated.split(ref).join(buildPreviewPlaceholderDataUri(normalized));
-            replacedCount++;
-            continue;
-        }
-
-        const assetPath = path.join(workDir, normalized);
-        const assetExists = await fs
-            .access(assetPath, fsConstants.F_OK)
-            .then(() => true)
-            .catch(() => false);
-        if (!assetExists) {
-            if (shouldReplaceWithInlinePlaceholder(normalized)) {
-                updated = updated.split(ref).join(buildEmptyDataUri(normalized));
-                replacedCount++;
-                continue;
-            }
-            unresolvedRefs.push(ref);
-            continue;
+    for (const [start, end] of spans) {
+        const ref = html.slice(start, end);
+        let replacement = replacements.get(ref);
+        if (replacement === undefined) {
+            replacement = await resolveInlineReplacement(ref, workDir, options);
+            replacements.set(ref, replacement);
+            if (replacement) replacedCount++;
         }
-
-        const mimeType = getMimeType(assetPath);
-        if (!mimeType) {
-            if (shouldReplaceWithInlinePlaceholder(normalized)) {
-                updated = updated.split(ref).join(buildEmptyDataUri(normalized));
-                replacedCount++;
-                continue;
-            }
+        if (replacement === null) {
             unresolvedRefs.push(ref);
             continue;
         }
-
-        let dataUri: string;
-        if (options.isPreview && /^image\//.test(mimeType)) {
-            dataUri = buildTrashWatermarkedImageDataUri();
-        } else if (options.isPreview && /^audio\//.test(mimeType)) {
-            dataUri = buildEmptyDataUri(normalized);
-        } else {
-            const payload = await fs.readFile(assetPath);
-            const base64 = payload.toString("base64");
-            dataUri = `data:${mimeType};base64,${base64}`;
-        }
-
-        if (updated.includes(ref)) {
-            updated = updated.split(ref).join(dataUri);
-            replacedCount++;
-        }
+        if (!replacement) continue;
+        chunks.push(html.slice(position, start), replacement);
+        position = end;
     }
 
-    if (replacedCount > 0 && updated !== html) {
-        await fs.writeFile(htmlPath, updated, "utf-8");
+    if (replacedCount > 0) {
+        chunks.push(html.slice(position));
+        await fs.writeFile(htmlPath, chunks.join(""), "utf-8");
         if (options.isPreview) {
             console.log(`[Builder] Inlined/stripped ${replacedCount} asset reference(s) for preview in ${path.basename(htmlPath)}.`);
         } else {
@@ -389,6 +538,28 @@ async function inlineLocalAssetsInHtml(htmlPath: string, workDir: string, option
     }
 }
 
+/**
+ * Encodes into the inline store every asset under `templateDir` that a watermarked preview of
+ * `gameKey` would embed, resolved exactly as the build resolves it; returns how many. Only
+ * previews run the inline step, so their rules are the ones warmed.
+ */
+export async function warmInlineCache(templateDir: string, gameKey: string): Promise<number> {
+    const encoded = new Set<string>();
+    const options: InlineAssetOptions = { isPreview: true, gameKey, onEncoded: (assetPath) => encoded.add(assetPath) };
+    const walk = async (dir: string): Promise<void> => {
+        for (const entry of await fs.readdir(dir, { withFileTypes: true })) {
+            const entryPath = path.join(dir, entry.name);
+            if (entry.isDirectory()) {
+                if (!INLINE_WARM_SKIP_DIRS.has(entry.name)) await walk(entryPath);
+            } else if (entry.isFile()) {
+                await resolveInlineReplacement(path.relative(templateDir, entryPath).split(path.sep).join("/"), templateDir, options);
+            }
+        }
+    };
+    await walk(templateDir);
+    return encoded.size;
+}
+
 function resolveTemplateConfig(game: string | undefined): TemplateBuildConfig {
     if (game && TEMPLATE_BY_GAME[game]) return TEMPLATE_BY_GAME[game];
     return TEMPLATE_BY_GAME.railroad;
@@ -474,34 +645,36 @@ async function ensureDepsCache(templateDir: string, requiredBins: string[]): Pro
         const cacheDir = path.join(DEPS_CACHE_ROOT, cacheKey);
         await fs.mkdir(cacheDir, { recursive: true });
 
-        const cachePackageJson = path.join(cacheDir, "package.json");
-        const templatePackageJson = path.join(templateDir, "package.json");
-        const templatePkg = await fs.readFile(templatePackageJson, "utf-8");
-        await fs.writeFile(cachePackageJson, templatePkg, "utf-8");
-
-        const cacheNodeModules = path.join(cacheDir, "node_modules");
-        let needsInstall = true;
-        try {
-            await fs.access(cacheNodeModules, fsConstants.F_OK);
-            needsInstall = false;
-        } catch {}
+        return withDirLock(`${cacheDir}.lock`, async () => {
+            const cachePackageJson = path.join(cacheDir, "package.json");
+            const templatePackageJson = path.join(templateDir, "package.json");
+            const templatePkg = await fs.readFile(templatePackageJson, "utf-8");
+            await fs.writeFile(cachePackageJson, templatePkg, "utf-8");
 
-        if (!needsInstall) {
-            const devDepsOk = await hasAllDevDeps(cacheNodeModules, cachePackageJson);
-            const binsOk = await hasBuildBins(cacheNodeModules, requiredBins);
-            if (!devDepsOk || !binsOk) needsInstall = true;
-        }
+            const cacheNodeModules = path.join(cacheDir, "node_modules");
+            let needsInstall = true;
+            try {
+                await fs.access(cacheNodeModules, fsConstants.F_OK);
+                needsInstall = false;
+            } catch {}
+
+            if (!needsInstall) {
+                const devDepsOk = await hasAllDevDeps(cacheNodeModules, cachePackageJson);
+                const binsOk = await hasBuildBins(cacheNodeModules, requiredBins);
+                if (!devDepsOk || !binsOk) needsInstall = true;
+            }
 
-        if (needsInstall) {
-            console.log(`[Builder] Installing dependency cache for ${path.basename(templateDir)}...`);
-            await execAsync(`npm install --no-audit --no-fund --include=dev`, {
-                cwd: cacheDir,
-                timeout: DEPS_INSTALL_TIMEOUT_MS,
-                maxBuffer: BUILD_MAX_BUFFER_BYTES,
-            });
-        }
+            if (needsInstall) {
+                console.log(`[Builder] Installing dependency cache for ${path.basename(templateDir)}...`);
+                await execAsync(`npm install --no-audit --no-fund --include=dev`, {
+                    cwd: cacheDir,
+                    timeout: DEPS_INSTALL_TIMEOUT_MS,
+                    maxBuffer: BUILD_MAX_BUFFER_BYTES,
+                });
+            }
 
-        return cacheNodeModules;
+            return cacheNodeModules;
+        });
     })();
 
     depsCachePromises.set(cacheKey, createdPromise);
@@ -509,7 +682,8 @@ async function ensureDepsCache(templateDir: string, requiredBins: string[]): Pro
 }
 
 // Build Queue Configuration
-const MAX_CONCURRENT_BUILDS = 2;
+// A Python-side pool runs several runner processes and sets this per process.
+const MAX_CONCURRENT_BUILDS = readPositiveIntEnv("BUILDER_MAX_CONCURRENT_BUILDS", 2);
 let activeBuilds = 0;
 const buildQueue: (() => void)[] = [];
 
@@ -522,10 +696,17 @@ export async function cleanupTemp() {
         const entries = await fs.readdir(TEMP_DIR, { withFileTypes: true });
         for (const entry of entries) {
             if (entry.name === path.basename(DEPS_CACHE_ROOT)) continue;
+            if (entry.name === path.basename(OPTIMIZED_TEMPLATES_ROOT)) continue;
+            if (entry.name === path.basename(INLINE_CACHE_ROOT)) continue;
             const targetPath = path.join(TEMP_DIR, entry.name);
+            // Live runners' workspaces are in use; only those of dead runners are removed.
+            if (targetPath === WORKSPACES_ROOT) continue;
+            // Profiles are read after the build finishes, possibly by a later runner.
+            if (targetPath === PROFILES_DIR) continue;
             await fs.rm(targetPath, { recursive: true, force: true });
         }
         await fs.mkdir(TEMP_DIR, { recursive: true });
+        await pruneDeadWorkspaces();
     } catch (e) {
         console.error("[Builder] Cleanup error:", e);
     }
@@ -541,8 +722,17 @@ export async function cleanupTemp() {
 interface Order {
     id: string;
     config: OrderConfig & { isWatermarked: boolean };
+    /** false forces a template build even when a library artifact exists (library prebuild). */
+    useLibrary?: boolean;
+    /** When set, the template's build command writes V8 CPU profiles into this directory. */
+    profileDir?: string;
 }
 
+export type BuildStage = "copy_template" | "link_deps" | "vite_build" | "inline_assets" | "inject_config" | "done";
+
+/** Called as each stage starts, with milliseconds since the job left the queue. */
+export type StageListener = (stage: BuildStage, elapsedMs: number) => void;
+
 function toRuntimeConfig(config: OrderConfig & { isWatermarked: boolean }) {
     const runtimeConfig: Record<string, unknown> = {
         game: config.game ?? "railroad",
@@ -690,6 +880,7 @@ async function validateTemplateResolutionContract(templateConfig: TemplateBuildC
 }
 
 function getLibraryArtifactPath(order: Order): string | null {
+    if (order.useLibrary === false) return null;
     const gameKey = String(order.config.game ?? "railroad");
     const gameId = LIBRARY_GAME_ID_BY_KEY[gameKey];
     if (!gameId) return null;
@@ -797,7 +988,223 @@ async function ensureWorkDependencies(
 /**
  * Internal worker that performs the actual build.
  */
-async function performBuild(order: Order): Promise<string | null> {
+/**
+ * Warm workspaces: each runner keeps populated copies of the templates it has built under
+ * `WORKSPACES_ROOT/<pid>/`. A job borrows one, writes its per-order files, builds, and
+ * hands it back; the reset to the pristine snapshot runs after the job has returned.
+ */
+type SnapshotEntry = { isDir: boolean; size: number; mtimeMs: number };
+
+type Workspace = {
+    dir: string;
+    templateDir: string;
+    /** What the workspace was cloned from: templateDir or its optimized copy. */
+    sourceDir: string;
+    snapshot: Map<string, SnapshotEntry>;
+};
+
+// Per template: workspaces being reset (or ready), resolving to null if one was discarded.
+const idleWorkspaces = new Map<string, Promise<Workspace | null>[]>();
+let workspaceCounter = 0;
+let workspacesPruned: Promise<void> | null = null;
+
+function isProcessAlive(pid: number): boolean {
+    try {
+        process.kill(pid, 0);
+        return true;
+    } catch (error) {
+        return (error as NodeJS.ErrnoException).code === "EPERM";
+    }
+}
+
+/** Removes workspaces left behind by runner processes that have exited or been killed. */
+async function pruneDeadWorkspaces(): Promise<void> {
+    const entries = await fs.readdir(WORKSPACES_ROOT).catch(() => [] as string[]);
+    await Promise.all(
+        entries.map(async (name) => {
+            const pid = Number(name);
+            if (!Number.isInteger(pid) || pid === process.pid || isProcessAlive(pid)) return;
+            await fs.rm(path.join(WORKSPACES_ROOT, name), { recursive: true, force: true }).catch(() => {});
+        })
+    );
+}
+
+/**
+ * Copies a template tree without node_modules. Files are reflinked where the filesystem
+ * supports it and copied otherwise; never hard-linked, because builds write in place.
+ */
+async function cloneTree(src: string, dest: string): Promise<void> {
+    await fs.mkdir(dest, { recursive: true });
+    const entries = await fs.readdir(src, { withFileTypes: true });
+    await Promise.all(
+        entries.map(async (entry) => {
+            if (entry.name === "node_modules") return;
+            const from = path.join(src, entry.name);
+            const to = path.join(dest, entry.name);
+            if (entry.isDirectory()) {
+                await cloneTree(from, to);
+            } else if (entry.isSymbolicLink()) {
+                await fs.symlink(await fs.readlink(from), to);
+            } else {
+                await fs.copyFile(from, to, fsConstants.COPYFILE_FICLONE);
+            }
+        })
+    );
+}
+
+async function snapshotTree(root: string, rel = "", into = new Map<string, SnapshotEntry>()): Promise<Map<string, SnapshotEntry>> {
+    const entries = await fs.readdir(path.join(root, rel), { withFileTypes: true });
+    for (const entry of entries) {
+        // Linked dependencies are shared and never written by a build.
+        if (!rel && entry.name === "node_modules") continue;
+        const relPath = path.join(rel, entry.name);
+        const stat = await fs.lstat(path.join(root, relPath));
+        into.set(relPath, { isDir: stat.isDirectory(), size: stat.size, mtimeMs: stat.mtimeMs });
+        if (stat.isDirectory()) await snapshotTree(root, relPath, into);
+    }
+    return into;
+}
+
+/** Deletes whatever a build added and restores whatever it changed; unchanged files are not touched. */
+async function resetWorkspace(workspace: Workspace): Promise<void> {
+    const current = await snapshotTree(workspace.dir);
+    for (const [relPath, entry] of current) {
+        const original = workspace.snapshot.get(relPath);
+        if (!original || original.isDir !== entry.isDir) {
+            await fs.rm(path.join(workspace.dir, relPath), { recursive: true, force: true });
+        }
+    }
+    for (const [relPath, original] of workspace.snapshot) {
+        const target = path.join(workspace.dir, relPath);
+        if (original.isDir) {
+            await fs.mkdir(target, { recursive: true });
+            continue;
+        }
+        const entry = current.get(relPath);
+        if (entry && !entry.isDir && entry.size === original.size && entry.mtimeMs === original.mtimeMs) continue;
+        await fs.rm(target, { force: true });
+        await fs.copyFile(path.join(workspace.sourceDir, relPath), target, fsConstants.COPYFILE_FICLONE);
+        const stat = await fs.lstat(target);
+        workspace.snapshot.set(relPath, { isDir: false, size: stat.size, mtimeMs: stat.mtimeMs });
+    }
+}
+
+/** SHA-256 over relative paths and bytes of every file under `root`; matches content_hash() in bot_py/artifact_cache.py. */
+async function contentHash(root: string): Promise<string> {
+    const files: string[] = [];
+    async function walk(rel: string): Promise<void> {
+        const entries = await fs.readdir(path.join(root, rel), { withFileTypes: true });
+        for (const entry of entries) {
+            const relPath = rel ? `${rel}/${entry.name}` : entry.name;
+            if (entry.isDirectory()) {
+                if (!SOURCE_HASH_SKIP_DIRS.has(entry.name)) await walk(relPath);
+            } else {
+                files.push(relPath);
+            }
+        }
+    }
+    await walk("");
+    files.sort((a, b) => (a < b ? -1 : a > b ? 1 : 0));
+    const hash = createHash("sha256");
+    for (const relPath of files) {
+        hash.update(relPath, "utf8");
+        hash.update("\0");
+        hash.update(await fs.readFile(path.join(root, relPath)));
+        hash.update("\0");
+    }
+    return hash.digest("hex");
+}
+
+// Decided once per runner: templates only change on deploy, and runners are recycled.
+const templateSources = new Map<string, Promise<string>>();
+
+/**
+ * The directory to clone `templateDir` from: its copy with optimized assets if the asset
+ * optimizer has written one for the template's current contents, otherwise the template.
+ */
+function resolveTemplateSource(templateDir: string): Promise<string> {
+    let source = templateSources.get(templateDir);
+    if (!source) {
+        source = (async () => {
+            const optimizedDir = path.join(OPTIMIZED_TEMPLATES_ROOT, path.basename(templateDir));
+            let manifest: { version?: number; source_hash?: string };
+            try {
+                manifest = JSON.parse(await fs.readFile(path.join(optimizedDir, OPTIMIZED_MANIFEST_NAME), "utf-8"));
+            } catch {
+                return templateDir;
+            }
+            if (manifest.version === 1 && manifest.source_hash === (await contentHash(templateDir))) {
+                console.log(`[Builder] Using optimized assets for ${path.basename(templateDir)}`);
+                return optimizedDir;
+            }
+            console.warn(`[Builder] Optimized assets for ${path.basename(templateDir)} are stale; re-run the asset optimizer`);
+            return templateDir;
+        })();
+        templateSources.set(templateDir, source);
+    }
+    return source;
+}
+
+async function acquireWorkspace(
+    templateConfig: TemplateBuildConfig,
+    templateDir: string,
+    stage: (name: BuildStage) => void,
+): Promise<Workspace> {
+    const idle = idleWorkspaces.get(templateDir) ?? [];
+    while (idle.length > 0) {
+        const workspace = await idle.shift()!;
+        if (workspace) return workspace;
+    }
+
+    workspacesPruned ??= pruneDeadWorkspaces();
+    await workspacesPruned;
+    const dir = path.join(WORKSPACES_ROOT, String(process.pid), `${templateConfig.templateDirName}_${++workspaceCounter}`);
+    try {
+        await fs.access(templateDir, fsConstants.F_OK);
+        const sourceDir = await resolveTemplateSource(templateDir);
+        await cloneTree(sourceDir, dir);
+        stage("link_deps");
+        await ensureWorkDependencies(templateConfig, templateDir, dir);
+        return { dir, templateDir, sourceDir, snapshot: await snapshotTree(dir) };
+    } catch (error) {
+        await fs.rm(dir, { recursive: true, force: true }).catch(() => {});
+        throw error;
+    }
+}
+
+/** Returns a workspace to the pool, or discards it after a failed build or beyond one per build slot. */
+function releaseWorkspace(workspace: Workspace, reusable: boolean): void {
+    const idle = idleWorkspaces.get(workspace.templateDir) ?? [];
+    idleWorkspaces.set(workspace.templateDir, idle);
+    const keep = reusable && idle.length < MAX_CONCURRENT_BUILDS;
+    const discard = async () => {
+        await fs.rm(workspace.dir, { recursive: true, force: true }).catch(() => {});
+        return null;
+    };
+    if (!keep) {
+        void discard();
+        return;
+    }
+    idle.push(
+        resetWorkspace(workspace).then(
+            () => workspace,
+            (error: unknown) => {
+                console.error(`[Builder] Workspace reset failed, discarding ${workspace.dir}:`, error);
+                return discard();
+            }
+        )
+    );
+}
+
+function buildCommandEnv(order: Order): NodeJS.ProcessEnv {
+    if (!order.profileDir) return process.env;
+    const nodeOptions = `${process.env.NODE_OPTIONS ?? ""} --import "${pathToFileURL(CPU_PROFILE_PRELOAD).href}"`;
+    return { ...process.env, NODE_OPTIONS: nodeOptions.trim(), BUILDER_PROFILE_DIR: order.profileDir };
+}
+
+async function performBuild(order: Order, onStage?: StageListener): Promise<string | null> {
+    const startedAt = Date.now();
+    const stage = (name: BuildStage) => onStage?.(name, Date.now() - startedAt);
     const isPreview = order.config.isWatermarked;
     const modeLabel = isPreview ? "PREVIEW" : "FINAL";
     console.log(`[Builder] [Job ${order.id}] Processing ${modeLabel}...`);
@@ -812,9 +1219,11 @@ async function performBuild(order: Order): Promise<string | null> {
             .then(() => true)
             .catch(() => false);
         if (exists) {
+            stage("inject_config");
             await fs.mkdir(PREVIEWS_DIR, { recursive: true });
             await fs.copyFile(libraryPath, finalPath);
             await injectRuntimeConfig(finalPath, toRuntimeConfig(order.config));
+            stage("done");
             return finalPath;
         }
     }
@@ -836,21 +1245,14 @@ async function performBuild(order: Order): Promise<string | null> {
         return finalPath;
     }
     
-    // 1. Create Temp Work Directory
-    const workDir = path.join(TEMP_DIR, order.id);
-    
-    try {
-        await fs.mkdir(workDir, { recursive: true });
-        await fs.access(templateDir, fsConstants.F_OK);
-        
-        // 2. Copy Template (skip node_modules to keep builds fast)
-        await fs.cp(templateDir, workDir, {
-            recursive: true,
-            filter: (src) => !src.includes(`${path.sep}node_modules`)
-        });
+    // 1-3. Borrow a warm workspace (template copy with linked dependencies)
+    stage("copy_template");
+    let workspace: Workspace | null = null;
+    let succeeded = false;
 
-        // 3. Link dependencies when template has package.json
-        await ensureWorkDependencies(templateConfig, templateDir, workDir);
+    try {
+        workspace = await acquireWorkspace(templateConfig, templateDir, stage);
+        const workDir = workspace.dir;
 
         // 4. Inject template-specific config
         await injectTemplateConfig(templateConfig, workDir, order.config);
@@ -862,11 +1264,13 @@ async function performBuild(order: Order): Promise<string | null> {
         
         // 5. Build
         if (templateConfig.buildCommand) {
+            stage("vite_build");
             console.log(`[Builder] [Job ${order.id}] Building ${templateConfig.templateDirName}...`);
             await execAsync(templateConfig.buildCommand, {
                 cwd: workDir,
                 timeout: BUILD_TIMEOUT_MS,
                 maxBuffer: BUILD_MAX_BUFFER_BYTES,
+                env: buildCommandEnv(order),
             });
         }
 
@@ -874,15 +1278,19 @@ async function performBuild(order: Order): Promise<string | null> {
         const distPath = path.join(workDir, templateConfig.outputHtmlRelativePath);
         await fs.access(distPath, fsConstants.F_OK);
         if (order.config.isWatermarked) {
+            stage("inline_assets");
             await inlineLocalAssetsInHtml(distPath, workDir, {
                 isPreview: true,
                 gameKey: String(order.config.game ?? "railroad"),
             });
         }
+        stage("inject_config");
         await fs.copyFile(distPath, finalPath);
         // Keep output as plain single-file playable: no obfuscation, no wrappers, no external protections.
         await injectRuntimeConfig(finalPath, toRuntimeConfig(order.config));
-        
+        stage("done");
+
+        succeeded = true;
         return finalPath;
     } catch (e) {
         if (isBuildTimeoutError(e)) {
@@ -891,15 +1299,15 @@ async function performBuild(order: Order): Promise<string | null> {
         console.error(`[Builder] [Job ${order.id}] Failed:`, e);
         return null;
     } finally {
-        // Always attempt cleanup to avoid orphaned temp dirs
-        await fs.rm(workDir, { recursive: true, force: true }).catch(() => {});
+        // Not awaited: the reset runs while the result is already on its way back.
+        if (workspace) releaseWorkspace(workspace, succeeded);
     }
 }
 
 /**
  * Entry point for building playables with concurrency control.
  */
-export async function generatePlayable(order: Order): Promise<string | null> {
+export async function generatePlayable(order: Order, onStage?: StageListener): Promise<string | null> {
     if (activeBuilds >= MAX_CONCURRENT_BUILDS) {
         if (buildQueue.length >= MAX_BUILD_QUEUE_SIZE) {
             console.error(`[Builder] Queue overflow: ${buildQueue.length} waiting. Rejecting job ${order.id}.`);
@@ -911,7 +1319,7 @@ export async function generatePlayable(order: Order): Promise<string | null> {
 
     activeBuilds++;
     try {
-        return await performBuild(order);
+        return await performBuild(order, onStage);
     } finally {
         activeBuilds--;
         const next = buildQueue.shift();
@@ -0,0 +1,190 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+from bot_py import artifact_cache
+from bot_py.artifact_cache import ArtifactCache, source_fingerprint
+
+
+class TestArtifactCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.cache = ArtifactCache(self.root / "cache", budget_bytes=25)
+        self.builds = 0
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def _builder(self, body: str, delay: float = 0):
+        async def build(scratch: Path) -> Path:
+            self.builds += 1
+            await asyncio.sleep(delay)
+            scratch.write_text(body, encoding="utf-8")
+            return scratch
+
+        return build
+
+    async def test_identical_requests_build_once_and_share_an_inode(self):
+        key = ArtifactCache.key_for({"game": "railroad", "clickUrl": "https://a.example"}, "en_usd", "v1")
+        build = self._builder("<html>1</html>", delay=0.05)
+
+        first, second = await asyncio.gather(
+            self.cache.get_or_build(key, "ord_1", "railroad.html", build),
+            self.cache.get_or_build(key, "ord_2", "railroad.html", build),
+        )
+        third = await self.cache.get_or_build(key, "ord_3", "railroad.html", build)
+
+        self.assertEqual(self.builds, 1)
+        self.assertEqual({first.parent.name, second.parent.name, third.parent.name}, {"ord_1", "ord_2", "ord_3"})
+        self.assertEqual(first.read_text(encoding="utf-8"), "<html>1</html>")
+        self.assertEqual(len({path.stat().st_ino for path in (first, second, third)}), 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.entries), (2, 1, 1))
+
+    async def test_waiter_rebuilds_when_the_shared_build_is_abandoned(self):
+        key = ArtifactCache.key_for({"game": "railroad"}, "en_usd", "v1")
+        owner = asyncio.create_task(self.cache.get_or_build(key, "speculative", "a.html", self._builder("<html>1</html>", delay=10)))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(self.cache.get_or_build(key, "paid", "a.html", self._builder("<html>1</html>")))
+        await asyncio.sleep(0.01)
+
+        owner.cancel()
+        path = await waiter
+
+        self.assertTrue(owner.cancelled())
+        self.assertEqual(path.read_text(encoding="utf-8"), "<html>1</html>")
+        self.assertEqual(self.builds, 2)
+
+    async def test_different_inputs_get_different_keys(self):
+        base = {"game": "railroad", "clickUrl": "https://a.example"}
+
+        self.assertNotEqual(ArtifactCache.key_for(base, "en_usd", "v1"), ArtifactCache.key_for(base, "pt_brl", "v1"))
+        self.assertNotEqual(ArtifactCache.key_for(base, "en_usd", "v1"), ArtifactCache.key_for(base, "en_usd", "v2"))
+        self.assertNotEqual(
+            ArtifactCache.key_for(base, "en_usd", "v1"),
+            ArtifactCache.key_for({**base, "clickUrl": "https://b.example"}, "en_usd", "v1"),
+        )
+
+    async def test_least_recently_used_objects_are_evicted_over_budget(self):
+        keys = [ArtifactCache.key_for({"n": index}, None, "v1") for index in range(3)]
+        await self.cache.get_or_build(keys[0], "o0", "a.html", self._builder("x" * 10))
+        await self.cache.get_or_build(keys[1], "o1", "a.html", self._builder("y" * 10))
+        # Touch the oldest so the middle one becomes least recently used.
+        await self.cache.get_or_build(keys[0], "o2", "a.html", self._builder("unused"))
+
+        await self.cache.get_or_build(keys[2], "o3", "a.html", self._builder("z" * 10))
+
+        stats = self.cache.stats()
+        self.assertEqual((stats.entries, stats.evictions), (2, 1))
+        self.builds = 0
+        await self.cache.get_or_build(keys[1], "o4", "a.html", self._builder("y" * 10))
+        self.assertEqual(self.builds, 1)
+
+    async def test_object_being_linked_is_not_evicted(self):
+        old, new = (ArtifactCache.key_for({"n": index}, None, "v1") for index in range(2))
+        await self.cache.get_or_build(old, "o0", "a.html", self._builder("x" * 10))
+        await self.cache.get_or_build(new, "o1", "a.html", self._builder("y" * 10))
+        touch = ArtifactCache._touch
+        loop = asyncio.get_running_loop()
+
+        def touch_then_prune(path: Path) -> bool:
+            # A prune for another request runs while this one still holds the oldest object.
+            touched = touch(path)
+            self.cache._budget_bytes = 10
+            asyncio.run_coroutine_threadsafe(self.cache._prune(), loop).result()
+            return touched
+
+        self.cache._touch = touch_then_prune  # type: ignore[method-assign]
+        path = await self.cache.get_or_build(old, "o2", "a.html", self._builder("unused"))
+
+        self.assertEqual(path.read_text(encoding="utf-8"), "x" * 10)
+        self.assertEqual(self.builds, 2)
+        self.assertEqual(self.cache.stats().evictions, 1)
+
+    async def test_concurrent_prunes_evict_each_object_once(self):
+        keys = [ArtifactCache.key_for({"n": index}, None, "v1") for index in range(6)]
+        self.cache._budget_bytes = 1000
+        for index, key in enumerate(keys):
+            await self.cache.get_or_build(key, f"o{index}", "a.html", self._builder("x" * 10))
+        self.cache._budget_bytes = 25
+
+        await asyncio.gather(self.cache._prune(), self.cache._prune())
+
+        stats = self.cache.stats()
+        self.assertEqual((stats.entries, stats.evictions), (2, 4))
+        self.assertEqual(sorted(path.name for path in (self.root / "cache" / "objects").rglob("*.html")), sorted(f"{key}.html" for key in keys[4:]))
+
+    async def test_concurrent_builds_over_budget_all_succeed(self):
+        keys = [ArtifactCache.key_for({"n": index}, None, "v1") for index in range(8)]
+
+        paths = await asyncio.gather(
+            *(self.cache.get_or_build(key, f"o{index}", "a.html", self._builder("x" * 10, delay=0.01)) for index, key in enumerate(keys))
+        )
+
+        self.assertTrue(all(path.read_text(encoding="utf-8") == "x" * 10 for path in paths))
+        # Objects pinned while their siblings linked go on the next prune.
+        await self.cache._prune()
+        self.assertEqual(self.cache.stats().entries, 2)
+
+    async def test_object_removed_before_linking_is_rebuilt(self):
+        key = ArtifactCache.key_for({"game": "railroad"}, None, "v1")
+        await self.cache.get_or_build(key, "o1", "a.html", self._builder("ok"))
+        touch = ArtifactCache._touch
+
+        def touch_then_remove(path: Path) -> bool:
+            touched = touch(path)
+            path.unlink(missing_ok=True)
+            return touched
+
+        self.cache._touch = touch_then_remove  # type: ignore[method-assign]
+        with self.assertLogs(level="WARNING"):
+            path = await self.cache.get_or_build(key, "o2", "a.html", self._builder("rebuilt"))
+
+        self.assertEqual(path.read_text(encoding="utf-8"), "rebuilt")
+        self.assertEqual(self.builds, 2)
+
+    async def test_order_links_know_their_key(self):
+        key = ArtifactCache.key_for({"game": "railroad"}, None, "v1")
+        first = await self.cache.get_or_build(key, "o1", "a.html", self._builder("ok"))
+        second = await self.cache.get_or_build(key, "o2", "a.html", self._builder("unused"))
+
+        self.assertEqual((self.cache.key_of(first), self.cache.key_of(second)), (key, key))
+        self.assertIsNone(self.cache.key_of(self.root / "elsewhere.html"))
+
+    async def test_failed_build_is_not_cached(self):
+        key = ArtifactCache.key_for({"game": "railroad"}, None, "v1")
+
+        async def failing(_: Path) -> None:
+            self.builds += 1
+            return None
+
+        self.assertIsNone(await self.cache.get_or_build(key, "o1", "a.html", failing))
+        self.assertIsNotNone(await self.cache.get_or_build(key, "o2", "a.html", self._builder("ok")))
+        self.assertEqual(self.builds, 2)
+
+    async def test_index_is_rebuilt_from_disk(self):
+        key = ArtifactCache.key_for({"game": "railroad"}, None, "v1")
+        await self.cache.get_or_build(key, "o1", "a.html", self._builder("ok"))
+
+        reopened = ArtifactCache(self.root / "cache", budget_bytes=25)
+        await reopened.get_or_build(key, "o2", "a.html", self._builder("rebuilt"))
+
+        self.assertEqual(self.builds, 1)
+
+
+def test_source_fingerprint_skips_build_outputs(tmp_path: Path) -> None:
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "main.ts").write_text("a", encoding="utf-8")
+    (tmp_path / "node_modules").mkdir()
+    (tmp_path / "node_modules" / "dep.js").write_text("b", encoding="utf-8")
+    before = source_fingerprint([tmp_path])
+
+    (tmp_path / "node_modules" / "dep.js").write_text("changed", encoding="utf-8")
+    artifact_cache._fingerprints.clear()
+    assert source_fingerprint([tmp_path]) == before
+
+    (tmp_path / "src" / "main.ts").write_text("changed", encoding="utf-8")
+    artifact_cache._fingerprints.clear()
+    assert source_fingerprint([tmp_path]) != before
@@ -0,0 +1,67 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from bot_py.artifact_cache import content_hash
+from bot_py.asset_optimizer import OPTIMIZED_MANIFEST_NAME, fresh_optimized_dir, optimize_template, referenced_assets, rewrite_references
+
+
+def test_references_match_names_url_encoding_and_frame_prefixes() -> None:
+    assets = ["assets/bg.png", "assets/Слой 1.webp", "assets/jump/frame_07.png", "assets/unused.png", "assets/unused_2.png"]
+    sources = "load('assets/bg.png'); load('assets/%D0%A1%D0%BB%D0%BE%D0%B9%201.webp'); for (i) `jump/frame_${i}.png`"
+
+    assert referenced_assets(assets, sources) == {"assets/bg.png", "assets/Слой 1.webp", "assets/jump/frame_07.png"}
+
+
+def test_rewrite_replaces_whole_file_names_only() -> None:
+    text = "new URL('../assets/hand.png'); 'big_hand.png'; \"hand.png?inline\"; 'hand.png.map'"
+
+    rewritten = rewrite_references(text, {"hand.png": "hand.webp"})
+
+    assert rewritten == "new URL('../assets/hand.webp'); 'big_hand.png'; \"hand.webp?inline\"; 'hand.png.map'"
+
+
+def _template(root: Path) -> Path:
+    image = pytest.importorskip("PIL.Image")
+    template = root / "templates" / "matching"
+    for folder in ("public/assets", "src/assets"):
+        (template / folder).mkdir(parents=True)
+        image.new("RGBA", (256, 256), (200, 40, 40, 255)).save(template / folder / "hand.png")
+    image.new("RGB", (64, 64), (0, 0, 0)).save(template / "src" / "assets" / "unused.png")
+    (template / "src" / "main.js").write_text("const hand = new URL('./assets/hand.png', import.meta.url).href;\n", encoding="utf-8")
+    (template / "node_modules").mkdir()
+    return template
+
+
+def test_optimized_copy_renames_converted_assets_and_drops_unused(tmp_path: Path) -> None:
+    template = _template(tmp_path)
+    output = tmp_path / "optimized" / "matching"
+
+    report = optimize_template(template, output)
+
+    actions = {asset.path: (asset.action, asset.output) for asset in report.assets}
+    assert actions["src/assets/unused.png"] == ("dropped", None)
+    assert actions["src/assets/hand.png"][1] == "src/assets/hand.webp"
+    assert actions["public/assets/hand.png"][1] == "public/assets/hand.webp"
+    assert report.optimized_bytes < report.original_bytes
+    assert sorted(path.relative_to(output).as_posix() for path in output.rglob("*") if path.is_file()) == [
+        OPTIMIZED_MANIFEST_NAME,
+        "public/assets/hand.webp",
+        "src/assets/hand.webp",
+        "src/main.js",
+    ]
+    assert "./assets/hand.webp" in (output / "src" / "main.js").read_text(encoding="utf-8")
+    manifest = json.loads((output / OPTIMIZED_MANIFEST_NAME).read_text(encoding="utf-8"))
+    assert manifest["source_hash"] == content_hash(template)
+
+
+def test_optimized_copy_goes_stale_with_its_template(tmp_path: Path) -> None:
+    template = _template(tmp_path)
+    output = tmp_path / "optimized" / "matching"
+    optimize_template(template, output, keep_formats=True)
+
+    assert fresh_optimized_dir(template, output) == output
+    assert (output / "src" / "assets" / "hand.png").exists()
+    (template / "src" / "main.js").write_text("// changed\n", encoding="utf-8")
+    assert fresh_optimized_dir(template, output) is None
@@ -0,0 +1,174 @@
+import unittest
+from collections.abc import Collection
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from unittest import mock
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import SendDocument, SendPhoto
+from aiogram.types import FSInputFile
+
+from bot_py import asset_registry
+from bot_py.asset_registry import AssetRegistry, PhotoAsset, document_key
+
+
+class MemoryStore:
+    def __init__(self, rows: dict[str, str]) -> None:
+        self.rows = dict(rows)
+        self.reads: list[list[str]] = []
+
+    async def get_assets(self, keys: Collection[str]) -> dict[str, str]:
+        self.reads.append(sorted(keys))
+        return {key: self.rows[key] for key in keys if key in self.rows}
+
+    async def set_asset(self, key: str, file_id: str) -> None:
+        self.rows[key] = file_id
+
+
+class FakeBot:
+    def __init__(self, failing: set[str] = frozenset()) -> None:
+        self.failing = failing
+        self.uploaded: list[str] = []
+        self.deleted: list[int] = []
+        self.documents: list[str] = []
+
+    async def send_photo(self, chat_id: int, photo: FSInputFile, **kwargs: object) -> SimpleNamespace:
+        name = Path(photo.path).name
+        if name in self.failing:
+            raise TelegramBadRequest(method=SendPhoto(chat_id=chat_id, photo="x"), message="Bad Request: IMAGE_PROCESS_FAILED")
+        self.uploaded.append(name)
+        return SimpleNamespace(message_id=len(self.uploaded), photo=[SimpleNamespace(file_id=f"id-{name}")])
+
+    async def send_document(self, chat_id: int, document: str | FSInputFile, **kwargs: object) -> SimpleNamespace:
+        if isinstance(document, str):
+            if document in self.failing:
+                raise TelegramBadRequest(method=SendDocument(chat_id=chat_id, document=document), message="Bad Request: wrong file identifier")
+            self.documents.append(document)
+            return SimpleNamespace(document=SimpleNamespace(file_id=document))
+        name = Path(document.path).name
+        self.documents.append(name)
+        return SimpleNamespace(document=SimpleNamespace(file_id=f"id-{name}"))
+
+    async def delete_message(self, chat_id: int, message_id: int) -> bool:
+        self.deleted.append(message_id)
+        return True
+
+
+class TestAssetRegistry(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self._tmp = TemporaryDirectory()
+        root = Path(self._tmp.name)
+        for name in ("welcome.png", "fallback.jpg", "broken.png"):
+            (root / name).write_bytes(b"img")
+        self.root = root
+        self.assets = [
+            PhotoAsset("welcome", (root / "welcome.png",)),
+            PhotoAsset("preview", (root / "missing.png", root / "fallback.jpg")),
+            PhotoAsset("broken", (root / "broken.png",)),
+            PhotoAsset("absent", (root / "nowhere.png",)),
+        ]
+
+    async def asyncTearDown(self) -> None:
+        self._tmp.cleanup()
+
+    async def test_lookups_are_served_from_memory_after_load(self):
+        store = MemoryStore({"welcome": "cached-welcome", "doc:abc": "cached-doc"})
+        registry = AssetRegistry(store, self.assets)
+        with self.assertLogs(level="WARNING"):
+            await registry.load()
+
+        assert registry.manifest == {"welcome": self.root / "welcome.png", "preview": self.root / "fallback.jpg", "broken": self.root / "broken.png"}
+        assert registry.photo("welcome") == "cached-welcome"
+        preview = registry.photo("preview")
+        assert isinstance(preview, FSInputFile) and Path(preview.path) == self.root / "fallback.jpg"
+        assert registry.photo("absent") is None
+
+        await registry.remember("preview", "new-preview")
+        assert registry.photo("preview") == "new-preview"
+        assert store.rows["preview"] == "new-preview"
+        # Only the registered images are read, never the per-delivery document rows.
+        assert store.reads == [["absent", "broken", "preview", "welcome"]]
+
+    async def test_prewarm_uploads_only_images_without_a_file_id(self):
+        store = MemoryStore({"welcome": "cached-welcome"})
+        registry = AssetRegistry(store, self.assets)
+        with self.assertLogs(level="WARNING"):
+            await registry.load()
+        bot = FakeBot(failing={"broken.png"})
+
+        with self.assertLogs(level="WARNING"):
+            assert await registry.prewarm(bot, 42) == 1
+
+        assert bot.uploaded == ["fallback.jpg"]
+        assert bot.deleted == [1]
+        assert registry.photo("preview") == "id-fallback.jpg"
+        assert store.rows == {"welcome": "cached-welcome", "preview": "id-fallback.jpg"}
+        assert isinstance(registry.photo("broken"), FSInputFile)
+
+    async def test_documents_are_resent_by_cached_file_id(self):
+        store = MemoryStore({"doc:k": "cached-doc", "doc:stale": "expired-doc"})
+        registry = AssetRegistry(store, [])
+        await registry.load()
+        bot = FakeBot(failing={"expired-doc"})
+        uploads: list[str] = []
+
+        async def upload() -> tuple[FSInputFile, str]:
+            uploads.append("playable.zip")
+            return FSInputFile(self.root / "playable.zip"), "doc:stale"
+
+        await registry.send_document(bot, 42, "doc:k", upload, caption="ready")
+        with self.assertLogs(level="WARNING"):
+            await registry.send_document(bot, 42, "doc:stale", upload)
+        await registry.send_document(bot, 42, "doc:stale", upload)
+
+        assert bot.documents == ["cached-doc", "playable.zip", "id-playable.zip"]
+        assert uploads == ["playable.zip"]
+        assert store.rows["doc:stale"] == "id-playable.zip"
+        # Each document is read from the store once; the re-upload's id is served from memory.
+        assert store.reads == [[], ["doc:k"], ["doc:stale"]]
+
+    async def test_fallback_upload_is_remembered_under_its_own_key(self):
+        store = MemoryStore({})
+        registry = AssetRegistry(store, [])
+        bot = FakeBot()
+
+        async def upload() -> tuple[FSInputFile, str]:
+            # The ZIP was wanted, but archiving failed and the HTML went out instead.
+            return FSInputFile(self.root / "playable.html"), "doc:k"
+
+        await registry.send_document(bot, 42, "doc:k.zip", upload)
+
+        assert bot.documents == ["playable.html"]
+        assert store.rows == {"doc:k": "id-playable.html"}
+        assert store.reads == [["doc:k.zip"]]
+
+    async def test_only_recent_document_ids_stay_in_memory(self):
+        store = MemoryStore({})
+        registry = AssetRegistry(store, [])
+        with mock.patch.object(asset_registry, "DOCUMENT_IDS_MAX", 2):
+            for key in ("doc:a", "doc:b", "doc:c"):
+                await registry.remember(key, f"id-{key}")
+        bot = FakeBot()
+
+        async def upload() -> tuple[FSInputFile, str]:
+            raise AssertionError("a remembered document is not uploaded again")
+
+        await registry.send_document(bot, 42, "doc:a", upload)
+        await registry.send_document(bot, 42, "doc:c", upload)
+
+        assert bot.documents == ["id-doc:a", "id-doc:c"]
+        assert store.reads == [["doc:a"]]
+
+
+def test_document_keys_follow_the_artifact_and_the_zip(tmp_path: Path) -> None:
+    html = tmp_path / "a_final.html"
+    html.write_text("<html></html>", encoding="utf-8")
+
+    assert document_key(html, "abc") == "doc:abc"
+    assert document_key(html, "abc", archived=True) == "doc:abc.zip"
+    by_path = document_key(html)
+    assert by_path.startswith("doc:") and document_key(html) == by_path
+    assert document_key(html, archived=True) == f"{by_path}.zip"
+    html.write_text("<html>rebuilt</html>", encoding="utf-8")
+    assert document_key(html) != by_path
@@ -0,0 +1,161 @@
+import re
+import sqlite3
+import tempfile
+import time
+import unittest
+from collections.abc import Sequence
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.methods import SendMessage
+from aiogram.types import BufferedInputFile
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from bot_py import db
+from bot_py.broadcast import BroadcastEngine, BroadcastJob, RecipientResult
+from bot_py.db import DB
+
+ADMIN_BROADCAST_JOBS = Path(__file__).resolve().parents[1] / "admin" / "src" / "lib" / "broadcast-jobs.ts"
+BROADCAST_TABLES = ("broadcasts", "broadcast_recipients", "blocked_users")
+
+
+class MemoryStore:
+    def __init__(self, recipients: list[int], blocked: set[int] | None = None) -> None:
+        self.status = dict.fromkeys(recipients, "pending")
+        self.blocked = blocked or set()
+        self.file_id = ""
+        self.finished: tuple[str, str] | None = None
+        self.batches: list[int] = []
+
+    async def claim_broadcast(self) -> BroadcastJob | None:
+        return None
+
+    async def next_broadcast_recipients(self, broadcast_id: str, limit: int) -> list[int]:
+        for user_id in [user_id for user_id, status in self.status.items() if status == "pending" and user_id in self.blocked]:
+            self.status[user_id] = "blocked"
+        return [user_id for user_id, status in self.status.items() if status == "pending"][:limit]
+
+    async def set_broadcast_file_id(self, broadcast_id: str, file_id: str) -> None:
+        self.file_id = file_id
+
+    async def record_broadcast_results(self, broadcast_id: str, results: Sequence[RecipientResult]) -> None:
+        self.batches.append(len(results))
+        for item in results:
+            self.status[item.user_id] = item.status
+            if item.status == "blocked":
+                self.blocked.add(item.user_id)
+
+    async def finish_broadcast(self, broadcast_id: str, status: str, error: str = "") -> None:
+        self.finished = (status, error)
+
+
+class FakeBot:
+    def __init__(self, *, blocked: Sequence[int] = (), missing: Sequence[int] = ()) -> None:
+        self.blocked = set(blocked)
+        self.missing = set(missing)
+        self.photos: list[tuple[int, object]] = []
+        self.messages: list[int] = []
+
+    def _check(self, chat_id: int) -> None:
+        method = SendMessage(chat_id=chat_id, text="x")
+        if chat_id in self.blocked:
+            raise TelegramForbiddenError(method=method, message="Forbidden: bot was blocked by the user")
+        if chat_id in self.missing:
+            raise TelegramBadRequest(method=method, message="Bad Request: chat not found")
+
+    async def send_photo(self, chat_id: int, photo: object, **kwargs: object) -> SimpleNamespace:
+        self._check(chat_id)
+        self.photos.append((chat_id, photo))
+        return SimpleNamespace(photo=[SimpleNamespace(file_id="small"), SimpleNamespace(file_id="large")])
+
+    async def send_message(self, chat_id: int, text: str, **kwargs: object) -> SimpleNamespace:
+        self._check(chat_id)
+        self.messages.append(chat_id)
+        return SimpleNamespace()
+
+
+class TestBroadcastEngine(unittest.IsolatedAsyncioTestCase):
+    async def test_photo_is_uploaded_once_and_reused_by_file_id(self):
+        store = MemoryStore([1, 2, 3, 4, 5])
+        bot = FakeBot(blocked=[1])
+        engine = BroadcastEngine(bot, store, rate=1000, batch_size=2)
+
+        await engine.send(BroadcastJob("br_1", "Hello", photo=b"jpeg"))
+
+        uploads = [chat_id for chat_id, photo in bot.photos if isinstance(photo, BufferedInputFile)]
+        assert uploads == [2]
+        assert [photo for _, photo in bot.photos[1:]] == ["large", "large", "large"]
+        assert store.file_id == "large"
+        assert store.status == {1: "blocked", 2: "sent", 3: "sent", 4: "sent", 5: "sent"}
+        assert store.finished == ("completed", "")
+
+    async def test_resume_sends_only_pending_recipients_and_skips_blocked_users(self):
+        store = MemoryStore([1, 2, 3, 4], blocked={3})
+        store.status[1] = "sent"
+        bot = FakeBot(blocked=[4], missing=[2])
+        engine = BroadcastEngine(bot, store, rate=1000)
+
+        await engine.send(BroadcastJob("br_1", "Hi"))
+
+        assert bot.messages == []
+        assert store.status == {1: "sent", 2: "failed", 3: "blocked", 4: "blocked"}
+        assert store.blocked == {3, 4}
+
+    async def test_sends_are_paced_by_the_rate(self):
+        store = MemoryStore(list(range(1, 31)))
+        bot = FakeBot()
+        engine = BroadcastEngine(bot, store, rate=20, batch_size=10)
+
+        started = time.monotonic()
+        await engine.send(BroadcastJob("br_1", "Hi"))
+
+        # 20 go out as the first burst, the other 10 at 20 a second.
+        assert 0.4 < time.monotonic() - started < 0.9
+        assert sorted(bot.messages) == list(range(1, 31))
+        assert store.batches == [10, 10, 10]
+
+
+def _admin_broadcast_ddl() -> list[str]:
+    source = ADMIN_BROADCAST_JOBS.read_text(encoding="utf-8")
+    body = source[source.index("export async function ensureBroadcastTables") :]
+    body = body[: body.index("\n}\n")]
+    return [backticked or quoted for backticked, quoted in re.findall(r'\$executeRawUnsafe\(\s*(?:`([^`]*)`|"([^"]*)")', body)]
+
+
+def _tables(path: Path) -> dict[str, tuple[list[tuple], list[tuple]]]:
+    with sqlite3.connect(path) as conn:
+        schema = {}
+        for table in BROADCAST_TABLES:
+            indexes = [
+                (name, unique, conn.execute(f"PRAGMA index_info({name})").fetchall())
+                for _, name, unique, origin, _ in conn.execute(f"PRAGMA index_list({table})").fetchall()
+                if origin == "c"
+            ]
+            schema[table] = (conn.execute(f"PRAGMA table_info({table})").fetchall(), sorted(indexes))
+    return schema
+
+
+class TestBroadcastSchema(unittest.IsolatedAsyncioTestCase):
+    async def test_admin_panel_and_bot_create_the_same_tables(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            admin_db, bot_db = Path(tmp) / "admin.db", Path(tmp) / "bot.db"
+            statements = _admin_broadcast_ddl()
+            with sqlite3.connect(admin_db) as conn:
+                for statement in statements:
+                    conn.execute(statement)
+            engine = create_async_engine(f"sqlite+aiosqlite:///{bot_db.as_posix()}")
+            try:
+                async with engine.begin() as conn:
+                    await conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, language TEXT)"))
+                with mock.patch.object(db, "engine", engine):
+                    await DB.ensure_runtime_schema()
+            finally:
+                await engine.dispose()
+
+            assert len(statements) == 4
+            admin, bot = _tables(admin_db), _tables(bot_db)
+            assert all(admin[table][0] for table in BROADCAST_TABLES)
+            assert admin == bot
@@ -0,0 +1,47 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from bot_py.build_bench import format_table, run_matrix
+from bot_py.builder_bridge import BuildMetrics, BuildMetricsStore
+from bot_py.models import OrderConfig
+from bot_py.prebuild_library import LibraryTarget
+
+
+class FlakyPool:
+    """Fails the first build the way a crashed worker does, then succeeds."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.metrics = BuildMetricsStore()
+        self.calls = 0
+
+    async def generate_playable(self, order_id: str, config: OrderConfig, **kwargs: object) -> str | None:
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError("builder worker exited")
+        produced = self.root / f"{order_id}.html"
+        produced.write_text("<html></html>", encoding="utf-8")
+        self.metrics.record(BuildMetrics(order_id, config.game, bool(config.is_watermarked), True, 1.0, {"vite_build": 0.5}, None))
+        return str(produced)
+
+
+class TestBuildBench(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    async def test_a_failed_worker_counts_as_a_failed_run(self):
+        target = LibraryTarget("game_drag", "drag", "default", "templates/drag", "en_usd", "en", "$", "preview")
+        pool = FlakyPool(self.root)
+
+        results = await run_matrix(pool, [target], repeat=3)  # type: ignore[arg-type]
+
+        runs = results[target.relative_path]
+        self.assertEqual([run.ok for run in runs], [False, True, True])
+        self.assertEqual((runs[0].job_id, runs[0].preview), ("bench_game_drag_preview_0", True))
+        self.assertEqual(list(self.root.iterdir()), [])
+        self.assertEqual(format_table(results).splitlines()[1].split()[-1], "2/3")
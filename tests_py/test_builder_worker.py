@@ -0,0 +1,437 @@
+import asyncio
+import os
+import sys
+import tempfile
+import textwrap
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from bot_py.builder_bridge import (
+    BuilderPool,
+    BuilderWorker,
+    BuildMetrics,
+    BuildPriority,
+    BuildProgress,
+    BuildQueueFullError,
+    BuildScheduler,
+    read_tree_rss_bytes,
+    stage_durations,
+    summarize_stages,
+)
+from bot_py.models import OrderConfig
+
+FAKE_RUNNER = textwrap.dedent(
+    """
+    import json
+    import os
+    import subprocess
+    import sys
+    import threading
+    import time
+
+    lock = threading.Lock()
+
+    def reply(message):
+        with lock:
+            sys.stdout.write(json.dumps(message) + "\\n")
+            sys.stdout.flush()
+
+    def handle(request):
+        action = request.get("action")
+        if action == "ping":
+            reply({"rid": request["rid"], "ok": True, "pong": True})
+        elif action == "generate":
+            if request["config"].get("spawn"):
+                # Stands in for the vite child a real build runs.
+                child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+                with open("child.pid", "w") as handle:
+                    handle.write(str(child.pid))
+            reply({"rid": request["rid"], "event": "stage", "stage": "vite_build", "elapsedMs": 5})
+            time.sleep(request["config"].get("delay", 0))
+            reply({"rid": request["rid"], "event": "stage", "stage": "done", "elapsedMs": 25})
+            path = f"/out/{request['id']}.html"
+            response = {"rid": request["rid"], "ok": True, "path": path, "pid": os.getpid(), "env": os.environ.get("BUILDER_MAX_CONCURRENT_BUILDS")}
+            if request.get("profile"):
+                response["profileDir"] = "/profiles/" + request["id"]
+            reply(response)
+        elif action == "crash":
+            os._exit(3)
+
+    for line in sys.stdin:
+        threading.Thread(target=handle, args=(json.loads(line),)).start()
+    """
+)
+
+
+def _running(pid: int) -> bool:
+    # An orphan nobody reaps lingers as a zombie; that still counts as killed.
+    try:
+        state = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()[0]
+    except (OSError, IndexError):
+        return False
+    return state != "Z"
+
+
+class TestBuilderWorker(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        script = Path(self._tmp.name) / "fake_runner.py"
+        script.write_text(FAKE_RUNNER, encoding="utf-8")
+        self.worker = BuilderWorker([sys.executable, str(script)], cwd=Path(self._tmp.name))
+
+    async def asyncTearDown(self) -> None:
+        await self.worker.close(grace_seconds=0)
+        self._tmp.cleanup()
+
+    async def test_concurrent_requests_are_matched_by_rid(self):
+        slow = self.worker.request({"action": "generate", "id": "slow", "config": {"delay": 0.2}})
+        fast = self.worker.request({"action": "generate", "id": "fast", "config": {}})
+
+        slow_response, fast_response = await asyncio.gather(slow, fast)
+
+        self.assertEqual(slow_response["path"], "/out/slow.html")
+        self.assertEqual(fast_response["path"], "/out/fast.html")
+        self.assertEqual(slow_response["pid"], fast_response["pid"])
+        self.assertEqual(self.worker.in_flight, 0)
+
+    async def test_ping(self):
+        self.assertTrue(await self.worker.ping())
+
+    async def test_crash_fails_pending_and_next_request_restarts(self):
+        await self.worker.ping()
+        first_pid = self.worker.pid
+        with self.assertRaises(RuntimeError):
+            await self.worker.request({"action": "crash"}, timeout=5)
+
+        response = await self.worker.request({"action": "generate", "id": "again", "config": {}}, timeout=5)
+
+        self.assertEqual(response["path"], "/out/again.html")
+        self.assertNotEqual(response["pid"], first_pid)
+        self.assertEqual(self.worker.restarts, 1)
+
+    async def test_restart_replaces_process(self):
+        await self.worker.ping()
+        old_pid = self.worker.pid
+
+        await self.worker.restart()
+
+        self.assertTrue(self.worker.alive)
+        self.assertNotEqual(self.worker.pid, old_pid)
+
+
+class TestBuilderPool(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.script = Path(self._tmp.name) / "fake_runner.py"
+        self.script.write_text(FAKE_RUNNER, encoding="utf-8")
+
+    async def asyncTearDown(self) -> None:
+        await self.pool.close()
+        self._tmp.cleanup()
+
+    def _pool(self, size: int, **kwargs) -> BuilderPool:
+        self.pool = BuilderPool(size, command=[sys.executable, str(self.script)], cwd=Path(self._tmp.name), **kwargs)
+        return self.pool
+
+    async def test_jobs_spread_over_idle_workers(self):
+        pool = self._pool(2)
+        slow = OrderConfig(extra={"delay": 0.3})
+
+        paths = await asyncio.gather(pool.generate_playable("a", slow), pool.generate_playable("b", slow))
+
+        self.assertEqual(paths, ["/out/a.html", "/out/b.html"])
+        stats = pool.stats()
+        self.assertEqual([item.jobs_completed for item in stats], [1, 1])
+        self.assertEqual(len({item.pid for item in stats}), 2)
+
+    async def test_stage_events_reach_progress_listener(self):
+        pool = self._pool(1)
+        events: list[BuildProgress] = []
+
+        path = await pool.generate_playable("a", OrderConfig(), events.append)
+
+        self.assertEqual(path, "/out/a.html")
+        self.assertEqual(events, [BuildProgress("vite_build", 5), BuildProgress("done", 25)])
+
+    async def test_builds_are_recorded_with_stages_and_peak_rss(self):
+        pool = self._pool(1)
+
+        await pool.generate_playable("a", OrderConfig(game="railroad", is_watermarked=True, extra={"delay": 0.3}), profile=True)
+        await pool.generate_playable("b", OrderConfig(), use_library=False)
+
+        first, second = pool.metrics.recent()
+        self.assertEqual((first.job_id, first.game, first.preview, first.ok), ("a", "railroad", True, True))
+        self.assertEqual(first.stages, {"vite_build": 0.02})
+        self.assertEqual(first.profile_dir, "/profiles/a")
+        self.assertGreaterEqual(first.total_seconds, 0.3)
+        self.assertGreater(first.peak_rss_bytes or 0, 0)
+        self.assertIsNone(second.profile_dir)
+        self.assertEqual([item.stage for item in pool.metrics.stage_summary()], ["vite_build", "total"])
+
+    async def test_worker_is_recycled_after_max_jobs(self):
+        pool = self._pool(1, max_jobs_per_worker=2)
+
+        for order_id in ("a", "b", "c"):
+            await pool.generate_playable(order_id, OrderConfig())
+
+        stats = pool.stats()[0]
+        self.assertEqual(stats.recycled, 1)
+        self.assertEqual(stats.jobs_completed, 3)
+        self.assertIsNotNone(stats.rss_bytes)
+
+    async def test_health_check_leaves_busy_workers_alone(self):
+        pool = self._pool(1)
+        await pool.generate_playable("warm", OrderConfig())
+        worker = pool.stats()[0].pid
+
+        async def no_pong(timeout: float = 0) -> bool:
+            return False
+
+        pool._slots[0].worker.ping = no_pong  # type: ignore[method-assign]
+        build = asyncio.create_task(pool.generate_playable("busy", OrderConfig(extra={"delay": 0.3})))
+        await asyncio.sleep(0.1)
+
+        self.assertEqual(await pool.check_health(), 0)
+        self.assertEqual(await build, "/out/busy.html")
+        self.assertEqual(pool.stats()[0].pid, worker)
+        with self.assertLogs(level="WARNING"):
+            self.assertEqual(await pool.check_health(), 1)
+        self.assertNotEqual(pool.stats()[0].pid, worker)
+
+    async def test_deadline_kills_process_group_and_workspaces(self):
+        pool = self._pool(1, deadline_seconds=0.5)
+        await pool.generate_playable("warm", OrderConfig())
+        old_pid = pool.stats()[0].pid
+        work_dir = Path(self._tmp.name) / "temp" / "_workspaces" / str(old_pid)
+        work_dir.mkdir(parents=True)
+
+        self.assertIsNone(await pool.generate_playable("stuck", OrderConfig(extra={"spawn": True, "delay": 30})))
+
+        child_pid = int((Path(self._tmp.name) / "child.pid").read_text())
+        for _ in range(50):
+            if not pool._retiring:
+                break
+            await asyncio.sleep(0.05)
+        self.assertFalse(_running(child_pid))
+        self.assertFalse(work_dir.exists())
+        self.assertEqual(await pool.generate_playable("next", OrderConfig()), "/out/next.html")
+        stats = pool.stats()[0]
+        self.assertEqual(stats.jobs_timed_out, 1)
+        self.assertNotEqual(stats.pid, old_pid)
+
+    async def test_abandoned_workspaces_follow_the_configured_directory(self):
+        with mock.patch.dict(os.environ, {"BUILDER_WORKSPACE_DIR": "custom_ws"}):
+            pool = self._pool(1, deadline_seconds=0.3)
+        await pool.generate_playable("warm", OrderConfig())
+        work_dir = Path(self._tmp.name) / "custom_ws" / str(pool.stats()[0].pid)
+        work_dir.mkdir(parents=True)
+
+        self.assertIsNone(await pool.generate_playable("stuck", OrderConfig(extra={"delay": 30})))
+        for _ in range(50):
+            if not pool._retiring:
+                break
+            await asyncio.sleep(0.05)
+
+        self.assertFalse(work_dir.exists())
+
+
+class FakePool:
+    capacity = 1
+
+    def __init__(self) -> None:
+        self.started: list[str] = []
+        self.cancelled: list[str] = []
+        self.release = asyncio.Event()
+
+    async def generate_playable(self, order_id: str, config: OrderConfig, on_progress=None) -> str | None:
+        self.started.append(order_id)
+        if on_progress is not None:
+            on_progress(BuildProgress("vite_build", 1000))
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled.append(order_id)
+            raise
+        return f"/out/{order_id}.html"
+
+
+class TestBuildScheduler(unittest.IsolatedAsyncioTestCase):
+    async def test_higher_priority_jobs_run_first(self):
+        pool = FakePool()
+        scheduler = BuildScheduler(pool, max_queued=10)  # type: ignore[arg-type]
+        running = scheduler.submit("k0", "first", OrderConfig(), BuildPriority.PAID_FINAL)
+        prefetch = scheduler.submit("k1", "prefetch", OrderConfig(), BuildPriority.PREFETCH)
+        grant = scheduler.submit("k2", "grant", OrderConfig(), BuildPriority.ADMIN_GRANT)
+        paid = scheduler.submit("k3", "paid", OrderConfig(), BuildPriority.PAID_FINAL)
+        await asyncio.sleep(0)
+
+        self.assertEqual([scheduler.position(t) for t in (running, paid, grant, prefetch)], [0, 1, 2, 3])
+        self.assertLess(scheduler.eta_seconds(paid), scheduler.eta_seconds(prefetch))
+        pool.release.set()
+        await asyncio.gather(running.future, prefetch.future, grant.future, paid.future)
+
+        self.assertEqual(pool.started, ["first", "paid", "grant", "prefetch"])
+
+    async def test_identical_jobs_are_merged_and_upgraded(self):
+        pool = FakePool()
+        scheduler = BuildScheduler(pool, max_queued=10)  # type: ignore[arg-type]
+        scheduler.submit("busy", "busy", OrderConfig(), BuildPriority.PAID_FINAL)
+        other = scheduler.submit("k1", "other", OrderConfig(), BuildPriority.ADMIN_GRANT)
+        speculative = scheduler.submit("k2", "a", OrderConfig(), BuildPriority.PREFETCH)
+
+        merged = scheduler.submit("k2", "b", OrderConfig(), BuildPriority.PAID_FINAL)
+
+        self.assertIs(merged, speculative)
+        self.assertEqual(scheduler.position(merged), 1)
+        self.assertEqual(scheduler.position(other), 2)
+        pool.release.set()
+        self.assertEqual(await merged.future, "/out/a.html")
+        await other.future
+        self.assertEqual(pool.started.count("a"), 1)
+        self.assertNotIn("b", pool.started)
+
+    async def test_paid_build_preempts_a_running_speculative_one(self):
+        pool = FakePool()
+        scheduler = BuildScheduler(pool, max_queued=10)  # type: ignore[arg-type]
+        speculative = scheduler.submit("k0", "speculative", OrderConfig(), BuildPriority.PREFETCH)
+        await asyncio.sleep(0)
+
+        paid = scheduler.submit("k1", "paid", OrderConfig(), BuildPriority.PAID_FINAL)
+        for _ in range(3):
+            await asyncio.sleep(0)
+
+        self.assertEqual(pool.cancelled, ["speculative"])
+        self.assertTrue(speculative.future.cancelled())
+        self.assertEqual(pool.started, ["speculative", "paid"])
+        pool.release.set()
+        self.assertEqual(await paid.future, "/out/paid.html")
+
+    async def test_promoted_speculative_build_is_not_preempted(self):
+        pool = FakePool()
+        scheduler = BuildScheduler(pool, max_queued=10)  # type: ignore[arg-type]
+        speculative = scheduler.submit("k0", "speculative", OrderConfig(), BuildPriority.PREFETCH)
+        await asyncio.sleep(0)
+
+        self.assertTrue(scheduler.promote("k0", BuildPriority.PAID_FINAL))
+        other = scheduler.submit("k1", "other", OrderConfig(), BuildPriority.PAID_FINAL)
+        await asyncio.sleep(0)
+
+        self.assertEqual(pool.cancelled, [])
+        self.assertEqual(scheduler.position(other), 1)
+        self.assertFalse(scheduler.promote("missing", BuildPriority.PAID_FINAL))
+        pool.release.set()
+        self.assertEqual(await speculative.future, "/out/speculative.html")
+        await other.future
+
+    async def test_speculative_builds_leave_a_slot_and_the_queue_to_paid_ones(self):
+        pool = FakePool()
+        scheduler = BuildScheduler(pool, concurrency=2, max_queued=1)  # type: ignore[arg-type]
+        scheduler.submit("k0", "speculative", OrderConfig(), BuildPriority.PREFETCH)
+        waiting = scheduler.submit("k1", "waiting", OrderConfig(), BuildPriority.PREFETCH)
+        await asyncio.sleep(0)
+        self.assertEqual(pool.started, ["speculative"])
+
+        with self.assertRaises(BuildQueueFullError):
+            scheduler.submit("k2", "refused", OrderConfig(), BuildPriority.PREFETCH)
+        scheduler.submit("k3", "paid", OrderConfig(), BuildPriority.PAID_FINAL)
+        queued_paid = scheduler.submit("k4", "queued", OrderConfig(), BuildPriority.PAID_FINAL)
+        for _ in range(3):
+            await asyncio.sleep(0)
+
+        # The second paid job had no free slot, so the speculative build made room.
+        self.assertEqual(pool.cancelled, ["speculative"])
+        self.assertEqual(pool.started, ["speculative", "paid", "queued"])
+        self.assertEqual(scheduler.position(waiting), 1)
+        pool.release.set()
+        await asyncio.gather(queued_paid.future, waiting.future)
+
+    async def test_full_queue_refuses_new_jobs(self):
+        pool = FakePool()
+        scheduler = BuildScheduler(pool, max_queued=1)  # type: ignore[arg-type]
+        scheduler.submit("k0", "running", OrderConfig(), BuildPriority.PAID_FINAL)
+        scheduler.submit("k1", "waiting", OrderConfig(), BuildPriority.PAID_FINAL)
+
+        with self.assertRaises(BuildQueueFullError):
+            scheduler.submit("k2", "refused", OrderConfig(), BuildPriority.PAID_FINAL)
+        pool.release.set()
+
+    async def test_build_is_cancelled_when_its_last_waiter_is(self):
+        pool = FakePool()
+        scheduler = BuildScheduler(pool, max_queued=10)  # type: ignore[arg-type]
+        running = scheduler.submit("k0", "running", OrderConfig(), BuildPriority.PAID_FINAL)
+        queued = scheduler.submit("k1", "queued", OrderConfig(), BuildPriority.PAID_FINAL)
+        first = asyncio.create_task(scheduler.wait(running))
+        second = asyncio.create_task(scheduler.wait(running))
+        queued_waiter = asyncio.create_task(scheduler.wait(queued))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        self.assertEqual(pool.cancelled, [])
+
+        second.cancel()
+        queued_waiter.cancel()
+        await asyncio.gather(second, queued_waiter, return_exceptions=True)
+        await asyncio.sleep(0)
+
+        self.assertEqual(pool.cancelled, ["running"])
+        self.assertTrue(queued.future.cancelled())
+        self.assertNotIn("queued", pool.started)
+        self.assertEqual(scheduler.queued, 0)
+
+    async def test_late_waiter_gets_current_stage(self):
+        pool = FakePool()
+        scheduler = BuildScheduler(pool, max_queued=10)  # type: ignore[arg-type]
+        ticket = scheduler.submit("k0", "a", OrderConfig(), BuildPriority.PAID_FINAL)
+        await asyncio.sleep(0)
+        seen: list[BuildProgress] = []
+
+        waiter = asyncio.create_task(scheduler.wait(ticket, seen.append))
+        await asyncio.sleep(0)
+        pool.release.set()
+        await waiter
+
+        self.assertEqual(seen, [BuildProgress("vite_build", 1000)])
+        self.assertEqual(ticket.listeners, [])
+
+
+def test_stage_durations_run_until_the_next_stage() -> None:
+    events = [BuildProgress("copy_template", 0), BuildProgress("vite_build", 400), BuildProgress("inject_config", 1500), BuildProgress("done", 1600)]
+
+    assert stage_durations(events) == {"copy_template": 0.4, "vite_build": 1.1, "inject_config": 0.1}
+    assert stage_durations(events[:1]) == {}
+
+
+def test_stage_summary_skips_failed_builds() -> None:
+    builds = [
+        BuildMetrics("a", "railroad", False, True, 2.0, {"vite_build": 1.0}, None),
+        BuildMetrics("b", "railroad", False, True, 4.0, {"vite_build": 3.0, "inline_assets": 0.5}, None),
+        BuildMetrics("c", "railroad", False, False, 9.0, {"vite_build": 9.0}, None),
+    ]
+
+    summary = {item.stage: item for item in summarize_stages(builds)}
+
+    assert list(summary) == ["vite_build", "inline_assets", "total"]
+    assert (summary["vite_build"].samples, summary["vite_build"].mean_seconds, summary["vite_build"].p95_seconds) == (2, 2.0, 3.0)
+    assert summary["total"].mean_seconds == 3.0
+
+
+def test_tree_rss_sums_only_the_runner_and_its_descendants(tmp_path: Path) -> None:
+    def process(pid: int, resident_pages: int, children: tuple[int, ...] = ()) -> None:
+        task = tmp_path / str(pid) / "task" / str(pid)
+        task.mkdir(parents=True)
+        (task / "children").write_text(" ".join(map(str, children)))
+        (tmp_path / str(pid) / "statm").write_text(f"100 {resident_pages} 0 0 0 0 0\n")
+
+    # 13 exited between being listed and being read; 99 is someone else's process.
+    process(10, 5, (11, 13))
+    process(11, 7, (12,))
+    process(12, 3)
+    process(99, 1000)
+    page = os.sysconf("SC_PAGE_SIZE")
+
+    assert read_tree_rss_bytes(10, tmp_path) == 15 * page
+    assert read_tree_rss_bytes(11, tmp_path) == 10 * page
+    assert read_tree_rss_bytes(None, tmp_path) is None
+    assert read_tree_rss_bytes(42, tmp_path) is None
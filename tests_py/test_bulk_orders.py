@@ -0,0 +1,47 @@
+from bot_py.bulk_orders import order_units, parse_bulk_rows, variant_config
+from bot_py.models import CryptoPayment, OrderConfig, OrderVariant
+
+
+def test_rows_accept_any_separator_header_and_commas_inside_the_cta() -> None:
+    text = (
+        "geo;cta;balance\n"
+        "pt_brl; https://a.example/?x=1,2 ; 5000\n"
+        "# comment\n"
+        "EN_USD,b.example\n"
+        "es_eur\thttps://c.example\t1 000\n"
+        "en_usd https://d.example/?a=1,b=2\n"
+    )
+
+    result = parse_bulk_rows(text, default_balance=1000)
+
+    assert result.errors == []
+    assert result.variants == [
+        OrderVariant(geo_id="pt_brl", click_url="https://a.example/?x=1,2", starting_balance=5000),
+        OrderVariant(geo_id="en_usd", click_url="https://b.example", starting_balance=1000),
+        OrderVariant(geo_id="es_eur", click_url="https://c.example", starting_balance=1000),
+        OrderVariant(geo_id="en_usd", click_url="https://d.example/?a=1,b=2", starting_balance=1000),
+    ]
+
+
+def test_bad_rows_are_reported_by_line_number() -> None:
+    text = "en_usd,https://a.example\nxx_yyy,https://b.example\nen_usd\nen_usd,ftp://c.example\nen_usd,https://a.example\n"
+
+    result = parse_bulk_rows(text, default_balance=0, max_variants=5)
+
+    assert len(result.variants) == 1
+    assert [error.split(":")[0] for error in result.errors] == ["Строка 2", "Строка 3", "Строка 4", "Строка 5"]
+    assert parse_bulk_rows("\n\n", default_balance=0).errors
+    assert parse_bulk_rows("en_usd a.example\nen_usd b.example", default_balance=0, max_variants=1).errors
+
+
+def test_variant_config_is_a_plain_single_order() -> None:
+    variant = OrderVariant(geo_id="pt_brl", click_url="https://a.example", starting_balance=5000)
+    payment = CryptoPayment(invoice_id=1, pay_url="", type="single", amount=90, discount=10)
+    bulk = OrderConfig(game="railroad", theme_id="chicken_farm", variants=[variant, variant], payment=payment)
+
+    config = variant_config(bulk, variant)
+
+    assert (config.geo_id, config.language, config.currency) == ("pt_brl", "pt", "R$")
+    assert (config.click_url, config.starting_balance, config.theme_id) == ("https://a.example", 5000, "chicken_farm")
+    assert config.variants is None and config.payment is None
+    assert (order_units(bulk), order_units(config)) == (2, 1)
@@ -0,0 +1,45 @@
+from bot_py.callback_tokens import STEP_BALANCE, STEP_CUSTOM_GEO, WizardToken, WizardTokenCodec
+
+GAMES = ["railroad", "olympus", "matching", "match3"]
+GEOS = ["en_usd", "pt_brl", "es_eur"]
+
+
+def _codec(secret: str = "secret") -> WizardTokenCodec:
+    return WizardTokenCodec(secret, GAMES, GEOS, max_age_seconds=120)
+
+
+def test_round_trip_fits_callback_data_limit() -> None:
+    codec = _codec()
+    token = WizardToken(step=STEP_BALANCE, game="match3", geo="es_eur", balance=1_000_000_000, issued_at=1_700_000_000)
+
+    data = codec.encode(42, token)
+
+    assert len(data.encode("utf-8")) <= 64
+    assert codec.decode(42, data) == token
+
+
+def test_optional_fields_survive_round_trip() -> None:
+    codec = _codec()
+    token = WizardToken(step=STEP_CUSTOM_GEO, game="railroad", issued_at=1_700_000_000)
+
+    assert codec.decode(7, codec.encode(7, token)) == token
+
+
+def test_rejects_other_user_key_and_tampering() -> None:
+    codec = _codec()
+    data = codec.encode(42, WizardToken(step=STEP_BALANCE, game="railroad", geo="en_usd", balance=1000))
+
+    assert codec.decode(43, data) is None
+    assert _codec("other").decode(42, data) is None
+    tampered = data[:5] + ("A" if data[5] != "A" else "B") + data[6:]
+    assert codec.decode(42, tampered) is None
+    assert codec.decode(42, "wz_!!!") is None
+    assert codec.decode(42, "geo_en_usd") is None
+
+
+def test_expiry_uses_issue_time() -> None:
+    codec = _codec()
+    token = WizardToken(step=STEP_BALANCE, game="railroad", geo="en_usd", balance=0, issued_at=1_000)
+
+    assert not codec.expired(token, now=1_100)
+    assert codec.expired(token, now=1_121)
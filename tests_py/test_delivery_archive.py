@@ -0,0 +1,54 @@
+import asyncio
+import os
+import unittest
+import zipfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from bot_py.delivery_archive import ArchivePool, archive_path_for, is_fresh
+
+
+class TestArchivePool(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self._tmp = TemporaryDirectory()
+        self.html = Path(self._tmp.name) / "Railroad_en_usd.html"
+        self.html.write_text("<html>" + "A" * 100_000 + "</html>", encoding="utf-8")
+        self.pool = ArchivePool(1)
+
+    async def asyncTearDown(self) -> None:
+        self.pool.close()
+        self._tmp.cleanup()
+
+    async def test_archive_holds_the_html_under_its_own_name(self):
+        archive = await self.pool.archive_for(self.html)
+
+        self.assertEqual(archive, archive_path_for(self.html))
+        self.assertLess(archive.stat().st_size, self.html.stat().st_size // 10)
+        with zipfile.ZipFile(archive) as bundle:
+            self.assertEqual(bundle.namelist(), [self.html.name])
+            self.assertEqual(bundle.read(self.html.name), self.html.read_bytes())
+
+    async def test_fresh_archive_is_reused_and_rebuilt_when_the_html_changes(self):
+        first = await asyncio.gather(*(self.pool.archive_for(self.html) for _ in range(3)))
+        built_at = first[0].stat().st_mtime_ns
+        self.assertEqual(await self.pool.archive_for(self.html), first[0])
+        self.assertEqual(first[0].stat().st_mtime_ns, built_at)
+
+        self.html.write_text("<html>changed</html>", encoding="utf-8")
+        os.utime(self.html, ns=(built_at + 10**9, built_at + 10**9))
+        self.assertFalse(is_fresh(self.html, first[0]))
+        archive = await self.pool.archive_for(self.html)
+        with zipfile.ZipFile(archive) as bundle:
+            self.assertEqual(bundle.read(self.html.name), b"<html>changed</html>")
+        self.assertEqual(sorted(path.name for path in self.html.parent.iterdir()), ["Railroad_en_usd.html", "Railroad_en_usd.zip"])
+
+    async def test_bundle_holds_every_member_under_its_name(self):
+        other = self.html.with_name("Olympus_pt_brl.html")
+        other.write_text("<html>olympus</html>", encoding="utf-8")
+        target = Path(self._tmp.name) / "orders" / "bulk_1" / "railroad_2_variants.zip"
+
+        archive = await self.pool.bundle([(self.html, "01_a.html"), (other, "02_b.html")], target)
+
+        with zipfile.ZipFile(archive) as bundle:
+            self.assertEqual(bundle.namelist(), ["01_a.html", "02_b.html"])
+            self.assertEqual(bundle.read("02_b.html"), b"<html>olympus</html>")
@@ -0,0 +1,67 @@
+import asyncio
+import unittest
+
+from bot_py.delivery_queue import DeliveryError, DeliveryJob, DeliveryQueue
+
+
+class TestDeliveryQueue(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.queue = DeliveryQueue(2)
+
+    async def asyncTearDown(self) -> None:
+        await self.queue.close()
+
+    async def test_workers_bound_concurrency_and_jobs_run_after_their_delay(self):
+        release = asyncio.Event()
+        running: list[str] = []
+
+        async def run(job: DeliveryJob) -> None:
+            running.append(job.order_id)
+            job.detail = "building"
+            await release.wait()
+
+        jobs = [self.queue.submit(f"o{index}", 7, run) for index in range(3)]
+        delayed = self.queue.submit("late", 7, run, delay=0.05)
+        await asyncio.sleep(0.01)
+
+        assert running == ["o0", "o1"]
+        assert [job.state for job in jobs] == ["running", "running", "queued"]
+        assert delayed.state == "scheduled"
+        assert self.queue.jobs_for_user(7)[0] is delayed
+        release.set()
+        await asyncio.sleep(0.1)
+        assert running == ["o0", "o1", "o2", "late"]
+        assert all(job.state == "done" and job.detail == "" for job in [*jobs, delayed])
+        assert self.queue.pending == 0
+
+    async def test_repeated_submit_joins_the_active_job(self):
+        calls: list[str] = []
+
+        async def run(job: DeliveryJob) -> None:
+            calls.append(job.order_id)
+
+        first = self.queue.submit("o1", 7, run, delay=0.02)
+        again = self.queue.submit("o1", 7, run)
+        await asyncio.sleep(0.05)
+        after = self.queue.submit("o1", 7, run)
+        await asyncio.sleep(0.01)
+
+        assert again is first
+        assert after is not first
+        assert calls == ["o1", "o1"]
+
+    async def test_failures_keep_a_status(self):
+        async def rejected(job: DeliveryJob) -> None:
+            raise DeliveryError("Ошибка сборки.")
+
+        async def crashed(job: DeliveryJob) -> None:
+            raise ValueError("boom")
+
+        with self.assertLogs(level="ERROR"):
+            self.queue.submit("o1", 7, rejected)
+            self.queue.submit("o2", 8, crashed)
+            await asyncio.sleep(0.01)
+
+        assert (self.queue.status("o1").state, self.queue.status("o1").detail) == ("failed", "Ошибка сборки.")
+        assert (self.queue.status("o2").state, self.queue.status("o2").detail) == ("failed", "Внутренняя ошибка.")
+        assert [job.order_id for job in self.queue.jobs_for_user(8)] == ["o2"]
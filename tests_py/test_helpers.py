@@ -2,16 +2,11 @@
     build_order_summary,
     build_profile_message,
     calc_price,
-    create_initial_session,
     get_discount,
     parse_pay_callback,
 )
 
 
-def test_create_initial_session() -> None:
-    assert create_initial_session() == {"config": {}}
-
-
 def test_get_discount_thresholds() -> None:
     assert get_discount(0) == 0
     assert get_discount(2) == 0
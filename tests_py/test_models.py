@@ -0,0 +1,117 @@
+import json
+
+from bot_py.models import (
+    CryptoPayment,
+    OrderConfig,
+    OrderVariant,
+    Session,
+    decode_order_config,
+    decode_session,
+    encode,
+)
+
+
+def test_decode_legacy_session_file() -> None:
+    raw = json.dumps(
+        {
+            "config": {"game": "railroad", "themeId": "chicken_farm", "startingBalance": 1000, "geoId": "en_usd"},
+            "wizard": {"stage": "cta_url", "updatedAt": 1700000000000, "attempts": 1},
+            "previewInProgress": False,
+            "pendingManualPayment": {"orderId": "ord_1", "paymentType": "sub", "amount": 100},
+        }
+    )
+
+    session = decode_session(raw)
+
+    assert session.config.game == "railroad"
+    assert session.config.starting_balance == 1000
+    assert session.wizard is not None and session.wizard.stage == "cta_url" and session.wizard.attempts == 1
+    assert session.preview_in_progress is False
+    assert session.pending_manual_payment is not None
+    assert session.pending_manual_payment.payment_type == "sub"
+
+
+def test_decode_garbage_falls_back_to_empty_session() -> None:
+    assert decode_session("not json") == Session()
+    assert decode_session("[1, 2]") == Session()
+    assert decode_session('{"config": "broken"}').config == OrderConfig()
+
+
+def test_session_round_trip_is_compact_and_keeps_unknown_keys() -> None:
+    session = decode_session('{"config":{"game":"matching","custom":{"a":1}},"legacyFlag":true}')
+
+    encoded = encode(session)
+
+    assert json.loads(encoded) == {"legacyFlag": True, "config": {"custom": {"a": 1}, "game": "matching"}}
+    assert " " not in encoded
+
+
+def test_order_config_validates_crypto_payment() -> None:
+    config = decode_order_config(
+        json.dumps(
+            {
+                "payment": {
+                    "provider": "crypto_pay",
+                    "invoiceId": "42",
+                    "payUrl": "https://pay.example/42",
+                    "type": "single",
+                    "amount": 349,
+                    "discount": 0,
+                }
+            }
+        )
+    )
+
+    assert config.payment == CryptoPayment(invoice_id=42, pay_url="https://pay.example/42", type="single", amount=349, discount=0)
+
+
+def test_order_config_keeps_invalid_payment_verbatim() -> None:
+    raw = {"payment": {"provider": "crypto_pay", "invoiceId": 0, "type": "single", "amount": 1, "discount": 0}}
+
+    config = decode_order_config(json.dumps(raw))
+
+    assert config.payment is None
+    assert config.to_dict() == raw
+
+
+def test_manual_payment_amounts_are_normalized() -> None:
+    config = decode_order_config('{"manualPayment": {"type": "weird", "amount": "abc", "discount": -5, "state": "approved"}}')
+
+    assert config.manual_payment is not None
+    assert config.manual_payment.type == "single"
+    assert config.manual_payment.amount == 0
+    assert config.manual_payment.discount == 0
+    assert config.manual_payment.state == "approved"
+
+
+def test_bulk_variants_round_trip_and_drop_broken_rows() -> None:
+    raw = '{"game": "railroad", "variants": [{"geoId": "pt_brl", "clickUrl": "https://a.example", "startingBalance": 5000}, {"geoId": "en_usd"}]}'
+
+    config = decode_order_config(raw)
+
+    assert config.variants == [OrderVariant(geo_id="pt_brl", click_url="https://a.example", starting_balance=5000)]
+    assert json.loads(encode(config))["variants"] == [{"geoId": "pt_brl", "clickUrl": "https://a.example", "startingBalance": 5000}]
+    assert "variants" not in json.loads(encode(OrderConfig(game="railroad")))
+
+
+def test_unknown_nested_keys_survive_a_rewrite() -> None:
+    raw = {
+        "payment": {"provider": "crypto_pay", "invoiceId": 42, "payUrl": "", "type": "sub", "amount": 99, "discount": 0, "asset": "USDT"},
+        "manualPayment": {"provider": "direct_wallet", "type": "single", "amount": 10, "discount": 0, "network": "TRC20"},
+    }
+
+    config = decode_order_config(json.dumps(raw))
+
+    assert config.manual_payment is not None and config.manual_payment.extra == {"network": "TRC20"}
+    assert config.to_dict() == raw
+
+
+def test_untouched_session_parts_are_written_back_as_read() -> None:
+    raw = {"config": {"game": "railroad", "startingBalance": "1 000"}, "wizard": {"stage": "geo", "updatedAt": 1, "step": 2}, "previewInProgress": False}
+
+    session = decode_session(json.dumps(raw))
+    assert json.loads(encode(session)) == raw
+
+    session.wizard = None
+    assert session.config.starting_balance is None
+    assert json.loads(encode(session)) == {"config": {"game": "railroad"}, "previewInProgress": False}
@@ -0,0 +1,191 @@
+import asyncio
+import tempfile
+import unittest
+from collections.abc import Collection
+from pathlib import Path
+from unittest import mock
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from bot_py import db
+from bot_py.db import DB, Order, OutboxMessage
+from bot_py.models import OrderConfig
+from bot_py.outbox import OutboxDispatcher, OutboxEntry, OutboxItem, OutboxRejected, backoff_seconds
+
+
+class MemoryStore:
+    def __init__(self, *entries: OutboxEntry) -> None:
+        self.entries = {entry.id: entry for entry in entries}
+        self.due_at = {entry.id: 0.0 for entry in entries}
+        self.status = {entry.id: "pending" for entry in entries}
+        self.errors: dict[int, str] = {}
+
+    async def due_outbox(
+        self,
+        now: float,
+        limit: int,
+        exclude: Collection[int],
+        kinds: Collection[str] | None = None,
+        skip_kinds: Collection[str] = (),
+    ) -> list[OutboxEntry]:
+        due = [self.entries[entry_id] for entry_id, status in self.status.items() if status == "pending" and self.due_at[entry_id] <= now]
+        due = [entry for entry in due if (kinds is None or entry.kind in kinds) and entry.kind not in skip_kinds]
+        return [entry for entry in due if entry.id not in exclude][:limit]
+
+    async def complete_outbox(self, entry_id: int) -> None:
+        self.status[entry_id] = "done"
+
+    async def retry_outbox(self, entry_id: int, attempts: int, next_attempt_at: float, error: str) -> None:
+        entry = self.entries[entry_id]
+        self.entries[entry_id] = OutboxEntry(entry.id, entry.kind, entry.payload, attempts)
+        self.due_at[entry_id] = next_attempt_at
+        self.errors[entry_id] = error
+
+    async def dead_letter_outbox(self, entry_id: int, attempts: int, error: str) -> None:
+        self.status[entry_id] = "dead"
+        self.errors[entry_id] = error
+
+
+async def _settle(dispatcher: OutboxDispatcher) -> None:
+    while dispatcher.in_flight:
+        await asyncio.sleep(0)
+
+
+class TestOutboxDispatcher(unittest.IsolatedAsyncioTestCase):
+    async def test_completed_and_rejected_entries(self):
+        store = MemoryStore(OutboxEntry(1, "note", {"text": "hi"}, 0), OutboxEntry(2, "note", {"text": ""}, 0), OutboxEntry(3, "unknown", {}, 0))
+        sent: list[str] = []
+        dead: list[int] = []
+
+        async def note(entry: OutboxEntry) -> None:
+            if not entry.payload["text"]:
+                raise OutboxRejected("empty message")
+            sent.append(entry.payload["text"])
+
+        async def on_dead_letter(entry: OutboxEntry, error: str) -> None:
+            dead.append(entry.id)
+
+        dispatcher = OutboxDispatcher(store, {"note": note}, on_dead_letter=on_dead_letter)
+        with self.assertLogs(level="ERROR"):
+            assert await dispatcher.drain() == 3
+            await _settle(dispatcher)
+
+        assert sent == ["hi"]
+        assert store.status == {1: "done", 2: "dead", 3: "dead"}
+        assert store.errors == {2: "empty message", 3: "no handler for 'unknown'"}
+        assert dead == [2, 3]
+
+    async def test_failures_back_off_then_dead_letter(self):
+        store = MemoryStore(OutboxEntry(1, "flaky", {}, 0))
+        calls = 0
+
+        async def flaky(entry: OutboxEntry) -> None:
+            nonlocal calls
+            calls += 1
+            raise ConnectionError("telegram is down")
+
+        dispatcher = OutboxDispatcher(store, {"flaky": flaky}, max_attempts=3)
+        with self.assertLogs(level="WARNING"):
+            await dispatcher.drain()
+            await _settle(dispatcher)
+        assert store.status[1] == "pending"
+        assert store.entries[1].attempts == 1
+        # Not due again until the backoff has passed.
+        assert await dispatcher.drain() == 0
+
+        with self.assertLogs(level="ERROR"):
+            for _ in range(2):
+                store.due_at[1] = 0.0
+                await dispatcher.drain()
+                await _settle(dispatcher)
+
+        assert calls == 3
+        assert store.status[1] == "dead"
+        assert store.errors[1] == "ConnectionError: telegram is down"
+
+    async def test_concurrency_is_bounded_and_running_entries_are_not_started_twice(self):
+        store = MemoryStore(*(OutboxEntry(entry_id, "slow", {}, 0) for entry_id in range(1, 4)))
+        release = asyncio.Event()
+
+        async def slow(entry: OutboxEntry) -> None:
+            await release.wait()
+
+        dispatcher = OutboxDispatcher(store, {"slow": slow}, concurrency=2)
+        assert await dispatcher.drain() == 2
+        await asyncio.sleep(0)
+        assert await dispatcher.drain() == 0
+        release.set()
+        await _settle(dispatcher)
+        assert await dispatcher.drain() == 1
+        await _settle(dispatcher)
+        assert set(store.status.values()) == {"done"}
+        await dispatcher.close()
+
+    async def test_slow_kinds_in_their_own_lane_leave_the_shared_slots_free(self):
+        store = MemoryStore(*(OutboxEntry(entry_id, "delivery", {}, 0) for entry_id in range(1, 5)), OutboxEntry(5, "note", {}, 0))
+        release = asyncio.Event()
+        notes: list[int] = []
+
+        async def delivery(entry: OutboxEntry) -> None:
+            await release.wait()
+
+        async def note(entry: OutboxEntry) -> None:
+            notes.append(entry.id)
+
+        dispatcher = OutboxDispatcher(store, {"delivery": delivery, "note": note}, concurrency=1, lanes={"delivery": 3})
+        assert await dispatcher.drain() == 4
+        await asyncio.sleep(0)
+        assert notes == [5]
+        # The fourth delivery waits for its lane, not for the note's slot.
+        assert await dispatcher.drain() == 0
+        release.set()
+        await _settle(dispatcher)
+        assert await dispatcher.drain() == 1
+        await _settle(dispatcher)
+        assert set(store.status.values()) == {"done"}
+
+
+class TestOutboxTransactions(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{(Path(self._tmp.name) / 'bot.db').as_posix()}")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(db.Base.metadata.create_all)
+        self._patches = [
+            mock.patch.object(db, "engine", self.engine),
+            mock.patch.object(db, "SessionLocal", async_sessionmaker(self.engine, expire_on_commit=False)),
+        ]
+        for patch in self._patches:
+            patch.start()
+        await DB.create_order("ord_1", 7, "railroad", "chicken_farm", OrderConfig(game="railroad"))
+
+    async def asyncTearDown(self) -> None:
+        for patch in self._patches:
+            patch.stop()
+        await self.engine.dispose()
+        self._tmp.cleanup()
+
+    async def _state(self) -> tuple[str, list[str]]:
+        async with db.SessionLocal() as session:
+            status = await session.scalar(select(Order.status).where(Order.order_id == "ord_1"))
+            keys = list(await session.scalars(select(OutboxMessage.dedupe_key)))
+        return status, keys
+
+    async def test_outbox_row_commits_with_the_order_change(self):
+        await DB.mark_paid("ord_1", "paid", 349, 0, [OutboxItem("delivery", {"orderId": "ord_1"}, dedupe_key="delivery:ord_1")])
+
+        assert await self._state() == ("paid", ["delivery:ord_1"])
+        assert [entry.kind for entry in await DB.due_outbox(float("inf"), 10)] == ["delivery"]
+
+    async def test_order_change_rolls_back_with_a_failed_outbox_row(self):
+        unserializable = OutboxItem("delivery", {"orderId": object()}, dedupe_key="delivery:ord_1")
+
+        with self.assertRaises(TypeError):
+            await DB.set_order_status("ord_1", "paid", [unserializable])
+
+        assert await self._state() == ("pending", [])
+
+
+def test_backoff_doubles_up_to_the_cap() -> None:
+    assert [backoff_seconds(attempts, base=5, cap=30) for attempts in range(1, 6)] == [5, 10, 20, 30, 30]
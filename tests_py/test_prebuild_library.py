@@ -0,0 +1,102 @@
+import json
+import sys
+import tempfile
+import textwrap
+import unittest
+from pathlib import Path
+
+from bot_py.builder_bridge import BuilderPool
+from bot_py.prebuild_library import library_targets, load_manifest, prebuild
+
+FAKE_RUNNER = textwrap.dedent(
+    """
+    import json
+    import os
+    import sys
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        if request["action"] == "warm_inline_cache":
+            with open("warms.log", "a") as log:
+                log.write(os.path.basename(request["templateDir"]) + "\\n")
+            print(json.dumps({"rid": request["rid"], "ok": True, "warmed": 1}), flush=True)
+            continue
+        if request.get("useLibrary") is not False or request["config"]["game"] == "olympus":
+            print(json.dumps({"rid": request["rid"], "ok": True, "path": None}), flush=True)
+            continue
+        os.makedirs("previews", exist_ok=True)
+        path = os.path.abspath(os.path.join("previews", request["id"] + ".html"))
+        with open(path, "w") as handle:
+            handle.write(request["id"])
+        with open("builds.log", "a") as log:
+            log.write(request["id"] + "\\n")
+        print(json.dumps({"rid": request["rid"], "ok": True, "path": path}), flush=True)
+    """
+)
+
+
+class TestPrebuildLibrary(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        (self.root / "fake_runner.py").write_text(FAKE_RUNNER, encoding="utf-8")
+        (self.root / "dist").mkdir()
+        (self.root / "dist" / "builder.js").write_text("v1", encoding="utf-8")
+        for template in ("matching", "railroad", "gate_of_olympus"):
+            (self.root / "templates" / template / "node_modules").mkdir(parents=True)
+            (self.root / "templates" / template / "main.ts").write_text(template, encoding="utf-8")
+        self.pool = BuilderPool(2, command=[sys.executable, str(self.root / "fake_runner.py")], cwd=self.root)
+
+    async def asyncTearDown(self) -> None:
+        await self.pool.close()
+        self._tmp.cleanup()
+
+    def _builds(self) -> list[str]:
+        log = self.root / "builds.log"
+        return log.read_text(encoding="utf-8").split() if log.exists() else []
+
+    async def test_only_stale_artifacts_are_rebuilt(self):
+        targets = library_targets(["game_drag", "game_railroad"], ["en_usd"])
+
+        first = await prebuild(self.pool, targets, root=self.root)
+        second = await prebuild(self.pool, targets, root=self.root)
+        (self.root / "templates" / "matching" / "node_modules" / "dep.js").write_text("ignored", encoding="utf-8")
+        third = await prebuild(self.pool, targets, root=self.root)
+        (self.root / "templates" / "matching" / "main.ts").write_text("changed", encoding="utf-8")
+        fourth = await prebuild(self.pool, targets, root=self.root)
+
+        self.assertEqual(len(first.built), 4)
+        self.assertEqual((second.built, len(second.fresh)), ([], 4))
+        self.assertEqual(third.built, [])
+        self.assertEqual(sorted(fourth.built), ["game_drag/en_usd_final.html", "game_drag/en_usd_preview.html"])
+        self.assertEqual(len(self._builds()), 6)
+        # Only templates with a stale preview are warmed, once per run.
+        self.assertEqual((self.root / "warms.log").read_text(encoding="utf-8").split(), ["matching", "railroad", "matching"])
+        final = self.root / "library" / "game_drag" / "en_usd_final.html"
+        self.assertEqual(final.read_text(encoding="utf-8"), "lib_game_drag_en_usd_final")
+        self.assertFalse(any((self.root / "previews").iterdir()))
+        manifest = load_manifest(self.root / "library" / "manifest.json")
+        self.assertEqual(manifest["game_drag/en_usd_final.html"]["size"], final.stat().st_size)
+        self.assertTrue(final.with_suffix(".zip").exists())
+        self.assertFalse((self.root / "library" / "game_drag" / "en_usd_preview.zip").exists())
+
+    async def test_failed_builds_stay_stale(self):
+        targets = library_targets(["game_olympus"], ["en_usd"])
+
+        report = await prebuild(self.pool, targets, root=self.root)
+
+        self.assertEqual(len(report.failed), 2)
+        self.assertEqual(load_manifest(self.root / "library" / "manifest.json"), {})
+        retry = await prebuild(self.pool, targets, root=self.root, dry_run=True)
+        self.assertEqual(len(retry.built), 2)
+
+    async def test_missing_artifact_is_rebuilt_even_if_manifest_matches(self):
+        targets = library_targets(["game_railroad"], ["en_usd"])
+        await prebuild(self.pool, targets, root=self.root)
+
+        (self.root / "library" / "game_railroad" / "en_usd_final.html").unlink()
+        report = await prebuild(self.pool, targets, root=self.root)
+
+        self.assertEqual(report.built, ["game_railroad/en_usd_final.html"])
+        manifest = json.loads((self.root / "library" / "manifest.json").read_text(encoding="utf-8"))
+        self.assertEqual(manifest["version"], 1)
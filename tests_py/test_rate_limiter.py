@@ -0,0 +1,116 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import GetMe, SendMessage
+
+from bot_py import rate_limiter
+from bot_py.rate_limiter import PRIORITY_BULK, PRIORITY_INTERACTIVE, OutboundLimiter, TokenBucket, bulk_sends
+
+
+def test_token_bucket_refills_at_its_rate() -> None:
+    bucket = TokenBucket(rate=2.0, capacity=2.0, updated_at=0.0)
+    bucket.take()
+    bucket.take()
+
+    assert bucket.wait_time(0.0) == 0.5
+    assert bucket.wait_time(0.5) == 0.0
+    bucket.paused_until = 3.0
+    assert bucket.wait_time(1.0) == 2.0
+
+
+def test_token_bucket_is_idle_once_refilled_by_the_clock() -> None:
+    bucket = TokenBucket(rate=1.0, capacity=2.0, updated_at=0.0)
+    bucket.take()
+    bucket.take()
+
+    assert not bucket.idle(1.0)
+    assert bucket.idle(2.0)
+    bucket.paused_until = 5.0
+    assert not bucket.idle(4.0)
+    assert bucket.idle(5.0)
+
+
+class TestOutboundLimiter(unittest.IsolatedAsyncioTestCase):
+    async def test_global_rate_is_held_across_chats(self):
+        limiter = OutboundLimiter(global_rate=50)
+        started = time.monotonic()
+
+        await asyncio.gather(*(limiter.acquire(chat_id) for chat_id in range(1, 76)))
+
+        # 50 go out as the initial burst, the other 25 at 50 a second.
+        assert 0.4 < time.monotonic() - started < 0.8
+
+    async def test_user_replies_go_before_bulk_traffic(self):
+        limiter = OutboundLimiter(global_rate=20)
+        await asyncio.gather(*(limiter.acquire(chat_id) for chat_id in range(1, 21)))
+        order: list[str] = []
+
+        async def send(label: str, chat_id: int, priority: int) -> None:
+            await limiter.acquire(chat_id, priority)
+            order.append(label)
+
+        bulk = [asyncio.create_task(send(f"bulk{index}", 100 + index, PRIORITY_BULK)) for index in range(3)]
+        await asyncio.sleep(0)
+        reply = asyncio.create_task(send("reply", 200, PRIORITY_INTERACTIVE))
+        await asyncio.gather(reply, *bulk)
+
+        assert order[0] == "reply"
+        assert sorted(order[1:]) == ["bulk0", "bulk1", "bulk2"]
+
+    async def test_chat_buckets_that_refilled_are_dropped(self):
+        now = 0.0
+        limiter = OutboundLimiter(global_rate=100, clock=lambda: now)
+        with mock.patch.object(rate_limiter, "CHAT_BUCKETS_MAX", 3):
+            for chat_id in range(1, 4):
+                await limiter.acquire(chat_id)
+            limiter.pause(1, 30)
+            now = 10.0
+            for chat_id in range(4, 7):
+                await limiter.acquire(chat_id)
+
+            # Chats 2 and 3 refilled and went; paused chat 1 is kept and the map runs one over until it is not.
+            assert list(limiter._chats) == [1, 4, 5, 6]
+            now = 40.0
+            await limiter.acquire(7)
+            assert list(limiter._chats) == [5, 6, 7]
+
+    async def test_retry_after_pauses_the_chat_and_requeues(self):
+        limiter = OutboundLimiter()
+        method = SendMessage(chat_id=5, text="hi")
+        calls: list[float] = []
+
+        async def make_request(bot, method):
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=1)
+            return "sent"
+
+        with self.assertLogs(level="WARNING"), bulk_sends():
+            assert await limiter(make_request, None, method) == "sent"
+
+        assert len(calls) == 2
+        assert calls[1] - calls[0] >= 0.9
+
+    async def test_retry_after_beyond_the_limit_is_raised(self):
+        limiter = OutboundLimiter(max_retry_after=5)
+        method = SendMessage(chat_id=5, text="hi")
+
+        async def make_request(bot, method):
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=30)
+
+        with self.assertRaises(TelegramRetryAfter):
+            await limiter(make_request, None, method)
+
+    async def test_calls_without_a_chat_are_not_limited(self):
+        limiter = OutboundLimiter(global_rate=1)
+
+        async def make_request(bot, method):
+            return "ok"
+
+        results = await asyncio.gather(*(limiter(make_request, None, GetMe()) for _ in range(10)))
+
+        assert results == ["ok"] * 10
+        assert limiter.waiting == 0
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import re
+from pathlib import Path
+
+from bot_py.models import OrderConfig
+from bot_py.runtime_config import (
+    build_guard_payload,
+    build_output_filename,
+    build_runtime_script,
+    inject_runtime_config,
+    to_runtime_config,
+)
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _node_script_template() -> str:
+    source = (ROOT / "src" / "builder.ts").read_text(encoding="utf-8-sig")
+    start = source.index("const script = `") + len("const script = `")
+    template = source[start : source.index("`;", start)]
+    return template.replace("\\\\", "\\")
+
+
+def test_script_matches_node_builder() -> None:
+    runtime_config = {"game": "railroad", "isWatermarked": False}
+
+    script = build_runtime_script(runtime_config, guard_salt="abc123")
+
+    expected = _node_script_template().replace("${json}", json.dumps(runtime_config, separators=(",", ":"))).replace("${guardSalt}", "abc123")
+    assert script == expected
+
+
+def test_watermarked_config_is_signed() -> None:
+    runtime_config = to_runtime_config(OrderConfig(game="matching", click_url="https://example.com/?a=<b>"), True)
+
+    script = build_runtime_script(runtime_config, guard_salt="s4lt")
+
+    config_json = re.search(r"window\.__USER_CONFIG__=(\{.*?\});", script).group(1)
+    assert "<" not in config_json
+    signed = json.loads(config_json)
+    assert signed["__guardVer"] == "v2"
+    assert signed["__guardSig"] == hashlib.sha256(f"{build_guard_payload(runtime_config)}|s4lt".encode()).hexdigest()
+    assert build_guard_payload(runtime_config).startswith("matching|default|en|$|1000|4|true|https://")
+
+
+def test_inject_splices_before_first_head_close(tmp_path: Path) -> None:
+    source = tmp_path / "lib.html"
+    source.write_bytes("<html><head><title>ф</title></head><body></head></body></html>".encode())
+    runtime_config = to_runtime_config(OrderConfig(click_url="https://example.com"), False)
+
+    target = inject_runtime_config(source, tmp_path / "out" / "final.html", runtime_config, guard_salt="x")
+
+    script = build_runtime_script(runtime_config, guard_salt="x")
+    expected = source.read_text(encoding="utf-8").replace("</head>", f"{script}</head>", 1)
+    assert target.read_text(encoding="utf-8") == expected
+    assert list((tmp_path / "out").iterdir()) == [target]
+
+
+def test_inject_prepends_without_head(tmp_path: Path) -> None:
+    source = tmp_path / "lib.html"
+    source.write_text("<body></body>", encoding="utf-8")
+
+    target = inject_runtime_config(source, tmp_path / "final.html", {"game": "railroad"}, guard_salt="x")
+
+    assert target.read_text(encoding="utf-8") == build_runtime_script({"game": "railroad"}, guard_salt="x") + "\n<body></body>"
+
+
+def test_output_filename_matches_node_builder() -> None:
+    config = OrderConfig(game="railroad", theme_id="chicken_farm", language="pt", currency="R$")
+
+    assert build_output_filename("ord_1", config, False) == "railroad_chicken_farm_PT_R.html"
+    assert build_output_filename("ord_1", config, True) == "PREVIEW_ord_1.html"
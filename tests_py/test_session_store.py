@@ -0,0 +1,80 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from bot_py.models import OrderConfig, Session
+from bot_py.session_store import FileSessionStore
+
+
+class TestFileSessionStore(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.sessions_dir = Path(self._tmp.name)
+        self.store = FileSessionStore(self.sessions_dir, ttl_seconds=3600, pending_payment_ttl_seconds=600, wizard_timeout_ms=120_000)
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def _write(self, user_id: int, payload: dict, age_seconds: float = 0) -> Path:
+        path = self.sessions_dir / f"{user_id}.json"
+        path.write_text(json.dumps(payload), encoding="utf-8")
+        mtime = time.time() - age_seconds
+        os.utime(path, (mtime, mtime))
+        return path
+
+    async def test_locks_are_released_after_use(self):
+        await self.store.save(1, Session(config=OrderConfig(game="railroad")))
+        session = await self.store.get(1)
+        self.assertEqual(session.config.game, "railroad")
+        self.assertEqual(self.store.active_locks, 0)
+
+    async def test_sweep_deletes_idle_sessions(self):
+        idle = self._write(1, {"config": {"game": "railroad"}}, age_seconds=7200)
+        fresh = self._write(2, {"config": {"game": "railroad"}})
+
+        stats = await self.store.sweep()
+
+        self.assertEqual(stats.deleted, 1)
+        self.assertFalse(idle.exists())
+        self.assertTrue(fresh.exists())
+
+    async def test_sweep_compacts_expired_state_and_keeps_mtime(self):
+        now_ms = int(time.time() * 1000)
+        path = self._write(
+            1,
+            {
+                "config": {"game": "railroad"},
+                "wizard": {"stage": "cta_url", "updatedAt": now_ms - 600_000},
+                "previewInProgress": True,
+                "pendingManualPayment": {"orderId": "ord_1", "createdAt": now_ms - 3_600_000},
+            },
+            age_seconds=1800,
+        )
+        mtime_before = path.stat().st_mtime
+
+        stats = await self.store.sweep()
+
+        self.assertEqual(stats.compacted, 1)
+        self.assertEqual(json.loads(path.read_text(encoding="utf-8")), {"config": {"game": "railroad"}})
+        self.assertAlmostEqual(path.stat().st_mtime, mtime_before, places=3)
+
+    async def test_sweep_removes_sessions_left_empty(self):
+        path = self._write(1, {"config": {}, "wizard": {"stage": "geo", "updatedAt": 0}})
+
+        stats = await self.store.sweep()
+
+        self.assertEqual(stats.deleted, 1)
+        self.assertFalse(path.exists())
+
+    async def test_sweep_keeps_active_wizard(self):
+        now_ms = int(time.time() * 1000)
+        payload = {"config": {"game": "railroad"}, "wizard": {"stage": "geo", "updatedAt": now_ms}}
+        path = self._write(1, payload)
+
+        stats = await self.store.sweep()
+
+        self.assertEqual((stats.deleted, stats.compacted), (0, 0))
+        self.assertEqual(json.loads(path.read_text(encoding="utf-8")), payload)
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import socket
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Any
+
+import aiohttp
+
+from bot_py.webhook import SECRET_HEADER, WebhookServer, derive_webhook_secret
+from bot_py.webhook_replay import load_updates, replay
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestWebhookServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.fed: list[int] = []
+        self.running = 0
+        self.peak = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+        async def feed(update: dict[str, Any]) -> None:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            await self.release.wait()
+            self.running -= 1
+            self.fed.append(update["update_id"])
+
+        self.server = WebhookServer(feed, secret="s3cret", concurrency=2)
+        port = _free_port()
+        await self.server.start("127.0.0.1", port)
+        self.url = f"http://127.0.0.1:{port}{self.server.path}"
+
+    async def asyncTearDown(self) -> None:
+        self.release.set()
+        await self.server.close()
+
+    async def test_recorded_updates_are_replayed_in_order(self):
+        with TemporaryDirectory() as tmp:
+            recorded = Path(tmp) / "updates.json"
+            recorded.write_text(json.dumps({"ok": True, "result": [{"update_id": index} for index in range(5)]}), encoding="utf-8")
+            updates = load_updates(recorded)
+
+        report = await replay(updates, self.url, "s3cret")
+        await self.server.close()
+
+        assert report.statuses == {200: 5}
+        assert self.fed == [0, 1, 2, 3, 4]
+
+    async def test_wrong_secret_and_bad_bodies_are_refused(self):
+        async with aiohttp.ClientSession() as session:
+            async with session.post(self.url, json={"update_id": 1}, headers={SECRET_HEADER: "guess"}) as response:
+                assert response.status == 401
+            async with session.post(self.url, json={"update_id": 1}) as response:
+                assert response.status == 401
+            async with session.post(self.url, data=b"{not json", headers={SECRET_HEADER: "s3cret"}) as response:
+                assert response.status == 400
+        assert self.fed == []
+
+    async def test_handling_is_bounded_by_concurrency(self):
+        self.release.clear()
+        posted = asyncio.create_task(replay([{"update_id": index} for index in range(5)], self.url, "s3cret", concurrency=5))
+        await asyncio.sleep(0.2)
+
+        # Two updates are being handled; the rest wait unanswered for a slot.
+        assert self.server.in_flight == 2
+        assert not posted.done()
+        self.release.set()
+        report = await posted
+        await self.server.close()
+
+        assert report.statuses == {200: 5}
+        assert sorted(self.fed) == [0, 1, 2, 3, 4]
+        assert self.peak == 2
+
+
+def test_load_updates_reads_json_lines(tmp_path: Path) -> None:
+    recorded = tmp_path / "updates.jsonl"
+    recorded.write_text('{"update_id": 1}\n\n{"update_id": 2}\n', encoding="utf-8")
+
+    assert load_updates(recorded) == [{"update_id": 1}, {"update_id": 2}]
+
+
+def test_derived_secret_is_stable_and_allowed_by_telegram() -> None:
+    secret = derive_webhook_secret("123:abc")
+
+    assert secret == derive_webhook_secret("123:abc") != derive_webhook_secret("123:abd")
+    assert secret.isalnum() and len(secret) <= 256